@@ -76,6 +76,8 @@ if __name__ == "__main__":
     weights = get_weights()
     # Put weights in the object store.
     weights_id = ray.put(weights)
+    # Every worker needs the weights, so copy them to all machines along a tree.
+    ray.broadcast(weights_id)
 
     # Compute the accuracy on a random training batch.
     x_id, y_id = batches[np.random.randint(len(batches))]
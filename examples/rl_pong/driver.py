@@ -137,6 +137,8 @@ if __name__ == "__main__":
 
   while True:
     model_id = ray.put(model)
+    # Every worker needs the model, so copy it to all machines along a tree.
+    ray.broadcast(model_id)
     grads, reward_sums = [], []
     # Launch tasks to compute gradients from multiple rollouts in parallel.
     for i in range(batch_size):
@@ -34,7 +34,65 @@ public:
   }
 };
 
-typedef std::vector<std::vector<ObjStoreId> > ObjTable;
+// A table indexed by ObjectID. Object IDs are handed out densely by push_back,
+// but the entries for objects that are dead can be erased, so the memory used
+// by the table is proportional to the number of live objects and not to the
+// number of objects that have ever been created. size() returns the number of
+// object IDs that have been allocated (including erased ones), so it can be used
+// for bounds checks just like the size of a vector indexed by ObjectID.
+template<class T>
+class ObjectIDTable {
+public:
+  ObjectIDTable(const T& erased_value = T()) : size_(0), erased_value_(erased_value) {}
+  size_t size() const {
+    return size_;
+  }
+  // The number of entries that have not been erased.
+  size_t num_live() const {
+    return table_.size();
+  }
+  void push_back(const T& value) {
+    table_.emplace(size_, value);
+    size_ += 1;
+  }
+  bool contains(ObjectID objectid) const {
+    return table_.find(objectid) != table_.end();
+  }
+  T& operator[](ObjectID objectid) {
+    auto it = table_.find(objectid);
+    RAY_CHECK(it != table_.end(), "Attempting to access objectid " << objectid << " in an ObjectIDTable, but this objectid " << (objectid < size_ ? "has been erased." : "has not been allocated."));
+    return it->second;
+  }
+  // Like operator[], but returns the value passed into the constructor for
+  // object IDs that have been erased.
+  const T& get(ObjectID objectid) const {
+    auto it = table_.find(objectid);
+    return it == table_.end() ? erased_value_ : it->second;
+  }
+  // Iterate over the (objectid, value) pairs that have not been erased, in no
+  // particular order.
+  typename std::unordered_map<ObjectID, T>::const_iterator begin() const {
+    return table_.begin();
+  }
+  typename std::unordered_map<ObjectID, T>::const_iterator end() const {
+    return table_.end();
+  }
+  void erase(ObjectID objectid) {
+    table_.erase(objectid);
+    // std::unordered_map never gives buckets back on its own, so shrink the
+    // bucket array once most of the entries have been erased.
+    if (table_.bucket_count() > MIN_BUCKETS && table_.size() * 8 < table_.bucket_count()) {
+      table_.rehash(0);
+    }
+  }
+private:
+  static const size_t MIN_BUCKETS = 1024;
+  size_t size_;
+  T erased_value_;
+  std::unordered_map<ObjectID, T> table_;
+};
+
+typedef ObjectIDTable<std::vector<ObjStoreId> > ObjTable;
 typedef std::unordered_map<std::string, FnInfo> FnTable;
 
 class objstore_not_registered_error : public std::runtime_error
@@ -1,2 +1,3 @@
-import random, linalg
+import random, linalg, lazy
 from core import *
+from reductions import *
@@ -1,61 +1,291 @@
+import itertools
 import numpy as np
 import ray.array.remote as ra
 import ray
 
-__all__ = ["BLOCK_SIZE", "DistArray", "assemble", "zeros", "ones", "copy",
-           "eye", "triu", "tril", "blockwise_dot", "dot", "transpose", "add", "subtract", "numpy_to_dist", "subblocks"]
+__all__ = ["BLOCK_SIZE", "TARGET_BLOCK_BYTES", "REDUCTION_FANIN", "ASSEMBLE_CHUNK_SIZE", "ASSEMBLE_PREFETCH_CHUNKS", "DistArray", "choose_block_shape", "assemble", "zeros", "ones", "copy",
+           "eye", "triu", "tril", "blockwise_dot", "panel_dot", "apply_to_transposed", "block_task", "add_blocks", "sum_tree", "dot", "transpose", "broadcast_shapes", "add", "subtract",
+           "multiply", "divide", "power", "equal", "not_equal", "less", "less_equal", "greater", "greater_equal", "numpy_to_dist",
+           "load_block", "from_memmap", "from_npy", "write_block", "to_npy", "subblocks"]
 
+# The length of each side of a block for arrays that are created without a
+# block_shape.
 BLOCK_SIZE = 10
+# The number of bytes per block that choose_block_shape aims for.
+TARGET_BLOCK_BYTES = 16 * 1024 * 1024
+# The number of partial results that are combined by each task in the trees
+# that combine the partial results of reductions and products.
+REDUCTION_FANIN = 4
+# The number of blocks that DistArray.assemble gets from the object store at a
+# time.
+ASSEMBLE_CHUNK_SIZE = 8
+# The number of chunks that DistArray.assemble copies to the local object store
+# ahead of the chunk it is getting.
+ASSEMBLE_PREFETCH_CHUNKS = 4
+
+def choose_block_shape(shape, dtype_name="float", target_block_bytes=TARGET_BLOCK_BYTES):
+  """Choose a block shape for an array so that its blocks hold about target_block_bytes.
+
+  The blocks are as close to square as the shape of the array allows. If the
+  array is narrow along some dimension, the blocks span that whole dimension
+  and are longer along the others.
+
+  Args:
+    shape (List[int]): The shape of the array.
+    dtype_name (str): The name of the dtype of the array.
+    target_block_bytes (int): The desired size of a block in bytes.
+
+  Returns:
+    A list with the length of the blocks along each dimension.
+  """
+  remaining = max(1, target_block_bytes // np.dtype(dtype_name).itemsize)
+  block_shape = [1] * len(shape)
+  # Visit the dimensions from shortest to longest, so that the budget left over
+  # by short dimensions goes to the longer ones.
+  dims = sorted(range(len(shape)), key=lambda dim: shape[dim])
+  for i, dim in enumerate(dims):
+    num_dims_left = len(dims) - i
+    side = int(remaining ** (1.0 / num_dims_left))
+    if (side + 1) ** num_dims_left <= remaining: # correct for rounding errors in the root
+      side += 1
+    block_shape[dim] = max(1, min(shape[dim], side))
+    remaining = max(1, remaining // block_shape[dim])
+  return block_shape
 
 class DistArray(object):
-  def __init__(self, shape, objectids=None):
+  def __init__(self, shape, objectids=None, block_shape=None, dtype_name=None, transposed=False):
     self.shape = shape
     self.ndim = len(shape)
-    self.num_blocks = [int(np.ceil(1.0 * a / BLOCK_SIZE)) for a in self.shape]
+    self.block_shape = list(block_shape) if block_shape is not None else [BLOCK_SIZE] * self.ndim
+    if len(self.block_shape) != self.ndim or min(self.block_shape + [1]) < 1:
+      raise Exception("The field `block_shape` must contain one positive entry per dimension, but `block_shape` is {} and `shape` is {}.".format(self.block_shape, self.shape))
+    self.num_blocks = DistArray.compute_num_blocks(self.shape, self.block_shape)
     self.objectids = objectids if objectids is not None else np.empty(self.num_blocks, dtype=object)
     if self.num_blocks != list(self.objectids.shape):
       raise Exception("The fields `num_blocks` and `objectids` are inconsistent, `num_blocks` is {} and `objectids` has shape {}".format(self.num_blocks, list(self.objectids.shape)))
+    # The name of the dtype of the blocks, or None if it is not known without
+    # retrieving a block.
+    self.dtype_name = np.dtype(dtype_name).name if dtype_name is not None else None
+    # If True, the objects in objectids hold the transposes of the blocks, so
+    # that transposing a matrix does not require transposing its blocks.
+    self.transposed = transposed
+    if self.transposed and self.ndim != 2:
+      raise Exception("Only 2-dimensional arrays can have transposed blocks, but the shape is {}.".format(self.shape))
 
   @staticmethod
-  def compute_block_lower(index, shape):
+  def compute_block_lower(index, shape, block_shape=None):
     if len(index) != len(shape):
       raise Exception("The fields `index` and `shape` must have the same length, but `index` is {} and `shape` is {}.".format(index, shape))
-    return [elem * BLOCK_SIZE for elem in index]
+    block_shape = block_shape if block_shape is not None else [BLOCK_SIZE] * len(shape)
+    return [elem * size for (elem, size) in zip(index, block_shape)]
 
   @staticmethod
-  def compute_block_upper(index, shape):
+  def compute_block_upper(index, shape, block_shape=None):
     if len(index) != len(shape):
       raise Exception("The fields `index` and `shape` must have the same length, but `index` is {} and `shape` is {}.".format(index, shape))
+    block_shape = block_shape if block_shape is not None else [BLOCK_SIZE] * len(shape)
     upper = []
     for i in range(len(shape)):
-      upper.append(min((index[i] + 1) * BLOCK_SIZE, shape[i]))
+      upper.append(min((index[i] + 1) * block_shape[i], shape[i]))
     return upper
 
   @staticmethod
-  def compute_block_shape(index, shape):
-    lower = DistArray.compute_block_lower(index, shape)
-    upper = DistArray.compute_block_upper(index, shape)
+  def compute_block_shape(index, shape, block_shape=None):
+    lower = DistArray.compute_block_lower(index, shape, block_shape)
+    upper = DistArray.compute_block_upper(index, shape, block_shape)
     return [u - l for (l, u) in zip(lower, upper)]
 
   @staticmethod
-  def compute_num_blocks(shape):
-    return [int(np.ceil(1.0 * a / BLOCK_SIZE)) for a in shape]
-
-  def assemble(self):
-    """Assemble an array on this node from a distributed array of object IDs."""
-    first_block = ray.get(self.objectids[(0,) * self.ndim])
-    dtype = first_block.dtype
-    result = np.zeros(self.shape, dtype=dtype)
+  def compute_num_blocks(shape, block_shape=None):
+    block_shape = block_shape if block_shape is not None else [BLOCK_SIZE] * len(shape)
+    return [int(np.ceil(1.0 * a / size)) for (a, size) in zip(shape, block_shape)]
+
+  def assemble(self, out=None):
+    """Assemble an array on this node from a distributed array of object IDs.
+
+    The blocks are gotten in chunks of ASSEMBLE_CHUNK_SIZE, in order, and
+    copied into the result, so that the scheduler is asked about each block
+    only once. While a chunk is gotten, the next ASSEMBLE_PREFETCH_CHUNKS
+    chunks are copied to the local object store in parallel. The blocks stay in
+    the local object store as long as the DistArray refers to them, so it must
+    have room for the whole array.
+
+    Args:
+      out (Optional[np.ndarray]): A preallocated array with the same shape as
+        this array to assemble the result into. By default, a new array is
+        allocated.
+
+    Returns:
+      The assembled array. If out was given, this is out.
+    """
+    if out is not None and list(out.shape) != list(self.shape):
+      raise Exception("The argument `out` must have the same shape as the array, but out.shape is {} and the shape of the array is {}.".format(list(out.shape), self.shape))
+    result = out
+    if result is None and self.dtype_name is not None:
+      result = np.empty(self.shape, dtype=self.dtype_name)
+    # A single object ID may appear in several blocks, so the blocks are
+    # identified by object identity and each object is only gotten once.
+    block_indices = {}
+    for index in np.ndindex(*self.num_blocks):
+      block_indices.setdefault(id(self.objectids[index]), []).append(index)
+    objectids = [self.objectids[indices[0]] for indices in block_indices.values()]
+    window = ASSEMBLE_CHUNK_SIZE * ASSEMBLE_PREFETCH_CHUNKS
+    if len(objectids) > 0:
+      ray.prefetch(objectids[:window])
+    for start in range(0, len(objectids), ASSEMBLE_CHUNK_SIZE):
+      if start + window < len(objectids):
+        ray.prefetch(objectids[(start + window):(start + window + ASSEMBLE_CHUNK_SIZE)])
+      chunk = objectids[start:start + ASSEMBLE_CHUNK_SIZE]
+      for (objectid, value) in zip(chunk, ray.get(chunk)):
+        if result is None:
+          result = np.empty(self.shape, dtype=value.dtype)
+        if self.transposed:
+          value = value.T
+        for index in block_indices[id(objectid)]:
+          lower = DistArray.compute_block_lower(index, self.shape, self.block_shape)
+          upper = DistArray.compute_block_upper(index, self.shape, self.block_shape)
+          result[[slice(l, u) for (l, u) in zip(lower, upper)]] = value
+    if result is None:
+      # The array has no blocks and its dtype is not known.
+      result = np.empty(self.shape)
+    return result
+
+  def copy(self):
+    """Return a DistArray with the same blocks.
+
+    This runs locally and does not launch any tasks, because the blocks are
+    immutable and can be shared.
+    """
+    return DistArray(self.shape, np.copy(self.objectids), self.block_shape, self.dtype_name, self.transposed)
+
+  def transpose(self):
+    """Return the transpose of a 2-dimensional DistArray.
+
+    This runs locally and does not launch any tasks. The result refers to the
+    same blocks and records that they have to be transposed when they are used.
+    """
+    if self.ndim != 2:
+      raise Exception("transpose expects its argument to be 2-dimensional, but a.ndim = {}, a.shape = {}.".format(self.ndim, self.shape))
+    return DistArray([self.shape[1], self.shape[0]], np.copy(self.objectids.T), [self.block_shape[1], self.block_shape[0]], self.dtype_name, not self.transposed)
+
+  @property
+  def T(self):
+    return self.transpose()
+
+  def untransposed(self):
+    """Return a DistArray with the same entries whose blocks are not transposed.
+
+    If the blocks of this array are transposed, this launches a task to
+    transpose each of them.
+    """
+    if not self.transposed:
+      return self
+    result = DistArray(self.shape, block_shape=self.block_shape, dtype_name=self.dtype_name)
     for index in np.ndindex(*self.num_blocks):
-      lower = DistArray.compute_block_lower(index, self.shape)
-      upper = DistArray.compute_block_upper(index, self.shape)
-      result[[slice(l, u) for (l, u) in zip(lower, upper)]] = ray.get(self.objectids[index])
+      result.objectids[index] = ra.transpose.remote(self.objectids[index])
+    return result
+
+  def subblocks(self, *ranges):
+    """
+    This function produces a distributed array from a subset of the blocks in the array `a`. The result and `a` will have the same number of dimensions. For example,
+        a.subblocks([0, 1], [2, 4])
+    will produce a DistArray whose objectids are
+        [[a.objectids[0, 2], a.objectids[0, 4]],
+         [a.objectids[1, 2], a.objectids[1, 4]]]
+    We allow the user to pass in an empty list [] to indicate the full range.
+    This runs locally and does not launch any tasks.
+    """
+    ranges = list(ranges)
+    if len(ranges) != self.ndim:
+      raise Exception("sub_blocks expects to receive a number of ranges equal to a.ndim, but it received {} ranges and a.ndim = {}.".format(len(ranges), self.ndim))
+    for i in range(len(ranges)):
+      if ranges[i] == []: # We allow the user to pass in an empty list to indicate the full range
+        ranges[i] = range(self.num_blocks[i])
+      if not np.alltrue(ranges[i] == np.sort(ranges[i])):
+        raise Exception("Ranges passed to sub_blocks must be sorted, but the {}th range is {}.".format(i, ranges[i]))
+      if ranges[i][0] < 0:
+        raise Exception("Values in the ranges passed to sub_blocks must be at least 0, but the {}th range is {}.".format(i, ranges[i]))
+      if ranges[i][-1] >= self.num_blocks[i]:
+        raise Exception("Values in the ranges passed to sub_blocks must be less than the relevant number of blocks, but the {}th range is {}, and a.num_blocks = {}.".format(i, ranges[i], self.num_blocks))
+    last_index = [r[-1] for r in ranges]
+    last_block_shape = DistArray.compute_block_shape(last_index, self.shape, self.block_shape)
+    shape = [(len(ranges[i]) - 1) * self.block_shape[i] + last_block_shape[i] for i in range(self.ndim)]
+    result = DistArray(shape, block_shape=self.block_shape, dtype_name=self.dtype_name, transposed=self.transposed)
+    for index in np.ndindex(*result.num_blocks):
+      result.objectids[index] = self.objectids[tuple([ranges[i][index[i]] for i in range(self.ndim)])]
     return result
 
   def __getitem__(self, sliced):
-    # TODO(rkn): fix this, this is just a placeholder that should work but is inefficient
-    a = self.assemble()
-    return a[sliced]
+    """Return the entries selected by sliced as a numpy array.
+
+    Only the blocks that overlap the selection are retrieved, and they are
+    retrieved with a single call to ray.get. Integers, slices, and Ellipsis are
+    supported as indices.
+    """
+    selected, keep_dims = _selected_indices(sliced, self.shape)
+    # For each dimension, the blocks that contain selected entries.
+    blocks = [np.unique(idx // size) for (idx, size) in zip(selected, self.block_shape)]
+    block_indices = list(itertools.product(*blocks))
+    if len(block_indices) > 0:
+      values = ray.get([self.objectids[index] for index in block_indices])
+      dtype = values[0].dtype
+    else:
+      values = []
+      if self.dtype_name is not None:
+        dtype = self.dtype_name
+      else:
+        dtype = ray.get(self.objectids[(0,) * self.ndim]).dtype if self.objectids.size > 0 else np.float64
+    result = np.empty([len(idx) for idx in selected], dtype=dtype)
+    for (index, value) in zip(block_indices, values):
+      if self.transposed:
+        value = value.T
+      # The positions in the result and in the block of the selected entries
+      # that lie in this block.
+      positions = [np.nonzero(idx // size == i)[0] for (idx, size, i) in zip(selected, self.block_shape, index)]
+      local = [idx[pos] - i * size for (idx, pos, size, i) in zip(selected, positions, self.block_shape, index)]
+      result[np.ix_(*positions)] = value[np.ix_(*local)]
+    result = result.reshape([len(idx) for (idx, keep) in zip(selected, keep_dims) if keep])
+    # Like numpy, return a scalar if every dimension is indexed by an integer.
+    return result[()] if result.ndim == 0 else result
+
+def _selected_indices(sliced, shape):
+  """Compute the entries of an array of the given shape that are selected by sliced.
+
+  Returns:
+    A list with an array of the selected indices along each dimension, and a
+      list of booleans that are False for the dimensions that are indexed by an
+      integer and therefore do not appear in the result.
+  """
+  sliced = list(sliced) if isinstance(sliced, tuple) else [sliced]
+  ellipsis_positions = [i for (i, s) in enumerate(sliced) if s is Ellipsis]
+  if len(ellipsis_positions) > 1:
+    raise IndexError("An index can only have a single Ellipsis, but the index is {}.".format(sliced))
+  if len(ellipsis_positions) == 1:
+    position = ellipsis_positions[0]
+    sliced[position:position + 1] = [slice(None)] * (len(shape) - len(sliced) + 1)
+  if len(sliced) > len(shape):
+    raise IndexError("Too many indices for an array with shape {}, the index is {}.".format(shape, sliced))
+  sliced += [slice(None)] * (len(shape) - len(sliced))
+  selected = []
+  keep_dims = []
+  for (s, n) in zip(sliced, shape):
+    if isinstance(s, slice):
+      selected.append(np.arange(*s.indices(n)))
+      keep_dims.append(True)
+    elif isinstance(s, (int, long, np.integer)):
+      if s < -n or s >= n:
+        raise IndexError("Index {} is out of bounds for a dimension of size {}.".format(s, n))
+      selected.append(np.array([s % n]))
+      keep_dims.append(False)
+    else:
+      raise IndexError("DistArray only supports integers, slices, and Ellipsis as indices, but the index contains {}.".format(s))
+  return selected, keep_dims
+
+def _result_dtype_name(*arrays):
+  """Return the name of the dtype that numpy gives the result of combining arrays, or None if a dtype is not known."""
+  if any([a.dtype_name is None for a in arrays]):
+    return None
+  return np.result_type(*[a.dtype_name for a in arrays]).name
 
 # Register the DistArray class with Ray so that it knows how to serialize it.
 ray.register_class(DistArray)
@@ -66,42 +296,153 @@ def assemble(a):
 
 # TODO(rkn): what should we call this method
 @ray.remote
-def numpy_to_dist(a):
-  result = DistArray(a.shape)
+def numpy_to_dist(a, block_shape=None):
+  result = DistArray(a.shape, block_shape=block_shape, dtype_name=a.dtype.name)
   for index in np.ndindex(*result.num_blocks):
-    lower = DistArray.compute_block_lower(index, a.shape)
-    upper = DistArray.compute_block_upper(index, a.shape)
+    lower = DistArray.compute_block_lower(index, a.shape, result.block_shape)
+    upper = DistArray.compute_block_upper(index, a.shape, result.block_shape)
     result.objectids[index] = ray.put(a[[slice(l, u) for (l, u) in zip(lower, upper)]])
   return result
 
+def _open_memmap(filename, dtype_name, mode, offset, shape, order):
+  return np.memmap(filename, dtype=dtype_name, mode=mode, offset=offset, shape=tuple(shape), order=order)
+
 @ray.remote
-def zeros(shape, dtype_name="float"):
-  result = DistArray(shape)
+def load_block(filename, dtype_name, offset, shape, order, lower, upper):
+  data = _open_memmap(filename, dtype_name, "r", offset, shape, order)
+  # Copy the block out of the file so that it does not refer to the mapping.
+  return np.array(data[[slice(l, u) for (l, u) in zip(lower, upper)]])
+
+def from_memmap(a, block_shape=None):
+  """Create a DistArray from an array that is memory-mapped from a file.
+
+  Each block is read from the file by its own task, so the array is loaded in
+  parallel and never has to fit in the memory of a single node. The file must
+  be visible under the same name to all of the workers, for example on a
+  shared file system.
+
+  Args:
+    a (np.memmap): The memory-mapped array. Only its file name, offset, dtype,
+      shape and order are used, so none of the data is read on this node. This
+      may also be a view of a memory-mapped array, like a range of its rows, as
+      long as the view is contiguous in the file.
+    block_shape (Optional[List[int]]): The block shape of the result. By
+      default, it is chosen with choose_block_shape.
+
+  Returns:
+    A DistArray with the contents of the file.
+  """
+  # Views of a memory-mapped array have the file name and offset of the whole
+  # array, so we compute where the view starts from the array it was taken
+  # from.
+  mapped = a
+  while isinstance(mapped.base, np.ndarray):
+    mapped = mapped.base
+  if not isinstance(mapped, np.memmap) or mapped.filename is None:
+    raise Exception("from_memmap expects an array that is memory-mapped from a file, but the array is not backed by a file.")
+  if not a.flags.c_contiguous and not a.flags.f_contiguous:
+    raise Exception("from_memmap expects an array that is contiguous in the file, but the array is a strided view of a memory-mapped array.")
+  offset = mapped.offset + (a.ctypes.data - mapped.ctypes.data)
+  shape = list(a.shape)
+  dtype_name = a.dtype.name
+  block_shape = block_shape if block_shape is not None else choose_block_shape(shape, dtype_name)
+  order = "F" if a.flags.f_contiguous and not a.flags.c_contiguous else "C"
+  result = DistArray(shape, block_shape=block_shape, dtype_name=dtype_name)
   for index in np.ndindex(*result.num_blocks):
-    result.objectids[index] = ra.zeros.remote(DistArray.compute_block_shape(index, shape), dtype_name=dtype_name)
+    lower = DistArray.compute_block_lower(index, shape, result.block_shape)
+    upper = DistArray.compute_block_upper(index, shape, result.block_shape)
+    result.objectids[index] = load_block.remote(mapped.filename, dtype_name, offset, shape, order, lower, upper)
   return result
 
 @ray.remote
-def ones(shape, dtype_name="float"):
-  result = DistArray(shape)
+def from_npy(path, block_shape=None):
+  """Load a DistArray from a .npy file with one task per block.
+
+  See from_memmap. The file is opened with np.load(mmap_mode="r"), which only
+  reads its header.
+  """
+  return from_memmap(np.load(path, mmap_mode="r"), block_shape=block_shape)
+
+@ray.remote
+def write_block(filename, dtype_name, offset, shape, lower, upper, block, transposed):
+  block = np.ascontiguousarray(block.T if transposed else block, dtype=dtype_name)
+  # The elements of the block are contiguous in the C-ordered file along the
+  # trailing dimensions that the block covers completely and along the
+  # dimension before them, so each block[index] below is one range of bytes.
+  split = len(shape) - 1
+  while split > 0 and lower[split] == 0 and upper[split] == shape[split]:
+    split -= 1
+  itemsize = np.dtype(dtype_name).itemsize
+  with open(filename, "r+b") as f:
+    for index in np.ndindex(*block.shape[:split]):
+      start = [l + i for (l, i) in zip(lower, index)] + list(lower[split:])
+      f.seek(offset + itemsize * int(np.ravel_multi_index(start, shape)))
+      f.write(block[index].tobytes())
+  return True
+
+def to_npy(a, path):
+  """Save a DistArray to a .npy file.
+
+  The file is created with its full size on this node, and then each block is
+  written into it by its own task, so the array never has to fit in the memory
+  of a single node. The file must be visible under the same name to all of the
+  workers, for example on a shared file system.
+
+  The tasks write the bytes of their blocks with plain file writes rather than
+  through memory maps, because memory maps write back whole pages, so tasks
+  whose blocks share a page of the file could overwrite each other. This
+  relies on the file system applying concurrent writes to different bytes of
+  the same page independently, which local file systems and NFS do.
+
+  Args:
+    a (DistArray): The array to save. Its dtype must be known.
+    path (str): The path of the file to create.
+
+  Returns:
+    A list of object IDs, one for each block, which are ready once the block
+      has been written. This does not wait for the writes, so call ray.get on
+      the result before reading the file.
+  """
+  if a.dtype_name is None:
+    raise Exception("to_npy needs to know the dtype of the array, but a.dtype_name is None.")
+  # Write the header and allocate the file.
+  data = np.lib.format.open_memmap(path, mode="w+", dtype=a.dtype_name, shape=tuple(a.shape))
+  offset = data.offset
+  del data
+  writes = []
+  for index in np.ndindex(*a.num_blocks):
+    lower = DistArray.compute_block_lower(index, a.shape, a.block_shape)
+    upper = DistArray.compute_block_upper(index, a.shape, a.block_shape)
+    writes.append(write_block.remote(path, a.dtype_name, offset, a.shape, lower, upper, a.objectids[index], a.transposed, _placement_hint=a.objectids[index]))
+  return writes
+
+@ray.remote
+def zeros(shape, dtype_name="float", block_shape=None):
+  result = DistArray(shape, block_shape=block_shape, dtype_name=dtype_name)
   for index in np.ndindex(*result.num_blocks):
-    result.objectids[index] = ra.ones.remote(DistArray.compute_block_shape(index, shape), dtype_name=dtype_name)
+    result.objectids[index] = ra.zeros.remote(DistArray.compute_block_shape(index, shape, result.block_shape), dtype_name=dtype_name)
   return result
 
 @ray.remote
-def copy(a):
-  result = DistArray(a.shape)
+def ones(shape, dtype_name="float", block_shape=None):
+  result = DistArray(shape, block_shape=block_shape, dtype_name=dtype_name)
   for index in np.ndindex(*result.num_blocks):
-    result.objectids[index] = a.objectids[index] # We don't need to actually copy the objects because cluster-level objects are assumed to be immutable.
+    result.objectids[index] = ra.ones.remote(DistArray.compute_block_shape(index, shape, result.block_shape), dtype_name=dtype_name)
   return result
 
 @ray.remote
-def eye(dim1, dim2=-1, dtype_name="float"):
+def copy(a):
+  return a.copy()
+
+@ray.remote
+def eye(dim1, dim2=-1, dtype_name="float", block_shape=None):
   dim2 = dim1 if dim2 == -1 else dim2
   shape = [dim1, dim2]
-  result = DistArray(shape)
+  result = DistArray(shape, block_shape=block_shape, dtype_name=dtype_name)
+  if result.block_shape[0] != result.block_shape[1]:
+    raise Exception("eye expects square blocks, but block_shape = {}.".format(result.block_shape))
   for (i, j) in np.ndindex(*result.num_blocks):
-    block_shape = DistArray.compute_block_shape([i, j], shape)
+    block_shape = DistArray.compute_block_shape([i, j], shape, result.block_shape)
     if i == j:
       result.objectids[i, j] = ra.eye.remote(block_shape[0], block_shape[1], dtype_name=dtype_name)
     else:
@@ -112,28 +453,32 @@ def eye(dim1, dim2=-1, dtype_name="float"):
 def triu(a):
   if a.ndim != 2:
     raise Exception("Input must have 2 dimensions, but a.ndim is " + str(a.ndim))
-  result = DistArray(a.shape)
+  if a.block_shape[0] != a.block_shape[1]:
+    raise Exception("triu expects square blocks, but a.block_shape = {}.".format(a.block_shape))
+  result = DistArray(a.shape, block_shape=a.block_shape, dtype_name=a.dtype_name)
   for (i, j) in np.ndindex(*result.num_blocks):
     if i < j:
-      result.objectids[i, j] = ra.copy.remote(a.objectids[i, j])
+      result.objectids[i, j] = block_task("copy", [a.objectids[i, j]], [a.transposed])
     elif i == j:
-      result.objectids[i, j] = ra.triu.remote(a.objectids[i, j])
+      result.objectids[i, j] = block_task("triu", [a.objectids[i, j]], [a.transposed])
     else:
-      result.objectids[i, j] = ra.zeros_like.remote(a.objectids[i, j])
+      result.objectids[i, j] = block_task("zeros_like", [a.objectids[i, j]], [a.transposed])
   return result
 
 @ray.remote
 def tril(a):
   if a.ndim != 2:
     raise Exception("Input must have 2 dimensions, but a.ndim is " + str(a.ndim))
-  result = DistArray(a.shape)
+  if a.block_shape[0] != a.block_shape[1]:
+    raise Exception("tril expects square blocks, but a.block_shape = {}.".format(a.block_shape))
+  result = DistArray(a.shape, block_shape=a.block_shape, dtype_name=a.dtype_name)
   for (i, j) in np.ndindex(*result.num_blocks):
     if i > j:
-      result.objectids[i, j] = ra.copy.remote(a.objectids[i, j])
+      result.objectids[i, j] = block_task("copy", [a.objectids[i, j]], [a.transposed])
     elif i == j:
-      result.objectids[i, j] = ra.tril.remote(a.objectids[i, j])
+      result.objectids[i, j] = block_task("tril", [a.objectids[i, j]], [a.transposed])
     else:
-      result.objectids[i, j] = ra.zeros_like.remote(a.objectids[i, j])
+      result.objectids[i, j] = block_task("zeros_like", [a.objectids[i, j]], [a.transposed])
   return result
 
 @ray.remote
@@ -148,76 +493,229 @@ def blockwise_dot(*matrices):
   return result
 
 @ray.remote
-def dot(a, b):
+def apply_to_transposed(name, transposed, *args):
+  return getattr(np, name)(*[np.transpose(arg) if t else arg for (arg, t) in zip(args, transposed)])
+
+def block_task(name, args, transposed, placement_hint=None):
+  """Submit a task that applies the function called name in ray.array.remote to blocks.
+
+  Args:
+    name (str): The name of the function, which must also be the name of a numpy
+      function.
+    args (List): The arguments, which are object IDs of blocks or values.
+    transposed (List[bool]): For each argument, True if the argument is a block
+      that is stored transposed and has to be transposed before it is used.
+    placement_hint (Optional[raylib.ObjectID]): The _placement_hint of the task.
+
+  Returns:
+    The object ID of the result.
+  """
+  if any(transposed):
+    return apply_to_transposed.remote(name, list(transposed), *args, _placement_hint=placement_hint)
+  return getattr(ra, name).remote(*args, _placement_hint=placement_hint)
+
+@ray.remote
+def add_blocks(*blocks):
+  return reduce(np.add, blocks)
+
+def sum_tree(objectids):
+  """Add up blocks with a tree of tasks and return the object ID of the sum.
+
+  Each task adds up to REDUCTION_FANIN blocks, and the other blocks are copied
+  to the object store of the first one.
+  """
+  while len(objectids) > 1:
+    groups = [objectids[i:(i + REDUCTION_FANIN)] for i in range(0, len(objectids), REDUCTION_FANIN)]
+    objectids = [add_blocks.remote(*group, _placement_hint=group[0]) if len(group) > 1 else group[0] for group in groups]
+  return objectids[0]
+
+@ray.remote
+def panel_dot(a_transposed, b_transposed, *blocks):
+  """Add up the products of a panel of blocks of a with a panel of blocks of b.
+
+  The first half of blocks are the blocks of a and the second half are the
+  corresponding blocks of b.
+  """
+  n = len(blocks) / 2
+  result = None
+  for (x, y) in zip(blocks[:n], blocks[n:]):
+    product = np.dot(x.T if a_transposed else x, y.T if b_transposed else y)
+    if result is None:
+      result = product
+    else:
+      result += product
+  return result
+
+def _dot_panel_blocks(a, b):
+  """Choose how many blocks along the inner dimension each task of dot multiplies.
+
+  The blocks of a and b that a task reads add up to about TARGET_BLOCK_BYTES,
+  so arrays with small blocks are multiplied with few tasks.
+  """
+  itemsize = np.dtype(_result_dtype_name(a, b) or "float").itemsize
+  bytes_per_block = itemsize * (np.prod(a.block_shape) + np.prod(b.block_shape))
+  return max(1, int(TARGET_BLOCK_BYTES // bytes_per_block))
+
+@ray.remote
+def dot(a, b, panel_blocks=None):
+  """Multiply a matrix by a matrix or by a vector.
+
+  This follows SUMMA. The inner dimension is split into panels of panel_blocks
+  block columns of a and block rows of b. The larger operand stays where its
+  blocks are: for each panel, one task per block of the result multiplies the
+  blocks of the panel and adds up their products, and it is placed next to the
+  block of the stationary operand. The blocks of the panel of the other operand
+  are used by every row (or column) of tasks, so each one is broadcast once to
+  the object stores instead of being copied for every task. The partial results
+  of the panels are then added up with sum_tree. If b is a vector, a is always
+  stationary and only the vector moves.
+
+  Args:
+    a (DistArray): A 2-dimensional array.
+    b (DistArray): A 1-dimensional or 2-dimensional array.
+    panel_blocks (Optional[int]): The number of blocks along the inner
+      dimension that each task multiplies. By default, it is chosen so that
+      the blocks a task reads hold about TARGET_BLOCK_BYTES.
+
+  Returns:
+    A DistArray with the product of a and b.
+  """
   if a.ndim != 2:
-    raise Exception("dot expects its arguments to be 2-dimensional, but a.ndim = {}.".format(a.ndim))
-  if b.ndim != 2:
-    raise Exception("dot expects its arguments to be 2-dimensional, but b.ndim = {}.".format(b.ndim))
+    raise Exception("dot expects a to be 2-dimensional, but a.ndim = {}.".format(a.ndim))
+  if b.ndim not in [1, 2]:
+    raise Exception("dot expects b to be 1-dimensional or 2-dimensional, but b.ndim = {}.".format(b.ndim))
   if a.shape[1] != b.shape[0]:
     raise Exception("dot expects a.shape[1] to equal b.shape[0], but a.shape = {} and b.shape = {}.".format(a.shape, b.shape))
-  shape = [a.shape[0], b.shape[1]]
-  result = DistArray(shape)
-  for (i, j) in np.ndindex(*result.num_blocks):
-    args = list(a.objectids[i, :]) + list(b.objectids[:, j])
-    result.objectids[i, j] = blockwise_dot.remote(*args)
+  if a.block_shape[1] != b.block_shape[0]:
+    raise Exception("dot expects a.block_shape[1] to equal b.block_shape[0], but a.block_shape = {} and b.block_shape = {}.".format(a.block_shape, b.block_shape))
+  if panel_blocks is not None and panel_blocks < 1:
+    raise Exception("dot expects panel_blocks to be positive, but panel_blocks = {}.".format(panel_blocks))
+  panel_blocks = panel_blocks if panel_blocks is not None else _dot_panel_blocks(a, b)
+  shape = [a.shape[0]] + list(b.shape[1:])
+  result = DistArray(shape, block_shape=[a.block_shape[0]] + b.block_shape[1:], dtype_name=_result_dtype_name(a, b))
+  a_stationary = b.ndim == 1 or np.prod(a.shape) >= np.prod(b.shape)
+  # The moving blocks only need to be broadcast if more than one row (or
+  # column) of tasks uses them.
+  num_users = result.num_blocks[0] if a_stationary else int(np.prod(result.num_blocks[1:]))
+  num_inner_blocks = a.num_blocks[1]
+  partial_results = np.empty(result.num_blocks, dtype=object)
+  for index in np.ndindex(*result.num_blocks):
+    partial_results[index] = []
+  for k in range(0, num_inner_blocks, panel_blocks):
+    panel = range(k, min(k + panel_blocks, num_inner_blocks))
+    if num_users > 1:
+      ray.broadcast([b.objectids[(l,) + index] for l in panel for index in np.ndindex(*b.num_blocks[1:])] if a_stationary else [a.objectids[i, l] for i in range(a.num_blocks[0]) for l in panel])
+    for index in np.ndindex(*result.num_blocks):
+      a_blocks = [a.objectids[index[0], l] for l in panel]
+      b_blocks = [b.objectids[(l,) + index[1:]] for l in panel]
+      placement_hint = a_blocks[0] if a_stationary else b_blocks[0]
+      partial_results[index].append(panel_dot.remote(a.transposed, b.transposed, *(a_blocks + b_blocks), _placement_hint=placement_hint))
+  for index in np.ndindex(*result.num_blocks):
+    result.objectids[index] = sum_tree(partial_results[index])
   return result
 
 @ray.remote
 def subblocks(a, *ranges):
-  """
-  This function produces a distributed array from a subset of the blocks in the `a`. The result and `a` will have the same number of dimensions.For example,
-      subblocks(a, [0, 1], [2, 4])
-  will produce a DistArray whose objectids are
-      [[a.objectids[0, 2], a.objectids[0, 4]],
-       [a.objectids[1, 2], a.objectids[1, 4]]]
-  We allow the user to pass in an empty list [] to indicate the full range.
-  """
-  ranges = list(ranges)
-  if len(ranges) != a.ndim:
-    raise Exception("sub_blocks expects to receive a number of ranges equal to a.ndim, but it received {} ranges and a.ndim = {}.".format(len(ranges), a.ndim))
-  for i in range(len(ranges)):
-    if ranges[i] == []: # We allow the user to pass in an empty list to indicate the full range
-      ranges[i] = range(a.num_blocks[i])
-    if not np.alltrue(ranges[i] == np.sort(ranges[i])):
-      raise Exception("Ranges passed to sub_blocks must be sorted, but the {}th range is {}.".format(i, ranges[i]))
-    if ranges[i][0] < 0:
-      raise Exception("Values in the ranges passed to sub_blocks must be at least 0, but the {}th range is {}.".format(i, ranges[i]))
-    if ranges[i][-1] >= a.num_blocks[i]:
-      raise Exception("Values in the ranges passed to sub_blocks must be less than the relevant number of blocks, but the {}th range is {}, and a.num_blocks = {}.".format(i, ranges[i], a.num_blocks))
-  last_index = [r[-1] for r in ranges]
-  last_block_shape = DistArray.compute_block_shape(last_index, a.shape)
-  shape = [(len(ranges[i]) - 1) * BLOCK_SIZE + last_block_shape[i] for i in range(a.ndim)]
-  result = DistArray(shape)
-  for index in np.ndindex(*result.num_blocks):
-    result.objectids[index] = a.objectids[tuple([ranges[i][index[i]] for i in range(a.ndim)])]
-  return result
+  """Produce a distributed array from a subset of the blocks of `a`, see DistArray.subblocks."""
+  return a.subblocks(*ranges)
 
 @ray.remote
 def transpose(a):
-  if a.ndim != 2:
-    raise Exception("transpose expects its argument to be 2-dimensional, but a.ndim = {}, a.shape = {}.".format(a.ndim, a.shape))
-  result = DistArray([a.shape[1], a.shape[0]])
-  for i in range(result.num_blocks[0]):
-    for j in range(result.num_blocks[1]):
-      result.objectids[i, j] = ra.transpose.remote(a.objectids[j, i])
+  return a.transpose()
+
+def broadcast_shapes(*shapes):
+  """Compute the shape that numpy broadcasts arrays of the given shapes to."""
+  ndim = max([len(shape) for shape in shapes])
+  result = []
+  for d in range(ndim):
+    sizes = [shape[d - ndim + len(shape)] for shape in shapes if d - ndim + len(shape) >= 0]
+    size = max(sizes)
+    if any([s != 1 and s != size for s in sizes]):
+      raise Exception("Arrays with shapes {} cannot be broadcast together.".format(", ".join([str(list(shape)) for shape in shapes])))
+    result.append(size)
   return result
 
-# TODO(rkn): support broadcasting?
-@ray.remote
-def add(x1, x2):
-  if x1.shape != x2.shape:
-    raise Exception("add expects arguments `x1` and `x2` to have the same shape, but x1.shape = {}, and x2.shape = {}.".format(x1.shape, x2.shape))
-  result = DistArray(x1.shape)
+def _broadcast_binary(name, x1, x2):
+  """Apply a binary elementwise function to DistArrays or scalars with broadcasting.
+
+  The blocks of the result are computed by calling the function called name in
+  ray.array.remote on the corresponding blocks of the operands. An operand that has length one along a
+  dimension contributes the same block to every block of the result along that
+  dimension, so it is never copied or expanded.
+  """
+  numpy_function = getattr(np, name)
+  arrays = [x for x in [x1, x2] if isinstance(x, DistArray)]
+  if len(arrays) == 0:
+    raise Exception("{} expects at least one of `x1` and `x2` to be a DistArray.".format(numpy_function.__name__))
+  for x in [x1, x2]:
+    if not isinstance(x, DistArray) and not np.isscalar(x):
+      raise Exception("{} expects its arguments to be DistArrays or scalars, but received a {}.".format(numpy_function.__name__, type(x)))
+  shape = broadcast_shapes(*[x.shape for x in arrays])
+  ndim = len(shape)
+  # Along each dimension, the blocks of the result match the blocks of the
+  # operands that are not broadcast along it.
+  block_shape = []
+  for d in range(ndim):
+    block_sizes = set([x.block_shape[d - ndim + x.ndim] for x in arrays if d - ndim + x.ndim >= 0 and x.shape[d - ndim + x.ndim] == shape[d]])
+    if len(block_sizes) > 1:
+      raise Exception("{} expects the arguments to have the same block shape along the dimensions that are not broadcast, but x1.block_shape = {}, and x2.block_shape = {}.".format(numpy_function.__name__, x1.block_shape, x2.block_shape))
+    block_shape.append(block_sizes.pop())
+  if all([x.dtype_name is not None for x in arrays]):
+    dtype_name = numpy_function(*[np.ones([1], dtype=x.dtype_name) if isinstance(x, DistArray) else x for x in [x1, x2]]).dtype.name
+  else:
+    dtype_name = None
+  result = DistArray(shape, block_shape=block_shape, dtype_name=dtype_name)
   for index in np.ndindex(*result.num_blocks):
-    result.objectids[index] = ra.add.remote(x1.objectids[index], x2.objectids[index])
+    args = []
+    for x in [x1, x2]:
+      if isinstance(x, DistArray):
+        x_index = tuple([0 if x.shape[d] == 1 else index[d - x.ndim + ndim] for d in range(x.ndim)])
+        args.append(x.objectids[x_index])
+      else:
+        args.append(x)
+    result.objectids[index] = block_task(name, args, [isinstance(x, DistArray) and x.transposed for x in [x1, x2]])
   return result
 
-# TODO(rkn): support broadcasting?
+@ray.remote
+def add(x1, x2):
+  return _broadcast_binary("add", x1, x2)
+
 @ray.remote
 def subtract(x1, x2):
-  if x1.shape != x2.shape:
-    raise Exception("subtract expects arguments `x1` and `x2` to have the same shape, but x1.shape = {}, and x2.shape = {}.".format(x1.shape, x2.shape))
-  result = DistArray(x1.shape)
-  for index in np.ndindex(*result.num_blocks):
-    result.objectids[index] = ra.subtract.remote(x1.objectids[index], x2.objectids[index])
-  return result
+  return _broadcast_binary("subtract", x1, x2)
+
+@ray.remote
+def multiply(x1, x2):
+  return _broadcast_binary("multiply", x1, x2)
+
+@ray.remote
+def divide(x1, x2):
+  return _broadcast_binary("divide", x1, x2)
+
+@ray.remote
+def power(x1, x2):
+  return _broadcast_binary("power", x1, x2)
+
+@ray.remote
+def equal(x1, x2):
+  return _broadcast_binary("equal", x1, x2)
+
+@ray.remote
+def not_equal(x1, x2):
+  return _broadcast_binary("not_equal", x1, x2)
+
+@ray.remote
+def less(x1, x2):
+  return _broadcast_binary("less", x1, x2)
+
+@ray.remote
+def less_equal(x1, x2):
+  return _broadcast_binary("less_equal", x1, x2)
+
+@ray.remote
+def greater(x1, x2):
+  return _broadcast_binary("greater", x1, x2)
+
+@ray.remote
+def greater_equal(x1, x2):
+  return _broadcast_binary("greater_equal", x1, x2)
@@ -0,0 +1,200 @@
+import numpy as np
+import ray
+
+from core import *
+
+# The numpy functions that can appear in the expression of a block. Each one
+# takes the values of its operands and returns a block.
+BLOCK_FUNCTIONS = {"add": np.add,
+                   "subtract": np.subtract,
+                   "multiply": np.multiply,
+                   "divide": np.divide,
+                   "power": np.power,
+                   "transpose": np.transpose,
+                   "triu": np.triu,
+                   "tril": np.tril,
+                   "zeros_like": np.zeros_like}
+
+class LazyDistArray(object):
+  """A distributed array that is described by the operations that produce it.
+
+  Operations on LazyDistArrays do not launch any tasks. Instead, they record
+  the operation, and materialize turns the whole expression into a single task
+  per block of the result, so chains of blockwise operations do not create
+  intermediate distributed arrays. Unlike the functions in core, they do not
+  broadcast their operands.
+  """
+  def __init__(self, op, operands, shape, block_shape, dtype_name=None, array=None):
+    self.op = op
+    self.operands = operands
+    self.shape = shape
+    self.ndim = len(shape)
+    self.block_shape = block_shape
+    self.num_blocks = DistArray.compute_num_blocks(shape, block_shape)
+    self.dtype_name = dtype_name
+    # The DistArray that this expression refers to if op is "array".
+    self.array = array
+
+  def block_expression(self, index, blocks):
+    """Compute the expression for one block of this array.
+
+    Args:
+      index (Tuple[int]): The index of the block.
+      blocks (List): The object IDs of the blocks that the expression refers
+        to. The object IDs of the blocks that this expression needs are appended
+        to it.
+
+    Returns:
+      A nested tuple whose first entry is the name of a function in
+        BLOCK_FUNCTIONS and whose remaining entries are the expressions of its
+        operands, ("arg", i) to refer to blocks[i], or ("number", value) for an
+        operand that is a number.
+    """
+    if self.op == "array":
+      blocks.append(self.array.objectids[index])
+      return ("transpose", ("arg", len(blocks) - 1)) if self.array.transposed else ("arg", len(blocks) - 1)
+    if self.op == "transpose":
+      return ("transpose", self.operands[0].block_expression(tuple(reversed(index)), blocks))
+    if self.op in ["triu", "tril"]:
+      expression = self.operands[0].block_expression(index, blocks)
+      (i, j) = index
+      if i == j:
+        return (self.op, expression)
+      elif (i < j) == (self.op == "triu"):
+        return expression
+      else:
+        return ("zeros_like", expression)
+    return tuple([self.op] + [operand.block_expression(index, blocks) if isinstance(operand, LazyDistArray) else ("number", operand) for operand in self.operands])
+
+  def __add__(self, other):
+    return add(self, other)
+
+  def __radd__(self, other):
+    return add(other, self)
+
+  def __sub__(self, other):
+    return subtract(self, other)
+
+  def __rsub__(self, other):
+    return subtract(other, self)
+
+  def __mul__(self, other):
+    return multiply(self, other)
+
+  def __rmul__(self, other):
+    return multiply(other, self)
+
+  def __div__(self, other):
+    return divide(self, other)
+
+  def __rdiv__(self, other):
+    return divide(other, self)
+
+  def __pow__(self, other):
+    return power(self, other)
+
+  def __rpow__(self, other):
+    return power(other, self)
+
+# Register the LazyDistArray class with Ray so that it knows how to serialize it.
+ray.register_class(LazyDistArray)
+
+def as_lazy(a):
+  """Return a LazyDistArray for a DistArray, or a if it is already lazy."""
+  if isinstance(a, LazyDistArray):
+    return a
+  if not isinstance(a, DistArray):
+    raise Exception("as_lazy expects a DistArray or a LazyDistArray, but received a {}.".format(type(a)))
+  return LazyDistArray("array", [], a.shape, a.block_shape, dtype_name=a.dtype_name, array=a)
+
+def add(x1, x2):
+  return _elementwise("add", x1, x2)
+
+def subtract(x1, x2):
+  return _elementwise("subtract", x1, x2)
+
+def multiply(x1, x2):
+  return _elementwise("multiply", x1, x2)
+
+def divide(x1, x2):
+  return _elementwise("divide", x1, x2)
+
+def power(x1, x2):
+  return _elementwise("power", x1, x2)
+
+def transpose(a):
+  a = as_lazy(a)
+  if a.ndim != 2:
+    raise Exception("transpose expects its argument to be 2-dimensional, but a.ndim = {}, a.shape = {}.".format(a.ndim, a.shape))
+  return LazyDistArray("transpose", [a], [a.shape[1], a.shape[0]], [a.block_shape[1], a.block_shape[0]], dtype_name=a.dtype_name)
+
+def triu(a):
+  return _triangle("triu", a)
+
+def tril(a):
+  return _triangle("tril", a)
+
+def _is_number(x):
+  return isinstance(x, (bool, int, long, float, complex, np.number, np.bool_))
+
+def _elementwise(op, x1, x2):
+  """Record an elementwise operation on two arrays, or on an array and a number.
+
+  A number is stored in the expression of each block.
+  """
+  for x in [x1, x2]:
+    if not isinstance(x, (DistArray, LazyDistArray)) and not _is_number(x):
+      raise Exception("{} expects its arguments to be DistArrays, LazyDistArrays or numbers, but received a {}.".format(op, type(x)))
+  if _is_number(x1) and _is_number(x2):
+    raise Exception("{} expects at least one of `x1` and `x2` to be a DistArray or a LazyDistArray.".format(op))
+  if _is_number(x1) or _is_number(x2):
+    operands = [x if _is_number(x) else as_lazy(x) for x in [x1, x2]]
+    [array] = [x for x in operands if not _is_number(x)]
+    if array.dtype_name is not None:
+      dtype_name = BLOCK_FUNCTIONS[op](*[x if _is_number(x) else np.ones([1], dtype=x.dtype_name) for x in operands]).dtype.name
+    else:
+      dtype_name = None
+    return LazyDistArray(op, operands, array.shape, array.block_shape, dtype_name=dtype_name)
+  x1, x2 = as_lazy(x1), as_lazy(x2)
+  if x1.shape != x2.shape:
+    raise Exception("{} expects arguments `x1` and `x2` to have the same shape, but x1.shape = {}, and x2.shape = {}.".format(op, x1.shape, x2.shape))
+  if x1.block_shape != x2.block_shape:
+    raise Exception("{} expects arguments `x1` and `x2` to have the same block shape, but x1.block_shape = {}, and x2.block_shape = {}.".format(op, x1.block_shape, x2.block_shape))
+  if x1.dtype_name is not None and x2.dtype_name is not None:
+    dtype_name = BLOCK_FUNCTIONS[op](np.ones([1], dtype=x1.dtype_name), np.ones([1], dtype=x2.dtype_name)).dtype.name
+  else:
+    dtype_name = None
+  return LazyDistArray(op, [x1, x2], x1.shape, x1.block_shape, dtype_name=dtype_name)
+
+def _triangle(op, a):
+  a = as_lazy(a)
+  if a.ndim != 2:
+    raise Exception("Input must have 2 dimensions, but a.ndim is " + str(a.ndim))
+  if a.block_shape[0] != a.block_shape[1]:
+    raise Exception("{} expects square blocks, but a.block_shape = {}.".format(op, a.block_shape))
+  return LazyDistArray(op, [a], a.shape, a.block_shape, dtype_name=a.dtype_name)
+
+def _evaluate(expression, blocks):
+  if expression[0] == "arg":
+    return blocks[expression[1]]
+  if expression[0] == "number":
+    return expression[1]
+  return BLOCK_FUNCTIONS[expression[0]](*[_evaluate(operand, blocks) for operand in expression[1:]])
+
+@ray.remote
+def evaluate_block(expression, *blocks):
+  return _evaluate(expression, blocks)
+
+@ray.remote
+def materialize(a):
+  """Compute a LazyDistArray with one task per block of the result."""
+  a = as_lazy(a)
+  result = DistArray(a.shape, block_shape=a.block_shape, dtype_name=a.dtype_name)
+  for index in np.ndindex(*result.num_blocks):
+    blocks = []
+    expression = a.block_expression(index, blocks)
+    if expression[0] == "arg":
+      result.objectids[index] = blocks[expression[1]] # The block is a block of an existing array, so there is nothing to compute.
+    else:
+      result.objectids[index] = evaluate_block.remote(expression, *blocks)
+  return result
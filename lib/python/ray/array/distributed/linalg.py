@@ -3,8 +3,9 @@ import ray.array.remote as ra
 import ray
 
 from core import *
+from reductions import tree_reduce
 
-__all__ = ["tsqr", "modified_lu", "tsqr_hr", "qr"]
+__all__ = ["tsqr", "modified_lu", "tsqr_hr", "qr", "norm"]
 
 @ray.remote(num_return_vals=2)
 def tsqr(a):
@@ -26,6 +27,7 @@ def tsqr(a):
     raise Exception("tsqr requires len(a.shape) == 2, but a.shape is {}".format(a.shape))
   if a.num_blocks[1] != 1:
     raise Exception("tsqr requires a.num_blocks[1] == 1, but a.num_blocks is {}".format(a.num_blocks))
+  a = a.untransposed()
 
   num_blocks = a.num_blocks[0]
   K = int(np.ceil(np.log2(num_blocks))) + 1
@@ -53,9 +55,7 @@ def tsqr(a):
     q_shape = a.shape
   else:
     q_shape = [a.shape[0], a.shape[0]]
-  q_num_blocks = DistArray.compute_num_blocks(q_shape)
-  q_objectids = np.empty(q_num_blocks, dtype=object)
-  q_result = DistArray(q_shape, q_objectids)
+  q_result = DistArray(q_shape, block_shape=a.block_shape)
 
   # reconstruct output
   for i in range(num_blocks):
@@ -64,10 +64,10 @@ def tsqr(a):
     for j in range(1, K):
       if np.mod(ith_index, 2) == 0:
         lower = [0, 0]
-        upper = [a.shape[1], BLOCK_SIZE]
+        upper = [a.shape[1], a.block_shape[1]]
       else:
         lower = [a.shape[1], 0]
-        upper = [2 * a.shape[1], BLOCK_SIZE]
+        upper = [2 * a.shape[1], a.block_shape[1]]
       ith_index /= 2
       q_block_current = ra.dot.remote(q_block_current, ra.subarray.remote(q_tree[ith_index, j], lower, upper))
     q_result.objectids[i] = q_block_current
@@ -87,6 +87,7 @@ def modified_lu(q):
     u: upper triangular
     s: a diagonal matrix represented by its diagonal
   """
+  block_shape = q.block_shape
   q = q.assemble()
   m, b = q.shape[0], q.shape[1]
   S = np.zeros(b)
@@ -103,7 +104,7 @@ def modified_lu(q):
   for i in range(b):
     L[i, i] = 1
   U = np.triu(q_work)[:b, :]
-  return ray.get(numpy_to_dist.remote(ray.put(L))), U, S # TODO(rkn): get rid of put
+  return ray.get(numpy_to_dist.remote(ray.put(L), block_shape)), U, S # TODO(rkn): get rid of put
 
 @ray.remote(num_return_vals=2)
 def tsqr_hr_helper1(u, s, y_top_block, b):
@@ -140,17 +141,20 @@ def qr(a):
   """Algorithm 7 from http://www.eecs.berkeley.edu/Pubs/TechRpts/2013/EECS-2013-175.pdf"""
   m, n = a.shape[0], a.shape[1]
   k = min(m, n)
+  if a.block_shape[0] != a.block_shape[1]:
+    raise Exception("qr requires square blocks, but a.block_shape is {}".format(a.block_shape))
 
   # we will store our scratch work in a_work
-  a_work = DistArray(a.shape, np.copy(a.objectids))
+  a = a.untransposed()
+  a_work = DistArray(a.shape, np.copy(a.objectids), a.block_shape)
 
   result_dtype = np.linalg.qr(ray.get(a.objectids[0, 0]))[0].dtype.name
-  r_res = ray.get(zeros.remote([k, n], result_dtype)) # TODO(rkn): It would be preferable not to get this right after creating it.
-  y_res = ray.get(zeros.remote([m, k], result_dtype)) # TODO(rkn): It would be preferable not to get this right after creating it.
+  r_res = ray.get(zeros.remote([k, n], result_dtype, a.block_shape)) # TODO(rkn): It would be preferable not to get this right after creating it.
+  y_res = ray.get(zeros.remote([m, k], result_dtype, a.block_shape)) # TODO(rkn): It would be preferable not to get this right after creating it.
   Ts = []
 
   for i in range(min(a.num_blocks[0], a.num_blocks[1])): # this differs from the paper, which says "for i in range(a.num_blocks[1])", but that doesn't seem to make any sense when a.num_blocks[1] > a.num_blocks[0]
-    sub_dist_array = subblocks.remote(a_work, range(i, a_work.num_blocks[0]), [i])
+    sub_dist_array = a_work.subblocks(range(i, a_work.num_blocks[0]), [i])
     y, t, _, R = tsqr_hr.remote(sub_dist_array)
     y_val = ray.get(y)
 
@@ -163,7 +167,7 @@ def qr(a):
       r_res.objectids[i, i] = ra.dot.remote(eye_temp, R)
     else:
       r_res.objectids[i, i] = R
-    Ts.append(numpy_to_dist.remote(t))
+    Ts.append(numpy_to_dist.remote(t, a.block_shape))
 
     for c in range(i + 1, a.num_blocks[1]):
       W_rcs = []
@@ -178,9 +182,14 @@ def qr(a):
       r_res.objectids[i, c] = a_work.objectids[i, c]
 
   # construct q_res from Ys and Ts
-  q = eye.remote(m, k, dtype_name=result_dtype)
+  q = eye.remote(m, k, dtype_name=result_dtype, block_shape=a.block_shape)
   for i in range(len(Ts))[::-1]:
-    y_col_block = subblocks.remote(y_res, [], [i])
-    q = subtract.remote(q, dot.remote(y_col_block, dot.remote(Ts[i], dot.remote(transpose.remote(y_col_block), q))))
+    y_col_block = y_res.subblocks([], [i])
+    q = subtract.remote(q, dot.remote(y_col_block, dot.remote(Ts[i], dot.remote(y_col_block.T, q))))
 
   return ray.get(q), r_res
+
+@ray.remote
+def norm(a, axis=None, keepdims=False):
+  """Compute the Frobenius norm of a, or the 2-norms of its vectors along axis."""
+  return tree_reduce("sumsquares", a, axis, keepdims)
@@ -5,10 +5,8 @@ import ray
 from core import *
 
 @ray.remote
-def normal(shape):
-  num_blocks = DistArray.compute_num_blocks(shape)
-  objectids = np.empty(num_blocks, dtype=object)
-  for index in np.ndindex(*num_blocks):
-    objectids[index] = ra.random.normal.remote(DistArray.compute_block_shape(index, shape))
-  result = DistArray(shape, objectids)
+def normal(shape, block_shape=None):
+  result = DistArray(shape, block_shape=block_shape, dtype_name="float64")
+  for index in np.ndindex(*result.num_blocks):
+    result.objectids[index] = ra.random.normal.remote(DistArray.compute_block_shape(index, shape, result.block_shape))
   return result
@@ -0,0 +1,155 @@
+import numpy as np
+import ray
+
+from core import *
+
+__all__ = ["sum", "mean", "max", "min", "argmax"]
+
+# A reduction is computed by reducing every block along the axis to a partial
+# result, combining the partial results in a tree, and finishing the combined
+# result. The partial results of "sum", "mean", "max" and "min" are arrays of
+# the same kind as the result. Those of "sumsquares" are sums of the squared
+# absolute values of the entries, and those of "argmax" are pairs of maximum
+# values and the indices of those values in the whole array.
+
+# The numpy functions that correspond to the reductions. They are used to
+# compute the dtypes of the results.
+NUMPY_REDUCTIONS = {"sum": np.sum,
+                    "mean": np.mean,
+                    "max": np.max,
+                    "min": np.min,
+                    "argmax": np.argmax,
+                    "sumsquares": np.linalg.norm}
+
+def _reduce_block(op, block, axis, lower, shape):
+  if op in ["sum", "mean"]:
+    return np.sum(block, axis=axis, keepdims=True)
+  elif op == "sumsquares":
+    return np.sum(np.abs(block) ** 2, axis=axis, keepdims=True)
+  elif op == "max":
+    return np.max(block, axis=axis, keepdims=True)
+  elif op == "min":
+    return np.min(block, axis=axis, keepdims=True)
+  elif op == "argmax":
+    values = np.max(block, axis=axis, keepdims=True)
+    if axis is None:
+      # Convert the position in the block to a position in the whole array.
+      index = np.unravel_index(np.argmax(block), block.shape)
+      indices = np.ravel_multi_index([i + l for (i, l) in zip(index, lower)], shape)
+      return [values, np.array(indices).reshape(values.shape)]
+    return [values, np.expand_dims(np.argmax(block, axis=axis), axis) + lower[axis]]
+  raise Exception("Unknown reduction {}.".format(op))
+
+def _combine(op, partials):
+  if op == "argmax":
+    (values, indices) = partials[0]
+    for (other_values, other_indices) in partials[1:]:
+      # The partials are in the order of the blocks, so ties go to the earlier
+      # block like they do in numpy.
+      greater = other_values > values
+      values = np.where(greater, other_values, values)
+      indices = np.where(greater, other_indices, indices)
+    return [values, indices]
+  elif op == "max":
+    return np.maximum.reduce(partials)
+  elif op == "min":
+    return np.minimum.reduce(partials)
+  return np.add.reduce(partials)
+
+def _finish(op, combined, count):
+  if op == "mean":
+    return combined / float(count)
+  elif op == "sumsquares":
+    return np.sqrt(combined)
+  elif op == "argmax":
+    return combined[1]
+  return combined
+
+@ray.remote
+def reduce_block(op, block, transposed, axis, lower, shape):
+  return _reduce_block(op, block.T if transposed else block, axis, lower, shape)
+
+@ray.remote
+def combine_partials(op, *partials):
+  return _combine(op, partials)
+
+@ray.remote
+def finish_partials(op, count, axis, keepdims, *partials):
+  result = _finish(op, _combine(op, partials), count)
+  if keepdims:
+    return result
+  result = np.squeeze(result, axis=axis)
+  # Like numpy, return a scalar if every axis has been reduced.
+  return result[()] if result.ndim == 0 else result
+
+def tree_reduce(op, a, axis, keepdims):
+  """Reduce a DistArray along an axis by combining per-block partial results in a tree.
+
+  Each task in the tree combines the partial results of up to REDUCTION_FANIN
+  neighboring blocks, and the partial results are copied to the object store
+  of the first of them, so that most of the combining happens where the
+  blocks are.
+
+  Args:
+    op (str): The name of the reduction.
+    a (DistArray): The array to reduce.
+    axis (Optional[int]): The axis to reduce along, or None to reduce the whole
+      array.
+    keepdims (bool): If True, the reduced axes are kept with length one.
+
+  Returns:
+    A numpy scalar if axis is None and keepdims is False or if a is
+      one-dimensional and keepdims is False, a numpy array if axis is None and
+      keepdims is True, and a DistArray otherwise.
+  """
+  if axis is not None:
+    if not isinstance(axis, (int, long)) or axis < -a.ndim or axis >= a.ndim:
+      raise Exception("The axis must be None or an integer between {} and {}, but it is {}.".format(-a.ndim, a.ndim - 1, axis))
+    axis %= a.ndim
+  if a.objectids.size == 0:
+    raise Exception("Cannot compute {} of an array with no entries, a.shape = {}.".format(op, a.shape))
+  dtype_name = NUMPY_REDUCTIONS[op](np.zeros([1], dtype=a.dtype_name)).dtype.name if a.dtype_name is not None else None
+  if axis is None or (a.ndim == 1 and not keepdims):
+    partials = [reduce_block.remote(op, a.objectids[index], a.transposed, axis, DistArray.compute_block_lower(index, a.shape, a.block_shape), a.shape) for index in np.ndindex(*a.num_blocks)]
+    count = np.prod(a.shape) if axis is None else a.shape[axis]
+    return ray.get(_combine_tree(op, partials, count, axis, keepdims))
+  if keepdims:
+    shape = list(a.shape[:axis]) + [1] + list(a.shape[axis + 1:])
+    block_shape = a.block_shape
+  else:
+    shape = list(a.shape[:axis]) + list(a.shape[axis + 1:])
+    block_shape = a.block_shape[:axis] + a.block_shape[axis + 1:]
+  result = DistArray(shape, block_shape=block_shape, dtype_name=dtype_name)
+  for result_index in np.ndindex(*result.num_blocks):
+    partials = []
+    for i in range(a.num_blocks[axis]):
+      index = result_index[:axis] + (i,) + result_index[axis + (1 if keepdims else 0):]
+      partials.append(reduce_block.remote(op, a.objectids[index], a.transposed, axis, DistArray.compute_block_lower(index, a.shape, a.block_shape), a.shape))
+    result.objectids[result_index] = _combine_tree(op, partials, a.shape[axis], axis, keepdims)
+  return result
+
+def _combine_tree(op, partials, count, axis, keepdims):
+  while len(partials) > REDUCTION_FANIN:
+    groups = [partials[i:(i + REDUCTION_FANIN)] for i in range(0, len(partials), REDUCTION_FANIN)]
+    partials = [combine_partials.remote(op, *group, _placement_hint=group[0]) for group in groups]
+  return finish_partials.remote(op, count, axis, keepdims, *partials, _placement_hint=partials[0])
+
+@ray.remote
+def sum(a, axis=None, keepdims=False):
+  return tree_reduce("sum", a, axis, keepdims)
+
+@ray.remote
+def mean(a, axis=None, keepdims=False):
+  return tree_reduce("mean", a, axis, keepdims)
+
+@ray.remote
+def max(a, axis=None, keepdims=False):
+  return tree_reduce("max", a, axis, keepdims)
+
+@ray.remote
+def min(a, axis=None, keepdims=False):
+  return tree_reduce("min", a, axis, keepdims)
+
+@ray.remote
+def argmax(a, axis=None, keepdims=False):
+  return tree_reduce("argmax", a, axis, keepdims)
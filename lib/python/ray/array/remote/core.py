@@ -1,7 +1,8 @@
 import numpy as np
 import ray
 
-__all__ = ["zeros", "zeros_like", "ones", "eye", "dot", "vstack", "hstack", "subarray", "copy", "tril", "triu", "diag", "transpose", "add", "subtract", "sum", "shape", "sum_list"]
+__all__ = ["zeros", "zeros_like", "ones", "eye", "dot", "vstack", "hstack", "subarray", "copy", "tril", "triu", "diag", "transpose", "add", "subtract", "multiply", "divide", "power",
+           "equal", "not_equal", "less", "less_equal", "greater", "greater_equal", "sum", "shape", "sum_list"]
 
 @ray.remote
 def zeros(shape, dtype_name="float", order="C"):
@@ -67,6 +68,42 @@ def add(x1, x2):
 def subtract(x1, x2):
   return np.subtract(x1, x2)
 
+@ray.remote
+def multiply(x1, x2):
+  return np.multiply(x1, x2)
+
+@ray.remote
+def divide(x1, x2):
+  return np.divide(x1, x2)
+
+@ray.remote
+def power(x1, x2):
+  return np.power(x1, x2)
+
+@ray.remote
+def equal(x1, x2):
+  return np.equal(x1, x2)
+
+@ray.remote
+def not_equal(x1, x2):
+  return np.not_equal(x1, x2)
+
+@ray.remote
+def less(x1, x2):
+  return np.less(x1, x2)
+
+@ray.remote
+def less_equal(x1, x2):
+  return np.less_equal(x1, x2)
+
+@ray.remote
+def greater(x1, x2):
+  return np.greater(x1, x2)
+
+@ray.remote
+def greater_equal(x1, x2):
+  return np.greater_equal(x1, x2)
+
 @ray.remote
 def sum(x, axis=-1):
   return np.sum(x, axis=axis if axis != -1 else None)
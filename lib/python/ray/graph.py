@@ -15,7 +15,10 @@ def graph_to_graphviz(computation_graph):
   """
   dot = graphviz.Digraph(format="pdf")
   dot.node("op-root", shape="box")
-  for (i, op) in enumerate(computation_graph.operation):
+  # The scheduler prunes operations from the computation graph, so the position
+  # of an operation in the list is not necessarily its operation id.
+  operationids = computation_graph.operationid if len(computation_graph.operationid) > 0 else range(len(computation_graph.operation))
+  for (i, op) in zip(operationids, computation_graph.operation):
     if op.HasField("task"):
       dot.node("op" + str(i), shape="box", label=str(i) + "\n" + op.task.name.split(".")[-1])
       for res in op.task.result:
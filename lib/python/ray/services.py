@@ -17,6 +17,10 @@ _services_env["GRPC_VERBOSITY"] = "ERROR"
 # that have been started by this services module if Ray is being used in local
 # mode.
 all_processes = []
+# spill_files is a list of the computation graph spill files of the schedulers
+# that have been started by this services module. They are deleted by
+# cleanup().
+spill_files = []
 
 TIMEOUT_SECONDS = 5
 
@@ -34,7 +38,7 @@ def cleanup():
   processes that were started by this services module. Driver processes are
   started and disconnected by worker.py.
   """
-  global all_processes
+  global all_processes, spill_files
   successfully_shut_down = True
   for p in all_processes:
     if p.poll() is not None: # process has already terminated
@@ -53,8 +57,12 @@ def cleanup():
   else:
     print "Ray did not shut down properly."
   all_processes = []
+  for spill_file_name in spill_files:
+    if os.path.exists(spill_file_name):
+      os.remove(spill_file_name)
+  spill_files = []
 
-def start_scheduler(scheduler_address, cleanup):
+def start_scheduler(scheduler_address, cleanup, scheduling_policy="locality_aware", speculation_percentile=None, spill_computation_graph=False, early_shipping_budget=None):
   """This method starts a scheduler process.
 
   Args:
@@ -62,13 +70,41 @@ def start_scheduler(scheduler_address, cleanup):
     cleanup (bool): True if using Ray in local mode. If cleanup is true, then
       this process will be killed by serices.cleanup() when the Python process
       that imported services exits.
+    scheduling_policy (Optional[str]): The policy the scheduler uses to assign
+      tasks to workers. This should be one of "naive", "locality_aware",
+      "locality_by_bytes", "least_loaded", "random", and "delay".
+    speculation_percentile (Optional[float]): If this is provided, then the
+      scheduler starts a copy of a task when the task has been running for
+      longer than 1.5 times this percentile (a number between 0 and 1) of the
+      runtimes of the previous tasks of the same remote function, and uses the
+      results of whichever copy finishes first.
+    spill_computation_graph (Optional[bool]): If True, the scheduler appends the
+      operations that it prunes from the computation graph to a file in the log
+      directory, so that the whole computation graph can still be dumped. The
+      file grows with the number of operations, and it is deleted by
+      services.cleanup() if cleanup is True. If False, pruned operations are
+      discarded.
+    early_shipping_budget (Optional[int]): If this is provided, then the
+      scheduler ships at most this many bytes of arguments to each object store
+      ahead of time for the tasks that are still queued. Zero disables shipping
+      arguments ahead of time.
   """
   scheduler_port = scheduler_address.split(":")[1]
-  p = subprocess.Popen(["scheduler", scheduler_address, "--log-file-name", config.get_log_file_path("scheduler-" + scheduler_port + ".log")], env=_services_env)
+  command = ["scheduler", scheduler_address, "--log-file-name", config.get_log_file_path("scheduler-" + scheduler_port + ".log"), "--scheduling-policy", scheduling_policy]
+  if spill_computation_graph:
+    spill_file_name = config.get_log_file_path("computation-graph-" + scheduler_port + ".binaryproto")
+    command += ["--computation-graph-spill-file-name", spill_file_name]
+    if cleanup:
+      spill_files.append(spill_file_name)
+  if speculation_percentile is not None:
+    command += ["--speculation-percentile", str(speculation_percentile)]
+  if early_shipping_budget is not None:
+    command += ["--early-shipping-budget", str(early_shipping_budget)]
+  p = subprocess.Popen(command, env=_services_env)
   if cleanup:
     all_processes.append(p)
 
-def start_objstore(scheduler_address, node_ip_address, cleanup):
+def start_objstore(scheduler_address, node_ip_address, cleanup, huge_pages=False, prefault=False):
   """This method starts an object store process.
 
   Args:
@@ -78,9 +114,16 @@ def start_objstore(scheduler_address, node_ip_address, cleanup):
     cleanup (bool): True if using Ray in local mode. If cleanup is true, then
       this process will be killed by serices.cleanup() when the Python process
       that imported services exits.
+    huge_pages (Optional[bool]): If True, the object store asks the kernel to
+      back objects with transparent huge pages.
+    prefault (Optional[bool]): If True, the pages of an object are faulted in
+      when its memory is allocated and when a worker maps it, instead of one at
+      a time when they are first accessed.
   """
   random_string = "".join(random.choice(string.ascii_uppercase + string.digits) for _ in range(10))
-  p = subprocess.Popen(["objstore", scheduler_address, node_ip_address, "--log-file-name", config.get_log_file_path("-".join(["objstore", random_string]) + ".log")], env=_services_env)
+  command = ["objstore", scheduler_address, node_ip_address, "--log-file-name", config.get_log_file_path("-".join(["objstore", random_string]) + ".log")]
+  command += ["--huge-pages", "on" if huge_pages else "off", "--prefault", "on" if prefault else "off"]
+  p = subprocess.Popen(command, env=_services_env)
   if cleanup:
     all_processes.append(p)
 
@@ -154,7 +197,7 @@ def start_workers(scheduler_address, objstore_address, num_workers, worker_path)
   for _ in range(num_workers):
     start_worker(node_ip_address, worker_path, scheduler_address, cleanup=False)
 
-def start_ray_local(node_ip_address="127.0.0.1", num_objstores=1, num_workers=0, worker_path=None):
+def start_ray_local(node_ip_address="127.0.0.1", num_objstores=1, num_workers=0, worker_path=None, scheduling_policy="locality_aware", speculation_percentile=None, huge_pages=False, prefault=False, spill_computation_graph=False, early_shipping_budget=None):
   """Start Ray in local mode.
 
   This method starts Ray in local mode (as opposed to cluster mode, which is
@@ -166,6 +209,20 @@ def start_ray_local(node_ip_address="127.0.0.1", num_objstores=1, num_workers=0,
     num_workers (int): The number of workers to start.
     worker_path (str): The path of the source code that will be run by the
       worker.
+    scheduling_policy (Optional[str]): The policy the scheduler uses to assign
+      tasks to workers.
+    speculation_percentile (Optional[float]): If this is provided, then
+      straggler tasks are executed speculatively (see start_scheduler).
+    huge_pages (Optional[bool]): If True, the object stores back objects with
+      transparent huge pages (see start_objstore).
+    prefault (Optional[bool]): If True, the pages of objects are faulted in
+      ahead of time (see start_objstore).
+    spill_computation_graph (Optional[bool]): If True, the scheduler spills
+      pruned operations of the computation graph to a file (see
+      start_scheduler).
+    early_shipping_budget (Optional[int]): The number of bytes of arguments
+      that the scheduler ships to each object store ahead of time (see
+      start_scheduler).
 
   Returns:
     The address of the scheduler and the addresses of all of the object stores.
@@ -175,11 +232,11 @@ def start_ray_local(node_ip_address="127.0.0.1", num_objstores=1, num_workers=0,
   if num_objstores < 1:
     raise Exception("`num_objstores` is {}, but should be at least 1.".format(num_objstores))
   scheduler_address = address(node_ip_address, new_scheduler_port())
-  start_scheduler(scheduler_address, cleanup=True)
+  start_scheduler(scheduler_address, cleanup=True, scheduling_policy=scheduling_policy, speculation_percentile=speculation_percentile, spill_computation_graph=spill_computation_graph, early_shipping_budget=early_shipping_budget)
   time.sleep(0.1)
   # create objstores
   for i in range(num_objstores):
-    start_objstore(scheduler_address, node_ip_address, cleanup=True)
+    start_objstore(scheduler_address, node_ip_address, cleanup=True, huge_pages=huge_pages, prefault=prefault)
     time.sleep(0.2)
     if i < num_objstores - 1:
       num_workers_to_start = num_workers / num_objstores
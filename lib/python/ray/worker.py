@@ -1,5 +1,6 @@
 import os
 import sys
+import signal
 import time
 import traceback
 import copy
@@ -62,7 +63,7 @@ class RayTaskError(Exception):
   def __init__(self, function_name, exception, traceback_str):
     """Initialize a RayTaskError."""
     self.function_name = function_name
-    if isinstance(exception, RayGetError) or isinstance(exception, RayGetArgumentError):
+    if isinstance(exception, RayGetError) or isinstance(exception, RayGetArgumentError) or isinstance(exception, RayCancelledError):
       self.exception = exception
     else:
       self.exception = None
@@ -118,6 +119,19 @@ class RayGetArgumentError(Exception):
     """Format a RayGetArgumentError as a string."""
     return "Failed to get objectid {} as argument {} for remote function {}{}{}. It was created by remote function {}{}{} which failed with:\n{}".format(self.objectid, self.argument_index, colorama.Fore.RED, self.function_name, colorama.Fore.RESET, colorama.Fore.RED, self.task_error.function_name, colorama.Fore.RESET, self.task_error)
 
+class RayCancelledError(BaseException):
+  """An exception used when a task was cancelled with ray.cancel.
+
+  If the task had not started, it never runs. If it was running, this exception
+  is raised inside of the remote function. Like KeyboardInterrupt, it derives
+  from BaseException, so that "except Exception:" clauses in remote functions
+  do not swallow the cancellation.
+  """
+
+  def __str__(self):
+    """Format a RayCancelledError as a string."""
+    return "The task was cancelled."
+
 
 class Reusable(object):
   """An Python object that can be shared between tasks.
@@ -356,6 +370,11 @@ class Worker(object):
       that connect has been called already.
     cached_functions_to_run (List): A list of functions to run on all of the
       workers that should be exported as soon as connect is called.
+    task_interruptible (bool): True while the worker is executing a remote
+      function, which is when a cancellation request may interrupt it.
+    task_objectids (List[int]): The IDs of the objects returned by the task
+      that the worker is executing. An interrupt is only for this task if it
+      names one of them.
   """
 
   def __init__(self):
@@ -365,6 +384,8 @@ class Worker(object):
     self.mode = None
     self.cached_remote_functions = []
     self.cached_functions_to_run = []
+    self.task_interruptible = False
+    self.task_objectids = []
 
   def set_mode(self, mode):
     """Set the mode of the worker.
@@ -431,8 +452,8 @@ class Worker(object):
     Args:
       objectid (raylib.ObjectID): The object ID of the value to retrieve.
     """
-    assert raylib.is_arrow(self.handle, objectid), "All objects should be serialized using Arrow."
     buff, segmentid, metadata_offset = raylib.get_buffer(self.handle, objectid)
+    assert metadata_offset != 0, "All objects should be serialized using Arrow."
     metadata_size = int(np.frombuffer(buff, dtype="int64", count=1)[0])
     metadata = np.frombuffer(buff, dtype="byte", offset=8, count=metadata_size)
     data = np.frombuffer(buff, dtype="byte")[8 + metadata_size:]
@@ -456,7 +477,7 @@ class Worker(object):
     """Make two object IDs refer to the same object."""
     raylib.alias_objectids(self.handle, alias_objectid, target_objectid)
 
-  def submit_task(self, func_name, args):
+  def submit_task(self, func_name, args, placement_hint=None):
     """Submit a remote task to the scheduler.
 
     Tell the scheduler to schedule the execution of the function with name
@@ -468,6 +489,9 @@ class Worker(object):
       args (List[Any]): The arguments to pass into the function. Arguments can
         be object IDs or they can be values. If they are values, they
         must be serializable objecs.
+      placement_hint (Optional[raylib.ObjectID]): If this is provided, the
+        arguments that are remote objects are copied to an object store that
+        holds this object as soon as they are ready.
     """
     # Convert all of the argumens to object IDs. It is a little strange that we
     # are calling put, which is external to this class.
@@ -486,6 +510,8 @@ class Worker(object):
       serialized_args.append(next_arg)
     task_capsule = raylib.serialize_task(self.handle, func_name, serialized_args)
     objectids = raylib.submit_task(self.handle, task_capsule)
+    if placement_hint is not None:
+      raylib.prefetch_objects(self.handle, [arg for arg in serialized_args if isinstance(arg, raylib.ObjectID)], "", placement_hint)
     return objectids
 
   def export_function_to_run_on_all_workers(self, function):
@@ -583,7 +609,12 @@ def print_failed_task(task_status):
   """.format(task_status["function_name"], task_status["operationid"], task_status["error_message"])
 
 def scheduler_info(worker=global_worker):
-  """Return information about the state of the scheduler."""
+  """Return information about the state of the scheduler.
+
+  The "reference_counts" and "target_objectids" entries map the object IDs that
+  have not been deallocated to their reference counts and, for aliased object
+  IDs, to their targets. Deallocated object IDs are left out.
+  """
   check_connected(worker)
   return raylib.scheduler_info(worker.handle)
 
@@ -629,6 +660,35 @@ def task_info(worker=global_worker):
   check_connected(worker)
   return raylib.task_info(worker.handle)
 
+def memory_info(worker=global_worker):
+  """Return information about the memory used by the objects in each object store.
+
+  This can be used to find out which part of a program is holding on to
+  objects that are no longer needed.
+
+  Returns:
+    A list with a dictionary for each object store. The dictionary contains the
+      number of objects in the object store and their total size in bytes
+      ("num_objects" and "num_bytes"), the number of objects of each size
+      ("num_objects_by_size", which maps the smallest size in a size bucket to
+      the number of objects in that bucket), the total size of the objects that
+      are only present in this object store and of those that are also present
+      in another one ("pinned_bytes" and "evictable_bytes"), the ID, age in
+      seconds, and creating function of the object that has been in the object
+      store for the longest time ("oldest_objectid", "oldest_object_age", and
+      "oldest_object_function"), the number and total size of the objects
+      created by each remote function or put ("functions"), and statistics
+      about the compression of objects sent between machines
+      ("compression_stats"). If an object store did not reply, "available" is
+      False and the statistics for that object store are empty.
+  """
+  check_connected(worker)
+  info = raylib.memory_info(worker.handle)
+  size_bucket_starts = [0] + info["size_bucket_bounds"]
+  for objstore_info in info["objstores"]:
+    objstore_info["num_objects_by_size"] = dict(zip(size_bucket_starts, objstore_info["num_objects_by_size"]))
+  return info["objstores"]
+
 def initialize_numbuf(worker=global_worker):
   """Initialize the serialization library.
 
@@ -644,14 +704,34 @@ def initialize_numbuf(worker=global_worker):
     return raylib.deserialize_objectid(worker.handle, serialized_obj)
   serialization.add_class_to_whitelist(raylib.ObjectID, pickle=False, custom_serializer=objectid_custom_serializer, custom_deserializer=objectid_custom_deserializer)
 
+  # Define a custom serializer and deserializer for numpy arrays, which stores
+  # arrays of object IDs (like the blocks of a DistArray) as a single array of
+  # integers instead of going through objectid_custom_serializer for every ID.
+  # The reference counts of the deserialized object IDs are incremented in bulk.
+  def array_custom_serializer(obj):
+    if obj.dtype == object:
+      ids = raylib.serialize_objectids(obj.ravel())
+      if ids is not None:
+        contained_objectids.extend(obj.ravel())
+        return {"objectids": ids, "shape": list(obj.shape)}
+    return serialization.array_custom_serializer(obj)
+  def array_custom_deserializer(serialized_obj):
+    if isinstance(serialized_obj, dict):
+      result = np.empty(len(serialized_obj["objectids"]), dtype=object)
+      result[:] = raylib.deserialize_objectids(worker.handle, serialized_obj["objectids"])
+      return result.reshape(serialized_obj["shape"])
+    return serialization.array_custom_deserializer(serialized_obj)
+  serialization.add_class_to_whitelist(np.ndarray, pickle=False, custom_serializer=array_custom_serializer, custom_deserializer=array_custom_deserializer)
+
   if worker.mode in [raylib.SCRIPT_MODE, raylib.SILENT_MODE]:
     # These should only be called on the driver because register_class will
     # export the class to all of the workers.
     register_class(RayTaskError)
     register_class(RayGetError)
     register_class(RayGetArgumentError)
+    register_class(RayCancelledError)
 
-def init(start_ray_local=False, num_workers=None, num_objstores=None, scheduler_address=None, node_ip_address=None, driver_mode=raylib.SCRIPT_MODE):
+def init(start_ray_local=False, num_workers=None, num_objstores=None, scheduler_address=None, node_ip_address=None, driver_mode=raylib.SCRIPT_MODE, scheduling_policy=None, speculation_percentile=None, huge_pages=None, prefault=None, spill_computation_graph=None):
   """Either connect to an existing Ray cluster or start one and connect to it.
 
   This method handles two cases. Either a Ray cluster already exists and we
@@ -673,6 +753,27 @@ def init(start_ray_local=False, num_workers=None, num_objstores=None, scheduler_
       provided otherwise.
     driver_mode (Optional[bool]): The mode in which to start the driver. This
       should be one of SCRIPT_MODE, PYTHON_MODE, and SILENT_MODE.
+    scheduling_policy (Optional[str]): The policy the scheduler uses to assign
+      tasks to workers if start_ray_local is True. This should be one of
+      "naive", "locality_aware", "locality_by_bytes", "least_loaded", "random",
+      and "delay".
+    speculation_percentile (Optional[float]): If this is provided and
+      start_ray_local is True, then the scheduler starts a copy of a task that
+      has been running for longer than 1.5 times this percentile (a number
+      between 0 and 1) of the runtimes of the previous tasks of the same remote
+      function, and the results of whichever copy finishes first are used.
+      This requires remote functions to be deterministic.
+    huge_pages (Optional[bool]): If True and start_ray_local is True, then the
+      object stores back objects with transparent huge pages, which reduces the
+      number of page faults for large objects.
+    prefault (Optional[bool]): If True and start_ray_local is True, then the
+      pages of an object are faulted in when its memory is allocated and mapped
+      instead of one at a time when they are first accessed.
+    spill_computation_graph (Optional[bool]): If True and start_ray_local is
+      True, then the scheduler appends the operations that it prunes from the
+      computation graph to a file in the log directory, so that
+      ray.visualize_computation_graph can still show them. The file is deleted
+      when Ray shuts down.
 
   Returns:
     A string containing the address of the scheduler.
@@ -697,14 +798,18 @@ def init(start_ray_local=False, num_workers=None, num_objstores=None, scheduler_
     node_ip_address = "127.0.0.1"
     num_workers = 1 if num_workers is None else num_workers
     num_objstores = 1 if num_objstores is None else num_objstores
+    scheduling_policy = "locality_aware" if scheduling_policy is None else scheduling_policy
+    huge_pages = False if huge_pages is None else huge_pages
+    prefault = False if prefault is None else prefault
+    spill_computation_graph = False if spill_computation_graph is None else spill_computation_graph
     # Start the scheduler, object store, and some workers. These will be killed
     # by the call to cleanup(), which happens when the Python script exits.
-    scheduler_address = services.start_ray_local(num_objstores=num_objstores, num_workers=num_workers, worker_path=None)
+    scheduler_address = services.start_ray_local(num_objstores=num_objstores, num_workers=num_workers, worker_path=None, scheduling_policy=scheduling_policy, speculation_percentile=speculation_percentile, huge_pages=huge_pages, prefault=prefault, spill_computation_graph=spill_computation_graph)
   else:
     # In this case, there is an existing scheduler and object store, and we do
     # not need to start any processes.
-    if (num_workers is not None) or (num_objstores is not None):
-      raise Exception("The arguments num_workers and num_objstores must not be provided unless start_ray_local=True.")
+    if (num_workers is not None) or (num_objstores is not None) or (scheduling_policy is not None) or (speculation_percentile is not None) or (huge_pages is not None) or (prefault is not None) or (spill_computation_graph is not None):
+      raise Exception("The arguments num_workers, num_objstores, scheduling_policy, speculation_percentile, huge_pages, prefault, and spill_computation_graph must not be provided unless start_ray_local=True.")
     if (node_ip_address is None) or (scheduler_address is None):
       raise Exception("When start_ray_local=False, node_ip_address and scheduler_address must be provided.")
   # Connect this driver to the scheduler and object store. The corresponing call
@@ -929,6 +1034,51 @@ def put(value, worker=global_worker):
   worker.put_object(objectid, value)
   return objectid
 
+def broadcast(objectid, worker=global_worker):
+  """Copy a remote object or a list of remote objects to all object stores.
+
+  This is useful for objects that tasks on every machine need, such as the
+  weights of a model. The copies are made along a tree: object stores that
+  have received a large object send it on to the others, so the time it takes
+  to reach every machine grows logarithmically rather than linearly with the
+  number of machines. This method returns immediately, and the objects are
+  copied once they have been created.
+
+  Args:
+    objectid: Object ID of the object to copy or a list of object IDs to copy.
+  """
+  check_connected(worker)
+  if worker.mode == raylib.PYTHON_MODE:
+    return # In raylib.PYTHON_MODE, there are no object stores to copy objects to
+  if isinstance(objectid, list):
+    [raylib.broadcast_object(worker.handle, x) for x in objectid]
+    return
+  raylib.broadcast_object(worker.handle, objectid)
+
+def prefetch(objectids, node=None, worker=global_worker):
+  """Copy remote objects to an object store before tasks need them there.
+
+  Normally, the arguments of a task are only copied once the task has been
+  assigned to a worker. Drivers that know where objects will be needed can
+  call this to start the copies earlier, so that they overlap with other work.
+  This method returns immediately, and objects that have not been created yet
+  are copied once they have been created.
+
+  Args:
+    objectids: Object ID of the object to copy or a list of object IDs to copy.
+    node (str): The address of the object store to copy the objects to, as
+      listed in ray.scheduler_info()["objstores"]. By default, the objects are
+      copied to the local object store.
+  """
+  check_connected(worker)
+  if worker.mode == raylib.PYTHON_MODE:
+    return # In raylib.PYTHON_MODE, there are no object stores to copy objects to
+  if not isinstance(objectids, list):
+    objectids = [objectids]
+  # The scheduler raises an exception if node is not the address of an object
+  # store.
+  raylib.prefetch_objects(worker.handle, objectids, "" if node is None else node, None)
+
 def wait(objectids, num_returns=1, timeout=None, worker=global_worker):
   """Return a list of IDs that are ready and a list of IDs that are not ready.
 
@@ -956,6 +1106,8 @@ def wait(objectids, num_returns=1, timeout=None, worker=global_worker):
     raise Exception("num_returns cannot be less than 0.")
   if num_returns > len(objectids):
     raise Exception("num_returns cannot be greater than the length of the input list: num_objects is {}, and the length is {}.".format(num_returns, len(objectids)))
+  if worker.mode == raylib.PYTHON_MODE:
+    return objectids[:num_returns], objectids[num_returns:] # In raylib.PYTHON_MODE, all objects are ready as soon as they are created
   start_time = time.time()
   ready_indices = raylib.wait(worker.handle, objectids)
   # Polls scheduler until enough objects are ready.
@@ -963,10 +1115,44 @@ def wait(objectids, num_returns=1, timeout=None, worker=global_worker):
     ready_indices = raylib.wait(worker.handle, objectids)
     time.sleep(0.1)
   # Return indices for exactly the requested number of objects.
-  ready_ids = [objectids[i] for i in ready_indices[:num_returns]]
-  not_ready_ids = [objectids[i] for i in range(len(objectids)) if i not in ready_indices[:num_returns]]
+  ready_indices = ready_indices[:num_returns]
+  ready_set = set(ready_indices)
+  ready_ids = [objectids[i] for i in ready_indices]
+  not_ready_ids = [objectids[i] for i in range(len(objectids)) if i not in ready_set]
   return ready_ids, not_ready_ids
 
+def cancel(objectid, worker=global_worker):
+  """Cancel the task that creates an object.
+
+  If the task has not started yet, it is removed from the scheduler's queue. If
+  it is running, the worker executing it is interrupted. In both cases, getting
+  any of the task's outputs afterwards raises an exception saying that the task
+  was cancelled. Nothing happens if the task has already finished.
+
+  A running task is interrupted between Python bytecodes. If it is blocked in a
+  call into Ray, for example in ray.get waiting for an object, then it is
+  interrupted as soon as that call returns. The interruption raises
+  RayCancelledError in the remote function. This derives from BaseException,
+  so it passes through "except Exception:" clauses, but a bare "except:" or an
+  "except BaseException:" in the remote function catches it and keeps the task
+  running.
+
+  Args:
+    objectid (raylib.ObjectID): An object ID returned by the task to cancel.
+
+  Returns:
+    True if the task was cancelled and False if it had already finished.
+  """
+  check_connected(worker)
+  if worker.mode == raylib.PYTHON_MODE:
+    return False # In raylib.PYTHON_MODE, tasks finish as soon as they are submitted
+  cancelled, function_name, return_objectids = raylib.cancel_task(worker.handle, objectid)
+  if len(return_objectids) > 0:
+    # The task never ran, so we store the errors for its outputs ourselves.
+    failure_object = RayTaskError(function_name, RayCancelledError(), None)
+    store_outputs_in_objstore(return_objectids, [failure_object for _ in range(len(return_objectids))], worker)
+  return cancelled
+
 def kill_workers(worker=global_worker):
   """Kill all of the workers in the cluster. This does not kill drivers.
 
@@ -1032,6 +1218,24 @@ def main_loop(worker=global_worker):
   """
   if not raylib.connected(worker.handle):
     raise Exception("Worker is attempting to enter main_loop but has not been connected yet.")
+  def interrupt_handler(signum, frame):
+    """Interrupt the running task because it was cancelled.
+
+    The worker service sends SIGUSR1 to the worker process when the task it is
+    executing is cancelled. If the signal arrives after the remote function has
+    returned, or while the worker is executing a different task, the
+    cancellation came too late and is ignored.
+
+    Python only runs signal handlers between bytecodes, so a task that is
+    blocked in a call into raylib, like ray.get waiting for an object, is
+    interrupted when that call returns.
+    """
+    if worker.task_interruptible and raylib.interrupted_objectid(worker.handle) in worker.task_objectids:
+      worker.task_interruptible = False
+      raise RayCancelledError()
+
+  if hasattr(signal, "SIGUSR1"):
+    signal.signal(signal.SIGUSR1, interrupt_handler)
   # Notify the scheduler that the worker is ready to start receiving tasks.
   raylib.ready_for_new_task(worker.handle)
 
@@ -1048,11 +1252,22 @@ def main_loop(worker=global_worker):
     """
     function_name, serialized_args, return_objectids = task
     try:
-      arguments = get_arguments_for_execution(worker.functions[function_name], serialized_args, worker) # get args from objstore
-      outputs = worker.functions[function_name].executor(arguments) # execute the function
+      worker.task_objectids = [objectid.id for objectid in return_objectids]
+      worker.task_interruptible = True
+      try:
+        arguments = get_arguments_for_execution(worker.functions[function_name], serialized_args, worker) # get args from objstore
+        outputs = worker.functions[function_name].executor(arguments) # execute the function
+      finally:
+        worker.task_interruptible = False
       if len(return_objectids) == 1:
         outputs = (outputs,)
       store_outputs_in_objstore(return_objectids, outputs, worker) # store output in local object store
+    except RayCancelledError as e:
+      # The task was cancelled while it was running. This is not a failure, so
+      # we do not notify the scheduler.
+      failure_object = RayTaskError(function_name, e, None)
+      store_outputs_in_objstore(return_objectids, [failure_object for _ in range(len(return_objectids))], worker)
+      _logger().info("The task running function {} was cancelled.".format(function_name))
     except Exception as e:
       # If the task threw an exception, then record the traceback. We determine
       # whether the exception was thrown in the task execution by whether the
@@ -1158,7 +1373,7 @@ def main_loop(worker=global_worker):
       # Allow releasing the variables BEFORE we wait for the next message or exit the block
       del command_args
 
-def _submit_task(func_name, args, worker=global_worker):
+def _submit_task(func_name, args, placement_hint=None, worker=global_worker):
   """This is a wrapper around worker.submit_task.
 
   We use this wrapper so that in the remote decorator, we can call _submit_task
@@ -1166,7 +1381,7 @@ def _submit_task(func_name, args, worker=global_worker):
   serialize remote functions, we don't attempt to serialize the worker object,
   which cannot be serialized.
   """
-  return worker.submit_task(func_name, args)
+  return worker.submit_task(func_name, args, placement_hint)
 
 def _mode(worker=global_worker):
   """This is a wrapper around worker.mode.
@@ -1220,6 +1435,12 @@ def remote(*args, **kwargs):
       def func_call(*args, **kwargs):
         """This gets run immediately when a worker calls a remote function."""
         check_connected()
+        # The arguments that are remote objects are copied next to the
+        # _placement_hint object before the task is assigned to a worker, so
+        # that the task runs there without waiting for them.
+        placement_hint = kwargs.pop("_placement_hint", None)
+        if placement_hint is not None and _mode() != raylib.PYTHON_MODE and not isinstance(placement_hint, raylib.ObjectID):
+          raise Exception("The _placement_hint passed to {} must be an object ID.".format(func_name))
         args = list(args)
         args.extend([kwargs[keyword] if kwargs.has_key(keyword) else default for keyword, default in keyword_defaults[len(args):]]) # fill in the remaining arguments
         if any([arg is funcsigs._empty for arg in args]):
@@ -1235,7 +1456,7 @@ def remote(*args, **kwargs):
             _reusables()._reinitialize()
             _reusables()._running_remote_function_locally = False
           return result
-        objectids = _submit_task(func_name, args)
+        objectids = _submit_task(func_name, args, placement_hint)
         if len(objectids) == 1:
           return objectids[0]
         elif len(objectids) > 1:
@@ -1,27 +1,147 @@
 #include "computation_graph.h"
 
+ComputationGraph::ComputationGraph() : num_operations_(0) {}
+
 OperationId ComputationGraph::add_operation(std::unique_ptr<Operation> operation) {
-  OperationId operationid = operations_.size();
+  OperationId operationid = num_operations_;
   OperationId creator_operationid = operation->creator_operationid();
-  RAY_CHECK_EQ(spawned_operations_.size(), operationid, "ComputationGraph is attempting to call add_operation, but spawned_operations_.size() != operationid.");
-  operations_.emplace_back(std::move(operation));
-  if (creator_operationid != NO_OPERATION && creator_operationid != ROOT_OPERATION) {
+  num_operations_ += 1;
+  std::vector<ObjectID> outputs;
+  size_t num_dependents = 0;
+  if (operation->has_task()) {
+    outputs.assign(operation->task().result().begin(), operation->task().result().end());
+    num_dependents += 1; // The task has not finished executing yet.
+  } else if (operation->has_put()) {
+    outputs.push_back(operation->put().objectid());
+  } else if (operation->has_get()) {
+    outputs.push_back(operation->get().objectid());
+  }
+  for (ObjectID objectid : outputs) {
+    output_operations_[objectid].push_back(operationid);
+  }
+  num_dependents += outputs.size();
+  operations_.emplace(operationid, std::move(operation));
+  spawned_operations_.emplace(operationid, std::vector<OperationId>());
+  num_dependents_[operationid] = num_dependents;
+  // If the creator has already been pruned, then there is nothing to record.
+  if (creator_operationid != NO_OPERATION && creator_operationid != ROOT_OPERATION && operations_.find(creator_operationid) != operations_.end()) {
     spawned_operations_[creator_operationid].push_back(operationid);
+    num_dependents_[creator_operationid] += 1;
   }
-  spawned_operations_.push_back(std::vector<OperationId>());
   return operationid;
 }
 
 const Task& ComputationGraph::get_task(OperationId operationid) {
   RAY_CHECK_NEQ(operationid, ROOT_OPERATION, "ComputationGraph attempting to get_task with operationid == ROOT_OPERATION");
   RAY_CHECK_NEQ(operationid, NO_OPERATION, "ComputationGraph attempting to get_task with operationid == NO_OPERATION");
-  RAY_CHECK_LT(operationid, operations_.size(), "ComputationGraph attempting to get_task with operationid " << operationid << ", but operationid >= operations_.size().");
-  RAY_CHECK(operations_[operationid]->has_task(), "Calling get_task with operationid " << operationid << ", but this corresponds to a put not a task.");
-  return operations_[operationid]->task();
+  RAY_CHECK_LT(operationid, num_operations_, "ComputationGraph attempting to get_task with operationid " << operationid << ", but operationid >= num_operations_.");
+  auto it = operations_.find(operationid);
+  RAY_CHECK(it != operations_.end(), "ComputationGraph attempting to get_task with operationid " << operationid << ", but this operation has been pruned.");
+  RAY_CHECK(it->second->has_task(), "Calling get_task with operationid " << operationid << ", but this corresponds to a put not a task.");
+  return it->second->task();
+}
+
+OperationId ComputationGraph::get_creator_operationid(OperationId operationid) {
+  auto it = operations_.find(operationid);
+  RAY_CHECK(it != operations_.end(), "ComputationGraph attempting to get_creator_operationid with operationid " << operationid << ", but this operation has been pruned.");
+  return it->second->creator_operationid();
+}
+
+std::string ComputationGraph::get_creating_function(ObjectID objectid) {
+  auto it = output_operations_.find(objectid);
+  if (it == output_operations_.end()) {
+    return "unknown";
+  }
+  // The operations that produced an object cannot be pruned before the object
+  // is deallocated, so they are all in operations_.
+  for (OperationId operationid : it->second) {
+    const Operation& operation = *operations_[operationid];
+    if (operation.has_task()) {
+      return operation.task().name();
+    }
+    if (operation.has_put()) {
+      auto creator = operations_.find(operation.creator_operationid());
+      if (creator == operations_.end() || !creator->second->has_task()) {
+        return "ray.put in driver";
+      }
+      return "ray.put in " + creator->second->task().name();
+    }
+  }
+  return "unknown";
+}
+
+void ComputationGraph::finish_task(OperationId operationid) {
+  RAY_CHECK(operations_.find(operationid) != operations_.end(), "ComputationGraph attempting to finish_task with operationid " << operationid << ", but this operation has been pruned.");
+  num_dependents_[operationid] -= 1;
+  prune_if_possible(operationid);
+}
+
+void ComputationGraph::object_deallocated(ObjectID objectid) {
+  auto it = output_operations_.find(objectid);
+  if (it == output_operations_.end()) {
+    return;
+  }
+  std::vector<OperationId> operationids;
+  operationids.swap(it->second);
+  output_operations_.erase(it);
+  for (OperationId operationid : operationids) {
+    num_dependents_[operationid] -= 1;
+    prune_if_possible(operationid);
+  }
+}
+
+void ComputationGraph::set_spill_file(const std::string& spill_file_name) {
+  spill_file_name_ = spill_file_name;
+  spill_file_.open(spill_file_name, std::ios::out | std::ios::trunc | std::ios::binary);
+  RAY_CHECK(spill_file_.is_open(), "ComputationGraph could not open spill file " << spill_file_name);
+}
+
+void ComputationGraph::get_spill_file(std::string* spill_file_name, size_t* spill_file_size) {
+  *spill_file_name = spill_file_name_;
+  *spill_file_size = 0;
+  if (spill_file_.is_open()) {
+    spill_file_.flush();
+    *spill_file_size = spill_file_.tellp();
+  }
+}
+
+OperationId ComputationGraph::num_operations() const {
+  return num_operations_;
+}
+
+void ComputationGraph::to_protobuf(OperationId begin, OperationId end, CompGraph* computation_graph) {
+  for (OperationId id = begin; id < std::min(end, num_operations_); ++id) {
+    auto it = operations_.find(id);
+    if (it != operations_.end()) {
+      computation_graph->add_operation()->CopyFrom(*it->second);
+      computation_graph->add_operationid(id);
+    }
+  }
 }
 
-void ComputationGraph::to_protobuf(CompGraph* computation_graph) {
-  for (OperationId id = 0; id < operations_.size(); ++id) {
-    computation_graph->add_operation()->CopyFrom(*operations_[id]);
+void ComputationGraph::prune_if_possible(OperationId operationid) {
+  while (operationid != NO_OPERATION && operationid != ROOT_OPERATION && num_dependents_[operationid] == 0) {
+    auto it = operations_.find(operationid);
+    OperationId creator_operationid = it->second->creator_operationid();
+    if (spill_file_.is_open()) {
+      // Serialized CompGraphs can be concatenated, so the spill file always
+      // parses as a single CompGraph.
+      CompGraph spilled;
+      spilled.add_operation()->Swap(it->second.get());
+      spilled.add_operationid(operationid);
+      RAY_CHECK(spilled.SerializeToOstream(&spill_file_), "ComputationGraph could not write to spill file " << spill_file_name_);
+    }
+    operations_.erase(it);
+    spawned_operations_.erase(operationid);
+    num_dependents_.erase(operationid);
+    RAY_LOG(RAY_DEBUG, "Pruned operation " << operationid << " from the computation graph.");
+    // The creator is only still around if this operation was registered as one
+    // of its spawned operations in add_operation.
+    auto creator_it = num_dependents_.find(creator_operationid);
+    if (creator_it == num_dependents_.end()) {
+      break;
+    }
+    creator_it->second -= 1;
+    operationid = creator_operationid;
   }
 }
@@ -2,6 +2,7 @@
 #define RAY_COMPUTATIONGRAPH_H
 
 #include <iostream>
+#include <fstream>
 #include <limits>
 
 #include "ray/ray.h"
@@ -14,22 +15,66 @@ const OperationId ROOT_OPERATION = std::numeric_limits<OperationId>::max();
 // used to represent the absence of an operation
 const OperationId NO_OPERATION = std::numeric_limits<OperationId>::max() - 1;
 
+// The computation graph only keeps the operations that may still be needed.
+// An operation is pruned once all of the objects it produced (the results of a
+// task, the object of a put, or the object retrieved by a get) have been
+// deallocated, it has finished executing, and all of the operations it spawned
+// have been pruned. If a spill file is set, pruned operations are appended to
+// it, so that the full lineage is still available on disk.
 class ComputationGraph {
 public:
+  ComputationGraph();
   // Add an operation to the computation graph, this returns the OperationId for
   // the new operation. This method takes ownership over operation.
   OperationId add_operation(std::unique_ptr<Operation> operation);
   // Return the task corresponding to a particular OperationId. If operationid
   // corresponds to a put, then fail.
   const Task& get_task(OperationId operationid);
-  // Serialize the computation graph to ProtoBuf and store it in computation_graph
-  void to_protobuf(CompGraph* computation_graph);
+  // Return the OperationId of the operation that spawned operationid.
+  OperationId get_creator_operationid(OperationId operationid);
+  // Return the name of the remote function whose task produced objectid. If
+  // objectid was created by a put, return "ray.put in " followed by the name of
+  // the function that called put, or "ray.put in driver" if the driver called
+  // it. Return "unknown" if the graph has no record of objectid.
+  std::string get_creating_function(ObjectID objectid);
+  // Indicate that the task with OperationId operationid has finished executing.
+  void finish_task(OperationId operationid);
+  // Indicate that objectid has been deallocated. This prunes the operations
+  // that are no longer needed.
+  void object_deallocated(ObjectID objectid);
+  // Append pruned operations to the file spill_file_name instead of discarding
+  // them.
+  void set_spill_file(const std::string& spill_file_name);
+  // Flush the spill file and return its name and current size. The first
+  // spill_file_size bytes of the file form a serialized CompGraph.
+  void get_spill_file(std::string* spill_file_name, size_t* spill_file_size);
+  // Return the number of OperationIds that have been handed out so far.
+  OperationId num_operations() const;
+  // Serialize the operations with OperationIds in [begin, end) that have not
+  // been pruned to ProtoBuf and store them in computation_graph
+  void to_protobuf(OperationId begin, OperationId end, CompGraph* computation_graph);
 private:
+  // Remove operationid from the graph (spilling it if necessary) and
+  // recursively prune the operation that created it if that is now possible.
+  void prune_if_possible(OperationId operationid);
+
+  // The number of OperationIds handed out so far.
+  OperationId num_operations_;
   // maps an OperationId to the corresponding task or put
-  std::vector<std::unique_ptr<Operation> > operations_;
+  std::unordered_map<OperationId, std::unique_ptr<Operation> > operations_;
   // spawned_operations_[operationid] is a vector of the OperationIds of the
   // operations spawned by the task with OperationId operationid
-  std::vector<std::vector<OperationId> > spawned_operations_;
+  std::unordered_map<OperationId, std::vector<OperationId> > spawned_operations_;
+  // num_dependents_[operationid] is the number of reasons why operationid
+  // cannot be pruned yet: objects produced by the operation that have not been
+  // deallocated, spawned operations that have not been pruned, and whether the
+  // task is still executing.
+  std::unordered_map<OperationId, size_t> num_dependents_;
+  // output_operations_[objectid] is a vector of the OperationIds of the
+  // operations that produced or retrieved objectid
+  std::unordered_map<ObjectID, std::vector<OperationId> > output_operations_;
+  std::string spill_file_name_;
+  std::ofstream spill_file_;
 };
 
 #endif
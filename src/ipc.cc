@@ -3,15 +3,38 @@
 #if defined(__unix__) || defined(__linux__)
 #include <sys/statvfs.h>
 #endif
+#if defined(__linux__)
+#include <sys/mman.h>
+#ifndef MADV_POPULATE_WRITE
+#define MADV_POPULATE_WRITE 23 // available since Linux 5.14
+#endif
+#endif
 
 #include <stdlib.h>
+#if !defined(WIN32) && !defined(_WIN32)
+#include <errno.h>
+#include <signal.h>
+#include <unistd.h>
+#endif
+#include <chrono>
+#include <thread>
 #include "ray/ray.h"
 #include "utils.h"
 
-ObjHandle::ObjHandle(SegmentId segmentid, size_t size, IpcPointer ipcpointer, size_t metadata_offset)
-  : segmentid_(segmentid), size_(size), ipcpointer_(ipcpointer), metadata_offset_(metadata_offset)
+ObjHandle::ObjHandle(SegmentId segmentid, size_t size, IpcPointer ipcpointer, size_t metadata_offset, SegmentOptions options)
+  : segmentid_(segmentid), size_(size), ipcpointer_(ipcpointer), metadata_offset_(metadata_offset), options_(options)
 {}
 
+// Return the name of a shared memory object or message queue that is used by
+// Ray.
+static std::string get_ipc_name(const std::string& name) {
+  std::string ipc_name = "ray-{BC200A09-2465-431D-AEC7-2F8530B04535}-" + name;
+#if defined(WIN32) || defined(_WIN32)
+  std::replace(ipc_name.begin(), ipc_name.end(), ':', '-');
+#endif
+  return ipc_name;
+}
+
 MessageQueue<>::MessageQueue() : create_(false) { }
 
 MessageQueue<>::~MessageQueue() {
@@ -37,11 +60,7 @@ MessageQueue<>& MessageQueue<>::operator=(MessageQueue&& other) {
 
 
 bool MessageQueue<>::connect(const std::string& name, bool create, size_t message_size, size_t message_capacity) {
-  name_ = name;
-  name_.insert(0, "ray-{BC200A09-2465-431D-AEC7-2F8530B04535}-");
-#if defined(WIN32) || defined(_WIN32)
-  std::replace(name_.begin(), name_.end(), ':', '-');
-#endif
+  name_ = get_ipc_name(name);
   try {
     if (create) {
       bip::message_queue::remove(name_.c_str()); // remove queue if it has not been properly removed from last run
@@ -62,16 +81,15 @@ bool MessageQueue<>::connected() {
 }
 
 bool MessageQueue<>::send(const void * object, size_t size) {
-  bool succeeded;
   try {
-    // This will return true if the message was successfully sent and false if
-    // the message queue is full.
-    succeeded = queue_->try_send(object, size, 0);
+    // If the message queue is full, this waits until the receiver has made
+    // room.
+    queue_->send(object, size, 0);
   }
   catch (bip::interprocess_exception &ex) {
     RAY_CHECK(false, "boost::interprocess exception: " << ex.what());
   }
-  return succeeded;
+  return true;
 }
 
 bool MessageQueue<>::receive(void * object, size_t size) {
@@ -86,14 +104,164 @@ bool MessageQueue<>::receive(void * object, size_t size) {
   return true;
 }
 
-MemorySegmentPool::MemorySegmentPool(ObjStoreId objstoreid, std::string& objstore_address, bool create) : objstoreid_(objstoreid), objstore_address_(objstore_address), create_mode_(create) {
+void ring_buffer_backoff(size_t num_attempts) {
+  if (num_attempts < 64) {
+    return;
+  } else if (num_attempts < RING_BUFFER_POLLS_BEFORE_SLEEP) {
+    std::this_thread::yield();
+  } else {
+    std::this_thread::sleep_for(std::chrono::microseconds(10));
+  }
+}
+
+DoorbellArray::DoorbellArray() : create_(false), doorbells_(nullptr), num_doorbells_(0) { }
+
+DoorbellArray::~DoorbellArray() {
+  if (create_) {
+    for (size_t i = 0; i < num_doorbells_; ++i) {
+      doorbells_[i].~Doorbell();
+    }
+  }
+  region_.reset();
+  if (!name_.empty() && create_) {
+    RAY_LOG(RAY_DEBUG, "Removing doorbells " << name_);
+    bip::shared_memory_object::remove(name_.c_str());
+  }
+}
+
+bool DoorbellArray::create(const std::string& name, size_t num_doorbells) {
+  name_ = get_ipc_name(name);
+  try {
+    bip::shared_memory_object::remove(name_.c_str()); // remove doorbells if they have not been properly removed from last run
+    bip::shared_memory_object shm(bip::create_only, name_.c_str(), bip::read_write);
+    shm.truncate(num_doorbells * sizeof(Doorbell));
+    region_ = std::unique_ptr<bip::mapped_region>(new bip::mapped_region(shm, bip::read_write));
+    doorbells_ = static_cast<Doorbell*>(region_->get_address());
+    for (size_t i = 0; i < num_doorbells; ++i) {
+      new (&doorbells_[i]) Doorbell();
+    }
+    num_doorbells_ = num_doorbells;
+    create_ = true; // Only set create_ = true on success.
+  }
+  catch (bip::interprocess_exception &ex) {
+    RAY_CHECK(false, "name = " << name_ << ", boost::interprocess exception: " << ex.what());
+  }
+  return true;
+}
+
+void DoorbellArray::open(const std::string& name) {
+  name_ = get_ipc_name(name);
+}
+
+void DoorbellArray::map() {
+  try {
+    bip::shared_memory_object shm(bip::open_only, name_.c_str(), bip::read_write);
+    region_ = std::unique_ptr<bip::mapped_region>(new bip::mapped_region(shm, bip::read_write));
+    doorbells_ = static_cast<Doorbell*>(region_->get_address());
+    num_doorbells_ = region_->get_size() / sizeof(Doorbell);
+  }
+  catch (bip::interprocess_exception &ex) {
+    RAY_CHECK(false, "name = " << name_ << ", boost::interprocess exception: " << ex.what());
+  }
+}
+
+Doorbell& DoorbellArray::operator[](size_t index) {
+  RAY_CHECK_LT(index, num_doorbells_, "Attempting to use doorbell " << index << " of " << name_ << ", which only has " << num_doorbells_ << " doorbells.");
+  return doorbells_[index];
+}
+
+void DoorbellArray::ring(size_t index) {
+  if (doorbells_ == nullptr) {
+    map();
+  }
+  (*this)[index].ring();
+}
+
+ObjStoreChannel::ObjStoreChannel() : create_(false), rings_(nullptr) { }
+
+ObjStoreChannel::~ObjStoreChannel() {
+  region_.reset();
+  if (!name_.empty() && create_) {
+    // Only remove the shared memory if we created it. The other side keeps its
+    // mapping until it unmaps it.
+    RAY_LOG(RAY_DEBUG, "Removing object store channel " << name_);
+    bip::shared_memory_object::remove(name_.c_str());
+  }
+}
+
+bool ObjStoreChannel::connect(const std::string& name, bool create) {
+  name_ = get_ipc_name(name);
+  try {
+    if (create) {
+      bip::shared_memory_object::remove(name_.c_str()); // remove channel if it has not been properly removed from last run
+      bip::shared_memory_object shm(bip::create_only, name_.c_str(), bip::read_write);
+      shm.truncate(sizeof(Rings));
+      region_ = std::unique_ptr<bip::mapped_region>(new bip::mapped_region(shm, bip::read_write));
+      rings_ = new (region_->get_address()) Rings();
+      rings_->request_doorbell = -1;
+#if defined(WIN32) || defined(_WIN32)
+      rings_->pid = -1;
+#else
+      rings_->pid = getpid();
+#endif
+      create_ = true; // Only set create_ = true on success.
+    } else {
+      bip::shared_memory_object shm(bip::open_only, name_.c_str(), bip::read_write);
+      region_ = std::unique_ptr<bip::mapped_region>(new bip::mapped_region(shm, bip::read_write));
+      rings_ = static_cast<Rings*>(region_->get_address());
+    }
+  }
+  catch (bip::interprocess_exception &ex) {
+    RAY_CHECK(false, "name = " << name_ << ", create = " << create << ", boost::interprocess exception: " << ex.what());
+  }
+  return true;
+}
+
+bool ObjStoreChannel::connected() {
+  return rings_ != nullptr;
+}
+
+void ObjStoreChannel::push_request(const ObjRequest& request, DoorbellArray& request_doorbells) {
+  for (size_t num_attempts = 0; !rings_->requests.try_push(request); ++num_attempts) {
+    ring_buffer_backoff(num_attempts);
+  }
+  std::atomic_thread_fence(std::memory_order_seq_cst); // order the push before the load of request_doorbell
+  int64_t index = rings_->request_doorbell.load();
+  // If the object store has not assigned a request thread yet, it looks at the
+  // requests when it does.
+  if (index >= 0) {
+    request_doorbells.ring(index);
+  }
+}
+
+void ObjStoreChannel::pop_reply(ObjHandle* reply) {
+  rings_->replies.pop(reply, rings_->reply_doorbell);
+}
+
+void ObjStoreChannel::push_reply(const ObjHandle& reply) {
+  rings_->replies.push(reply, rings_->reply_doorbell);
+}
+
+void ObjStoreChannel::set_request_doorbell(size_t index) {
+  rings_->request_doorbell = index;
+}
+
+bool ObjStoreChannel::producer_alive() {
+#if defined(WIN32) || defined(_WIN32)
+  return true;
+#else
+  return kill(rings_->pid, 0) == 0 || errno != ESRCH;
+#endif
+}
+
+MemorySegmentPool::MemorySegmentPool(ObjStoreId objstoreid, std::string& objstore_address, bool create, SegmentOptions options) : objstoreid_(objstoreid), objstore_address_(objstore_address), create_mode_(create), options_(options) {
   std::string::iterator split_point = split_ip_address(objstore_address);
   objstore_port_.assign(split_point, objstore_address.end());
 }
 
 // creates a memory segment if it is not already there; if the pool is in create mode,
 // space is allocated, if it is in open mode, the shared memory is mapped into the process
-void MemorySegmentPool::open_segment(SegmentId segmentid, size_t size) {
+void MemorySegmentPool::open_segment(SegmentId segmentid, size_t size, SegmentOptions options) {
   RAY_LOG(RAY_DEBUG, "Opening segmentid " << segmentid << " on object store " << objstoreid_ << " with port " << objstore_port_ << " with create_mode_ = " << create_mode_);
   RAY_CHECK(segmentid == segments_.size() || !create_mode_, "Object store " << objstoreid_ << " with port " << objstore_port_ << " is attempting to open segmentid " << segmentid << " on the object store, but segments_.size() = " << segments_.size());
   if (segmentid >= segments_.size()) { // resize and initialize segments_
@@ -117,6 +285,31 @@ void MemorySegmentPool::open_segment(SegmentId segmentid, size_t size) {
   } else {
     segments_[segmentid] = std::make_pair(std::unique_ptr<bip::managed_shared_memory>(new bip::managed_shared_memory(bip::open_only, segment_name.c_str())), SegmentStatusType::OPENED);
   }
+  advise_segment(segmentid, options);
+}
+
+// The huge page advice has to come before the pages are populated, because the
+// kernel picks the page size when a page is first faulted in. Populating the
+// mapping of a worker does not allocate new memory if the object store already
+// populated the segment, it only fills in the worker's page tables.
+void MemorySegmentPool::advise_segment(SegmentId segmentid, SegmentOptions options) {
+#if defined(__linux__)
+  bip::managed_shared_memory* segment = segments_[segmentid].first.get();
+  uint8_t* address = static_cast<uint8_t*>(segment->get_address());
+  size_t size = segment->get_size();
+  if (options.huge_pages && madvise(address, size, MADV_HUGEPAGE) != 0) {
+    RAY_LOG(RAY_DEBUG, "madvise(MADV_HUGEPAGE) failed for segmentid " << segmentid << " on object store " << objstoreid_);
+  }
+  if (options.prefault && madvise(address, size, MADV_POPULATE_WRITE) != 0) {
+    // Older kernels do not support MADV_POPULATE_WRITE, so fault the pages in
+    // by reading one byte of each page. Reading is safe even if another process
+    // is using the segment.
+    volatile uint8_t* pages = address;
+    for (size_t offset = 0; offset < size; offset += page_size_) {
+      pages[offset];
+    }
+  }
+#endif
 }
 
 void MemorySegmentPool::unmap_segment(SegmentId segmentid) {
@@ -136,11 +329,11 @@ ObjHandle MemorySegmentPool::allocate(size_t size) {
   RAY_CHECK(create_mode_, "Attempting to call allocate, but create_mode_ is false");
   // TODO(pcm): at the moment, this always creates a new segment, this will be changed
   SegmentId segmentid = segments_.size();
-  open_segment(segmentid, size);
   objstore_memcheck(size);
+  open_segment(segmentid, size, options_);
   void* ptr = segments_[segmentid].first->allocate(size);
   auto handle = segments_[segmentid].first->get_handle_from_address(ptr);
-  return ObjHandle(segmentid, size, handle);
+  return ObjHandle(segmentid, size, handle, 0, options_);
 }
 
 void MemorySegmentPool::deallocate(ObjHandle pointer) {
@@ -155,7 +348,7 @@ void MemorySegmentPool::deallocate(ObjHandle pointer) {
 uint8_t* MemorySegmentPool::get_address(ObjHandle pointer) {
   RAY_CHECK(!create_mode_ || segments_[pointer.segmentid()].second == SegmentStatusType::OPENED, "Object store " << objstoreid_ << " is attempting to call get_address on segmentid " << pointer.segmentid() << ", which has not been opened yet.");
   if (!create_mode_) {
-    open_segment(pointer.segmentid());
+    open_segment(pointer.segmentid(), 0, pointer.options());
   }
   bip::managed_shared_memory* segment = segments_[pointer.segmentid()].first.get();
   return static_cast<uint8_t*>(segment->get_address_from_handle(pointer.ipcpointer()));
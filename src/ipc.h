@@ -1,6 +1,9 @@
 #ifndef RAY_IPC_H
 #define RAY_IPC_H
 
+#include <atomic>
+#include <cerrno>
+#include <chrono>
 #include <iostream>
 #include <limits>
 
@@ -21,7 +24,11 @@ namespace boost {
 #endif
 
 #include <boost/interprocess/managed_shared_memory.hpp>
+#include <boost/interprocess/shared_memory_object.hpp>
+#include <boost/interprocess/mapped_region.hpp>
 #include <boost/interprocess/ipc/message_queue.hpp>
+#include <boost/interprocess/sync/interprocess_semaphore.hpp>
+#include <boost/date_time/posix_time/posix_time_types.hpp>
 
 #include "ray/ray.h"
 
@@ -60,6 +67,164 @@ public:
   bool receive(T* object) { return MessageQueue<>::receive(object, sizeof(*object)); }
 };
 
+// Doorbells: Let the consumer of ring buffers sleep while they are empty. A
+// doorbell lives in shared memory. Before sleeping, the consumer announces that
+// it is about to sleep and checks its ring buffers one last time. A producer
+// rings the doorbell after pushing, which only enters the kernel if the
+// consumer has announced that it is sleeping.
+
+class Doorbell {
+public:
+  Doorbell() : sleeping_(false), semaphore_(0) {}
+  // Wake up the consumer if it is sleeping. This is called by producers after
+  // they push.
+  void ring() {
+    std::atomic_thread_fence(std::memory_order_seq_cst); // order the push before the load of sleeping_
+    if (sleeping_.load() && sleeping_.exchange(false)) {
+      semaphore_.post();
+    }
+  }
+  // Sleep until a producer rings the doorbell or until timeout has passed. This
+  // returns right away if is_ready returns true after the consumer has
+  // announced that it is sleeping.
+  template<typename Predicate>
+  void wait(Predicate is_ready, std::chrono::milliseconds timeout) {
+    sleeping_.store(true);
+    std::atomic_thread_fence(std::memory_order_seq_cst); // order the store of sleeping_ before the loads in is_ready
+    if (!is_ready() && timed_wait(timeout)) {
+      return; // The producer that woke us up has reset sleeping_.
+    }
+    if (!sleeping_.exchange(false)) {
+      // A producer reset sleeping_ and posts the semaphore, so consume the post
+      // to keep the count of the semaphore at zero.
+      while (!timed_wait(timeout)) {}
+    }
+  }
+private:
+  // Wait for a post of the semaphore, returning false after timeout or if a
+  // signal interrupted the wait. Signals interrupt sem_timedwait with EINTR,
+  // which boost turns into an exception. Workers receive SIGUSR1 when their
+  // task is cancelled while they are waiting for a reply, so this treats the
+  // signal like a spurious wakeup, and the callers check again.
+  bool timed_wait(std::chrono::milliseconds timeout) {
+    try {
+      return semaphore_.timed_wait(boost::posix_time::microsec_clock::universal_time() + boost::posix_time::milliseconds(timeout.count()));
+    }
+    catch (bip::interprocess_exception &ex) {
+      RAY_CHECK_EQ(ex.get_native_error(), EINTR, "boost::interprocess exception: " << ex.what());
+      return false;
+    }
+  }
+  static_assert(ATOMIC_BOOL_LOCK_FREE == 2, "Doorbells require lock free atomics.");
+  std::atomic<bool> sleeping_;
+  bip::interprocess_semaphore semaphore_;
+};
+
+// Doorbell array: A fixed number of doorbells in one shared memory segment. The
+// object store creates one for its request threads, and the workers map it to
+// wake up the thread that processes their requests.
+
+class DoorbellArray {
+public:
+  DoorbellArray();
+  ~DoorbellArray();
+  // Create num_doorbells doorbells in the shared memory segment name.
+  bool create(const std::string& name, size_t num_doorbells);
+  // Refer to the doorbells in the shared memory segment name, which has been
+  // created by another process. The segment is mapped the first time a
+  // doorbell is rung.
+  void open(const std::string& name);
+  Doorbell& operator[](size_t index);
+  // Ring doorbell index, mapping the segment first if necessary.
+  void ring(size_t index);
+private:
+  void map();
+  std::string name_;
+  bool create_;
+  std::unique_ptr<bip::mapped_region> region_;
+  Doorbell* doorbells_;
+  size_t num_doorbells_;
+};
+
+// Ring Buffers: Exchanging objects of type T between exactly one producer and
+// one consumer, which may live in different processes. A ring buffer is placed
+// in shared memory and only uses atomic loads and stores, so neither side takes
+// a lock or enters the kernel while the other side keeps up. A producer that
+// finds the ring buffer full waits for the consumer to catch up instead of
+// failing, and a consumer that finds it empty for a while sleeps on a doorbell.
+
+// The number of times a consumer polls an empty ring buffer before it sleeps on
+// its doorbell.
+const size_t RING_BUFFER_POLLS_BEFORE_SLEEP = 128;
+// How long a consumer sleeps on its doorbell before it checks for other work,
+// like noticing that the producer has died.
+const std::chrono::milliseconds DOORBELL_TIMEOUT = std::chrono::milliseconds(1000);
+
+// Wait a little before polling a ring buffer again. This spins at first and
+// then yields. After RING_BUFFER_POLLS_BEFORE_SLEEP attempts, it sleeps
+// briefly, which only happens to producers waiting for room in a full ring
+// buffer, because consumers sleep on their doorbell instead.
+void ring_buffer_backoff(size_t num_attempts);
+
+template<typename T, size_t N = 1024>
+class RingBuffer {
+public:
+  RingBuffer() : head_(0), tail_(0) {}
+  // Append object, return false if the ring buffer is full.
+  bool try_push(const T& object) {
+    uint64_t tail = tail_.load(std::memory_order_relaxed);
+    if (tail - head_.load(std::memory_order_acquire) == N) {
+      return false;
+    }
+    slots_[tail % N] = object;
+    tail_.store(tail + 1, std::memory_order_release);
+    return true;
+  }
+  // Append object, waiting while the ring buffer is full, and wake up the
+  // consumer through doorbell.
+  void push(const T& object, Doorbell& doorbell) {
+    for (size_t num_attempts = 0; !try_push(object); ++num_attempts) {
+      ring_buffer_backoff(num_attempts);
+    }
+    doorbell.ring();
+  }
+  // Return true if there is nothing to pop. This is only reliable for the
+  // consumer.
+  bool empty() {
+    return head_.load(std::memory_order_relaxed) == tail_.load(std::memory_order_acquire);
+  }
+  // Remove the oldest object, return false if the ring buffer is empty.
+  bool try_pop(T* object) {
+    uint64_t head = head_.load(std::memory_order_relaxed);
+    if (head == tail_.load(std::memory_order_acquire)) {
+      return false;
+    }
+    *object = slots_[head % N];
+    head_.store(head + 1, std::memory_order_release);
+    return true;
+  }
+  // Remove the oldest object, sleeping on doorbell while the ring buffer is
+  // empty.
+  void pop(T* object, Doorbell& doorbell) {
+    for (size_t num_attempts = 0; !try_pop(object); ++num_attempts) {
+      if (num_attempts < RING_BUFFER_POLLS_BEFORE_SLEEP) {
+        ring_buffer_backoff(num_attempts);
+      } else {
+        doorbell.wait([this]() { return !empty(); }, DOORBELL_TIMEOUT);
+      }
+    }
+  }
+private:
+  // The atomics are shared between processes, which requires them to be lock free.
+  static_assert(ATOMIC_LLONG_LOCK_FREE == 2, "Ring buffers require lock free 64 bit atomics.");
+  static const size_t CACHE_LINE_SIZE = 64;
+  std::atomic<uint64_t> head_; // index of the next object to pop, only written by the consumer
+  char head_padding_[CACHE_LINE_SIZE - sizeof(std::atomic<uint64_t>)]; // keep head_ and tail_ on different cache lines
+  std::atomic<uint64_t> tail_; // index of the next object to push, only written by the producer
+  char tail_padding_[CACHE_LINE_SIZE - sizeof(std::atomic<uint64_t>)];
+  T slots_[N];
+};
+
 // Object Queues
 
 // For communicating between object store and workers, the following
@@ -71,10 +236,15 @@ public:
 // worker requests an object from the object store
 // WORKER_DONE: workerid, objectid -> ():
 // worker tells the object store that an object has been finalized
-// ALIAS_DONE: objectid -> ():
-// objstore tells itself that it has finalized something (perhaps an alias)
+// CONNECT: workerid -> ():
+// worker tells the object store that it has created its ObjStoreChannel
+// DISCONNECT: workerid -> ():
+// worker tells the object store that it will not send any more requests
+//
+// CONNECT is sent over the object store's message queue, all other messages are
+// exchanged over the worker's ObjStoreChannel.
 
-enum ObjRequestType {ALLOC = 0, GET = 1, WORKER_DONE = 2, ALIAS_DONE = 3};
+enum ObjRequestType {ALLOC = 0, GET = 1, WORKER_DONE = 2, CONNECT = 3, DISCONNECT = 4};
 
 struct ObjRequest {
   WorkerId workerid; // worker that sends the request
@@ -90,19 +260,74 @@ typedef bip::managed_shared_memory::handle_t IpcPointer;
 // Object handle: Handle to object that can be passed around between processes
 // that are connected to the same object store
 
+// Options for the shared memory segments that an object store creates.
+struct SegmentOptions {
+  // If true, ask the kernel to back the segments with transparent huge pages.
+  // This only has an effect if huge pages are enabled for shared memory, see
+  // /sys/kernel/mm/transparent_hugepage/shmem_enabled.
+  bool huge_pages = false;
+  // If true, the object store populates the page tables of a segment when it
+  // creates it, and workers do the same when they map it, so that writing or
+  // reading the object does not take a page fault per page.
+  bool prefault = false;
+};
+
 class ObjHandle {
 public:
-  ObjHandle(SegmentId segmentid = 0, size_t size = 0, IpcPointer ipcpointer = IpcPointer(), size_t metadata_offset = 0);
+  ObjHandle(SegmentId segmentid = 0, size_t size = 0, IpcPointer ipcpointer = IpcPointer(), size_t metadata_offset = 0, SegmentOptions options = SegmentOptions());
   SegmentId segmentid() { return segmentid_; }
   size_t size() { return size_; }
   IpcPointer ipcpointer() { return ipcpointer_; }
   size_t metadata_offset() { return metadata_offset_; }
   void set_metadata_offset(size_t metadata_offset) {metadata_offset_ = metadata_offset; }
+  SegmentOptions options() { return options_; }
 private:
   SegmentId segmentid_; // which shared memory file the object is stored in
   IpcPointer ipcpointer_; // pointer to the beginning of the object, exchangeable between processes
   size_t size_; // total size of the object
   size_t metadata_offset_; // offset of the metadata that describes this object
+  SegmentOptions options_; // the options the segment was created with, the workers apply them when they map the segment
+};
+
+// Object store channel: The pair of ring buffers that a worker uses to send
+// requests to its object store and to receive the replies. The worker creates
+// the channel in shared memory and then sends CONNECT to the object store,
+// which opens it and assigns it to one of its request threads. The worker rings
+// the doorbell of that thread after each request, and the object store rings
+// the doorbell in the channel after each reply.
+
+class ObjStoreChannel {
+public:
+  ObjStoreChannel();
+  ~ObjStoreChannel();
+  bool connect(const std::string& name, bool create);
+  bool connected();
+  // Used by the worker: send a request to the object store and wake up the
+  // thread that processes it, whose doorbell is in request_doorbells.
+  void push_request(const ObjRequest& request, DoorbellArray& request_doorbells);
+  // Used by the worker: wait for the reply to the last request.
+  void pop_reply(ObjHandle* reply);
+  // Used by the object store: the requests of the worker.
+  RingBuffer<ObjRequest>& requests() { return rings_->requests; }
+  // Used by the object store: send a reply to the worker.
+  void push_reply(const ObjHandle& reply);
+  // Used by the object store: tell the worker which doorbell to ring after
+  // pushing a request.
+  void set_request_doorbell(size_t index);
+  // Used by the object store: return false if the worker process has exited.
+  bool producer_alive();
+private:
+  struct Rings {
+    RingBuffer<ObjRequest> requests;
+    RingBuffer<ObjHandle> replies;
+    Doorbell reply_doorbell; // rung by the object store after it pushes a reply
+    std::atomic<int64_t> request_doorbell; // the index of the doorbell of the request thread of the object store that processes the requests, or -1 if it has not been assigned yet
+    int64_t pid; // the process ID of the worker
+  };
+  std::string name_;
+  bool create_;
+  std::unique_ptr<bip::mapped_region> region_;
+  Rings* rings_;
 };
 
 // Memory segment pool: A collection of shared memory segments
@@ -117,7 +342,7 @@ enum SegmentStatusType {UNOPENED = 0, OPENED = 1, CLOSED = 2};
 
 class MemorySegmentPool {
 public:
-  MemorySegmentPool(ObjStoreId objstoreid, std::string& objstore_address, bool create); // can be used in two modes: create mode and open mode (see above)
+  MemorySegmentPool(ObjStoreId objstoreid, std::string& objstore_address, bool create, SegmentOptions options = SegmentOptions()); // can be used in two modes: create mode and open mode (see above), options are only used in create mode
   ~MemorySegmentPool();
   ObjHandle allocate(size_t nbytes); // allocate memory, potentially creating a new segment (only run on object store)
   void deallocate(ObjHandle pointer); // deallocate object, potentially deallocating a new segment (only run on object store)
@@ -127,7 +352,8 @@ public:
   void destroy_segments();
   void objstore_memcheck(int64_t size);
 private:
-  void open_segment(SegmentId segmentid, size_t size = 0); // create a segment or map an existing one into memory
+  void open_segment(SegmentId segmentid, size_t size = 0, SegmentOptions options = SegmentOptions()); // create a segment or map an existing one into memory
+  void advise_segment(SegmentId segmentid, SegmentOptions options); // apply the huge page and prefault options to the mapping of a segment
   void close_segment(SegmentId segmentid); // close a segment
   bool create_mode_; // true in the object stores, false on the workers
   ObjStoreId objstoreid_; // the identity of the associated object store
@@ -136,6 +362,7 @@ private:
   // The port of the object store. This is used to help avoid name collisions.
   std::string objstore_port_;
   size_t page_size_ = bip::mapped_region::get_page_size();
+  SegmentOptions options_; // the options for the segments created by this pool
   std::vector<std::pair<std::unique_ptr<bip::managed_shared_memory>, SegmentStatusType> > segments_;
 };
 
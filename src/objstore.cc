@@ -1,46 +1,166 @@
 #include "objstore.h"
 
+#include <algorithm>
 #include <chrono>
+#ifndef _WIN32
+#include <zlib.h>
+#endif
 #include "utils.h"
 
 const size_t ObjStoreService::CHUNK_SIZE = 8 * 1024;
 
-// this method needs to be protected by a objstore_lock_
-// TODO(rkn): Make sure that we do not in fact need the objstore_lock_. We want multiple deliveries to be able to happen simultaneously.
-void ObjStoreService::get_data_from(ObjectID objectid, ObjStore::Stub& stub) {
-  RAY_LOG(RAY_DEBUG, "Objstore " << objstoreid_ << " is beginning to get objectid " << objectid);
+// Compress the size bytes at data into compressed. Return false if this fails
+// or if compression is not supported on this platform.
+static bool compress_chunk(const uint8_t* data, size_t size, std::string& compressed) {
+#ifdef _WIN32
+  return false;
+#else
+  uLongf compressed_size = compressBound(size);
+  compressed.resize(compressed_size);
+  if (compress2(reinterpret_cast<Bytef*>(&compressed[0]), &compressed_size, data, size, Z_BEST_SPEED) != Z_OK) {
+    return false;
+  }
+  compressed.resize(compressed_size);
+  return true;
+#endif
+}
+
+// Decompress compressed to data. Return false unless it decompresses to
+// exactly size bytes.
+static bool decompress_chunk(const std::string& compressed, uint8_t* data, size_t size) {
+#ifdef _WIN32
+  return false;
+#else
+  uLongf decompressed_size = size;
+  return uncompress(data, &decompressed_size, reinterpret_cast<const Bytef*>(compressed.data()), compressed.size()) == Z_OK && decompressed_size == size;
+#endif
+}
+
+size_t ObjStoreService::stream_range(ObjectID objectid, ObjStore::Stub& stub, bool allow_compression, size_t offset, size_t length, uint8_t* data, size_t total_size) {
   ObjChunk chunk;
   ClientContext context;
   StreamObjToRequest stream_request;
   stream_request.set_objectid(objectid);
+  stream_request.set_offset(offset);
+  stream_request.set_length(length);
+  stream_request.set_allow_compression(allow_compression);
   std::unique_ptr<ClientReader<ObjChunk> > reader(stub.StreamObjTo(&context, stream_request));
-
-  size_t total_size = 0;
-  ObjHandle handle;
-  if (reader->Read(&chunk)) {
-    total_size = chunk.total_size();
-    handle = alloc(objectid, total_size);
-  }
   size_t num_bytes = 0;
+  size_t metadata_offset = 0;
+  std::chrono::duration<double> decompression_time(0);
+  while (reader->Read(&chunk)) {
+    RAY_CHECK_EQ(chunk.total_size(), total_size, "The size of objectid " << objectid << " differs between object stores.");
+    if (chunk.compressed()) {
+      // The sender splits the range into chunks of CHUNK_SIZE bytes before
+      // compressing them.
+      RAY_CHECK_LT(num_bytes, length, "The reader attempted to stream too many bytes.");
+      size_t chunk_size = std::min(CHUNK_SIZE, length - num_bytes);
+      auto start = std::chrono::steady_clock::now();
+      RAY_CHECK(decompress_chunk(chunk.data(), data + offset + num_bytes, chunk_size), "Objstore " << objstoreid_ << " failed to decompress a chunk of objectid " << objectid);
+      decompression_time += std::chrono::steady_clock::now() - start;
+      num_bytes += chunk_size;
+    } else {
+      RAY_CHECK_LE(num_bytes + chunk.data().size(), length, "The reader attempted to stream too many bytes.");
+      std::memcpy(data + offset + num_bytes, chunk.data().c_str(), chunk.data().size());
+      num_bytes += chunk.data().size();
+    }
+    metadata_offset = chunk.metadata_offset();
+  }
+  RAY_CHECK_GRPC(reader->Finish());
+  if (decompression_time.count() > 0) {
+    std::lock_guard<std::mutex> compression_stats_lock(compression_stats_lock_);
+    compression_stats_.set_decompression_time(compression_stats_.decompression_time() + decompression_time.count());
+  }
+  RAY_CHECK_EQ(num_bytes, length, "Streamed bytes " << offset << " to " << offset + length << " of objectid " << objectid << ", but received " << num_bytes << " bytes");
+  return metadata_offset;
+}
+
+void ObjStoreService::get_data_from(ObjectID objectid, const std::vector<ObjStore::Stub*>& stubs, const std::vector<bool>& allow_compression, size_t size) {
+  RAY_LOG(RAY_DEBUG, "Objstore " << objstoreid_ << " is beginning to get objectid " << objectid << " from " << stubs.size() << " object stores");
+  ObjHandle handle = alloc(objectid, size);
   segmentpool_lock_.lock();
   uint8_t* data = segmentpool_->get_address(handle);
   segmentpool_lock_.unlock();
-  do {
-    RAY_CHECK_LE(num_bytes + chunk.data().size(), total_size, "The reader attempted to stream too many bytes.");
-    std::memcpy(data, chunk.data().c_str(), chunk.data().size());
-    data += chunk.data().size();
-    num_bytes += chunk.data().size();
-  } while (reader->Read(&chunk));
-  RAY_CHECK_GRPC(reader->Finish());
+  // Split the object into one contiguous range per source and stream the
+  // ranges in parallel.
+  size_t num_ranges = std::max(std::min(stubs.size(), size / CHUNK_SIZE), static_cast<size_t>(1));
+  size_t range_size = (size + num_ranges - 1) / num_ranges;
+  std::vector<size_t> metadata_offsets(num_ranges);
+  std::vector<std::thread> threads;
+  for (size_t i = 1; i < num_ranges; ++i) {
+    size_t offset = i * range_size;
+    size_t length = std::min(range_size, size - offset);
+    threads.emplace_back([this, objectid, &stubs, &allow_compression, i, offset, length, data, size, &metadata_offsets]() {
+      metadata_offsets[i] = stream_range(objectid, *stubs[i], allow_compression[i], offset, length, data, size);
+    });
+  }
+  metadata_offsets[0] = stream_range(objectid, *stubs[0], allow_compression[0], 0, std::min(range_size, size), data, size);
+  for (std::thread& thread : threads) {
+    thread.join();
+  }
 
   // finalize object
-  RAY_CHECK_EQ(num_bytes, total_size, "Streamed objectid " << objectid << ", but num_bytes != total_size");
-  object_ready(objectid, chunk.metadata_offset());
-  RAY_LOG(RAY_DEBUG, "finished streaming data, objectid was " << objectid << " and size was " << num_bytes);
+  object_ready(objectid, metadata_offsets[0]);
+  RAY_LOG(RAY_DEBUG, "finished streaming data, objectid was " << objectid << " and size was " << size);
+}
+
+bool ObjStoreService::copy_from_shared_memory(ObjectID objectid, ObjStore::Stub& stub) {
+  ClientContext context;
+  MapObjRequest request;
+  request.set_objectid(objectid);
+  MapObjReply reply;
+  RAY_CHECK_GRPC(stub.MapObj(&context, request, &reply));
+  // The scheduler holds a reference to the object until this object store
+  // reports it as ready, so the other object store does not deallocate it
+  // while we are copying it.
+  std::unique_ptr<bip::managed_shared_memory> segment;
+  try {
+    segment.reset(new bip::managed_shared_memory(bip::open_only, reply.segment_name().c_str()));
+  } catch (bip::interprocess_exception &ex) {
+    RAY_LOG(RAY_INFO, "Objstore " << objstoreid_ << " cannot open segment " << reply.segment_name() << " to copy objectid " << objectid << ", streaming it instead: " << ex.what());
+    return false;
+  }
+  const uint8_t* source = static_cast<const uint8_t*>(segment->get_address_from_handle(reply.handle()));
+  ObjHandle handle = alloc(objectid, reply.total_size());
+  segmentpool_lock_.lock();
+  uint8_t* data = segmentpool_->get_address(handle);
+  segmentpool_lock_.unlock();
+  std::memcpy(data, source, reply.total_size());
+  object_ready(objectid, reply.metadata_offset());
+  RAY_LOG(RAY_DEBUG, "finished copying data through shared memory, objectid was " << objectid << " and size was " << reply.total_size());
+  return true;
+}
+
+bool ObjStoreService::is_colocated(const std::string& objstore_address) {
+  std::string address = objstore_address;
+  std::string own_address = objstore_address_;
+  return std::string(address.begin(), split_ip_address(address)) == std::string(own_address.begin(), split_ip_address(own_address));
+}
+
+bool ObjStoreService::should_compress(const uint8_t* data, size_t size) {
+  if (size < COMPRESSION_MIN_SIZE) {
+    return false;
+  }
+  auto start = std::chrono::steady_clock::now();
+  size_t num_bytes = 0;
+  size_t num_bytes_compressed = 0;
+  std::string compressed;
+  for (size_t i = 0; i < NUM_COMPRESSION_SAMPLES; ++i) {
+    size_t sample_offset = (size - CHUNK_SIZE) / (NUM_COMPRESSION_SAMPLES - 1) * i;
+    if (!compress_chunk(data + sample_offset, CHUNK_SIZE, compressed)) {
+      return false;
+    }
+    num_bytes += CHUNK_SIZE;
+    num_bytes_compressed += compressed.size();
+  }
+  std::chrono::duration<double> sampling_time = std::chrono::steady_clock::now() - start;
+  std::lock_guard<std::mutex> compression_stats_lock(compression_stats_lock_);
+  compression_stats_.set_compression_time(compression_stats_.compression_time() + sampling_time.count());
+  return num_bytes_compressed <= MAX_COMPRESSION_RATIO * num_bytes;
 }
 
-ObjStoreService::ObjStoreService(std::shared_ptr<Channel> scheduler_channel)
-  : scheduler_stub_(Scheduler::NewStub(scheduler_channel)) {
+ObjStoreService::ObjStoreService(std::shared_ptr<Channel> scheduler_channel, bool compression, SegmentOptions segment_options)
+  : segment_options_(segment_options), scheduler_stub_(Scheduler::NewStub(scheduler_channel)), compression_(compression) {
 }
 
 void ObjStoreService::register_objstore(const std::string& objstore_address, const std::string& recv_queue_name) {
@@ -56,7 +176,7 @@ void ObjStoreService::register_objstore(const std::string& objstore_address, con
   RegisterObjStoreReply reply;
   RAY_CHECK_GRPC(scheduler_stub_->RegisterObjStore(&context, request, &reply));
   objstoreid_ = reply.objstoreid();
-  segmentpool_ = std::make_shared<MemorySegmentPool>(objstoreid_, objstore_address_, true);
+  segmentpool_ = std::make_shared<MemorySegmentPool>(objstoreid_, objstore_address_, true, segment_options_);
 }
 
 // this method needs to be protected by a objstores_lock_
@@ -73,37 +193,71 @@ Status ObjStoreService::StartDelivery(ServerContext* context, const StartDeliver
   // TODO(rkn): We're pushing the delivery task onto a new thread so that this method can return immediately. This matters
   // because the scheduler holds a lock while DeliverObj is being called. The correct solution is to make DeliverObj
   // an asynchronous call (and similarly with the rest of the object store service methods).
-  std::string address = request->objstore_address();
+  std::vector<std::string> addresses(request->objstore_address().begin(), request->objstore_address().end());
+  size_t size = request->size();
   ObjectID objectid = request->objectid();
   {
     std::lock_guard<std::mutex> memory_lock(memory_lock_);
-    if (objectid >= memory_.size()) {
-      memory_.resize(objectid + 1, std::make_pair(ObjHandle(), MemoryStatusType::NOT_PRESENT));
-    }
-    if (memory_[objectid].second == MemoryStatusType::NOT_PRESENT) {
+    std::pair<ObjHandle, MemoryStatusType>& item = get_memory_entry(objectid);
+    if (item.second == MemoryStatusType::NOT_PRESENT) {
     }
     else {
-      RAY_CHECK_NEQ(memory_[objectid].second, MemoryStatusType::DEALLOCATED, "Objstore " << objstoreid_ << " is attempting to get objectid " << objectid << ", but memory_[objectid] == DEALLOCATED.");
+      RAY_CHECK_NEQ(item.second, MemoryStatusType::DEALLOCATED, "Objstore " << objstoreid_ << " is attempting to get objectid " << objectid << ", but memory_[objectid] == DEALLOCATED.");
       RAY_LOG(RAY_DEBUG, "Objstore " << objstoreid_ << " already has objectid " << objectid << " or it is already being shipped, so no need to get it again.");
       return Status::OK;
     }
-    memory_[objectid].second = MemoryStatusType::PRE_ALLOCED;
+    item.second = MemoryStatusType::PRE_ALLOCED;
   }
-  delivery_threads_.push_back(std::make_shared<std::thread>([this, address, objectid]() {
-    std::lock_guard<std::mutex> objstores_lock(objstores_lock_);
-    ObjStore::Stub& stub = get_objstore_stub(address);
-    get_data_from(objectid, stub);
+  delivery_threads_.push_back(std::make_shared<std::thread>([this, addresses, objectid, size]() {
+    std::vector<ObjStore::Stub*> stubs;
+    {
+      std::lock_guard<std::mutex> objstores_lock(objstores_lock_);
+      for (const std::string& address : addresses) {
+        stubs.push_back(&get_objstore_stub(address));
+      }
+    }
+    // Object stores on the same machine can copy the object from shared memory
+    // instead of streaming it over the network.
+    for (size_t i = 0; i < addresses.size(); ++i) {
+      if (is_colocated(addresses[i]) && copy_from_shared_memory(objectid, *stubs[i])) {
+        return;
+      }
+    }
+    // Compression only pays off when the data goes over the network.
+    std::vector<bool> allow_compression;
+    for (const std::string& address : addresses) {
+      allow_compression.push_back(compression_ && !is_colocated(address));
+    }
+    get_data_from(objectid, stubs, allow_compression, size);
   }));
   return Status::OK;
 }
 
 Status ObjStoreService::ObjStoreInfo(ServerContext* context, const ObjStoreInfoRequest* request, ObjStoreInfoReply* reply) {
-  std::lock_guard<std::mutex> memory_lock(memory_lock_);
-  for (size_t i = 0; i < memory_.size(); ++i) {
-    if (memory_[i].second == MemoryStatusType::READY) { // is the object available?
-      reply->add_objectid(i);
+  {
+    std::lock_guard<std::mutex> memory_lock(memory_lock_);
+    for (const auto& entry : memory_) {
+      if (entry.second.second == MemoryStatusType::READY) { // is the object available?
+        reply->add_objectid(entry.first);
+      }
+    }
+    auto now = std::chrono::steady_clock::now();
+    for (const auto& entry : allocation_times_) {
+      auto item = memory_.find(entry.first); // this must not add entries to memory_
+      if (item == memory_.end()) {
+        continue;
+      }
+      ObjectMemoryInfo* info = reply->add_object_memory();
+      info->set_objectid(entry.first);
+      info->set_size(item->second.first.size());
+      info->set_age(std::chrono::duration<double>(now - entry.second).count());
+      info->set_ready(item->second.second == MemoryStatusType::READY);
     }
   }
+  {
+    std::lock_guard<std::mutex> compression_stats_lock(compression_stats_lock_);
+    *reply->mutable_compression_stats() = compression_stats_;
+  }
   /*
   for (int i = 0; i < request->objectid_size(); ++i) {
     ObjectID objectid = request->objectid(i);
@@ -121,20 +275,67 @@ Status ObjStoreService::StreamObjTo(ServerContext* context, const StreamObjToReq
   ObjChunk chunk;
   ObjectID objectid = request->objectid();
   memory_lock_.lock();
-  RAY_CHECK_LT(objectid, memory_.size(), "Objstore " << objstoreid_ << " is attempting to use objectid " << objectid << " in StreamObjTo, but this objectid is not present in the object store.");
-  RAY_CHECK_EQ(memory_[objectid].second, MemoryStatusType::READY, "Objstore " << objstoreid_ << " is attempting to stream objectid " << objectid << ", but memory_[objectid].second != MemoryStatusType::READY.");
-  ObjHandle handle = memory_[objectid].first;
+  auto it = memory_.find(objectid);
+  RAY_CHECK(it != memory_.end(), "Objstore " << objstoreid_ << " is attempting to use objectid " << objectid << " in StreamObjTo, but this objectid is not present in the object store.");
+  RAY_CHECK_EQ(it->second.second, MemoryStatusType::READY, "Objstore " << objstoreid_ << " is attempting to stream objectid " << objectid << ", but memory_[objectid].second != MemoryStatusType::READY.");
+  ObjHandle handle = it->second.first;
   memory_lock_.unlock(); // TODO(rkn): Make sure we don't still need to hold on to this lock.
   segmentpool_lock_.lock();
   const uint8_t* head = segmentpool_->get_address(handle);
   segmentpool_lock_.unlock();
   size_t size = handle.size();
-  for (size_t i = 0; i < size; i += CHUNK_SIZE) {
+  // Stream the bytes [offset, end) of the object.
+  size_t offset = request->offset();
+  size_t end = request->length() == 0 ? size : std::min(size, offset + request->length());
+  bool compress = request->allow_compression() && should_compress(head + offset, end - offset);
+  std::string compressed;
+  size_t num_bytes_sent = 0;
+  std::chrono::duration<double> compression_time(0);
+  for (size_t i = offset; i < end; i += CHUNK_SIZE) {
+    size_t chunk_size = std::min(CHUNK_SIZE, end - i);
     chunk.set_metadata_offset(handle.metadata_offset());
     chunk.set_total_size(size);
-    chunk.set_data(head + i, std::min(CHUNK_SIZE, size - i));
+    // Chunks that do not get smaller are sent as they are.
+    bool chunk_compressed = false;
+    if (compress) {
+      auto start = std::chrono::steady_clock::now();
+      chunk_compressed = compress_chunk(head + i, chunk_size, compressed) && compressed.size() < chunk_size;
+      compression_time += std::chrono::steady_clock::now() - start;
+    }
+    chunk.set_compressed(chunk_compressed);
+    if (chunk_compressed) {
+      chunk.set_data(compressed);
+    } else {
+      chunk.set_data(head + i, chunk_size);
+    }
+    num_bytes_sent += chunk.data().size();
     RAY_CHECK(writer->Write(chunk), "stream connection prematurely closed")
   }
+  std::lock_guard<std::mutex> compression_stats_lock(compression_stats_lock_);
+  if (compress) {
+    RAY_LOG(RAY_DEBUG, "Objstore " << objstoreid_ << " compressed " << end - offset << " bytes of objectid " << objectid << " to " << num_bytes_sent << " bytes");
+    compression_stats_.set_num_streams_compressed(compression_stats_.num_streams_compressed() + 1);
+    compression_stats_.set_num_bytes_uncompressed(compression_stats_.num_bytes_uncompressed() + end - offset);
+    compression_stats_.set_num_bytes_compressed(compression_stats_.num_bytes_compressed() + num_bytes_sent);
+    compression_stats_.set_compression_time(compression_stats_.compression_time() + compression_time.count());
+  } else {
+    compression_stats_.set_num_streams_uncompressed(compression_stats_.num_streams_uncompressed() + 1);
+  }
+  return Status::OK;
+}
+
+Status ObjStoreService::MapObj(ServerContext* context, const MapObjRequest* request, MapObjReply* reply) {
+  ObjectID objectid = request->objectid();
+  std::lock_guard<std::mutex> memory_lock(memory_lock_);
+  auto it = memory_.find(objectid);
+  RAY_CHECK(it != memory_.end(), "Objstore " << objstoreid_ << " is attempting to use objectid " << objectid << " in MapObj, but this objectid is not present in the object store.");
+  RAY_CHECK_EQ(it->second.second, MemoryStatusType::READY, "Objstore " << objstoreid_ << " is attempting to map objectid " << objectid << ", but memory_[objectid].second != MemoryStatusType::READY.");
+  ObjHandle handle = it->second.first;
+  std::lock_guard<std::mutex> segmentpool_lock(segmentpool_lock_);
+  reply->set_segment_name(segmentpool_->get_segment_name(handle.segmentid()));
+  reply->set_handle(handle.ipcpointer());
+  reply->set_total_size(handle.size());
+  reply->set_metadata_offset(handle.metadata_offset());
   return Status::OK;
 }
 
@@ -145,20 +346,36 @@ Status ObjStoreService::NotifyAlias(ServerContext* context, const NotifyAliasReq
   RAY_LOG(RAY_DEBUG, "Aliasing objectid " << alias_objectid << " with objectid " << canonical_objectid);
   {
     std::lock_guard<std::mutex> memory_lock(memory_lock_);
-    RAY_CHECK_LT(canonical_objectid, memory_.size(), "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " is not in the objstore.")
-    RAY_CHECK_NEQ(memory_[canonical_objectid].second, MemoryStatusType::NOT_READY, "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " is not ready yet in the objstore.")
-    RAY_CHECK_NEQ(memory_[canonical_objectid].second, MemoryStatusType::NOT_PRESENT, "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " is not present in the objstore.")
-    RAY_CHECK_NEQ(memory_[canonical_objectid].second, MemoryStatusType::DEALLOCATED, "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " has already been deallocated.")
-    if (alias_objectid >= memory_.size()) {
-      memory_.resize(alias_objectid + 1, std::make_pair(ObjHandle(), MemoryStatusType::NOT_PRESENT));
+    auto it = memory_.find(canonical_objectid);
+    RAY_CHECK(it != memory_.end(), "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " is not in the objstore.")
+    RAY_CHECK_NEQ(it->second.second, MemoryStatusType::NOT_READY, "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " is not ready yet in the objstore.")
+    RAY_CHECK_NEQ(it->second.second, MemoryStatusType::NOT_PRESENT, "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " is not present in the objstore.")
+    RAY_CHECK_NEQ(it->second.second, MemoryStatusType::DEALLOCATED, "Attempting to alias objectid " << alias_objectid << " with objectid " << canonical_objectid << ", but objectid " << canonical_objectid << " has already been deallocated.")
+    ObjHandle handle = it->second.first;
+    std::pair<ObjHandle, MemoryStatusType>& item = get_memory_entry(alias_objectid); // this may invalidate it
+    std::vector<ObjectID>& aliases = aliases_[canonical_objectid];
+    bool is_alias = std::find(aliases.begin(), aliases.end(), alias_objectid) != aliases.end();
+    if (item.second == MemoryStatusType::READY && !is_alias) {
+      // The task that creates alias_objectid was executed twice, and the slower
+      // execution has already written an identical copy of the object here. We
+      // keep it, and the scheduler deallocates it later.
+      RAY_LOG(RAY_DEBUG, "Keeping the copy of objectid " << alias_objectid << " instead of aliasing it with objectid " << canonical_objectid);
+    } else {
+      if (item.second == MemoryStatusType::NOT_READY) {
+        // The slower execution of the task that creates alias_objectid is still
+        // writing it, its data is discarded when the worker is done.
+        discarded_objects_[alias_objectid] = item.first;
+      }
+      item.first = handle;
+      item.second = MemoryStatusType::READY;
+      // The memory of the alias is accounted for by canonical_objectid.
+      allocation_times_.erase(alias_objectid);
+      if (!is_alias) {
+        aliases.push_back(alias_objectid);
+      }
     }
-    memory_[alias_objectid].first = memory_[canonical_objectid].first;
-    memory_[alias_objectid].second = MemoryStatusType::READY;
   }
-  ObjRequest done_request;
-  done_request.type = ObjRequestType::ALIAS_DONE;
-  done_request.objectid = alias_objectid;
-  RAY_CHECK(recv_queue_.send(&done_request), "Failed to send message from the object store to itself because the message queue was full.");
+  process_gets_for_objectid(alias_objectid);
   return Status::OK;
 }
 
@@ -166,72 +383,104 @@ Status ObjStoreService::DeallocateObject(ServerContext* context, const Deallocat
   ObjectID canonical_objectid = request->canonical_objectid();
   RAY_LOG(RAY_INFO, "Deallocating canonical_objectid " << canonical_objectid);
   std::lock_guard<std::mutex> memory_lock(memory_lock_);
-  RAY_CHECK_EQ(memory_[canonical_objectid].second, MemoryStatusType::READY, "Attempting to deallocate canonical_objectid " << canonical_objectid << ", but memory_[canonical_objectid].second = " << memory_[canonical_objectid].second);
-  RAY_CHECK_LT(canonical_objectid, memory_.size(), "Attempting to deallocate canonical_objectid " << canonical_objectid << ", but it is not in the objstore.");
+  auto it = memory_.find(canonical_objectid);
+  RAY_CHECK(it != memory_.end(), "Attempting to deallocate canonical_objectid " << canonical_objectid << ", but it is not in the objstore.");
+  RAY_CHECK_EQ(it->second.second, MemoryStatusType::READY, "Attempting to deallocate canonical_objectid " << canonical_objectid << ", but memory_[canonical_objectid].second = " << it->second.second);
   segmentpool_lock_.lock();
-  segmentpool_->deallocate(memory_[canonical_objectid].first);
+  segmentpool_->deallocate(it->second.first);
   segmentpool_lock_.unlock();
-  memory_[canonical_objectid].second = MemoryStatusType::DEALLOCATED;
+  // Erase the entries for the object and for all of its aliases so that memory_
+  // only grows with the number of live objects.
+  memory_.erase(it);
+  allocation_times_.erase(canonical_objectid);
+  auto alias_it = aliases_.find(canonical_objectid);
+  if (alias_it != aliases_.end()) {
+    for (ObjectID alias_objectid : alias_it->second) {
+      memory_.erase(alias_objectid);
+      allocation_times_.erase(alias_objectid);
+    }
+    aliases_.erase(alias_it);
+  }
   return Status::OK;
 }
 
+void ObjStoreService::send_reply(WorkerId workerid, const ObjHandle& reply) {
+  std::lock_guard<std::mutex> channels_lock(channels_lock_);
+  auto it = channels_.find(workerid);
+  if (it == channels_.end()) {
+    RAY_LOG(RAY_DEBUG, "Not sending a reply to worker " << workerid << ", which has disconnected from objstore " << objstoreid_);
+    return;
+  }
+  it->second->push_reply(reply);
+}
+
+void ObjStoreService::remove_channel(size_t shard, WorkerId workerid) {
+  RAY_LOG(RAY_INFO, "Worker " << workerid << " has disconnected from objstore " << objstoreid_);
+  {
+    RequestShard& request_shard = *shards_[shard];
+    std::lock_guard<std::mutex> lock(request_shard.lock);
+    auto& channels = request_shard.channels;
+    channels.erase(std::remove_if(channels.begin(), channels.end(), [workerid](const std::pair<WorkerId, ObjStoreChannel*>& channel) {
+      return channel.first == workerid;
+    }), channels.end());
+    request_shard.changed.store(true);
+  }
+  {
+    // The worker does not wait for the objects it has requested anymore.
+    std::lock_guard<std::mutex> get_queue_lock(get_queue_lock_);
+    for (auto it = get_queue_.begin(); it != get_queue_.end();) {
+      std::vector<WorkerId>& workerids = it->second;
+      workerids.erase(std::remove(workerids.begin(), workerids.end(), workerid), workerids.end());
+      it = workerids.empty() ? get_queue_.erase(it) : std::next(it);
+    }
+  }
+  std::lock_guard<std::mutex> channels_lock(channels_lock_);
+  channels_.erase(workerid);
+}
+
 // This table describes how the memory status changes in response to requests.
 //
 // MemoryStatus | ObjRequest  | New MemoryStatus | action performed
 // -------------+-------------+------------------+----------------------------
 // NOT_PRESENT  | ALLOC       | NOT_READY        | allocate object
+// READY        | ALLOC       | READY            | allocate memory that is freed at WORKER_DONE
 // NOT_READY    | WORKER_DONE | READY            | send ObjReady to scheduler
 // NOT_READY    | GET         | NOT_READY        | add to get queue
 // READY        | GET         | READY            | return handle
-// READY        | DEALLOC     | DEALLOCATED      | deallocate
+// READY        | DEALLOC     | (erased)         | deallocate
 // -------------+-------------+------------------+----------------------------
-void ObjStoreService::process_objstore_request(const ObjRequest request) {
-  switch (request.type) {
-    case ObjRequestType::ALIAS_DONE: {
-        process_gets_for_objectid(request.objectid);
-      }
-      break;
-    default: {
-        RAY_CHECK(false, "Attempting to process request of type " <<  request.type << ". This code should be unreachable.");
-      }
-  }
-}
-
-void ObjStoreService::process_worker_request(const ObjRequest request) {
-  if (request.workerid >= send_queues_.size()) {
-    send_queues_.resize(request.workerid + 1);
-  }
-  if (!send_queues_[request.workerid].connected()) {
-    std::string queue_name = std::string("queue:") + objstore_address_ + std::string(":worker:") + std::to_string(request.workerid) + std::string(":obj");
-    RAY_CHECK(send_queues_[request.workerid].connect(queue_name, false), "error connecting receive_queue_");
-  }
-  {
-    std::lock_guard<std::mutex> memory_lock(memory_lock_);
-    if (request.objectid >= memory_.size()) {
-      memory_.resize(request.objectid + 1, std::make_pair(ObjHandle(), MemoryStatusType::NOT_PRESENT));
-    }
-  }
+//
+// Requests from different workers are processed concurrently by several
+// threads, and the requests of each worker are processed in order by one of
+// them. Replies to a worker can be sent from any thread, because a worker waits
+// for the reply to an ALLOC or a GET before sending its next request, so there
+// is never more than one reply in its channel. DISCONNECT is handled by the
+// request thread itself, see process_requests.
+void ObjStoreService::process_worker_request(const ObjRequest request, ObjStoreChannel& channel) {
   switch (request.type) {
     case ObjRequestType::ALLOC: {
+        RAY_LOG(RAY_VERBOSE, "Request (worker " << request.workerid << " to objstore " << objstoreid_ << "): Allocate object with objectid " << request.objectid << " and size " << request.size);
         ObjHandle handle = alloc(request.objectid, request.size); // This method acquires memory_lock_
-        RAY_CHECK(send_queues_[request.workerid].send(&handle), "Failed to send message from the object store to the worker with id " << request.workerid << " because the message queue was full.");
+        channel.push_reply(handle);
       }
       break;
     case ObjRequestType::GET: {
+        RAY_LOG(RAY_VERBOSE, "Request (worker " << request.workerid << " to objstore " << objstoreid_ << "): Get object with objectid " << request.objectid);
         std::lock_guard<std::mutex> memory_lock(memory_lock_);
-        std::pair<ObjHandle, MemoryStatusType>& item = memory_[request.objectid];
+        std::pair<ObjHandle, MemoryStatusType>& item = get_memory_entry(request.objectid);
         if (item.second == MemoryStatusType::READY) {
           RAY_LOG(RAY_DEBUG, "Responding to GET request: returning objectid " << request.objectid);
-          RAY_CHECK(send_queues_[request.workerid].send(&item.first), "Failed to send message from the object store to the worker with id " << request.workerid << " because the message queue was full.");
+          channel.push_reply(item.first);
         } else if (item.second == MemoryStatusType::NOT_READY || item.second == MemoryStatusType::NOT_PRESENT || item.second == MemoryStatusType::PRE_ALLOCED) {
           std::lock_guard<std::mutex> lock(get_queue_lock_);
-          get_queue_.push_back(std::make_pair(request.workerid, request.objectid));
+          get_queue_[request.objectid].push_back(request.workerid);
         } else {
-          RAY_CHECK(false, "A worker requested objectid " << request.objectid << ", but memory_[objectid].second = " << memory_[request.objectid].second);
+          RAY_CHECK(false, "A worker requested objectid " << request.objectid << ", but memory_[objectid].second = " << item.second);
         }
       }
       break;
     case ObjRequestType::WORKER_DONE: {
+        RAY_LOG(RAY_VERBOSE, "Request (worker " << request.workerid << " to objstore " << objstoreid_ << "): Finalize object with objectid " << request.objectid);
         object_ready(request.objectid, request.metadata_offset); // This method acquires memory_lock_
       }
       break;
@@ -241,51 +490,113 @@ void ObjStoreService::process_worker_request(const ObjRequest request) {
   }
 }
 
-void ObjStoreService::process_requests() {
-  // TODO(rkn): Should memory_lock_ be used in this method?
+void ObjStoreService::process_requests(size_t shard) {
+  RequestShard& request_shard = *shards_[shard];
+  Doorbell& doorbell = request_doorbells_[shard];
+  std::vector<std::pair<WorkerId, ObjStoreChannel*> > channels;
   ObjRequest request;
+  size_t num_attempts = 0;
+  auto last_liveness_check = std::chrono::steady_clock::now();
   while (true) {
-    RAY_CHECK(recv_queue_.receive(&request), "error receiving over IPC");
-    switch (request.type) {
-      case ObjRequestType::ALLOC: {
-          RAY_LOG(RAY_VERBOSE, "Request (worker " << request.workerid << " to objstore " << objstoreid_ << "): Allocate object with objectid " << request.objectid << " and size " << request.size);
-          process_worker_request(request);
-        }
-        break;
-      case ObjRequestType::GET: {
-          RAY_LOG(RAY_VERBOSE, "Request (worker " << request.workerid << " to objstore " << objstoreid_ << "): Get object with objectid " << request.objectid);
-          process_worker_request(request);
+    if (request_shard.changed.load()) {
+      std::lock_guard<std::mutex> lock(request_shard.lock);
+      channels = request_shard.channels;
+      request_shard.changed.store(false);
+    }
+    bool processed_request = false;
+    std::vector<WorkerId> disconnected;
+    for (auto& channel : channels) {
+      for (size_t i = 0; i < MAX_REQUESTS_PER_WORKER && channel.second->requests().try_pop(&request); ++i) {
+        if (request.type == ObjRequestType::DISCONNECT) {
+          disconnected.push_back(channel.first);
+          break;
         }
-        break;
-      case ObjRequestType::WORKER_DONE: {
-          RAY_LOG(RAY_VERBOSE, "Request (worker " << request.workerid << " to objstore " << objstoreid_ << "): Finalize object with objectid " << request.objectid);
-          process_worker_request(request);
+        process_worker_request(request, *channel.second);
+        processed_request = true;
+      }
+    }
+    // Workers that are killed do not send DISCONNECT, so check every now and
+    // then whether the workers are still alive.
+    auto now = std::chrono::steady_clock::now();
+    if (now - last_liveness_check > DOORBELL_TIMEOUT) {
+      for (auto& channel : channels) {
+        if (!channel.second->producer_alive()) {
+          disconnected.push_back(channel.first);
         }
-        break;
-      case ObjRequestType::ALIAS_DONE: {
-          process_objstore_request(request);
+      }
+      last_liveness_check = now;
+    }
+    if (!disconnected.empty()) {
+      for (WorkerId workerid : disconnected) {
+        remove_channel(shard, workerid); // This marks the shard as changed, so channels is reloaded before it is used again
+      }
+      num_attempts = 0;
+      continue;
+    }
+    if (processed_request) {
+      num_attempts = 0;
+    } else if (++num_attempts < RING_BUFFER_POLLS_BEFORE_SLEEP) {
+      ring_buffer_backoff(num_attempts);
+    } else {
+      // Sleep until a worker in this shard sends a request or a worker is
+      // added to the shard.
+      doorbell.wait([&request_shard, &channels]() {
+        if (request_shard.changed.load()) {
+          return true;
         }
-        break;
-      default: {
-          RAY_CHECK(false, "Attempting to process request of type " <<  request.type << ". This code should be unreachable.");
+        for (auto& channel : channels) {
+          if (!channel.second->requests().empty()) {
+            return true;
+          }
         }
+        return false;
+      }, DOORBELL_TIMEOUT);
+      num_attempts = 0;
+    }
+  }
+}
+
+void ObjStoreService::process_connections() {
+  ObjRequest request;
+  while (true) {
+    RAY_CHECK(recv_queue_.receive(&request), "error receiving over IPC");
+    RAY_CHECK_EQ(request.type, ObjRequestType::CONNECT, "Attempting to process request of type " <<  request.type << ". This code should be unreachable.");
+    RAY_LOG(RAY_INFO, "Worker " << request.workerid << " is connecting to objstore " << objstoreid_);
+    std::unique_ptr<ObjStoreChannel> channel(new ObjStoreChannel());
+    std::string channel_name = std::string("queue:") + objstore_address_ + std::string(":worker:") + std::to_string(request.workerid) + std::string(":obj");
+    RAY_CHECK(channel->connect(channel_name, false), "error connecting to the channel of worker " << request.workerid);
+    ObjStoreChannel* channel_ptr = channel.get();
+    {
+      std::lock_guard<std::mutex> channels_lock(channels_lock_);
+      channels_[request.workerid] = std::move(channel);
+    }
+    // Start processing the requests of the worker. The worker rings the
+    // doorbell of the request thread once it knows which one it is.
+    size_t shard = request.workerid % shards_.size();
+    RequestShard& request_shard = *shards_[shard];
+    channel_ptr->set_request_doorbell(shard);
+    {
+      std::lock_guard<std::mutex> lock(request_shard.lock);
+      request_shard.channels.push_back(std::make_pair(request.workerid, channel_ptr));
+      request_shard.changed.store(true);
     }
+    request_doorbells_[shard].ring();
   }
 }
 
 void ObjStoreService::process_gets_for_objectid(ObjectID objectid) {
-  std::pair<ObjHandle, MemoryStatusType>& item = memory_[objectid];
+  std::lock_guard<std::mutex> memory_lock(memory_lock_);
+  std::pair<ObjHandle, MemoryStatusType>& item = get_memory_entry(objectid);
   std::lock_guard<std::mutex> get_queue_lock(get_queue_lock_);
-  for (size_t i = 0; i < get_queue_.size(); ++i) {
-    if (get_queue_[i].second == objectid) {
-      ObjHandle& elem = memory_[objectid].first;
-      RAY_CHECK(send_queues_[get_queue_[i].first].send(&item.first), "Failed to send message from the object store to the worker with id " << get_queue_[i].first << " because the message queue was full.");
-      // Remove the get task from the queue
-      std::swap(get_queue_[i], get_queue_[get_queue_.size() - 1]);
-      get_queue_.pop_back();
-      i -= 1;
-    }
+  auto waiting = get_queue_.find(objectid);
+  if (waiting == get_queue_.end()) {
+    return;
   }
+  for (WorkerId workerid : waiting->second) {
+    send_reply(workerid, item.first);
+  }
+  // Remove the get tasks from the queue
+  get_queue_.erase(waiting);
 }
 
 ObjHandle ObjStoreService::alloc(ObjectID objectid, size_t size) {
@@ -294,44 +605,101 @@ ObjHandle ObjStoreService::alloc(ObjectID objectid, size_t size) {
   segmentpool_lock_.unlock();
   std::lock_guard<std::mutex> memory_lock(memory_lock_);
   RAY_LOG(RAY_VERBOSE, "Allocating space for objectid " << objectid << " on object store " << objstoreid_);
-  RAY_CHECK(memory_[objectid].second == MemoryStatusType::NOT_PRESENT || memory_[objectid].second == MemoryStatusType::PRE_ALLOCED, "Attempting to allocate space for objectid " << objectid << ", but memory_[objectid].second = " << memory_[objectid].second);
-  memory_[objectid].first = handle;
-  memory_[objectid].second = MemoryStatusType::NOT_READY;
+  std::pair<ObjHandle, MemoryStatusType>& item = get_memory_entry(objectid);
+  if (item.second == MemoryStatusType::READY) {
+    // The object was already created by another execution of the same task,
+    // which finished first. The worker writes its data anyway, but it is
+    // discarded when the worker is done.
+    RAY_LOG(RAY_DEBUG, "Allocating space for objectid " << objectid << ", which is already present, the data will be discarded");
+    discarded_objects_[objectid] = handle;
+    return handle;
+  }
+  RAY_CHECK(item.second == MemoryStatusType::NOT_PRESENT || item.second == MemoryStatusType::PRE_ALLOCED, "Attempting to allocate space for objectid " << objectid << ", but memory_[objectid].second = " << item.second);
+  item.first = handle;
+  item.second = MemoryStatusType::NOT_READY;
+  allocation_times_[objectid] = std::chrono::steady_clock::now();
   return handle;
 }
 
+std::pair<ObjHandle, MemoryStatusType>& ObjStoreService::get_memory_entry(ObjectID objectid) {
+  return memory_.emplace(objectid, std::make_pair(ObjHandle(), MemoryStatusType::NOT_PRESENT)).first->second;
+}
+
 void ObjStoreService::object_ready(ObjectID objectid, size_t metadata_offset) {
+  size_t size;
   {
     RAY_LOG(RAY_INFO, "Object with ObjectID " << objectid << " is ready.");
     std::lock_guard<std::mutex> memory_lock(memory_lock_);
-    std::pair<ObjHandle, MemoryStatusType>& item = memory_[objectid];
+    auto discarded = discarded_objects_.find(objectid);
+    if (discarded != discarded_objects_.end()) {
+      RAY_LOG(RAY_INFO, "Discarding the data written for objectid " << objectid << ", because the object was created by another execution of the same task.");
+      segmentpool_lock_.lock();
+      segmentpool_->deallocate(discarded->second);
+      segmentpool_lock_.unlock();
+      discarded_objects_.erase(discarded);
+      return;
+    }
+    std::pair<ObjHandle, MemoryStatusType>& item = get_memory_entry(objectid);
     RAY_CHECK_EQ(item.second, MemoryStatusType::NOT_READY, "A worker notified the object store that objectid " << objectid << " has been written to the object store, but memory_[objectid].second != NOT_READY.");
     item.first.set_metadata_offset(metadata_offset);
     item.second = MemoryStatusType::READY;
+    size = item.first.size();
   }
   process_gets_for_objectid(objectid);
-  // Tell the scheduler that the object arrived
-  // TODO(pcm): put this in a separate thread so we don't have to pay the latency here
-  ClientContext objready_context;
-  ObjReadyRequest objready_request;
-  objready_request.set_objectid(objectid);
-  objready_request.set_objstoreid(objstoreid_);
-  AckReply objready_reply;
-  RAY_CHECK_GRPC(scheduler_stub_->ObjReady(&objready_context, objready_request, &objready_reply));
+  // Tell the scheduler that the object arrived. This is done by
+  // objready_thread_ so that the threads processing requests from workers do
+  // not wait for the scheduler.
+  {
+    std::lock_guard<std::mutex> objready_lock(objready_lock_);
+    ObjReadyRequest* objready_request = pending_objready_.add_objects();
+    objready_request->set_objectid(objectid);
+    objready_request->set_objstoreid(objstoreid_);
+    objready_request->set_size(size);
+  }
+  objready_cond_.notify_one();
+}
+
+void ObjStoreService::send_objready_notifications() {
+  while (true) {
+    ObjReadyBatchRequest objready_request;
+    {
+      std::unique_lock<std::mutex> objready_lock(objready_lock_);
+      objready_cond_.wait(objready_lock, [this]() { return pending_objready_.objects_size() > 0; });
+      // Everything that became ready while the previous batch was being sent
+      // goes into this batch.
+      objready_request.Swap(&pending_objready_);
+    }
+    ClientContext objready_context;
+    AckReply objready_reply;
+    RAY_CHECK_GRPC(scheduler_stub_->ObjReadyBatch(&objready_context, objready_request, &objready_reply));
+  }
 }
 
-void ObjStoreService::start_objstore_service() {
-  communicator_thread_ = std::thread([this]() {
-    RAY_LOG(RAY_INFO, "started object store communicator server");
-    process_requests();
+void ObjStoreService::start_objstore_service(size_t num_request_threads) {
+  objready_thread_ = std::thread([this]() {
+    send_objready_notifications();
+  });
+  for (size_t i = 0; i < num_request_threads; ++i) {
+    shards_.emplace_back(new RequestShard());
+  }
+  std::string doorbells_name = std::string("queue:") + objstore_address_ + std::string(":doorbells");
+  RAY_CHECK(request_doorbells_.create(doorbells_name, num_request_threads), "error creating the doorbells of objstore " << objstoreid_);
+  for (size_t i = 0; i < num_request_threads; ++i) {
+    communicator_threads_.emplace_back([this, i]() {
+      RAY_LOG(RAY_INFO, "started object store communicator server");
+      process_requests(i);
+    });
+  }
+  connection_thread_ = std::thread([this]() {
+    process_connections();
   });
 }
 
-void start_objstore(const char* scheduler_addr, const char* node_ip_address) {
+void start_objstore(const char* scheduler_addr, const char* node_ip_address, size_t num_request_threads, bool compression, SegmentOptions segment_options) {
   RAY_LOG(RAY_INFO, "Starting an object store on node " << std::string(node_ip_address));
   auto scheduler_channel = grpc::CreateChannel(scheduler_addr, grpc::InsecureChannelCredentials());
   RAY_LOG(RAY_INFO, "Object store connected to scheduler " << scheduler_addr);
-  ObjStoreService service(scheduler_channel);
+  ObjStoreService service(scheduler_channel, compression, segment_options);
   ServerBuilder builder;
   // Get GRPC to assign an unused port.
   int port;
@@ -345,7 +713,7 @@ void start_objstore(const char* scheduler_addr, const char* node_ip_address) {
   RAY_LOG(RAY_INFO, "This object store has address " << objstore_address);
   std::string recv_queue_name = std::string("queue:") + objstore_address + std::string(":obj");
   service.register_objstore(objstore_address, recv_queue_name);
-  service.start_objstore_service();
+  service.start_objstore_service(num_request_threads);
   // Process incoming GRPC calls. These may come from the scheduler or from
   // other object stores. This method does not return.
   server->Wait();
@@ -356,6 +724,13 @@ RayConfig global_ray_config;
 int main(int argc, char** argv) {
   RAY_CHECK_GE(argc, 3, "object store: expected at least two arguments (scheduler ip address and object store ip address)");
 
+  size_t num_request_threads = DEFAULT_NUM_REQUEST_THREADS;
+#ifdef _WIN32
+  bool compression = false; // zlib is not available on Windows
+#else
+  bool compression = true;
+#endif
+  SegmentOptions segment_options;
   if (argc > 3) {
     const char* log_file_name = get_cmd_option(argv, argv + argc, "--log-file-name");
     if (log_file_name) {
@@ -367,9 +742,29 @@ int main(int argc, char** argv) {
       std::cout << "object store: writing logs to stdout; you can change this by passing --log-file-name <filename> to ./scheduler" << std::endl;
       global_ray_config.log_to_file = false;
     }
+    const char* num_request_threads_option = get_cmd_option(argv, argv + argc, "--num-request-threads");
+    if (num_request_threads_option) {
+      num_request_threads = std::stoul(num_request_threads_option);
+      RAY_CHECK_GE(num_request_threads, 1, "object store: --num-request-threads must be at least 1");
+    }
+    const char* compression_option = get_cmd_option(argv, argv + argc, "--compression");
+    if (compression_option) {
+      RAY_CHECK(std::string(compression_option) == "on" || std::string(compression_option) == "off", "object store: --compression must be on or off");
+      compression = std::string(compression_option) == "on";
+    }
+    const char* huge_pages_option = get_cmd_option(argv, argv + argc, "--huge-pages");
+    if (huge_pages_option) {
+      RAY_CHECK(std::string(huge_pages_option) == "on" || std::string(huge_pages_option) == "off", "object store: --huge-pages must be on or off");
+      segment_options.huge_pages = std::string(huge_pages_option) == "on";
+    }
+    const char* prefault_option = get_cmd_option(argv, argv + argc, "--prefault");
+    if (prefault_option) {
+      RAY_CHECK(std::string(prefault_option) == "on" || std::string(prefault_option) == "off", "object store: --prefault must be on or off");
+      segment_options.prefault = std::string(prefault_option) == "on";
+    }
   }
 
-  start_objstore(argv[1], argv[2]);
+  start_objstore(argv[1], argv[2], num_request_threads, compression, segment_options);
 
   return 0;
 }
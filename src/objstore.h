@@ -1,6 +1,9 @@
 #ifndef RAY_OBJSTORE_H
 #define RAY_OBJSTORE_H
 
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
 #include <unordered_map>
 #include <memory>
 #include <thread>
@@ -28,33 +31,93 @@ using grpc::Channel;
 // NOT_READY:   This is used to indicate that memory has been allocated for the
 //              object, but the object hasn't been copied from a worker yet.
 // DEALLOCATED: This is used to indicate that the object has been deallocated.
+//              Deallocated objects are erased from memory_, so this status is
+//              only seen transiently.
 // NOT_PRESENT: This is used to indicate that space has not been allocated for
-//              this object in this object store.
+//              this object in this object store. Object IDs that do not appear
+//              in memory_ are also NOT_PRESENT.
 // PRE_ALLOCED: This is used to indicate that the memory has not yet been
 //              alloced, but it will be alloced soon. This is set when we call
 //              StartDelivery.
 enum MemoryStatusType {READY = 0, NOT_READY = 1, DEALLOCATED = 2, NOT_PRESENT = 3, PRE_ALLOCED = 4};
 
+// Ranges of objects that are streamed to another object store are compressed
+// if they are at least COMPRESSION_MIN_SIZE bytes long and if compressing
+// NUM_COMPRESSION_SAMPLES chunks spread over the range shrinks them to at most
+// MAX_COMPRESSION_RATIO of their size.
+const size_t COMPRESSION_MIN_SIZE = 1024 * 1024;
+const size_t NUM_COMPRESSION_SAMPLES = 4;
+const double MAX_COMPRESSION_RATIO = 0.75;
+
+// The number of threads that process requests from workers by default.
+const size_t DEFAULT_NUM_REQUEST_THREADS = 4;
+// The maximum number of requests that a request thread processes from one
+// worker before it looks at the next worker.
+const size_t MAX_REQUESTS_PER_WORKER = 16;
+
+// The workers whose requests are processed by one request thread. Each worker
+// is assigned to exactly one thread, which is the only consumer of the
+// requests in the worker's ObjStoreChannel. The thread sleeps on its doorbell
+// while none of its workers sends requests.
+struct RequestShard {
+  std::mutex lock;
+  std::vector<std::pair<WorkerId, ObjStoreChannel*> > channels; // this is protected by lock
+  std::atomic_bool changed{false}; // true if channels has changed since the request thread last looked at it
+};
+
 class ObjStoreService final : public ObjStore::Service {
 public:
-  ObjStoreService(std::shared_ptr<Channel> scheduler_channel);
+  // If compression is true, objects sent to object stores on other machines
+  // are compressed when that pays off. The segments that hold the objects are
+  // created with segment_options.
+  ObjStoreService(std::shared_ptr<Channel> scheduler_channel, bool compression, SegmentOptions segment_options);
 
   Status StartDelivery(ServerContext* context, const StartDeliveryRequest* request, AckReply* reply) override;
   Status StreamObjTo(ServerContext* context, const StreamObjToRequest* request, ServerWriter<ObjChunk>* writer) override;
+  Status MapObj(ServerContext* context, const MapObjRequest* request, MapObjReply* reply) override;
   Status NotifyAlias(ServerContext* context, const NotifyAliasRequest* request, AckReply* reply) override;
   Status DeallocateObject(ServerContext* context, const DeallocateObjectRequest* request, AckReply* reply) override;
   Status ObjStoreInfo(ServerContext* context, const ObjStoreInfoRequest* request, ObjStoreInfoReply* reply) override;
-  void start_objstore_service();
+  // Start num_request_threads threads that process requests from workers, a
+  // thread that connects new workers, and a thread that sends ObjReady
+  // notifications to the scheduler.
+  void start_objstore_service(size_t num_request_threads);
   void register_objstore(const std::string& objstore_address, const std::string& recv_queue_name);
 private:
-  void get_data_from(ObjectID objectid, ObjStore::Stub& stub);
+  // Allocate objectid and stream it from the object stores in stubs, which all
+  // hold a copy of it. Large objects are split into ranges that are streamed
+  // from the different object stores in parallel.
+  void get_data_from(ObjectID objectid, const std::vector<ObjStore::Stub*>& stubs, const std::vector<bool>& allow_compression, size_t size);
+  // Stream the bytes [offset, offset + length) of objectid, which has size
+  // total_size, from stub to data + offset. Return the metadata offset of the object.
+  size_t stream_range(ObjectID objectid, ObjStore::Stub& stub, bool allow_compression, size_t offset, size_t length, uint8_t* data, size_t total_size);
+  // Decide whether to compress the size bytes at data before streaming them by
+  // compressing a sample of them.
+  bool should_compress(const uint8_t* data, size_t size);
+  // Copy objectid directly from the shared memory of an object store on the
+  // same machine. Return false if its shared memory cannot be opened, in which
+  // case nothing has been allocated.
+  bool copy_from_shared_memory(ObjectID objectid, ObjStore::Stub& stub);
+  // check if the object store at objstore_address runs on the same machine as this one
+  bool is_colocated(const std::string& objstore_address);
   // check if we already connected to the other objstore, if yes, return reference to connection, otherwise connect
   ObjStore::Stub& get_objstore_stub(const std::string& objstore_address);
-  void process_worker_request(const ObjRequest request);
-  void process_objstore_request(const ObjRequest request);
-  void process_requests();
+  void process_worker_request(const ObjRequest request, ObjStoreChannel& channel);
+  // process the requests of the workers in shards_[shard], this does not return
+  void process_requests(size_t shard);
+  // open the channels of newly connected workers, this does not return
+  void process_connections();
   void process_gets_for_objectid(ObjectID objectid);
+  // send reply to workerid, unless the worker has disconnected
+  void send_reply(WorkerId workerid, const ObjHandle& reply);
+  // stop processing the requests of workerid, which is in shards_[shard], and
+  // close its channel, this is called when the worker disconnects or dies
+  void remove_channel(size_t shard, WorkerId workerid);
+  // send the pending ObjReady notifications to the scheduler in batches, this does not return
+  void send_objready_notifications();
   ObjHandle alloc(ObjectID objectid, size_t size);
+  // return the memory_ entry for objectid, creating a NOT_PRESENT entry if there is none (needs protection by memory_lock_)
+  std::pair<ObjHandle, MemoryStatusType>& get_memory_entry(ObjectID objectid);
   void object_ready(ObjectID objectid, size_t metadata_offset);
 
   static const size_t CHUNK_SIZE;
@@ -62,16 +125,32 @@ private:
   ObjStoreId objstoreid_; // id of this objectstore in the scheduler object store table
   std::shared_ptr<MemorySegmentPool> segmentpool_;
   std::mutex segmentpool_lock_;
-  std::vector<std::pair<ObjHandle, MemoryStatusType> > memory_; // object ID -> (memory address, memory status)
+  SegmentOptions segment_options_; // huge page and prefault options for the segments in segmentpool_
+  std::unordered_map<ObjectID, std::pair<ObjHandle, MemoryStatusType> > memory_; // object ID -> (memory address, memory status), entries are erased when the object is deallocated
+  std::unordered_map<ObjectID, std::vector<ObjectID> > aliases_; // canonical object ID -> alias object IDs that share its memory, this is protected by memory_lock_
+  std::unordered_map<ObjectID, std::chrono::steady_clock::time_point> allocation_times_; // canonical object ID -> time at which the memory for the object was allocated, this is used to report the age of objects and is protected by memory_lock_
+  std::unordered_map<ObjectID, ObjHandle> discarded_objects_; // object ID -> memory that a worker is writing although the object already exists, because its task was executed twice (see speculative execution in the scheduler), the memory is freed when the worker is done, this is protected by memory_lock_
   std::mutex memory_lock_;
   std::unordered_map<std::string, std::unique_ptr<ObjStore::Stub>> objstores_;
   std::mutex objstores_lock_;
   std::unique_ptr<Scheduler::Stub> scheduler_stub_;
-  std::vector<std::pair<WorkerId, ObjectID> > get_queue_;
+  std::unordered_map<ObjectID, std::vector<WorkerId> > get_queue_; // object ID -> workers that are waiting for the object to become ready
   std::mutex get_queue_lock_;
-  MessageQueue<ObjRequest> recv_queue_; // This queue is used by workers to send tasks to the object store.
-  std::vector<MessageQueue<ObjHandle> > send_queues_; // This maps workerid -> queue. The object store uses these queues to send replies to the relevant workers.
-  std::thread communicator_thread_;
+  MessageQueue<ObjRequest> recv_queue_; // This queue is used by workers to connect to the object store.
+  std::unordered_map<WorkerId, std::unique_ptr<ObjStoreChannel> > channels_; // This maps workerid -> channel. The object store receives requests from the workers and sends the replies over these channels.
+  std::mutex channels_lock_;
+  std::vector<std::unique_ptr<RequestShard> > shards_; // shards_[i] holds the workers whose requests are processed by communicator_threads_[i]
+  DoorbellArray request_doorbells_; // request_doorbells_[i] is rung by the workers in shards_[i] after they send a request
+  std::vector<std::thread> communicator_threads_;
+  std::thread connection_thread_;
+  ObjReadyBatchRequest pending_objready_; // ObjReady notifications that have not been sent to the scheduler yet, this is protected by objready_lock_
+  std::mutex objready_lock_;
+  std::condition_variable objready_cond_;
+  std::thread objready_thread_;
+
+  bool compression_; // true if objects sent to other machines may be compressed
+  CompressionStats compression_stats_; // this is protected by compression_stats_lock_
+  std::mutex compression_stats_lock_;
 
   std::vector<std::shared_ptr<std::thread> > delivery_threads_; // TODO(rkn): document
   // TODO(rkn): possibly add lock, and properly remove these threads from the delivery_threads_ when the deliveries are done
@@ -242,6 +242,74 @@ static PyObject* deserialize_objectid(PyObject* self, PyObject* args) {
   return make_pyobjectid(worker_capsule, static_cast<ObjectID>(objectid));
 }
 
+// This converts a sequence of Python ObjectIDs to a numpy array of int64 IDs.
+// If one of the elements is not an ObjectID, this returns None.
+static PyObject* serialize_objectids(PyObject* self, PyObject* args) {
+  PyObject* objectids;
+  if (!PyArg_ParseTuple(args, "O", &objectids)) {
+    return NULL;
+  }
+  PyObject* sequence = PySequence_Fast(objectids, "The objectids argument must be a sequence.");
+  if (sequence == NULL) {
+    return NULL;
+  }
+  npy_intp size = PySequence_Fast_GET_SIZE(sequence);
+  PyObject* result = PyArray_SimpleNew(1, &size, NPY_INT64);
+  int64_t* data = static_cast<int64_t*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(result)));
+  for (npy_intp i = 0; i < size; ++i) {
+    PyObject* item = PySequence_Fast_GET_ITEM(sequence, i);
+    if (!PyObject_TypeCheck(item, &PyObjectIDType)) {
+      Py_DECREF(result);
+      Py_DECREF(sequence);
+      Py_RETURN_NONE;
+    }
+    data[i] = reinterpret_cast<PyObjectID*>(item)->id;
+  }
+  Py_DECREF(sequence);
+  return result;
+}
+
+// This converts a numpy array of int64 IDs to a list of Python ObjectIDs. The
+// reference counts of all of the objects are incremented with a single request
+// to the scheduler instead of one request per ObjectID.
+static PyObject* deserialize_objectids(PyObject* self, PyObject* args) {
+  PyObject* worker_capsule;
+  PyObject* ids;
+  if (!PyArg_ParseTuple(args, "OO", &worker_capsule, &ids)) {
+    return NULL;
+  }
+  Worker* worker;
+  PyObjectToWorker(worker_capsule, &worker);
+  PyArrayObject* array = reinterpret_cast<PyArrayObject*>(PyArray_FROMANY(ids, NPY_INT64, 1, 1, NPY_ARRAY_IN_ARRAY));
+  if (array == NULL) {
+    return NULL;
+  }
+  npy_intp size = PyArray_DIM(array, 0);
+  int64_t* data = static_cast<int64_t*>(PyArray_DATA(array));
+  PyObject* result = PyList_New(size);
+  std::vector<ObjectID> objectids;
+  for (npy_intp i = 0; i < size; ++i) {
+    PyObjectID* objectid = reinterpret_cast<PyObjectID*>(PyObjectIDType.tp_alloc(&PyObjectIDType, 0));
+    if (objectid == NULL) {
+      // The ObjectIDs that have been created decrement their reference counts
+      // when the list is deallocated, so increment them first.
+      worker->increment_reference_count(objectids);
+      Py_DECREF(result);
+      Py_DECREF(array);
+      return NULL;
+    }
+    objectid->id = static_cast<ObjectID>(data[i]);
+    objectid->worker_capsule = worker_capsule;
+    Py_INCREF(worker_capsule); // The corresponding decrement happens in PyObjectID_dealloc.
+    objectids.push_back(objectid->id);
+    PyList_SET_ITEM(result, i, reinterpret_cast<PyObject*>(objectid));
+  }
+  Py_DECREF(array);
+  RAY_LOG(RAY_REFCOUNT, "In deserialize_objectids, calling increment_reference_count for " << objectids.size() << " objectids");
+  worker->increment_reference_count(objectids);
+  return result;
+}
+
 static PyObject* allocate_buffer(PyObject* self, PyObject* args) {
   Worker* worker;
   ObjectID objectid;
@@ -287,18 +355,6 @@ static PyObject* get_buffer(PyObject* self, PyObject* args) {
   return t;
 }
 
-static PyObject* is_arrow(PyObject* self, PyObject* args) {
-  Worker* worker;
-  ObjectID objectid;
-  if (!PyArg_ParseTuple(args, "O&O&", &PyObjectToWorker, &worker, &PyObjectToObjectID, &objectid)) {
-    return NULL;
-  }
-  if (worker->is_arrow(objectid))
-    Py_RETURN_TRUE;
-  else
-    Py_RETURN_FALSE;
-}
-
 static PyObject* unmap_object(PyObject* self, PyObject* args) {
   Worker* worker;
   int segmentid;
@@ -628,6 +684,49 @@ static PyObject* request_object(PyObject* self, PyObject* args) {
   Py_RETURN_NONE;
 }
 
+static PyObject* broadcast_object(PyObject* self, PyObject* args) {
+  Worker* worker;
+  ObjectID objectid;
+  if (!PyArg_ParseTuple(args, "O&O&", &PyObjectToWorker, &worker, &PyObjectToObjectID, &objectid)) {
+    return NULL;
+  }
+  worker->broadcast_object(objectid);
+  Py_RETURN_NONE;
+}
+
+static PyObject* prefetch_objects(PyObject* self, PyObject* args) {
+  Worker* worker;
+  PyObject* objectids;
+  const char* objstore_address;
+  PyObject* placement_hint;
+  if (!PyArg_ParseTuple(args, "O&O!sO", &PyObjectToWorker, &worker, &PyList_Type, &objectids, &objstore_address, &placement_hint)) {
+    return NULL;
+  }
+  std::vector<ObjectID> objectids_vec;
+  for (size_t i = 0; i < PyList_Size(objectids); ++i) {
+    ObjectID objectid;
+    if (!PyObjectToObjectID(PyList_GetItem(objectids, i), &objectid)) {
+      return NULL;
+    }
+    objectids_vec.push_back(objectid);
+  }
+  bool objstore_registered;
+  if (placement_hint == Py_None) {
+    objstore_registered = worker->prefetch_objects(objectids_vec, objstore_address, nullptr);
+  } else {
+    ObjectID placement_hint_objectid;
+    if (!PyObjectToObjectID(placement_hint, &placement_hint_objectid)) {
+      return NULL;
+    }
+    objstore_registered = worker->prefetch_objects(objectids_vec, objstore_address, &placement_hint_objectid);
+  }
+  if (!objstore_registered) {
+    PyErr_Format(RayError, "There is no object store with address %s.", objstore_address);
+    return NULL;
+  }
+  Py_RETURN_NONE;
+}
+
 static PyObject* wait(PyObject* self, PyObject* args) {
   Worker* worker;
   PyObject* objectids;
@@ -648,6 +747,42 @@ static PyObject* wait(PyObject* self, PyObject* args) {
   return result;
 }
 
+static PyObject* interrupted_objectid(PyObject* self, PyObject* args) {
+  Worker* worker;
+  if (!PyArg_ParseTuple(args, "O&", &PyObjectToWorker, &worker)) {
+    return NULL;
+  }
+  return PyInt_FromSize_t(worker->get_interrupted_objectid());
+}
+
+static PyObject* cancel_task(PyObject* self, PyObject* args) {
+  PyObject* worker_capsule;
+  ObjectID objectid;
+  if (!PyArg_ParseTuple(args, "OO&", &worker_capsule, &PyObjectToObjectID, &objectid)) {
+    return NULL;
+  }
+  Worker* worker;
+  PyObjectToWorker(worker_capsule, &worker);
+  CancelTaskReply reply = worker->cancel_task(objectid);
+  int size = reply.result_size();
+  PyObject* list = PyList_New(size);
+  std::vector<ObjectID> result_objectids;
+  for (int i = 0; i < size; ++i) {
+    PyList_SetItem(list, i, make_pyobjectid(worker_capsule, reply.result(i)));
+    result_objectids.push_back(reply.result(i));
+  }
+  // SubmitTask increments the reference counts of the results twice. The first
+  // increment was released by submit_task, and the second one is normally
+  // released by deserialize_task, which never runs for a task that was
+  // cancelled before it was scheduled, so we release it here.
+  worker->decrement_reference_count(result_objectids);
+  PyObject* t = PyTuple_New(3);
+  PyTuple_SetItem(t, 0, PyBool_FromLong(reply.cancelled()));
+  PyTuple_SetItem(t, 1, PyString_FromStringAndSize(reply.function_name().data(), static_cast<ssize_t>(reply.function_name().size())));
+  PyTuple_SetItem(t, 2, list);
+  return t;
+}
+
 static PyObject* alias_objectids(PyObject* self, PyObject* args) {
   Worker* worker;
   ObjectID alias_objectid;
@@ -670,14 +805,14 @@ static PyObject* scheduler_info(PyObject* self, PyObject* args) {
   worker->scheduler_info(context, request, reply);
 
   // Unpack the target object reference information.
-  PyObject* target_objectid_list = PyList_New(reply.target_objectid_size());
-  for (size_t i = 0; i < reply.target_objectid_size(); ++i) {
-    PyList_SetItem(target_objectid_list, i, PyInt_FromLong(reply.target_objectid(i)));
+  PyObject* target_objectid_dict = PyDict_New();
+  for (const auto& entry : reply.target_objectid()) {
+    set_dict_item_and_transfer_ownership(target_objectid_dict, PyInt_FromLong(entry.first), PyInt_FromLong(entry.second));
   }
   // Unpack the reference count information.
-  PyObject* reference_count_list = PyList_New(reply.reference_count_size());
-  for (size_t i = 0; i < reply.reference_count_size(); ++i) {
-    PyList_SetItem(reference_count_list, i, PyInt_FromLong(reply.reference_count(i)));
+  PyObject* reference_count_dict = PyDict_New();
+  for (const auto& entry : reply.reference_count()) {
+    set_dict_item_and_transfer_ownership(reference_count_dict, PyInt_FromLong(entry.first), PyInt_FromLong(entry.second));
   }
   // Unpack the available worker information.
   PyObject* available_worker_list = PyList_New(reply.avail_worker_size());
@@ -695,10 +830,13 @@ static PyObject* scheduler_info(PyObject* self, PyObject* args) {
 
   // Store the unpacked values in a dictionary to return.
   PyObject* dict = PyDict_New();
-  set_dict_item_and_transfer_ownership(dict, PyString_FromString("target_objectids"), target_objectid_list);
-  set_dict_item_and_transfer_ownership(dict, PyString_FromString("reference_counts"), reference_count_list);
+  set_dict_item_and_transfer_ownership(dict, PyString_FromString("target_objectids"), target_objectid_dict);
+  set_dict_item_and_transfer_ownership(dict, PyString_FromString("reference_counts"), reference_count_dict);
   set_dict_item_and_transfer_ownership(dict, PyString_FromString("available_workers"), available_worker_list);
   set_dict_item_and_transfer_ownership(dict, PyString_FromString("objstores"), objstore_list);
+  set_dict_item_and_transfer_ownership(dict, PyString_FromString("num_live_objects"), PyInt_FromLong(reply.num_live_objects()));
+  set_dict_item_and_transfer_ownership(dict, PyString_FromString("num_speculative_executions"), PyInt_FromLong(reply.num_speculative_executions()));
+  set_dict_item_and_transfer_ownership(dict, PyString_FromString("num_speculative_executions_won"), PyInt_FromLong(reply.num_speculative_executions_won()));
   return dict;
 }
 
@@ -772,18 +910,76 @@ static PyObject* task_info(PyObject* self, PyObject* args) {
   return dict;
 }
 
+static PyObject* memory_info(PyObject* self, PyObject* args) {
+  Worker* worker;
+  if (!PyArg_ParseTuple(args, "O&", &PyObjectToWorker, &worker)) {
+    return NULL;
+  }
+  ClientContext context;
+  MemoryInfoRequest request;
+  MemoryInfoReply reply;
+  worker->memory_info(context, request, reply);
+
+  PyObject* size_bucket_bounds = PyList_New(reply.size_bucket_bound_size());
+  for (size_t i = 0; i < reply.size_bucket_bound_size(); ++i) {
+    PyList_SetItem(size_bucket_bounds, i, PyInt_FromLong(reply.size_bucket_bound(i)));
+  }
+
+  PyObject* objstore_list = PyList_New(reply.objstore_size());
+  for (size_t i = 0; i < reply.objstore_size(); ++i) {
+    const ObjStoreMemoryInfo& info = reply.objstore(i);
+    PyObject* num_objects_by_size = PyList_New(info.num_objects_by_size_size());
+    for (size_t j = 0; j < info.num_objects_by_size_size(); ++j) {
+      PyList_SetItem(num_objects_by_size, j, PyInt_FromLong(info.num_objects_by_size(j)));
+    }
+    PyObject* functions = PyDict_New();
+    for (const auto& entry : info.function()) {
+      PyObject* function_dict = PyDict_New();
+      set_dict_item_and_transfer_ownership(function_dict, PyString_FromString("num_objects"), PyInt_FromLong(entry.second.num_objects()));
+      set_dict_item_and_transfer_ownership(function_dict, PyString_FromString("num_bytes"), PyInt_FromLong(entry.second.num_bytes()));
+      set_dict_item_and_transfer_ownership(functions, PyString_FromStringAndSize(entry.first.data(), entry.first.size()), function_dict);
+    }
+    const CompressionStats& stats = info.compression_stats();
+    PyObject* compression_stats = PyDict_New();
+    set_dict_item_and_transfer_ownership(compression_stats, PyString_FromString("num_streams_compressed"), PyInt_FromLong(stats.num_streams_compressed()));
+    set_dict_item_and_transfer_ownership(compression_stats, PyString_FromString("num_streams_uncompressed"), PyInt_FromLong(stats.num_streams_uncompressed()));
+    set_dict_item_and_transfer_ownership(compression_stats, PyString_FromString("num_bytes_uncompressed"), PyInt_FromLong(stats.num_bytes_uncompressed()));
+    set_dict_item_and_transfer_ownership(compression_stats, PyString_FromString("num_bytes_compressed"), PyInt_FromLong(stats.num_bytes_compressed()));
+    set_dict_item_and_transfer_ownership(compression_stats, PyString_FromString("compression_time"), PyFloat_FromDouble(stats.compression_time()));
+    set_dict_item_and_transfer_ownership(compression_stats, PyString_FromString("decompression_time"), PyFloat_FromDouble(stats.decompression_time()));
+
+    PyObject* info_dict = PyDict_New();
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("objstoreid"), PyInt_FromLong(info.objstoreid()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("address"), PyString_FromStringAndSize(info.address().data(), info.address().size()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("available"), PyBool_FromLong(info.available()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("num_objects"), PyInt_FromLong(info.num_objects()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("num_bytes"), PyInt_FromLong(info.num_bytes()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("num_objects_by_size"), num_objects_by_size);
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("pinned_bytes"), PyInt_FromLong(info.pinned_bytes()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("evictable_bytes"), PyInt_FromLong(info.evictable_bytes()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("oldest_objectid"), PyInt_FromLong(info.oldest_objectid()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("oldest_object_age"), PyFloat_FromDouble(info.oldest_object_age()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("oldest_object_function"), PyString_FromStringAndSize(info.oldest_object_function().data(), info.oldest_object_function().size()));
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("functions"), functions);
+    set_dict_item_and_transfer_ownership(info_dict, PyString_FromString("compression_stats"), compression_stats);
+    PyList_SetItem(objstore_list, i, info_dict);
+  }
+
+  PyObject* dict = PyDict_New();
+  set_dict_item_and_transfer_ownership(dict, PyString_FromString("size_bucket_bounds"), size_bucket_bounds);
+  set_dict_item_and_transfer_ownership(dict, PyString_FromString("objstores"), objstore_list);
+  return dict;
+}
+
 static PyObject* dump_computation_graph(PyObject* self, PyObject* args) {
   Worker* worker;
   const char* output_file_name;
   if (!PyArg_ParseTuple(args, "O&s", &PyObjectToWorker, &worker, &output_file_name)) {
     return NULL;
   }
-  ClientContext context;
-  SchedulerInfoRequest request;
-  SchedulerInfoReply reply;
-  worker->scheduler_info(context, request, reply);
   std::fstream output(output_file_name, std::ios::out | std::ios::trunc | std::ios::binary);
-  RAY_CHECK(reply.computation_graph().SerializeToOstream(&output), "Cannot dump computation graph to file " << output_file_name);
+  RAY_CHECK(output.is_open(), "Cannot dump computation graph to file " << output_file_name);
+  worker->dump_computation_graph(output);
   Py_RETURN_NONE;
 }
 
@@ -803,10 +999,11 @@ static PyObject* kill_workers(PyObject* self, PyObject* args) {
 static PyMethodDef RayLibMethods[] = {
  { "serialize_objectid", serialize_objectid, METH_VARARGS, "serialize an object id" },
  { "deserialize_objectid", deserialize_objectid, METH_VARARGS, "deserialize an object id" },
+ { "serialize_objectids", serialize_objectids, METH_VARARGS, "serialize a sequence of object ids to an array of integers" },
+ { "deserialize_objectids", deserialize_objectids, METH_VARARGS, "deserialize an array of integers to a list of object ids" },
  { "allocate_buffer", allocate_buffer, METH_VARARGS, "Allocates and returns buffer for objectid."},
  { "finish_buffer", finish_buffer, METH_VARARGS, "Makes the buffer immutable and closes memory segment of objectid."},
  { "get_buffer", get_buffer, METH_VARARGS, "Gets buffer for objectid"},
- { "is_arrow", is_arrow, METH_VARARGS, "is the object in the local object store an arrow object?"},
  { "unmap_object", unmap_object, METH_VARARGS, "unmap the object from the client's shared memory pool"},
  { "serialize_task", serialize_task, METH_VARARGS, "serialize a task to protocol buffers" },
  { "create_worker", create_worker, METH_VARARGS, "connect to the scheduler and the object store" },
@@ -817,13 +1014,18 @@ static PyMethodDef RayLibMethods[] = {
  { "add_contained_objectids", add_contained_objectids, METH_VARARGS, "notify the scheduler about the object IDs contained in a remote object" },
  { "get_objectid", get_objectid, METH_VARARGS, "register a new object reference with the scheduler" },
  { "request_object" , request_object, METH_VARARGS, "request an object to be delivered to the local object store" },
+ { "broadcast_object", broadcast_object, METH_VARARGS, "request an object to be copied to all object stores" },
+ { "prefetch_objects", prefetch_objects, METH_VARARGS, "request objects to be copied to an object store before they are needed" },
  { "wait" , wait, METH_VARARGS, "checks the scheduler to see if a object can be gotten" },
+ { "cancel_task", cancel_task, METH_VARARGS, "cancel the task that creates an object" },
+ { "interrupted_objectid", interrupted_objectid, METH_VARARGS, "get the object ID of the last request to interrupt the running task" },
  { "alias_objectids", alias_objectids, METH_VARARGS, "make two objectids refer to the same object" },
  { "wait_for_next_message", wait_for_next_message, METH_VARARGS, "get next message from scheduler (blocking)" },
  { "submit_task", submit_task, METH_VARARGS, "call a remote function" },
  { "ready_for_new_task", ready_for_new_task, METH_VARARGS, "notify the scheduler that the worker is ready for a new task" },
  { "scheduler_info", scheduler_info, METH_VARARGS, "get info about scheduler state" },
  { "task_info", task_info, METH_VARARGS, "get information about task statuses and failures" },
+ { "memory_info", memory_info, METH_VARARGS, "get information about the memory used by the objects in each object store" },
  { "run_function_on_all_workers", run_function_on_all_workers, METH_VARARGS, "run an arbitrary function on all workers" },
  { "export_remote_function", export_remote_function, METH_VARARGS, "export a remote function to workers" },
  { "export_reusable_variable", export_reusable_variable, METH_VARARGS, "export a reusable variable to the workers" },
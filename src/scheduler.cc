@@ -111,7 +111,33 @@ template<class T>
 SchedulerService::MySynchronizedPtr<const T> SchedulerService::get(const Synchronized<T>& my_field, const char* name, unsigned int line_number) const { (void) name; (void) line_number; return my_field.unchecked_get(); }
 #endif
 
-SchedulerService::SchedulerService(SchedulingAlgorithmType scheduling_algorithm) : scheduling_algorithm_(scheduling_algorithm) {}
+// The number of runtimes that are kept for each remote function.
+const size_t NUM_RECORDED_RUNTIMES = 100;
+
+void TaskRuntimes::add(std::chrono::duration<double> runtime) {
+  runtimes_.push_back(runtime.count());
+  if (runtimes_.size() > NUM_RECORDED_RUNTIMES) {
+    runtimes_.pop_front();
+  }
+}
+
+size_t TaskRuntimes::size() const {
+  return runtimes_.size();
+}
+
+std::chrono::duration<double> TaskRuntimes::percentile(double fraction) const {
+  RAY_CHECK(!runtimes_.empty(), "Attempting to compute a percentile of the task runtimes, but no runtimes have been recorded.");
+  std::vector<double> runtimes(runtimes_.begin(), runtimes_.end());
+  size_t index = std::min(runtimes.size() - 1, static_cast<size_t>(fraction * runtimes.size()));
+  std::nth_element(runtimes.begin(), runtimes.begin() + index, runtimes.end());
+  return std::chrono::duration<double>(runtimes[index]);
+}
+
+SchedulerService::SchedulerService(std::unique_ptr<SchedulingPolicy> scheduling_policy, const SpeculationOptions& speculation_options, size_t early_shipping_budget, const std::string& computation_graph_spill_file_name) : reference_counts_(DEALLOCATED), target_objectids_(UNITIALIZED_ALIAS), rng_(std::random_device()()), scheduling_policy_(std::move(scheduling_policy)), speculation_options_(speculation_options), early_shipping_budget_(early_shipping_budget) {
+  if (!computation_graph_spill_file_name.empty()) {
+    GET(computation_graph_)->set_spill_file(computation_graph_spill_file_name);
+  }
+}
 
 Status SchedulerService::SubmitTask(ServerContext* context, const SubmitTaskRequest* request, SubmitTaskReply* reply) {
   std::unique_ptr<Task> task(new Task(request->task())); // need to copy, because request is const
@@ -202,6 +228,14 @@ Status SchedulerService::AliasObjectIDs(ServerContext* context, const AliasObjec
   RAY_CHECK_LT(alias_objectid, size, "internal error: no object with objectid " << alias_objectid << " exists");
   RAY_CHECK_LT(target_objectid, size, "internal error: no object with objectid " << target_objectid << " exists");
   {
+    auto reference_counts = GET(reference_counts_);
+    auto speculations = GET(speculations_);
+    if (reference_counts->get(alias_objectid) == DEALLOCATED || speculations->superseded_objectids.count(alias_objectid) > 0) {
+      // The task that created alias_objectid was executed speculatively and
+      // the copy finished first, so alias_objectid already has a target.
+      RAY_LOG(RAY_ALIAS, "Ignoring the aliasing of superseded objectid " << alias_objectid << " with objectid " << target_objectid);
+      return Status::OK;
+    }
     auto target_objectids = GET(target_objectids_);
     RAY_CHECK_EQ((*target_objectids)[alias_objectid], UNITIALIZED_ALIAS, "internal error: attempting to alias objectid " << alias_objectid << " with objectid " << target_objectid << ", but objectid " << alias_objectid << " has already been aliased with objectid " << (*target_objectids)[alias_objectid]);
     (*target_objectids)[alias_objectid] = target_objectid;
@@ -227,7 +261,8 @@ Status SchedulerService::RegisterObjStore(ServerContext* context, const Register
   (*objstores)[objstoreid].channel = channel;
   (*objstores)[objstoreid].objstore_stub = ObjStore::NewStub(channel);
   reply->set_objstoreid(objstoreid);
-  objects_in_transit_.push_back(std::vector<ObjectID>());
+  objects_in_transit_.push_back(std::unordered_map<ObjectID, std::vector<ObjStoreId> >());
+  num_outbound_deliveries_.push_back(0);
   return Status::OK;
 }
 
@@ -357,10 +392,43 @@ Status SchedulerService::NotifyFailure(ServerContext* context, const NotifyFailu
 }
 
 Status SchedulerService::ObjReady(ServerContext* context, const ObjReadyRequest* request, AckReply* reply) {
-  ObjectID objectid = request->objectid();
-  RAY_LOG(RAY_DEBUG, "object " << objectid << " ready on store " << request->objstoreid());
-  add_canonical_objectid(objectid);
-  add_location(objectid, request->objstoreid());
+  object_ready(request->objectid(), request->objstoreid(), request->size());
+  schedule();
+  return Status::OK;
+}
+
+Status SchedulerService::ObjReadyBatch(ServerContext* context, const ObjReadyBatchRequest* request, AckReply* reply) {
+  for (const ObjReadyRequest& object : request->objects()) {
+    object_ready(object.objectid(), object.objstoreid(), object.size());
+  }
+  schedule();
+  return Status::OK;
+}
+
+void SchedulerService::object_ready(ObjectID objectid, ObjStoreId objstoreid, size_t size) {
+  RAY_LOG(RAY_DEBUG, "object " << objectid << " ready on store " << objstoreid);
+  {
+    auto reference_counts = GET(reference_counts_);
+    auto speculations = GET(speculations_);
+    // If the task that created objectid was executed speculatively and the
+    // copy finished first, then this is a redundant copy of the object.
+    if (reference_counts->get(objectid) == DEALLOCATED) {
+      RAY_LOG(RAY_INFO, "superseded objectid " << objectid << " was written to objstore " << objstoreid << " after it was deallocated");
+      deallocate_superseded_copy(objectid, objstoreid);
+      return;
+    }
+    auto superseded = speculations->superseded_objectids.find(objectid);
+    if (superseded != speculations->superseded_objectids.end()) {
+      RAY_LOG(RAY_INFO, "superseded objectid " << objectid << " was written to objstore " << objstoreid);
+      superseded->second.push_back(objstoreid);
+      return;
+    }
+    add_canonical_objectid(objectid);
+  }
+  add_location(objectid, objstoreid, size);
+  // The new copy can be forwarded to the object stores that are waiting for
+  // the object.
+  start_pending_deliveries(objectid);
   {
     // If this is the first time that ObjReady has been called for this objectid,
     // the corresponding increment was done in register_new_object in the
@@ -370,15 +438,16 @@ Status SchedulerService::ObjReady(ServerContext* context, const ObjReadyRequest*
     auto contained_objectids = GET(contained_objectids_); // we grab this lock because decrement_ref_count assumes it has been acquired
     decrement_ref_count(std::vector<ObjectID>({objectid}), reference_counts, contained_objectids);
   }
-  schedule();
-  return Status::OK;
 }
 
 Status SchedulerService::ReadyForNewTask(ServerContext* context, const ReadyForNewTaskRequest* request, AckReply* reply) {
   WorkerId workerid = request->workerid();
+  OperationId operationid;
+  std::chrono::duration<double> runtime;
   {
     auto workers = GET(workers_);
-    OperationId operationid = (*workers)[workerid].current_task;
+    operationid = (*workers)[workerid].current_task;
+    runtime = std::chrono::steady_clock::now() - (*workers)[workerid].task_start_time;
     RAY_LOG(RAY_INFO, "worker " << workerid << " is ready for a new task");
     RAY_CHECK(operationid != ROOT_OPERATION, "A driver appears to have called ReadyForNewTask.");
     {
@@ -392,6 +461,18 @@ Status SchedulerService::ReadyForNewTask(ServerContext* context, const ReadyForN
     }
     (*workers)[workerid].current_task = NO_OPERATION; // clear operation ID
   }
+  if (operationid != NO_OPERATION) {
+    std::string function_name;
+    {
+      auto computation_graph = GET(computation_graph_);
+      function_name = computation_graph->get_task(operationid).name();
+      computation_graph->finish_task(operationid);
+    }
+    if (speculation_options_.enabled) {
+      (*GET(task_runtimes_))[function_name].add(runtime);
+      finish_speculative_execution(operationid);
+    }
+  }
   GET(avail_workers_)->push_back(workerid);
   schedule();
   return Status::OK;
@@ -488,6 +569,88 @@ Status SchedulerService::TaskInfo(ServerContext* context, const TaskInfoRequest*
   return Status::OK;
 }
 
+// Send the bytes [begin, end) of the computation graph spill file to writer in
+// chunks. Return false if the client has gone away.
+static bool write_spill_file(ServerWriter<ComputationGraphChunk>* writer, const std::string& spill_file_name, size_t begin, size_t end) {
+  if (begin >= end) {
+    return true;
+  }
+  std::ifstream spill_file(spill_file_name, std::ios::in | std::ios::binary);
+  RAY_CHECK(spill_file.is_open(), "Failed to open the computation graph spill file " << spill_file_name);
+  spill_file.seekg(begin);
+  const size_t CHUNK_SIZE = 8 * 1024;
+  std::vector<char> buffer(CHUNK_SIZE);
+  ComputationGraphChunk chunk;
+  for (size_t i = begin; i < end; i += CHUNK_SIZE) {
+    size_t num_bytes = std::min(CHUNK_SIZE, end - i);
+    RAY_CHECK(spill_file.read(buffer.data(), num_bytes), "Failed to read the computation graph spill file " << spill_file_name);
+    chunk.set_data(buffer.data(), num_bytes);
+    if (!writer->Write(chunk)) {
+      return false;
+    }
+  }
+  return true;
+}
+
+Status SchedulerService::ComputationGraphInfo(ServerContext* context, const ComputationGraphInfoRequest* request, ServerWriter<ComputationGraphChunk>* writer) {
+  // The computation graph is streamed in batches so that we never serialize
+  // the whole graph at once and so that we do not hold the lock on
+  // computation_graph_ for too long. Every operation is sent exactly once:
+  // 1. The operations that were spilled before we started are sent from the
+  //    spill file. Pruning is permanent, so none of them is still in memory.
+  // 2. The operations that are still in memory are sent in batches, and we
+  //    remember which ones were sent.
+  // 3. Operations that were pruned while 2 was happening were appended to the
+  //    spill file. They are sent from there, unless they were already sent in
+  //    2 before they were pruned.
+  std::string spill_file_name;
+  size_t spilled_before;
+  GET(computation_graph_)->get_spill_file(&spill_file_name, &spilled_before);
+  if (!write_spill_file(writer, spill_file_name, 0, spilled_before)) {
+    return Status::OK; // The client has gone away.
+  }
+  const OperationId BATCH_SIZE = 1000;
+  OperationId num_operations = GET(computation_graph_)->num_operations();
+  std::unordered_set<OperationId> sent_operationids;
+  ComputationGraphChunk chunk;
+  for (OperationId begin = 0; begin < num_operations; begin += BATCH_SIZE) {
+    CompGraph computation_graph;
+    GET(computation_graph_)->to_protobuf(begin, begin + BATCH_SIZE, &computation_graph);
+    if (computation_graph.operation_size() == 0) {
+      continue;
+    }
+    sent_operationids.insert(computation_graph.operationid().begin(), computation_graph.operationid().end());
+    RAY_CHECK(computation_graph.SerializeToString(chunk.mutable_data()), "Failed to serialize the computation graph.");
+    if (!writer->Write(chunk)) {
+      return Status::OK;
+    }
+  }
+  size_t spilled_after;
+  GET(computation_graph_)->get_spill_file(&spill_file_name, &spilled_after);
+  if (spilled_after > spilled_before) {
+    // Only the operations pruned during the stream are read into memory here.
+    std::ifstream spill_file(spill_file_name, std::ios::in | std::ios::binary);
+    RAY_CHECK(spill_file.is_open(), "Failed to open the computation graph spill file " << spill_file_name);
+    spill_file.seekg(spilled_before);
+    std::string data(spilled_after - spilled_before, '\0');
+    RAY_CHECK(spill_file.read(&data[0], data.size()), "Failed to read the computation graph spill file " << spill_file_name);
+    CompGraph spilled;
+    RAY_CHECK(spilled.ParseFromString(data), "Failed to parse the computation graph spill file " << spill_file_name);
+    CompGraph computation_graph;
+    for (int i = 0; i < spilled.operation_size(); ++i) {
+      if (sent_operationids.find(spilled.operationid(i)) == sent_operationids.end()) {
+        computation_graph.add_operation()->Swap(spilled.mutable_operation(i));
+        computation_graph.add_operationid(spilled.operationid(i));
+      }
+    }
+    if (computation_graph.operation_size() > 0) {
+      RAY_CHECK(computation_graph.SerializeToString(chunk.mutable_data()), "Failed to serialize the computation graph.");
+      writer->Write(chunk);
+    }
+  }
+  return Status::OK;
+}
+
 Status SchedulerService::KillWorkers(ServerContext* context, const KillWorkersRequest* request, KillWorkersReply* reply) {
   // TODO: Update reference counts
   auto failed_tasks = GET(failed_tasks_);
@@ -585,7 +748,7 @@ Status SchedulerService::Wait(ServerContext* context, const WaitRequest* request
     if (has_canonical_objectid(objectid)) {
       ObjectID canonical_objectid = get_canonical_objectid(objectid);
       RAY_CHECK_LT(canonical_objectid, objtable->size(), "Canonical_objectid is outside object table.");
-      if ((*objtable)[canonical_objectid].size() != 0) {
+      if (objtable->get(canonical_objectid).size() != 0) {
         reply->add_indices(i);
       }
     }
@@ -593,24 +756,311 @@ Status SchedulerService::Wait(ServerContext* context, const WaitRequest* request
   return Status::OK;
 }
 
-void SchedulerService::deliver_object_async_if_necessary(ObjectID canonical_objectid, ObjStoreId from, ObjStoreId to) {
-  bool object_present_or_in_transit;
+// If the task that creates the object is still in the task queue, it is removed
+// from the queue and its results are returned to the caller, which stores the
+// cancellation errors in them. If the task is running, the workers executing it
+// (including a speculative copy) are interrupted and store the errors
+// themselves. The interrupts are sent after all of the locks are released and
+// without waiting for the workers, so that a slow or dead worker cannot stall
+// the scheduler.
+Status SchedulerService::CancelTask(ServerContext* context, const CancelTaskRequest* request, CancelTaskReply* reply) {
+  ObjectID objectid = request->objectid();
+  std::vector<ObjectID> arguments;
+  std::vector<std::pair<WorkerId, std::shared_ptr<Channel> > > workers_to_interrupt;
+  {
+    auto computation_graph = GET(computation_graph_);
+    auto task_queue = GET(task_queue_);
+    auto produces_objectid = [&computation_graph, objectid](OperationId operationid) {
+      const Task& task = computation_graph->get_task(operationid);
+      return std::find(task.result().begin(), task.result().end(), objectid) != task.result().end();
+    };
+    auto task_it = std::find_if(task_queue->begin(), task_queue->end(), produces_objectid);
+    if (task_it != task_queue->end()) {
+      OperationId operationid = *task_it;
+      const Task& task = computation_graph->get_task(operationid);
+      reply->set_cancelled(true);
+      reply->set_function_name(task.name());
+      for (int i = 0; i < task.result_size(); ++i) {
+        reply->add_result(task.result(i));
+      }
+      for (int i = 0; i < task.arg_size(); ++i) {
+        if (task.arg(i).serialized_arg().empty()) {
+          arguments.push_back(task.arg(i).objectid());
+        }
+      }
+      task_queue->erase(task_it);
+      computation_graph->finish_task(operationid);
+    } else {
+      auto workers = GET(workers_);
+      auto speculations = GET(speculations_);
+      std::vector<OperationId> operationids;
+      for (const WorkerHandle& worker : *workers) {
+        OperationId operationid = worker.current_task;
+        if (operationid != NO_OPERATION && operationid != ROOT_OPERATION && produces_objectid(operationid)) {
+          operationids.push_back(operationid);
+          auto execution = speculations->running.find(operationid);
+          if (execution != speculations->running.end()) {
+            operationids.push_back(execution->second.original);
+            operationids.push_back(execution->second.copy);
+          }
+        }
+      }
+      for (WorkerId workerid = 0; workerid < workers->size(); ++workerid) {
+        const WorkerHandle& worker = (*workers)[workerid];
+        if (worker.worker_stub && std::find(operationids.begin(), operationids.end(), worker.current_task) != operationids.end()) {
+          workers_to_interrupt.push_back(std::make_pair(workerid, worker.channel));
+          reply->set_cancelled(true);
+        }
+      }
+    }
+  }
+  if (!arguments.empty()) {
+    // The task will never be deserialized, so we release the references to its
+    // arguments that deserialize_task in raylib would have released.
+    auto reference_counts = GET(reference_counts_);
+    auto contained_objectids = GET(contained_objectids_);
+    decrement_ref_count(arguments, reference_counts, contained_objectids);
+  }
+  for (const auto& worker : workers_to_interrupt) {
+    interrupt_worker(worker.first, worker.second, objectid);
+  }
+  return Status::OK;
+}
+
+void SchedulerService::interrupt_worker(WorkerId workerid, std::shared_ptr<Channel> channel, ObjectID objectid) {
+  // The worker may have finished the task and started another one by the time
+  // the interrupt arrives, so the request carries the object ID, and the worker
+  // ignores the interrupt unless its current task returns that object.
+  std::thread([workerid, channel, objectid]() {
+    std::unique_ptr<WorkerService::Stub> worker_stub = WorkerService::NewStub(channel);
+    ClientContext context;
+    context.set_deadline(std::chrono::system_clock::now() + std::chrono::seconds(INTERRUPT_TIMEOUT_SECONDS));
+    InterruptTaskRequest request;
+    request.set_objectid(objectid);
+    AckReply reply;
+    Status status = worker_stub->InterruptTask(&context, request, &reply);
+    if (!status.ok()) {
+      RAY_LOG(RAY_INFO, "Failed to interrupt worker " << workerid << " to cancel the task that creates objectid " << objectid << ": " << status.error_message());
+    }
+  }).detach();
+}
+
+Status SchedulerService::Broadcast(ServerContext* context, const BroadcastRequest* request, AckReply* reply) {
+  ObjectID objectid = request->objectid();
+  RAY_CHECK_LT(objectid, GET(objtable_)->size(), "internal error: no object with objectid " << objectid << " exists");
+  size_t num_stores = num_objstores();
+  {
+    // We increment once for every object store so the objectid doesn't go out
+    // of scope before the deliveries are started. The corresponding decrements
+    // happen in perform_prefetches.
+    auto reference_counts = GET(reference_counts_); // we grab this lock because increment_ref_count assumes it has been acquired
+    increment_ref_count(std::vector<ObjectID>(num_stores, objectid), reference_counts);
+  }
+  {
+    auto prefetch_queue = GET(prefetch_queue_);
+    for (ObjStoreId objstoreid = 0; objstoreid < num_stores; ++objstoreid) {
+      prefetch_queue->push_back({objectid, objstoreid, NO_PLACEMENT_HINT});
+    }
+  }
+  schedule();
+  return Status::OK;
+}
+
+Status SchedulerService::Prefetch(ServerContext* context, const PrefetchRequest* request, PrefetchReply* reply) {
+  ObjStoreId objstoreid = get_store(request->workerid());
+  if (!request->objstore_address().empty()) {
+    auto objstores = GET(objstores_);
+    auto objstore = std::find_if(objstores->begin(), objstores->end(), [request](const ObjStoreHandle& handle) {
+      return handle.address == request->objstore_address();
+    });
+    if (objstore == objstores->end()) {
+      reply->set_objstore_registered(false);
+      return Status::OK;
+    }
+    objstoreid = objstore - objstores->begin();
+  }
+  reply->set_objstore_registered(true);
+  ObjectID placement_hint = request->has_placement_hint() ? request->placement_hint() : NO_PLACEMENT_HINT;
+  std::vector<ObjectID> objectids;
+  {
+    size_t size = GET(objtable_)->size();
+    for (int i = 0; i < request->objectid_size(); ++i) {
+      RAY_CHECK_LT(request->objectid(i), size, "internal error: no object with objectid " << request->objectid(i) << " exists");
+      objectids.push_back(request->objectid(i));
+      if (placement_hint != NO_PLACEMENT_HINT) {
+        objectids.push_back(placement_hint);
+      }
+    }
+    RAY_CHECK(placement_hint == NO_PLACEMENT_HINT || placement_hint < size, "internal error: no object with objectid " << placement_hint << " exists");
+  }
+  {
+    // The corresponding decrements happen in perform_prefetches.
+    auto reference_counts = GET(reference_counts_); // we grab this lock because increment_ref_count assumes it has been acquired
+    increment_ref_count(objectids, reference_counts);
+  }
+  {
+    auto prefetch_queue = GET(prefetch_queue_);
+    for (int i = 0; i < request->objectid_size(); ++i) {
+      prefetch_queue->push_back({request->objectid(i), objstoreid, placement_hint});
+    }
+  }
+  schedule();
+  return Status::OK;
+}
+
+Status SchedulerService::MemoryInfo(ServerContext* context, const MemoryInfoRequest* request, MemoryInfoReply* reply) {
+  std::vector<std::pair<ObjStore::Stub*, std::string> > objstores;
   {
+    auto objstore_handles = GET(objstores_);
+    for (const ObjStoreHandle& handle : *objstore_handles) {
+      objstores.push_back(std::make_pair(handle.objstore_stub.get(), handle.address));
+    }
+  }
+  // Ask every object store for the memory used by its objects. We do not hold
+  // any locks while waiting for the replies. An object store that does not
+  // reply in time is reported as unavailable.
+  std::vector<ObjStoreInfoReply> objstore_replies(objstores.size());
+  std::vector<bool> available(objstores.size());
+  for (size_t i = 0; i < objstores.size(); ++i) {
+    ClientContext client_context;
+    client_context.set_deadline(std::chrono::system_clock::now() + std::chrono::seconds(MEMORY_INFO_TIMEOUT_SECONDS));
+    ObjStoreInfoRequest objstore_request;
+    Status status = objstores[i].first->ObjStoreInfo(&client_context, objstore_request, &objstore_replies[i]);
+    available[i] = status.ok();
+    if (!status.ok()) {
+      RAY_LOG(RAY_INFO, "Failed to get the memory info of object store " << i << " at " << objstores[i].second << ": " << status.error_message());
+      objstore_replies[i].Clear();
+    }
+  }
+  // Look up the function that created each object and the number of object
+  // stores that hold it.
+  std::unordered_map<ObjectID, std::string> creating_functions;
+  std::unordered_map<ObjectID, size_t> num_locations;
+  {
+    auto computation_graph = GET(computation_graph_);
+    for (const ObjStoreInfoReply& objstore_reply : objstore_replies) {
+      for (const ObjectMemoryInfo& object : objstore_reply.object_memory()) {
+        if (creating_functions.count(object.objectid()) == 0) {
+          creating_functions[object.objectid()] = computation_graph->get_creating_function(object.objectid());
+        }
+      }
+    }
+  }
+  {
+    // The objects may have been deallocated and reclaimed since the object
+    // stores replied, so we do not use operator[].
     auto objtable = GET(objtable_);
+    for (const auto& entry : creating_functions) {
+      num_locations[entry.first] = objtable->get(entry.first).size();
+    }
+  }
+  for (size_t bound : MEMORY_INFO_SIZE_BUCKET_BOUNDS) {
+    reply->add_size_bucket_bound(bound);
+  }
+  for (size_t i = 0; i < objstores.size(); ++i) {
+    ObjStoreMemoryInfo* info = reply->add_objstore();
+    info->set_objstoreid(i);
+    info->set_address(objstores[i].second);
+    info->set_available(available[i]);
+    *info->mutable_compression_stats() = objstore_replies[i].compression_stats();
+    std::vector<size_t> num_objects_by_size(MEMORY_INFO_SIZE_BUCKET_BOUNDS.size() + 1, 0);
+    for (const ObjectMemoryInfo& object : objstore_replies[i].object_memory()) {
+      ObjectID objectid = object.objectid();
+      info->set_num_objects(info->num_objects() + 1);
+      info->set_num_bytes(info->num_bytes() + object.size());
+      num_objects_by_size[std::upper_bound(MEMORY_INFO_SIZE_BUCKET_BOUNDS.begin(), MEMORY_INFO_SIZE_BUCKET_BOUNDS.end(), object.size()) - MEMORY_INFO_SIZE_BUCKET_BOUNDS.begin()] += 1;
+      // An object can only be dropped from this object store without losing
+      // it if another object store holds a copy.
+      if (object.ready() && num_locations[objectid] > 1) {
+        info->set_evictable_bytes(info->evictable_bytes() + object.size());
+      } else {
+        info->set_pinned_bytes(info->pinned_bytes() + object.size());
+      }
+      if (object.age() > info->oldest_object_age()) {
+        info->set_oldest_objectid(objectid);
+        info->set_oldest_object_age(object.age());
+        info->set_oldest_object_function(creating_functions[objectid]);
+      }
+      FunctionMemoryInfo& function = (*info->mutable_function())[creating_functions[objectid]];
+      function.set_num_objects(function.num_objects() + 1);
+      function.set_num_bytes(function.num_bytes() + object.size());
+    }
+    for (size_t num_objects : num_objects_by_size) {
+      info->add_num_objects_by_size(num_objects);
+    }
+  }
+  return Status::OK;
+}
+
+void SchedulerService::deliver_object_async_if_necessary(ObjectID canonical_objectid, ObjStoreId to, bool ship_early) {
+  std::vector<ObjStoreId> from;
+  bool postponed = false;
+  {
+    auto objtable = GET(objtable_);
+    std::pair<ObjectID, ObjStoreId> replica = std::make_pair(canonical_objectid, to);
+    if (ship_early) {
+      // Another queued task is predicted to use the copy now.
+      unused_early_replicas_.erase(std::remove(unused_early_replicas_.begin(), unused_early_replicas_.end(), replica), unused_early_replicas_.end());
+    } else {
+      // The copy is needed, so it must not be deallocated.
+      early_replicas_.erase(replica);
+    }
     auto &locations = (*objtable)[canonical_objectid];
     bool object_present = std::binary_search(locations.begin(), locations.end(), to);
     auto &objects_in_flight = objects_in_transit_[to];
-    bool object_in_transit = (std::find(objects_in_flight.begin(), objects_in_flight.end(), canonical_objectid) != objects_in_flight.end());
-    object_present_or_in_transit = object_present || object_in_transit;
-    if (!object_present_or_in_transit) {
-      objects_in_flight.push_back(canonical_objectid);
+    bool object_in_transit = objects_in_flight.find(canonical_objectid) != objects_in_flight.end();
+    auto pending = pending_deliveries_.find(canonical_objectid);
+    bool delivery_pending = pending != pending_deliveries_.end() && std::find(pending->second.begin(), pending->second.end(), to) != pending->second.end();
+    if (!object_present && !object_in_transit && !delivery_pending) {
+      from = pick_objstores(canonical_objectid, objtable);
+      if (from.empty()) {
+        // The object is being broadcast and every object store that holds it
+        // is busy sending it, so we wait for one of the receivers to finish
+        // and forward the object from there.
+        pending_deliveries_[canonical_objectid].push_back(to);
+        postponed = true;
+      }
+      for (ObjStoreId objstoreid : from) {
+        num_outbound_deliveries_[objstoreid] += 1;
+      }
+      if (!from.empty()) {
+        objects_in_flight[canonical_objectid] = from;
+      }
+      if (ship_early) {
+        early_replicas_.insert(replica);
+      }
     }
   }
-  if (!object_present_or_in_transit) {
+  if (postponed) {
+    // The corresponding decrement happens in start_pending_deliveries.
+    auto reference_counts = GET(reference_counts_); // we grab this lock because increment_ref_count assumes it has been acquired
+    increment_ref_count(std::vector<ObjectID>({canonical_objectid}), reference_counts);
+  }
+  if (!from.empty()) {
     deliver_object_async(canonical_objectid, from, to);
   }
 }
 
+void SchedulerService::start_pending_deliveries(ObjectID canonical_objectid) {
+  std::vector<ObjStoreId> targets;
+  {
+    auto objtable = GET(objtable_); // to protect pending_deliveries_
+    auto pending = pending_deliveries_.find(canonical_objectid);
+    if (pending == pending_deliveries_.end()) {
+      return;
+    }
+    targets.swap(pending->second);
+    pending_deliveries_.erase(pending);
+  }
+  // Deliveries that still cannot be started are postponed again.
+  for (ObjStoreId objstoreid : targets) {
+    deliver_object_async_if_necessary(canonical_objectid, objstoreid);
+  }
+  auto reference_counts = GET(reference_counts_); // we grab this lock because decrement_ref_count assumes it has been acquired
+  auto contained_objectids = GET(contained_objectids_); // we grab this lock because decrement_ref_count assumes it has been acquired
+  decrement_ref_count(std::vector<ObjectID>(targets.size(), canonical_objectid), reference_counts, contained_objectids);
+}
+
 // TODO(rkn): This could execute multiple times with the same arguments before
 // the delivery finishes, but we only want it to happen once. Currently, the
 // redundancy is handled by the object store, which will only execute the
@@ -618,8 +1068,8 @@ void SchedulerService::deliver_object_async_if_necessary(ObjectID canonical_obje
 // future.
 //
 // deliver_object_async assumes that the aliasing for objectid has already been completed. That is, has_canonical_objectid(objectid) == true
-void SchedulerService::deliver_object_async(ObjectID canonical_objectid, ObjStoreId from, ObjStoreId to) {
-  RAY_CHECK_NEQ(from, to, "attempting to deliver canonical_objectid " << canonical_objectid << " from objstore " << from << " to itself.");
+void SchedulerService::deliver_object_async(ObjectID canonical_objectid, const std::vector<ObjStoreId>& from, ObjStoreId to) {
+  RAY_CHECK(std::find(from.begin(), from.end(), to) == from.end(), "attempting to deliver canonical_objectid " << canonical_objectid << " from objstore " << to << " to itself.");
   RAY_CHECK(is_canonical(canonical_objectid), "attempting to deliver objectid " << canonical_objectid << ", but this objectid is not a canonical objectid.");
   {
     // We increment once so the objectid doesn't go out of scope before the ObjReady
@@ -632,21 +1082,26 @@ void SchedulerService::deliver_object_async(ObjectID canonical_objectid, ObjStor
   AckReply reply;
   StartDeliveryRequest request;
   request.set_objectid(canonical_objectid);
+  {
+    auto objtable = GET(objtable_); // to protect object_sizes_
+    request.set_size(object_sizes_[canonical_objectid]);
+  }
   auto objstores = GET(objstores_);
-  request.set_objstore_address((*objstores)[from].address);
+  for (ObjStoreId objstoreid : from) {
+    request.add_objstore_address((*objstores)[objstoreid].address);
+  }
   RAY_CHECK_GRPC((*objstores)[to].objstore_stub->StartDelivery(&context, request, &reply));
 }
 
 void SchedulerService::schedule() {
+  // Forget about the operations whose outputs have been deallocated.
+  prune_computation_graph();
   // See what we can do in get_queue_
   perform_gets();
-  if (scheduling_algorithm_ == SCHEDULING_ALGORITHM_NAIVE) {
-    schedule_tasks_naively(); // See what we can do in task_queue_
-  } else if (scheduling_algorithm_ == SCHEDULING_ALGORITHM_LOCALITY_AWARE) {
-    schedule_tasks_location_aware(); // See what we can do in task_queue_
-  } else {
-    RAY_CHECK(false, "scheduling algorithm not known");
-  }
+  perform_prefetches();
+  schedule_tasks(); // See what we can do in task_queue_
+  ship_arguments_early(); // Start moving the arguments of the tasks that are still queued
+  speculate_stragglers(); // Duplicate slow tasks on the workers that are still idle
   perform_notify_aliases(); // See what we can do in alias_notification_queue_
 }
 
@@ -669,12 +1124,13 @@ void SchedulerService::assign_task(OperationId operationid, WorkerId workerid, c
       GET(alias_notification_queue_)->push_back(std::make_pair(objstoreid, std::make_pair(objectid, canonical_objectid)));
       attempt_notify_alias(objstoreid, objectid, canonical_objectid);
       RAY_LOG(RAY_DEBUG, "task contains object ref " << canonical_objectid);
-      deliver_object_async_if_necessary(canonical_objectid, pick_objstore(canonical_objectid), objstoreid);
+      deliver_object_async_if_necessary(canonical_objectid, objstoreid);
     }
   }
   {
     auto workers = GET(workers_);
     (*workers)[workerid].current_task = operationid;
+    (*workers)[workerid].task_start_time = std::chrono::steady_clock::now();
     request.mutable_task()->CopyFrom(task); // TODO(rkn): Is ownership handled properly here?
     RAY_CHECK_GRPC((*workers)[workerid].worker_stub->ExecuteTask(&context, request, &reply));
   }
@@ -719,6 +1175,7 @@ ObjectID SchedulerService::register_new_object() {
   reverse_target_objectids->push_back(std::vector<ObjectID>());
   reference_counts->push_back(0);
   contained_objectids->push_back(std::vector<ObjectID>());
+  object_sizes_.push_back(0);
   {
     // We increment once so the objectid doesn't go out of scope before the ObjReady
     // method is called. The corresponding decrement will happen either in
@@ -728,9 +1185,9 @@ ObjectID SchedulerService::register_new_object() {
   return objtable_size;
 }
 
-void SchedulerService::add_location(ObjectID canonical_objectid, ObjStoreId objstoreid) {
+void SchedulerService::add_location(ObjectID canonical_objectid, ObjStoreId objstoreid, size_t size) {
   // add_location must be called with a canonical objectid
-  RAY_CHECK_NEQ((*GET(reference_counts_))[canonical_objectid], DEALLOCATED, "Calling ObjReady with canonical_objectid " << canonical_objectid << ", but this objectid has already been deallocated");
+  RAY_CHECK_NEQ(GET(reference_counts_)->get(canonical_objectid), DEALLOCATED, "Calling ObjReady with canonical_objectid " << canonical_objectid << ", but this objectid has already been deallocated");
   RAY_CHECK(is_canonical(canonical_objectid), "Attempting to call add_location with a non-canonical objectid (objectid " << canonical_objectid << ")");
   auto objtable = GET(objtable_);
   RAY_CHECK_LT(canonical_objectid, objtable->size(), "trying to put an object in the object store that was not registered with the scheduler (objectid " << canonical_objectid << ")");
@@ -740,8 +1197,15 @@ void SchedulerService::add_location(ObjectID canonical_objectid, ObjStoreId objs
   if (pos == locations.end() || objstoreid < *pos) {
     locations.insert(pos, objstoreid);
   }
+  object_sizes_[canonical_objectid] = size;
   auto &objects_in_flight = objects_in_transit_[objstoreid];
-  objects_in_flight.erase(std::remove(objects_in_flight.begin(), objects_in_flight.end(), canonical_objectid), objects_in_flight.end());
+  auto delivery = objects_in_flight.find(canonical_objectid);
+  if (delivery != objects_in_flight.end()) {
+    for (ObjStoreId source : delivery->second) {
+      num_outbound_deliveries_[source] -= 1;
+    }
+    objects_in_flight.erase(delivery);
+  }
 }
 
 void SchedulerService::add_canonical_objectid(ObjectID objectid) {
@@ -757,6 +1221,61 @@ ObjStoreId SchedulerService::get_store(WorkerId workerid) {
   return result;
 }
 
+size_t SchedulerService::num_objstores() {
+  return GET(objstores_)->size();
+}
+
+size_t SchedulerService::num_objects_to_ship(const Task& task, ObjStoreId objstoreid) {
+  size_t num_objects = 0;
+  for (int i = 0; i < task.arg_size(); ++i) {
+    if (task.arg(i).serialized_arg().empty()) {
+      ObjectID canonical_objectid = get_canonical_objectid(task.arg(i).objectid());
+      auto objtable = GET(objtable_);
+      if (!std::binary_search((*objtable)[canonical_objectid].begin(), (*objtable)[canonical_objectid].end(), objstoreid)) {
+        num_objects += 1;
+      }
+    }
+  }
+  return num_objects;
+}
+
+size_t SchedulerService::num_bytes_to_ship(const Task& task, ObjStoreId objstoreid) {
+  size_t num_bytes = 0;
+  for (int i = 0; i < task.arg_size(); ++i) {
+    if (task.arg(i).serialized_arg().empty()) {
+      ObjectID canonical_objectid = get_canonical_objectid(task.arg(i).objectid());
+      auto objtable = GET(objtable_);
+      if (!std::binary_search((*objtable)[canonical_objectid].begin(), (*objtable)[canonical_objectid].end(), objstoreid)) {
+        num_bytes += object_sizes_[canonical_objectid];
+      }
+    }
+  }
+  return num_bytes;
+}
+
+size_t SchedulerService::num_busy_workers(ObjStoreId objstoreid) {
+  auto workers = GET(workers_);
+  size_t num_busy = 0;
+  for (const WorkerHandle& worker : *workers) {
+    if (worker.worker_stub && worker.objstoreid == objstoreid && worker.current_task != NO_OPERATION && worker.current_task != ROOT_OPERATION) {
+      num_busy += 1;
+    }
+  }
+  return num_busy;
+}
+
+SchedulingPolicy& SchedulerService::scheduling_policy() {
+  return *scheduling_policy_;
+}
+
+std::chrono::milliseconds SchedulerService::rescheduling_interval() {
+  std::chrono::milliseconds interval = scheduling_policy_->rescheduling_interval();
+  if (speculation_options_.enabled && (interval.count() == 0 || interval > SPECULATION_CHECK_INTERVAL)) {
+    interval = SPECULATION_CHECK_INTERVAL;
+  }
+  return interval;
+}
+
 void SchedulerService::register_function(const std::string& name, WorkerId workerid, size_t num_return_vals) {
   auto fntable = GET(fntable_);
   FnInfo& info = (*fntable)[name];
@@ -765,21 +1284,33 @@ void SchedulerService::register_function(const std::string& name, WorkerId worke
 }
 
 void SchedulerService::get_info(const SchedulerInfoRequest& request, SchedulerInfoReply* reply) {
-  auto computation_graph = GET(computation_graph_);
   auto fntable = GET(fntable_);
   auto avail_workers = GET(avail_workers_);
   auto task_queue = GET(task_queue_);
   auto reference_counts = GET(reference_counts_);
+  auto speculations = GET(speculations_);
   auto objstores = GET(objstores_);
   auto target_objectids = GET(target_objectids_);
   auto function_table = reply->mutable_function_table();
-  // Return info about the reference counts.
-  for (int i = 0; i < reference_counts->size(); ++i) {
-    reply->add_reference_count((*reference_counts)[i]);
+  // Return info about speculative execution.
+  reply->set_num_speculative_executions(speculations->num_started);
+  reply->set_num_speculative_executions_won(speculations->num_won);
+  // Return info about the reference counts. Only the objects that have not
+  // been deallocated are included, so the size of the reply does not grow with
+  // the number of objects that have ever been created.
+  auto reference_count = reply->mutable_reference_count();
+  for (const auto& entry : *reference_counts) {
+    if (entry.second != DEALLOCATED) {
+      (*reference_count)[entry.first] = entry.second;
+    }
   }
-  // Return info about the target objectids.
-  for (int i = 0; i < target_objectids->size(); ++i) {
-    reply->add_target_objectid((*target_objectids)[i]);
+  reply->set_num_live_objects(reference_counts->num_live());
+  // Return info about the target objectids of the aliased objects.
+  auto target_objectid = reply->mutable_target_objectid();
+  for (const auto& entry : *target_objectids) {
+    if (entry.second != UNITIALIZED_ALIAS && reference_counts->get(entry.first) != DEALLOCATED) {
+      (*target_objectid)[entry.first] = entry.second;
+    }
   }
   // Return info about the function table.
   for (const auto& entry : *fntable) {
@@ -796,8 +1327,6 @@ void SchedulerService::get_info(const SchedulerInfoRequest& request, SchedulerIn
   for (const WorkerId& entry : *avail_workers) {
     reply->add_avail_worker(entry);
   }
-  // Return info about the computation graph.
-  computation_graph->to_protobuf(reply->mutable_computation_graph());
   // Return info about the object stores.
   for (int i = 0; i < objstores->size(); ++i) {
     ObjstoreData* objstore_data = reply->add_objstore();
@@ -806,14 +1335,39 @@ void SchedulerService::get_info(const SchedulerInfoRequest& request, SchedulerIn
   }
 }
 
-// pick_objstore must be called with a canonical_objectid
-ObjStoreId SchedulerService::pick_objstore(ObjectID canonical_objectid) {
-  std::mt19937 rng;
-  RAY_CHECK(is_canonical(canonical_objectid), "Attempting to call pick_objstore with a non-canonical objectid, (objectid " << canonical_objectid << ")");
-  auto objtable = GET(objtable_);
-  std::uniform_int_distribution<int> uni(0, (*objtable)[canonical_objectid].size() - 1);
-  ObjStoreId objstoreid = (*objtable)[canonical_objectid][uni(rng)];
-  return objstoreid;
+// pick_objstores must be called with a canonical_objectid
+std::vector<ObjStoreId> SchedulerService::pick_objstores(ObjectID canonical_objectid, const MySynchronizedPtr<ObjTable> &objtable) {
+  RAY_CHECK(is_canonical(canonical_objectid), "Attempting to call pick_objstores with a non-canonical objectid, (objectid " << canonical_objectid << ")");
+  std::vector<ObjStoreId> objstoreids = (*objtable)[canonical_objectid];
+  RAY_CHECK(!objstoreids.empty(), "Attempting to call pick_objstores with objectid " << canonical_objectid << ", which is not present in any object store");
+  if (object_sizes_[canonical_objectid] >= BROADCAST_MIN_SIZE) {
+    // Leave out the object stores that are already sending this object to
+    // MAX_BROADCAST_FANOUT other object stores. When a large object is needed
+    // everywhere, this spreads the deliveries over the object stores that have
+    // received it, so the number of copies doubles every round instead of
+    // growing by one.
+    std::unordered_map<ObjStoreId, size_t> num_deliveries;
+    for (const auto &objects_in_flight : objects_in_transit_) {
+      auto delivery = objects_in_flight.find(canonical_objectid);
+      if (delivery != objects_in_flight.end()) {
+        for (ObjStoreId source : delivery->second) {
+          num_deliveries[source] += 1;
+        }
+      }
+    }
+    objstoreids.erase(std::remove_if(objstoreids.begin(), objstoreids.end(), [&num_deliveries](ObjStoreId objstoreid) {
+      return num_deliveries[objstoreid] >= MAX_BROADCAST_FANOUT;
+    }), objstoreids.end());
+  }
+  // Shuffle first so that the ties between equally busy object stores are
+  // broken at random.
+  std::shuffle(objstoreids.begin(), objstoreids.end(), rng_);
+  std::stable_sort(objstoreids.begin(), objstoreids.end(), [this](ObjStoreId a, ObjStoreId b) {
+    return num_outbound_deliveries_[a] < num_outbound_deliveries_[b];
+  });
+  size_t num_sources = object_sizes_[canonical_objectid] >= STRIPED_DELIVERY_MIN_SIZE ? MAX_DELIVERY_SOURCES : 1;
+  objstoreids.resize(std::min(objstoreids.size(), num_sources));
+  return objstoreids;
 }
 
 bool SchedulerService::is_canonical(ObjectID objectid) {
@@ -838,7 +1392,7 @@ void SchedulerService::perform_gets() {
     RAY_LOG(RAY_DEBUG, "attempting to get objectid " << get_request.second << " with canonical objectid " << canonical_objectid << " to objstore " << objstoreid);
     int num_stores = (*GET(objtable_))[canonical_objectid].size();
     if (num_stores > 0) {
-      deliver_object_async_if_necessary(canonical_objectid, pick_objstore(canonical_objectid), objstoreid);
+      deliver_object_async_if_necessary(canonical_objectid, objstoreid);
       // Notify the relevant objstore about potential aliasing when it's ready
       GET(alias_notification_queue_)->push_back(std::make_pair(objstoreid, std::make_pair(objectid, canonical_objectid)));
       // Remove the get task from the queue
@@ -849,82 +1403,460 @@ void SchedulerService::perform_gets() {
   }
 }
 
-void SchedulerService::schedule_tasks_naively() {
-  auto computation_graph = GET(computation_graph_);
-  auto fntable = GET(fntable_);
-  auto avail_workers = GET(avail_workers_);
-  auto task_queue = GET(task_queue_);
-  for (int i = 0; i < avail_workers->size(); ++i) {
-    // Submit all tasks whose arguments are ready.
-    WorkerId workerid = (*avail_workers)[i];
-    for (auto it = task_queue->begin(); it != task_queue->end(); ++it) {
-      // The use of erase(it) below invalidates the iterator, but we
-      // immediately break out of the inner loop, so the iterator is not used
-      // after the erase
-      const OperationId operationid = *it;
-      const Task& task = computation_graph->get_task(operationid);
-      auto& workers = (*fntable)[task.name()].workers();
-      if (std::binary_search(workers.begin(), workers.end(), workerid) && can_run(task)) {
-        assign_task(operationid, workerid, computation_graph);
-        task_queue->erase(it);
-        std::swap((*avail_workers)[i], (*avail_workers)[avail_workers->size() - 1]);
-        avail_workers->pop_back();
-        i -= 1;
-        break;
+void SchedulerService::perform_prefetches() {
+  std::vector<ObjectID> released_objectids;
+  {
+    auto prefetch_queue = GET(prefetch_queue_);
+    for (int i = 0; i < prefetch_queue->size(); ++i) {
+      const PendingPrefetch& prefetch = (*prefetch_queue)[i];
+      if (!has_canonical_objectid(prefetch.objectid)) {
+        continue;
       }
+      ObjectID canonical_objectid = get_canonical_objectid(prefetch.objectid);
+      if ((*GET(objtable_))[canonical_objectid].size() == 0) {
+        continue;
+      }
+      ObjStoreId objstoreid = prefetch.objstoreid;
+      if (prefetch.placement_hint != NO_PLACEMENT_HINT) {
+        // Copy the object next to placement_hint once we know where that is.
+        if (!has_canonical_objectid(prefetch.placement_hint)) {
+          continue;
+        }
+        ObjectID canonical_placement_hint = get_canonical_objectid(prefetch.placement_hint);
+        auto objtable = GET(objtable_);
+        const std::vector<ObjStoreId> &locations = (*objtable)[canonical_placement_hint];
+        if (locations.size() == 0) {
+          continue;
+        }
+        objstoreid = locations[0];
+        released_objectids.push_back(prefetch.placement_hint);
+      }
+      released_objectids.push_back(prefetch.objectid);
+      deliver_object_async_if_necessary(canonical_objectid, objstoreid);
+      std::swap((*prefetch_queue)[i], (*prefetch_queue)[prefetch_queue->size() - 1]);
+      prefetch_queue->pop_back();
+      i -= 1;
     }
   }
+  if (!released_objectids.empty()) {
+    // The corresponding increments are done in Prefetch and Broadcast. The
+    // deliveries that were started hold references of their own.
+    auto reference_counts = GET(reference_counts_); // we grab this lock because decrement_ref_count assumes it has been acquired
+    auto contained_objectids = GET(contained_objectids_); // we grab this lock because decrement_ref_count assumes it has been acquired
+    decrement_ref_count(released_objectids, reference_counts, contained_objectids);
+  }
 }
 
-void SchedulerService::schedule_tasks_location_aware() {
+class SchedulerService::PolicyState : public SchedulingState {
+public:
+  // The scheduler passes in the data structures that it has locked.
+  PolicyState(SchedulerService* scheduler, const MySynchronizedPtr<ComputationGraph> &computation_graph, const MySynchronizedPtr<FnTable> &fntable, const MySynchronizedPtr<std::vector<WorkerId> > &avail_workers, const MySynchronizedPtr<std::deque<OperationId> > &task_queue)
+    : scheduler_(scheduler), computation_graph_(computation_graph), fntable_(fntable), avail_workers_(avail_workers), task_queue_(task_queue) {}
+  const std::deque<OperationId>& task_queue() override {
+    return *task_queue_;
+  }
+  const std::vector<WorkerId>& available_workers() override {
+    return *avail_workers_;
+  }
+  const Task& get_task(OperationId operationid) override {
+    return computation_graph_->get_task(operationid);
+  }
+  bool arguments_ready(OperationId operationid) override {
+    return scheduler_->can_run(get_task(operationid));
+  }
+  bool function_registered(OperationId operationid, WorkerId workerid) override {
+    auto& workers = (*fntable_)[get_task(operationid).name()].workers();
+    return std::binary_search(workers.begin(), workers.end(), workerid);
+  }
+  ObjStoreId get_store(WorkerId workerid) override {
+    return scheduler_->get_store(workerid);
+  }
+  size_t num_objstores() override {
+    return scheduler_->num_objstores();
+  }
+  size_t num_objects_to_ship(OperationId operationid, ObjStoreId objstoreid) override {
+    return scheduler_->num_objects_to_ship(get_task(operationid), objstoreid);
+  }
+  size_t num_bytes_to_ship(OperationId operationid, ObjStoreId objstoreid) override {
+    return scheduler_->num_bytes_to_ship(get_task(operationid), objstoreid);
+  }
+  size_t num_busy_workers(ObjStoreId objstoreid) override {
+    return scheduler_->num_busy_workers(objstoreid);
+  }
+private:
+  SchedulerService* scheduler_;
+  const MySynchronizedPtr<ComputationGraph> &computation_graph_;
+  const MySynchronizedPtr<FnTable> &fntable_;
+  const MySynchronizedPtr<std::vector<WorkerId> > &avail_workers_;
+  const MySynchronizedPtr<std::deque<OperationId> > &task_queue_;
+};
+
+void SchedulerService::schedule_tasks() {
   auto computation_graph = GET(computation_graph_);
   auto fntable = GET(fntable_);
   auto avail_workers = GET(avail_workers_);
   auto task_queue = GET(task_queue_);
-  for (int i = 0; i < avail_workers->size(); ++i) {
-    // Submit all tasks whose arguments are ready.
-    WorkerId workerid = (*avail_workers)[i];
-    ObjStoreId objstoreid = get_store(workerid);
-    auto bestit = task_queue->end(); // keep track of the task that fits the worker best so far
-    size_t min_num_shipped_objects = std::numeric_limits<size_t>::max(); // number of objects that need to be transfered for this worker
-    for (auto it = task_queue->begin(); it != task_queue->end(); ++it) {
-      OperationId operationid = *it;
+  if (avail_workers->empty() || task_queue->empty()) {
+    return;
+  }
+  std::vector<std::pair<OperationId, WorkerId> > assignments;
+  {
+    PolicyState state(this, computation_graph, fntable, avail_workers, task_queue);
+    scheduling_policy_->schedule(state, assignments);
+  }
+  for (const auto& assignment : assignments) {
+    OperationId operationid = assignment.first;
+    WorkerId workerid = assignment.second;
+    auto task_it = std::find(task_queue->begin(), task_queue->end(), operationid);
+    auto worker_it = std::find(avail_workers->begin(), avail_workers->end(), workerid);
+    RAY_CHECK(task_it != task_queue->end(), "The scheduling policy assigned operationid " << operationid << ", which is not in the task queue.");
+    RAY_CHECK(worker_it != avail_workers->end(), "The scheduling policy assigned a task to worker " << workerid << ", which is not available.");
+    assign_task(operationid, workerid, computation_graph);
+    task_queue->erase(task_it);
+    std::swap(*worker_it, avail_workers->back());
+    avail_workers->pop_back();
+  }
+}
+
+void SchedulerService::ship_arguments_early() {
+  if (early_shipping_budget_ == 0) {
+    return;
+  }
+  {
+    auto computation_graph = GET(computation_graph_);
+    auto fntable = GET(fntable_);
+    auto task_queue = GET(task_queue_);
+    size_t num_stores = num_objstores();
+    early_shipping_bytes_.resize(num_stores, 0);
+    // Forget the predictions for the tasks that have left the queue. Their
+    // arguments are not counted against the budget anymore, no matter whether
+    // the task ran where we predicted. If it ran elsewhere, the copies that were
+    // shipped for it are deallocated by deallocate_unused_early_replicas unless
+    // something else needs them or another queued task is predicted to use them.
+    std::unordered_set<OperationId> queued_tasks(task_queue->begin(), task_queue->end());
+    std::vector<std::pair<ObjectID, ObjStoreId> > released;
+    for (auto shipment = early_shipments_.begin(); shipment != early_shipments_.end(); ) {
+      if (queued_tasks.count(shipment->first) == 0) {
+        early_shipping_bytes_[shipment->second.objstoreid] -= shipment->second.num_bytes;
+        for (ObjectID canonical_objectid : shipment->second.objectids) {
+          released.push_back(std::make_pair(canonical_objectid, shipment->second.objstoreid));
+        }
+        shipment = early_shipments_.erase(shipment);
+      } else {
+        ++shipment;
+      }
+    }
+    if (!released.empty()) {
+      std::set<std::pair<ObjectID, ObjStoreId> > predicted;
+      for (const auto& shipment : early_shipments_) {
+        for (ObjectID canonical_objectid : shipment.second.objectids) {
+          predicted.insert(std::make_pair(canonical_objectid, shipment.second.objstoreid));
+        }
+      }
+      auto objtable = GET(objtable_); // to protect unused_early_replicas_
+      for (const auto& replica : released) {
+        if (predicted.count(replica) == 0 && std::find(unused_early_replicas_.begin(), unused_early_replicas_.end(), replica) == unused_early_replicas_.end()) {
+          unused_early_replicas_.push_back(replica);
+        }
+      }
+    }
+    // Every object store is expected to run at most one queued task per worker
+    // next, so we do not predict more tasks for an object store than it has
+    // workers that can run them.
+    std::vector<size_t> num_predicted(num_stores, 0);
+    for (const auto& shipment : early_shipments_) {
+      num_predicted[shipment.second.objstoreid] += 1;
+    }
+    size_t num_workers = GET(workers_)->size();
+    for (OperationId operationid : *task_queue) {
+      if (early_shipments_.size() >= num_workers) {
+        break;
+      }
+      if (early_shipments_.find(operationid) != early_shipments_.end()) {
+        continue;
+      }
       const Task& task = computation_graph->get_task(operationid);
-      auto& workers = (*fntable)[task.name()].workers();
-      if (std::binary_search(workers.begin(), workers.end(), workerid) && can_run(task)) {
-        // determine how many objects would need to be shipped
-        size_t num_shipped_objects = 0;
-        for (int j = 0; j < task.arg_size(); ++j) {
-          if (task.arg(j).serialized_arg().empty()) {
-            ObjectID objectid = task.arg(j).objectid();
-            RAY_CHECK(has_canonical_objectid(objectid), "no canonical object ref found even though task is ready; that should not be possible!");
-            ObjectID canonical_objectid = get_canonical_objectid(objectid);
-            {
-              // check if the object is already in the local object store
-              auto objtable = GET(objtable_);
-              if (!std::binary_search((*objtable)[canonical_objectid].begin(), (*objtable)[canonical_objectid].end(), objstoreid)) {
-                num_shipped_objects += 1;
-              }
-            }
+      auto fninfo = fntable->find(task.name());
+      if (fninfo == fntable->end() || !can_run(task)) {
+        continue;
+      }
+      std::vector<size_t> num_capable_workers(num_stores, 0);
+      for (WorkerId workerid : fninfo->second.workers()) {
+        num_capable_workers[get_store(workerid)] += 1;
+      }
+      // Predict that the task runs on the object store that needs the fewest
+      // bytes shipped, like the locality aware scheduling policies would.
+      ObjStoreId prediction = num_stores;
+      size_t min_bytes = std::numeric_limits<size_t>::max();
+      for (ObjStoreId objstoreid = 0; objstoreid < num_stores; ++objstoreid) {
+        if (num_predicted[objstoreid] >= num_capable_workers[objstoreid]) {
+          continue;
+        }
+        size_t num_bytes = num_bytes_to_ship(task, objstoreid);
+        if (num_bytes < min_bytes) {
+          min_bytes = num_bytes;
+          prediction = objstoreid;
+        }
+      }
+      if (prediction == num_stores || early_shipping_bytes_[prediction] + min_bytes > early_shipping_budget_) {
+        continue;
+      }
+      num_predicted[prediction] += 1;
+      EarlyShipment& shipment = early_shipments_[operationid];
+      shipment.objstoreid = prediction;
+      shipment.num_bytes = min_bytes;
+      early_shipping_bytes_[prediction] += min_bytes;
+      // The deliveries are started while we hold the lock on task_queue_, so
+      // that the task cannot be assigned to a worker in the meantime.
+      for (int i = 0; i < task.arg_size(); ++i) {
+        if (task.arg(i).serialized_arg().empty()) {
+          ObjectID canonical_objectid = get_canonical_objectid(task.arg(i).objectid());
+          shipment.objectids.push_back(canonical_objectid);
+          deliver_object_async_if_necessary(canonical_objectid, prediction, true);
+        }
+      }
+    }
+  }
+  deallocate_unused_early_replicas();
+}
+
+void SchedulerService::deallocate_unused_early_replicas() {
+  {
+    auto objtable = GET(objtable_); // to protect unused_early_replicas_
+    if (unused_early_replicas_.empty()) {
+      return;
+    }
+  }
+  // A worker that has asked for an object may read it from its object store as
+  // soon as it is there, so we keep the copies that queued gets refer to. We
+  // hold the lock on get_queue_ so that no new gets arrive in the meantime.
+  auto get_queue = GET(get_queue_);
+  std::set<std::pair<ObjectID, ObjStoreId> > requested;
+  for (const auto& get_request : *get_queue) {
+    if (has_canonical_objectid(get_request.second)) {
+      requested.insert(std::make_pair(get_canonical_objectid(get_request.second), get_store(get_request.first)));
+    }
+  }
+  auto reference_counts = GET(reference_counts_);
+  auto objtable = GET(objtable_);
+  auto objstores = GET(objstores_);
+  for (int i = 0; i < unused_early_replicas_.size(); ++i) {
+    const std::pair<ObjectID, ObjStoreId> replica = unused_early_replicas_[i];
+    ObjectID canonical_objectid = replica.first;
+    ObjStoreId objstoreid = replica.second;
+    bool keep = false;
+    if (reference_counts->get(canonical_objectid) != DEALLOCATED && early_replicas_.count(replica) > 0) {
+      auto &locations = (*objtable)[canonical_objectid];
+      auto location = std::lower_bound(locations.begin(), locations.end(), objstoreid);
+      bool object_present = location != locations.end() && *location == objstoreid;
+      if (object_present) {
+        // The copy stays if it is the only one or if another object store is
+        // copying the object from it.
+        bool is_source = false;
+        for (const auto& objects_in_flight : objects_in_transit_) {
+          auto in_flight = objects_in_flight.find(canonical_objectid);
+          if (in_flight != objects_in_flight.end() && std::find(in_flight->second.begin(), in_flight->second.end(), objstoreid) != in_flight->second.end()) {
+            is_source = true;
           }
         }
-        if (num_shipped_objects < min_num_shipped_objects) {
-          min_num_shipped_objects = num_shipped_objects;
-          bestit = it;
+        keep = requested.count(replica) > 0 || locations.size() < 2 || is_source;
+        if (!keep) {
+          RAY_LOG(RAY_REFCOUNT, "Deallocating the copy of canonical_objectid " << canonical_objectid << " in objstore " << objstoreid << ", which was shipped for a task that ran elsewhere");
+          ClientContext context;
+          AckReply reply;
+          DeallocateObjectRequest request;
+          request.set_canonical_objectid(canonical_objectid);
+          RAY_CHECK_GRPC((*objstores)[objstoreid].objstore_stub->DeallocateObject(&context, request, &reply));
+          locations.erase(location);
         }
+      } else {
+        // Wait for the copy to arrive unless it is not coming anymore.
+        auto pending = pending_deliveries_.find(canonical_objectid);
+        bool delivery_pending = pending != pending_deliveries_.end() && std::find(pending->second.begin(), pending->second.end(), objstoreid) != pending->second.end();
+        keep = objects_in_transit_[objstoreid].count(canonical_objectid) > 0 || delivery_pending;
       }
     }
-    // if we found a suitable task
-    if (bestit != task_queue->end()) {
-      assign_task(*bestit, workerid, computation_graph);
-      task_queue->erase(bestit);
-      std::swap((*avail_workers)[i], (*avail_workers)[avail_workers->size() - 1]);
-      avail_workers->pop_back();
+    if (!keep) {
+      early_replicas_.erase(replica);
+      std::swap(unused_early_replicas_[i], unused_early_replicas_.back());
+      unused_early_replicas_.pop_back();
       i -= 1;
     }
   }
 }
 
+void SchedulerService::speculate_stragglers() {
+  if (!speculation_options_.enabled) {
+    return;
+  }
+  auto computation_graph = GET(computation_graph_);
+  auto fntable = GET(fntable_);
+  auto avail_workers = GET(avail_workers_);
+  if (avail_workers->empty()) {
+    return;
+  }
+  // Find the tasks that have been running for much longer than the previous
+  // tasks of the same remote function.
+  std::vector<OperationId> stragglers;
+  {
+    auto now = std::chrono::steady_clock::now();
+    auto workers = GET(workers_);
+    auto task_runtimes = GET(task_runtimes_);
+    auto speculations = GET(speculations_);
+    for (const WorkerHandle& worker : *workers) {
+      OperationId operationid = worker.current_task;
+      if (!worker.worker_stub || operationid == NO_OPERATION || operationid == ROOT_OPERATION || speculations->running.count(operationid) > 0) {
+        continue;
+      }
+      auto runtimes = task_runtimes->find(computation_graph->get_task(operationid).name());
+      if (runtimes == task_runtimes->end() || runtimes->second.size() < speculation_options_.min_samples) {
+        continue;
+      }
+      if (now - worker.task_start_time > speculation_options_.multiplier * runtimes->second.percentile(speculation_options_.percentile)) {
+        stragglers.push_back(operationid);
+      }
+    }
+  }
+  for (OperationId operationid : stragglers) {
+    const Task& task = computation_graph->get_task(operationid);
+    auto& workers = (*fntable)[task.name()].workers();
+    auto worker_it = std::find_if(avail_workers->begin(), avail_workers->end(), [&workers](WorkerId workerid) {
+      return std::binary_search(workers.begin(), workers.end(), workerid);
+    });
+    if (worker_it == avail_workers->end()) {
+      continue;
+    }
+    std::vector<ObjectID> arguments;
+    for (int i = 0; i < task.arg_size(); ++i) {
+      if (task.arg(i).serialized_arg().empty()) {
+        arguments.push_back(task.arg(i).objectid());
+      }
+    }
+    {
+      // The corresponding decrements happen in deserialize_task in raylib.
+      auto reference_counts = GET(reference_counts_);
+      bool arguments_alive = std::all_of(arguments.begin(), arguments.end(), [&reference_counts](ObjectID objectid) {
+        return reference_counts->get(objectid) != DEALLOCATED;
+      });
+      if (!arguments_alive) {
+        // The original task has finished and released its arguments.
+        continue;
+      }
+      increment_ref_count(arguments, reference_counts);
+    }
+    // The copy writes its results to new object IDs so that the two executions
+    // do not interfere with each other.
+    SpeculativeExecution execution;
+    execution.original = operationid;
+    execution.resolved = false;
+    execution.results.assign(task.result().begin(), task.result().end());
+    std::unique_ptr<Task> copy(new Task(task));
+    copy->clear_result();
+    for (int i = 0; i < task.result_size(); ++i) {
+      ObjectID result = register_new_object();
+      copy->add_result(result);
+      execution.copy_results.push_back(result);
+    }
+    {
+      auto reference_counts = GET(reference_counts_);
+      // The corresponding decrement happens in deserialize_task in raylib.
+      increment_ref_count(execution.copy_results, reference_counts);
+      // The corresponding decrement happens in finish_speculative_execution.
+      increment_ref_count(execution.copy_results, reference_counts);
+    }
+    auto operation = std::unique_ptr<Operation>(new Operation());
+    operation->set_allocated_task(copy.release());
+    operation->set_creator_operationid(computation_graph->get_creator_operationid(operationid));
+    execution.copy = computation_graph->add_operation(std::move(operation));
+    {
+      auto speculations = GET(speculations_);
+      speculations->running[execution.original] = execution;
+      speculations->running[execution.copy] = execution;
+      speculations->num_started += 1;
+    }
+    WorkerId workerid = *worker_it;
+    avail_workers->erase(worker_it);
+    RAY_LOG(RAY_INFO, "operation " << operationid << " is a straggler, starting a copy with operationid " << execution.copy << " on worker " << workerid);
+    assign_task(execution.copy, workerid, computation_graph);
+  }
+}
+
+void SchedulerService::finish_speculative_execution(OperationId operationid) {
+  SpeculativeExecution execution;
+  {
+    auto speculations = GET(speculations_);
+    auto it = speculations->running.find(operationid);
+    if (it == speculations->running.end()) {
+      return;
+    }
+    execution = it->second;
+    speculations->running.erase(it);
+    if (execution.resolved) {
+      // The other execution finished first.
+      return;
+    }
+    OperationId other_operationid = (operationid == execution.original) ? execution.copy : execution.original;
+    auto other = speculations->running.find(other_operationid);
+    if (other != speculations->running.end()) {
+      other->second.resolved = true;
+    }
+    if (operationid == execution.copy) {
+      speculations->num_won += 1;
+    }
+  }
+  if (operationid == execution.copy) {
+    RAY_LOG(RAY_INFO, "the copy with operationid " << execution.copy << " of operation " << execution.original << " finished first");
+    for (size_t i = 0; i < execution.results.size(); ++i) {
+      supersede_objectid(execution.results[i], execution.copy_results[i]);
+    }
+  }
+  // The corresponding increment was done in speculate_stragglers.
+  auto reference_counts = GET(reference_counts_);
+  auto contained_objectids = GET(contained_objectids_);
+  decrement_ref_count(execution.copy_results, reference_counts, contained_objectids);
+}
+
+void SchedulerService::supersede_objectid(ObjectID objectid, ObjectID target_objectid) {
+  auto reference_counts = GET(reference_counts_);
+  auto contained_objectids = GET(contained_objectids_);
+  {
+    auto speculations = GET(speculations_);
+    auto target_objectids = GET(target_objectids_);
+    if (reference_counts->get(objectid) == DEALLOCATED || (*target_objectids)[objectid] != UNITIALIZED_ALIAS) {
+      // The original task has already created this result.
+      return;
+    }
+    RAY_LOG(RAY_ALIAS, "Aliasing superseded objectid " << objectid << " with objectid " << target_objectid);
+    (*target_objectids)[objectid] = target_objectid;
+    (*GET(reverse_target_objectids_))[target_objectid].push_back(objectid);
+    speculations->superseded_objectids[objectid];
+  }
+  // The corresponding increment was done in register_new_object.
+  decrement_ref_count(std::vector<ObjectID>({objectid}), reference_counts, contained_objectids);
+}
+
+void SchedulerService::deallocate_superseded_copy(ObjectID objectid, ObjStoreId objstoreid) {
+  RAY_LOG(RAY_REFCOUNT, "Deallocating the redundant copy of superseded objectid " << objectid << " from objstore " << objstoreid);
+  ClientContext context;
+  AckReply reply;
+  DeallocateObjectRequest request;
+  request.set_canonical_objectid(objectid);
+  auto objstores = GET(objstores_);
+  RAY_CHECK_GRPC((*objstores)[objstoreid].objstore_stub->DeallocateObject(&context, request, &reply));
+}
+
+void SchedulerService::prune_computation_graph() {
+  std::vector<ObjectID> deallocated_objectids;
+  GET(deallocated_objectids_)->swap(deallocated_objectids);
+  if (deallocated_objectids.empty()) {
+    return;
+  }
+  auto computation_graph = GET(computation_graph_);
+  for (ObjectID objectid : deallocated_objectids) {
+    computation_graph->object_deallocated(objectid);
+  }
+}
+
 void SchedulerService::perform_notify_aliases() {
   auto alias_notification_queue = GET(alias_notification_queue_);
   for (int i = 0; i < alias_notification_queue->size(); ++i) {
@@ -979,6 +1911,10 @@ bool SchedulerService::attempt_notify_alias(ObjStoreId objstoreid, ObjectID alia
   }
   {
     auto objtable = GET(objtable_);
+    if (!objtable->contains(canonical_objectid)) {
+      // the object has been deallocated and reclaimed in the meantime, so there is nothing left to notify the objstore about
+      return true;
+    }
     if (!std::binary_search((*objtable)[canonical_objectid].begin(), (*objtable)[canonical_objectid].end(), objstoreid)) {
       // the objstore doesn't have the object for canonical_objectid yet, so it's too early to notify the objstore about the alias
       return false;
@@ -993,7 +1929,7 @@ bool SchedulerService::attempt_notify_alias(ObjStoreId objstoreid, ObjectID alia
   return true;
 }
 
-void SchedulerService::deallocate_object(ObjectID canonical_objectid, const MySynchronizedPtr<std::vector<RefCount> > &reference_counts, const MySynchronizedPtr<std::vector<std::vector<ObjectID> > > &contained_objectids) {
+void SchedulerService::deallocate_object(ObjectID canonical_objectid, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_counts, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &contained_objectids) {
   // deallocate_object should only be called from decrement_ref_count (note that
   // deallocate_object also recursively calls decrement_ref_count). Both of
   // these methods take reference_counts and contained_objectids as argumens,
@@ -1021,26 +1957,26 @@ void SchedulerService::deallocate_object(ObjectID canonical_objectid, const MySy
   decrement_ref_count((*contained_objectids)[canonical_objectid], reference_counts, contained_objectids);
 }
 
-void SchedulerService::increment_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<std::vector<RefCount> > &reference_counts) {
+void SchedulerService::increment_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_counts) {
   // increment_ref_count takes reference_counts as an argument, which is
   // obtained by GET(reference_counts_), so we know that the data structure has
   // been locked
   for (int i = 0; i < objectids.size(); ++i) {
     ObjectID objectid = objectids[i];
-    RAY_CHECK_NEQ((*reference_counts)[objectid], DEALLOCATED, "Attempting to increment the reference count for objectid " << objectid << ", but this object appears to have been deallocated already.");
+    RAY_CHECK_NEQ(reference_counts->get(objectid), DEALLOCATED, "Attempting to increment the reference count for objectid " << objectid << ", but this object appears to have been deallocated already.");
     (*reference_counts)[objectid] += 1;
     RAY_LOG(RAY_REFCOUNT, "Incremented ref count for objectid " << objectid <<". New reference count is " << (*reference_counts)[objectid]);
   }
 }
 
-void SchedulerService::decrement_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<std::vector<RefCount> > &reference_counts, const MySynchronizedPtr<std::vector<std::vector<ObjectID> > > &contained_objectids) {
+void SchedulerService::decrement_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_counts, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &contained_objectids) {
   // decrement_ref_count takes reference_counts and contained_objectids as
   // arguments, which are obtained by GET(reference_counts_) and
   // GET(contained_objectids_), so we know that those data structures have been
   // locked
   for (int i = 0; i < objectids.size(); ++i) {
     ObjectID objectid = objectids[i];
-    RAY_CHECK_NEQ((*reference_counts)[objectid], DEALLOCATED, "Attempting to decrement the reference count for objectid " << objectid << ", but this object appears to have been deallocated already.");
+    RAY_CHECK_NEQ(reference_counts->get(objectid), DEALLOCATED, "Attempting to decrement the reference count for objectid " << objectid << ", but this object appears to have been deallocated already.");
     RAY_CHECK_NEQ((*reference_counts)[objectid], 0, "Attempting to decrement the reference count for objectid " << objectid << ", but the reference count for this object is already 0.");
     (*reference_counts)[objectid] -= 1;
     RAY_LOG(RAY_REFCOUNT, "Decremented ref count for objectid " << objectid << ". New reference count is " << (*reference_counts)[objectid]);
@@ -1058,14 +1994,49 @@ void SchedulerService::decrement_ref_count(const std::vector<ObjectID> &objectid
       ObjectID canonical_objectid = equivalent_objectids[0];
       RAY_CHECK(is_canonical(canonical_objectid), "canonical_objectid is not canonical.");
       deallocate_object(canonical_objectid, reference_counts, contained_objectids);
-      for (int j = 0; j < equivalent_objectids.size(); ++j) {
-        (*reference_counts)[equivalent_objectids[j]] = DEALLOCATED;
+      reclaim_objectids(equivalent_objectids, reference_counts, contained_objectids);
+    }
+  }
+}
+
+void SchedulerService::reclaim_objectids(const std::vector<ObjectID> &equivalent_objectids, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_counts, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &contained_objectids) {
+  // reclaim_objectids takes reference_counts and contained_objectids as
+  // arguments, which are obtained by GET(reference_counts_) and
+  // GET(contained_objectids_), so we know that those data structures have been
+  // locked. After this, reference_counts->get(objectid) returns DEALLOCATED for
+  // each of the equivalent objectids.
+  {
+    // Deallocate the redundant copies of objects written by tasks whose
+    // speculative copy finished first.
+    auto speculations = GET(speculations_);
+    for (ObjectID objectid : equivalent_objectids) {
+      auto superseded = speculations->superseded_objectids.find(objectid);
+      if (superseded != speculations->superseded_objectids.end()) {
+        for (ObjStoreId objstoreid : superseded->second) {
+          deallocate_superseded_copy(objectid, objstoreid);
+        }
+        speculations->superseded_objectids.erase(superseded);
       }
     }
   }
+  auto objtable = GET(objtable_);
+  auto target_objectids = GET(target_objectids_);
+  auto reverse_target_objectids = GET(reverse_target_objectids_);
+  auto deallocated_objectids = GET(deallocated_objectids_);
+  for (int i = 0; i < equivalent_objectids.size(); ++i) {
+    ObjectID objectid = equivalent_objectids[i];
+    RAY_LOG(RAY_REFCOUNT, "Reclaiming the scheduler metadata for objectid " << objectid << ".");
+    reference_counts->erase(objectid);
+    contained_objectids->erase(objectid);
+    objtable->erase(objectid);
+    object_sizes_.erase(objectid);
+    target_objectids->erase(objectid);
+    reverse_target_objectids->erase(objectid);
+    deallocated_objectids->push_back(objectid);
+  }
 }
 
-void SchedulerService::upstream_objectids(ObjectID objectid, std::vector<ObjectID> &objectids, const MySynchronizedPtr<std::vector<std::vector<ObjectID> > > &reverse_target_objectids) {
+void SchedulerService::upstream_objectids(ObjectID objectid, std::vector<ObjectID> &objectids, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &reverse_target_objectids) {
   // upstream_objectids takes reverse_target_objectids as an argument, which is
   // obtained by GET(reverse_target_objectids_), so we know the data structure
   // has been locked.
@@ -1138,12 +2109,24 @@ void SchedulerService::export_everything_to_all_workers_if_necessary(MySynchroni
   }
 }
 
-void start_scheduler_service(const char* service_addr, SchedulingAlgorithmType scheduling_algorithm) {
+void start_scheduler_service(const char* service_addr, std::unique_ptr<SchedulingPolicy> scheduling_policy, const SpeculationOptions& speculation_options, size_t early_shipping_budget, const std::string& computation_graph_spill_file_name) {
   std::string service_address(service_addr);
   std::string::iterator split_point = split_ip_address(service_address);
   std::string port;
   port.assign(split_point, service_address.end());
-  SchedulerService service(scheduling_algorithm);
+  SchedulerService service(std::move(scheduling_policy), speculation_options, early_shipping_budget, computation_graph_spill_file_name);
+  std::chrono::milliseconds rescheduling_interval = service.rescheduling_interval();
+  if (rescheduling_interval.count() > 0) {
+    // Some policies hold tasks back and stragglers are only detected over
+    // time, so schedule needs to be run periodically and not only when a
+    // request comes in.
+    std::thread([&service, rescheduling_interval]() {
+      while (true) {
+        std::this_thread::sleep_for(rescheduling_interval);
+        service.schedule();
+      }
+    }).detach();
+  }
   ServerBuilder builder;
   builder.AddListeningPort(std::string("0.0.0.0:") + port, grpc::InsecureServerCredentials());
   builder.RegisterService(&service);
@@ -1157,7 +2140,10 @@ void start_scheduler_service(const char* service_addr, SchedulingAlgorithmType s
 RayConfig global_ray_config;
 
 int main(int argc, char** argv) {
-  SchedulingAlgorithmType scheduling_algorithm = SCHEDULING_ALGORITHM_LOCALITY_AWARE;
+  std::string scheduling_policy_name = "locality_aware";
+  SpeculationOptions speculation_options = NO_SPECULATION;
+  size_t early_shipping_budget = DEFAULT_EARLY_SHIPPING_BUDGET;
+  std::string computation_graph_spill_file_name;
   RAY_CHECK_GE(argc, 2, "scheduler: expected at least one argument (scheduler ip address)");
   if (argc > 2) {
     const char* log_file_name = get_cmd_option(argv, argv + argc, "--log-file-name");
@@ -1170,18 +2156,48 @@ int main(int argc, char** argv) {
       std::cout << "scheduler: writing logs to stdout; you can change this by passing --log-file-name <filename> to ./scheduler" << std::endl;
       global_ray_config.log_to_file = false;
     }
-    const char* scheduling_algorithm_name = get_cmd_option(argv, argv + argc, "--scheduler-algorithm");
-    if (scheduling_algorithm_name) {
-      if (std::string(scheduling_algorithm_name) == "naive") {
-        RAY_LOG(RAY_INFO, "scheduler: using 'naive' scheduler");
-        scheduling_algorithm = SCHEDULING_ALGORITHM_NAIVE;
-      }
-      if (std::string(scheduling_algorithm_name) == "locality_aware") {
-        RAY_LOG(RAY_INFO, "scheduler: using 'locality aware' scheduler");
-        scheduling_algorithm = SCHEDULING_ALGORITHM_LOCALITY_AWARE;
-      }
+    const char* scheduling_policy_option = get_cmd_option(argv, argv + argc, "--scheduling-policy");
+    // --scheduler-algorithm is the old name of --scheduling-policy, and it is
+    // still accepted so that existing launch scripts keep working.
+    const char* scheduler_algorithm_option = get_cmd_option(argv, argv + argc, "--scheduler-algorithm");
+    if (scheduler_algorithm_option) {
+      RAY_CHECK(!scheduling_policy_option || std::string(scheduling_policy_option) == scheduler_algorithm_option, "scheduler: --scheduler-algorithm " << scheduler_algorithm_option << " conflicts with --scheduling-policy " << scheduling_policy_option);
+      RAY_LOG(RAY_INFO, "scheduler: --scheduler-algorithm is deprecated, use --scheduling-policy instead");
+      scheduling_policy_name = scheduler_algorithm_option;
+    }
+    if (scheduling_policy_option) {
+      scheduling_policy_name = scheduling_policy_option;
+    }
+    const char* speculation_percentile = get_cmd_option(argv, argv + argc, "--speculation-percentile");
+    if (speculation_percentile) {
+      speculation_options.enabled = true;
+      speculation_options.percentile = std::stod(speculation_percentile);
+      RAY_CHECK(speculation_options.percentile > 0 && speculation_options.percentile <= 1, "scheduler: --speculation-percentile must be in (0, 1], but it is " << speculation_options.percentile);
+    }
+    const char* speculation_multiplier = get_cmd_option(argv, argv + argc, "--speculation-multiplier");
+    if (speculation_multiplier) {
+      speculation_options.multiplier = std::stod(speculation_multiplier);
+    }
+    const char* speculation_min_samples = get_cmd_option(argv, argv + argc, "--speculation-min-samples");
+    if (speculation_min_samples) {
+      speculation_options.min_samples = std::stoul(speculation_min_samples);
+    }
+    if (speculation_options.enabled) {
+      RAY_LOG(RAY_INFO, "scheduler: speculatively executing tasks that take longer than " << speculation_options.multiplier << " times the " << speculation_options.percentile << " quantile of their runtimes");
+    }
+    const char* early_shipping_budget_option = get_cmd_option(argv, argv + argc, "--early-shipping-budget");
+    if (early_shipping_budget_option) {
+      early_shipping_budget = std::stoul(early_shipping_budget_option);
+    }
+    const char* spill_file_name = get_cmd_option(argv, argv + argc, "--computation-graph-spill-file-name");
+    if (spill_file_name) {
+      RAY_LOG(RAY_INFO, "scheduler: spilling pruned operations of the computation graph to " << spill_file_name);
+      computation_graph_spill_file_name = spill_file_name;
     }
   }
-  start_scheduler_service(argv[1], scheduling_algorithm);
+  std::unique_ptr<SchedulingPolicy> scheduling_policy = create_scheduling_policy(scheduling_policy_name);
+  RAY_CHECK(scheduling_policy, "scheduler: unknown scheduling policy '" << scheduling_policy_name << "'");
+  RAY_LOG(RAY_INFO, "scheduler: using the '" << scheduling_policy_name << "' scheduling policy");
+  start_scheduler_service(argv[1], std::move(scheduling_policy), speculation_options, early_shipping_budget, computation_graph_spill_file_name);
   return 0;
 }
@@ -2,8 +2,13 @@
 #define RAY_SCHEDULER_H
 
 
+#include <chrono>
 #include <deque>
 #include <memory>
+#include <random>
+#include <set>
+#include <unordered_map>
+#include <unordered_set>
 #include <algorithm>
 #include <iostream>
 #include <limits>
@@ -16,10 +21,12 @@
 
 #include "utils.h"
 #include "computation_graph.h"
+#include "scheduling_policy.h"
 
 using grpc::Server;
 using grpc::ServerBuilder;
 using grpc::ServerReader;
+using grpc::ServerWriter;
 using grpc::ServerContext;
 using grpc::Status;
 
@@ -41,6 +48,8 @@ struct WorkerHandle {
   // initial exports have been shipped to this worker.
   bool initial_exports_done;
   OperationId current_task;
+  // The time at which current_task was assigned to the worker.
+  std::chrono::steady_clock::time_point task_start_time;
 };
 
 struct ObjStoreHandle {
@@ -49,14 +58,120 @@ struct ObjStoreHandle {
   std::string address;
 };
 
-enum SchedulingAlgorithmType {
-  SCHEDULING_ALGORITHM_NAIVE = 0,
-  SCHEDULING_ALGORITHM_LOCALITY_AWARE = 1
+// Options for the speculative execution of straggler tasks. If a task has been
+// running for longer than multiplier times the given percentile of the
+// runtimes of the previous tasks of the same remote function and a worker that
+// can run it is idle, a copy of the task is started on that worker, and the
+// results of whichever execution finishes first are used.
+struct SpeculationOptions {
+  bool enabled;
+  // A number between 0 and 1, for example 0.95 for the 95th percentile.
+  double percentile;
+  double multiplier;
+  // Tasks are only duplicated once this many runtimes of the remote function
+  // have been recorded.
+  size_t min_samples;
+};
+
+const SpeculationOptions NO_SPECULATION = {false, 0.95, 1.5, 10};
+// Objects of at least this size are fetched from several object stores that
+// hold them in parallel, each of which sends a range of the object.
+const size_t STRIPED_DELIVERY_MIN_SIZE = 16 * 1024 * 1024;
+// The maximum number of object stores that a delivery fetches from.
+const size_t MAX_DELIVERY_SOURCES = 4;
+// Objects of at least this size are sent to many object stores along a tree.
+// Each object store holding such an object sends it to at most
+// MAX_BROADCAST_FANOUT object stores at a time, and the other deliveries wait
+// until an object store that has received the object can send it on.
+const size_t BROADCAST_MIN_SIZE = 1024 * 1024;
+const size_t MAX_BROADCAST_FANOUT = 2;
+// The object sizes that separate the size buckets reported by MemoryInfo.
+const std::vector<size_t> MEMORY_INFO_SIZE_BUCKET_BOUNDS = {1024, 64 * 1024, 1024 * 1024, 64 * 1024 * 1024, 1024 * 1024 * 1024};
+
+// A request to copy an object to an object store before it is needed (see
+// Prefetch and Broadcast). It holds a reference to objectid and, if it is set,
+// to placement_hint until the delivery has been started.
+struct PendingPrefetch {
+  ObjectID objectid;
+  // The object store to copy the object to. This is ignored if placement_hint
+  // is set, in which case the object is copied to an object store that holds
+  // placement_hint.
+  ObjStoreId objstoreid;
+  ObjectID placement_hint;
+};
+
+const ObjectID NO_PLACEMENT_HINT = std::numeric_limits<ObjectID>::max();
+
+// While tasks wait in the queue, the scheduler predicts the object stores
+// they will run on and starts shipping their arguments there (see
+// ship_arguments_early). The arguments shipped this way for the tasks that are
+// still queued take up at most this many bytes in each object store.
+const size_t DEFAULT_EARLY_SHIPPING_BUDGET = 256 * 1024 * 1024;
+
+// The arguments of a queued task that are being shipped ahead of time.
+struct EarlyShipment {
+  // The object store that the task is predicted to run on.
+  ObjStoreId objstoreid;
+  // The number of bytes that are shipped to it.
+  size_t num_bytes;
+  // The canonical object IDs of the arguments of the task.
+  std::vector<ObjectID> objectids;
+};
+
+// How long the scheduler waits for a worker to acknowledge an interrupt before
+// giving up on it.
+const int INTERRUPT_TIMEOUT_SECONDS = 5;
+// How long MemoryInfo waits for each object store to report its objects before
+// reporting the object store as unavailable.
+const int MEMORY_INFO_TIMEOUT_SECONDS = 5;
+
+// How often the scheduler looks for stragglers if speculation is enabled.
+const std::chrono::milliseconds SPECULATION_CHECK_INTERVAL = std::chrono::milliseconds(100);
+
+// The runtimes of the most recent tasks of a remote function.
+class TaskRuntimes {
+public:
+  void add(std::chrono::duration<double> runtime);
+  size_t size() const;
+  // Return the runtime that the given fraction of the recorded runtimes do not
+  // exceed.
+  std::chrono::duration<double> percentile(double fraction) const;
+private:
+  std::deque<double> runtimes_;
+};
+
+// A task that is being executed twice, because the original execution was
+// taking much longer than usual.
+struct SpeculativeExecution {
+  OperationId original;
+  OperationId copy;
+  // The result object IDs of the original task, which the user holds.
+  std::vector<ObjectID> results;
+  // The result object IDs of the copy. The scheduler holds a reference to each
+  // of them until one of the two executions has finished.
+  std::vector<ObjectID> copy_results;
+  // True if one of the two executions has finished.
+  bool resolved;
+};
+
+struct SpeculationTable {
+  // Map from the OperationIds of both executions to their SpeculativeExecution.
+  // Each entry is erased when the corresponding execution finishes.
+  std::unordered_map<OperationId, SpeculativeExecution> running;
+  // Result object IDs of original tasks that were aliased with the results of
+  // a copy because the copy finished first. Each is mapped to the object
+  // stores that hold a redundant copy of the object written by the original
+  // task afterwards, which are deallocated along with the object.
+  std::unordered_map<ObjectID, std::vector<ObjStoreId> > superseded_objectids;
+  // The number of copies that have been started and the number of copies that
+  // finished before the original task.
+  size_t num_started = 0;
+  size_t num_won = 0;
 };
 
 class SchedulerService : public Scheduler::Service {
 public:
-  SchedulerService(SchedulingAlgorithmType scheduling_algorithm);
+  SchedulerService(std::unique_ptr<SchedulingPolicy> scheduling_policy, const SpeculationOptions& speculation_options, size_t early_shipping_budget, const std::string& computation_graph_spill_file_name);
 
   Status SubmitTask(ServerContext* context, const SubmitTaskRequest* request, SubmitTaskReply* reply) override;
   Status PutObj(ServerContext* context, const PutObjRequest* request, PutObjReply* reply) override;
@@ -66,18 +181,24 @@ public:
   Status RegisterWorker(ServerContext* context, const RegisterWorkerRequest* request, RegisterWorkerReply* reply) override;
   Status RegisterRemoteFunction(ServerContext* context, const RegisterRemoteFunctionRequest* request, AckReply* reply) override;
   Status ObjReady(ServerContext* context, const ObjReadyRequest* request, AckReply* reply) override;
+  Status ObjReadyBatch(ServerContext* context, const ObjReadyBatchRequest* request, AckReply* reply) override;
   Status ReadyForNewTask(ServerContext* context, const ReadyForNewTaskRequest* request, AckReply* reply) override;
   Status IncrementRefCount(ServerContext* context, const IncrementRefCountRequest* request, AckReply* reply) override;
   Status DecrementRefCount(ServerContext* context, const DecrementRefCountRequest* request, AckReply* reply) override;
   Status AddContainedObjectIDs(ServerContext* context, const AddContainedObjectIDsRequest* request, AckReply* reply) override;
   Status SchedulerInfo(ServerContext* context, const SchedulerInfoRequest* request, SchedulerInfoReply* reply) override;
   Status TaskInfo(ServerContext* context, const TaskInfoRequest* request, TaskInfoReply* reply) override;
+  Status ComputationGraphInfo(ServerContext* context, const ComputationGraphInfoRequest* request, ServerWriter<ComputationGraphChunk>* writer) override;
   Status KillWorkers(ServerContext* context, const KillWorkersRequest* request, KillWorkersReply* reply) override;
   Status RunFunctionOnAllWorkers(ServerContext* context, const RunFunctionOnAllWorkersRequest* request, AckReply* reply) override;
   Status ExportRemoteFunction(ServerContext* context, const ExportRemoteFunctionRequest* request, AckReply* reply) override;
   Status ExportReusableVariable(ServerContext* context, const ExportReusableVariableRequest* request, AckReply* reply) override;
   Status NotifyFailure(ServerContext*, const NotifyFailureRequest* request, AckReply* reply) override;
   Status Wait(ServerContext*, const WaitRequest* request, WaitReply* reply) override;
+  Status CancelTask(ServerContext* context, const CancelTaskRequest* request, CancelTaskReply* reply) override;
+  Status Broadcast(ServerContext* context, const BroadcastRequest* request, AckReply* reply) override;
+  Status Prefetch(ServerContext* context, const PrefetchRequest* request, PrefetchReply* reply) override;
+  Status MemoryInfo(ServerContext* context, const MemoryInfoRequest* request, MemoryInfoReply* reply) override;
 
 #ifdef NDEBUG
   // If we've disabled assertions, then just use regular SynchronizedPtr to skip lock checking.
@@ -92,9 +213,18 @@ public:
   // This will ask an object store to send an object to another object store if
   // the object is not already present in that object store and is not already
   // being transmitted.
-  void deliver_object_async_if_necessary(ObjectID objectid, ObjStoreId from, ObjStoreId to);
-  // ask an object store to send object to another object store
-  void deliver_object_async(ObjectID objectid, ObjStoreId from, ObjStoreId to);
+  // The object stores to get the object from are picked by pick_objstores. If
+  // all of them are busy sending the object elsewhere, the delivery is
+  // postponed until start_pending_deliveries is called. If ship_early is true,
+  // the object is only needed by a queued task that is predicted to run on to
+  // (see ship_arguments_early), and the copy may be deallocated again if the
+  // task runs elsewhere.
+  void deliver_object_async_if_necessary(ObjectID objectid, ObjStoreId to, bool ship_early = false);
+  // start the postponed deliveries of objectid, this is called when a copy of
+  // objectid has arrived in an object store
+  void start_pending_deliveries(ObjectID objectid);
+  // ask an object store to get an object from other object stores
+  void deliver_object_async(ObjectID objectid, const std::vector<ObjStoreId>& from, ObjStoreId to);
   // assign a task to a worker
   void schedule();
   // execute a task on a worker and ship required object IDs
@@ -103,45 +233,95 @@ public:
   bool can_run(const Task& task);
   // register a new object with the scheduler and return its object ID
   ObjectID register_new_object();
-  // register the location of the object ID in the object table
-  void add_location(ObjectID objectid, ObjStoreId objstoreid);
+  // register the location and the size of the object ID in the object table
+  void add_location(ObjectID objectid, ObjStoreId objstoreid, size_t size);
   // indicate that objectid is a canonical objectid
   void add_canonical_objectid(ObjectID objectid);
+  // record that an object store has finalized objectid, without scheduling
+  void object_ready(ObjectID objectid, ObjStoreId objstoreid, size_t size);
   // get object store associated with a workerid
   ObjStoreId get_store(WorkerId workerid);
+  // get the number of object stores registered with the scheduler
+  size_t num_objstores();
+  // get the number of arguments of a ready task that are not in objstoreid
+  size_t num_objects_to_ship(const Task& task, ObjStoreId objstoreid);
+  // get the total size of the arguments of a ready task that are not in objstoreid
+  size_t num_bytes_to_ship(const Task& task, ObjStoreId objstoreid);
+  // get the number of workers connected to objstoreid that are executing a task
+  size_t num_busy_workers(ObjStoreId objstoreid);
   // register a function with the scheduler
   void register_function(const std::string& name, WorkerId workerid, size_t num_return_vals);
   // get information about the scheduler state
   void get_info(const SchedulerInfoRequest& request, SchedulerInfoReply* reply);
+  // the scheduling policy in use
+  SchedulingPolicy& scheduling_policy();
+  // how often schedule needs to be called even if no requests come in, zero if
+  // it only needs to be called when requests come in
+  std::chrono::milliseconds rescheduling_interval();
 private:
-  // pick an objectstore that holds a given object (needs protection by objects_lock_)
-  ObjStoreId pick_objstore(ObjectID objectid);
+  // The implementation of SchedulingState that is passed to the scheduling policy.
+  class PolicyState;
+
+  // pick the object stores to get an object from, these are the object stores
+  // holding it that are the source of the fewest deliveries, one of them
+  // unless the object is large, this returns no object stores if the object
+  // is being broadcast and all of its holders are sending it to
+  // MAX_BROADCAST_FANOUT object stores already
+  std::vector<ObjStoreId> pick_objstores(ObjectID objectid, const MySynchronizedPtr<ObjTable> &objtable);
   // checks if objectid is a canonical objectid
   bool is_canonical(ObjectID objectid);
   // Perform all queued up gets that can be performed.
   void perform_gets();
-  // schedule tasks using the naive algorithm
-  void schedule_tasks_naively();
-  // schedule tasks using a scheduling algorithm that takes into account data locality
-  void schedule_tasks_location_aware();
+  // Start the deliveries in prefetch_queue_ whose objects are ready.
+  void perform_prefetches();
+  // assign tasks from task_queue_ to avail_workers_ as decided by the scheduling policy
+  void schedule_tasks();
   void perform_notify_aliases();
+  // Predict the object stores that the tasks which are still queued will run
+  // on and start shipping their missing arguments there.
+  void ship_arguments_early();
+  // Deallocate the copies in unused_early_replicas_ that have arrived and that
+  // nothing else needs.
+  void deallocate_unused_early_replicas();
+  // Start copies of the tasks that are taking much longer than previous tasks
+  // of the same remote function on idle workers.
+  void speculate_stragglers();
+  // Resolve the speculative execution of operationid when either of its
+  // executions finishes.
+  void finish_speculative_execution(OperationId operationid);
+  // Alias objectid with target_objectid, because the speculative copy of the
+  // task that creates objectid finished first. This does nothing if objectid
+  // has already been created.
+  void supersede_objectid(ObjectID objectid, ObjectID target_objectid);
+  // Remove the operations that are no longer needed from the computation graph.
+  void prune_computation_graph();
+  // Ask the worker with workerid to interrupt its task if that task creates
+  // objectid. This returns right away, the request is sent on another thread.
+  static void interrupt_worker(WorkerId workerid, std::shared_ptr<Channel> channel, ObjectID objectid);
   // checks if aliasing for objectid has been completed
   bool has_canonical_objectid(ObjectID objectid);
   // get the canonical objectid for an objectid
   ObjectID get_canonical_objectid(ObjectID objectid);
+  // tell objstoreid to deallocate the redundant copy of the superseded objectid
+  // that it holds (see SpeculationTable)
+  void deallocate_superseded_copy(ObjectID objectid, ObjStoreId objstoreid);
   // attempt to notify the objstore about potential objectid aliasing, returns true if successful, if false then retry later
   bool attempt_notify_alias(ObjStoreId objstoreid, ObjectID alias_objectid, ObjectID canonical_objectid);
   // tell all of the objstores holding canonical_objectid to deallocate it, the
   // data structures are passed into ensure that the appropriate locks are held.
-  void deallocate_object(ObjectID canonical_objectid, const MySynchronizedPtr<std::vector<RefCount> > &reference_counts, const MySynchronizedPtr<std::vector<std::vector<ObjectID> > > &contained_objectids);
+  void deallocate_object(ObjectID canonical_objectid, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_counts, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &contained_objectids);
   // increment the ref counts for the object IDs in objectids, the data
   // structures are passed into ensure that the appropriate locks are held.
-  void increment_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<std::vector<RefCount> > &reference_count);
+  void increment_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_count);
   // decrement the ref counts for the object IDs in objectids, the data
   // structures are passed into ensure that the appropriate locks are held.
-  void decrement_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<std::vector<RefCount> > &reference_count, const MySynchronizedPtr<std::vector<std::vector<ObjectID> > > &contained_objectids);
+  void decrement_ref_count(const std::vector<ObjectID> &objectids, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_count, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &contained_objectids);
+  // Erase the scheduler's bookkeeping for a set of equivalent object IDs whose
+  // object has been deallocated, so that the memory can be reclaimed. The data
+  // structures are passed into ensure that the appropriate locks are held.
+  void reclaim_objectids(const std::vector<ObjectID> &equivalent_objectids, const MySynchronizedPtr<ObjectIDTable<RefCount> > &reference_counts, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &contained_objectids);
   // Find all of the object IDs which are upstream of objectid (including objectid itself). That is, you can get from everything in objectids to objectid by repeatedly indexing in target_objectids_.
-  void upstream_objectids(ObjectID objectid, std::vector<ObjectID> &objectids, const MySynchronizedPtr<std::vector<std::vector<ObjectID> > > &reverse_target_objectids);
+  void upstream_objectids(ObjectID objectid, std::vector<ObjectID> &objectids, const MySynchronizedPtr<ObjectIDTable<std::vector<ObjectID> > > &reverse_target_objectids);
   // Find all of the object IDs that refer to the same object as objectid (as best as we can determine at the moment). The information may be incomplete because not all of the aliases may be known.
   void get_equivalent_objectids(ObjectID objectid, std::vector<ObjectID> &equivalent_objectids);
   // Export a function to run to a worker.
@@ -179,6 +359,8 @@ private:
   Synchronized<std::vector<Failure> > failed_function_to_runs_;
   // List of pending get calls.
   Synchronized<std::vector<std::pair<WorkerId, ObjectID> > > get_queue_;
+  // List of objects to copy to object stores once they are ready.
+  Synchronized<std::vector<PendingPrefetch> > prefetch_queue_;
   // The computation graph tracks the operations that have been submitted to the
   // scheduler and is mostly used for fault tolerance.
   Synchronized<ComputationGraph> computation_graph_;
@@ -192,13 +374,22 @@ private:
   // existing references held to objectid. This is done for all objectids, not just
   // canonical_objectids. This data structure completely ignores aliasing. If the
   // object corresponding to objectid has been deallocated, then
-  // reference_counts[objectid] will equal DEALLOCATED.
-  Synchronized<std::vector<RefCount> > reference_counts_;
+  // reference_counts[objectid] will equal DEALLOCATED. The entries of
+  // deallocated objects are erased from this table and from contained_objectids_,
+  // objtable_, target_objectids_ and reverse_target_objectids_ (see
+  // reclaim_objectids), and reference_counts_.get(objectid) returns DEALLOCATED
+  // for them.
+  Synchronized<ObjectIDTable<RefCount> > reference_counts_;
   // contained_objectids_[objectid] is a vector of all of the objectids contained inside the object referred to by objectid
-  Synchronized<std::vector<std::vector<ObjectID> > > contained_objectids_;
+  Synchronized<ObjectIDTable<std::vector<ObjectID> > > contained_objectids_;
   // Vector of all workers registered in the system. Their index in this vector
   // is the workerid.
   Synchronized<std::vector<WorkerHandle> > workers_;
+  // The runtimes of the recent tasks of each remote function, this is used to
+  // detect stragglers.
+  Synchronized<std::unordered_map<std::string, TaskRuntimes> > task_runtimes_;
+  // The tasks that are being executed speculatively (see speculate_stragglers).
+  Synchronized<SpeculationTable> speculations_;
   // List of pending alias notifications. Each element consists of (objstoreid, (alias_objectid, canonical_objectid)).
   Synchronized<std::vector<std::pair<ObjStoreId, std::pair<ObjectID, ObjectID> > > > alias_notification_queue_;
   // Mapping from canonical objectid to list of object stores where the object is stored. Non-canonical (aliased) objectids should not be used to index objtable_.
@@ -211,27 +402,67 @@ private:
   // target_objectids_[objectid] == objectid. For each objectid, target_objectids_[objectid]
   // is initialized to UNITIALIZED_ALIAS and the correct value is filled later
   // when it is known.
-  Synchronized<std::vector<ObjectID> > target_objectids_;
+  Synchronized<ObjectIDTable<ObjectID> > target_objectids_;
   // This data structure maps an objectid to all of the objectids that alias it (there could be multiple such objectids).
-  Synchronized<std::vector<std::vector<ObjectID> > > reverse_target_objectids_;
-  // For each object store objstoreid, objects_in_transit_[objstoreid] is a
-  // vector of the canonical object IDs that are being streamed to that
-  // object store but are not yet present. object IDs are added to this
-  // in deliver_object_async_if_necessary (to ensure that we do not attempt to deliver
-  // the same object to a given object store twice), and object IDs are
-  // removed when add_location is called (from ObjReady), and they are moved to
-  // the objtable_. Note that objects_in_transit_ and objtable_ share the same
-  // lock (objects_lock_). // TODO(rkn): Consider making this part of the
-  // objtable data structure.
-  std::vector<std::vector<ObjectID> > objects_in_transit_;
+  Synchronized<ObjectIDTable<std::vector<ObjectID> > > reverse_target_objectids_;
+  // Object IDs that have been deallocated but have not yet been removed from
+  // the computation graph. These are filled in by reclaim_objectids and
+  // processed by prune_computation_graph.
+  Synchronized<std::vector<ObjectID> > deallocated_objectids_;
+  // For each object store objstoreid, objects_in_transit_[objstoreid] maps
+  // the canonical object IDs that are being streamed to that object store but
+  // are not yet present to the object stores they are streamed from. object IDs
+  // are added to this in deliver_object_async_if_necessary (to ensure that we do
+  // not attempt to deliver the same object to a given object store twice), and
+  // object IDs are removed when add_location is called (from ObjReady), and
+  // they are moved to the objtable_. Note that objects_in_transit_ and
+  // objtable_ share the same lock (objects_lock_). // TODO(rkn): Consider
+  // making this part of the objtable data structure.
+  std::vector<std::unordered_map<ObjectID, std::vector<ObjStoreId> > > objects_in_transit_;
+  // num_outbound_deliveries_[objstoreid] is the number of deliveries in
+  // objects_in_transit_ that objstoreid is a source of. This is protected by
+  // the lock on objtable_.
+  std::vector<size_t> num_outbound_deliveries_;
+  // pending_deliveries_[canonical_objectid] lists the object stores that need
+  // the object but wait for a holder of the object that is not already
+  // sending it to MAX_BROADCAST_FANOUT object stores. Each of these holds a
+  // reference to the object. This is protected by the lock on objtable_.
+  std::unordered_map<ObjectID, std::vector<ObjStoreId> > pending_deliveries_;
+  // Used by pick_objstores to choose between equally busy object stores. This
+  // is protected by the lock on objtable_.
+  std::mt19937 rng_;
+  // object_sizes_[canonical_objectid] is the size in bytes of the object, as
+  // reported by ObjReady. This is protected by the lock on objtable_.
+  ObjectIDTable<size_t> object_sizes_;
   // All of the functions that have been exported to the workers to run.
   Synchronized<std::vector<std::unique_ptr<Function> > > exported_functions_to_run_;
   // All of the remote functions that have been exported to the workers.
   Synchronized<std::vector<std::unique_ptr<Function> > > exported_remote_functions_;
   // All of the reusable variables that have been exported to the workers.
   Synchronized<std::vector<std::unique_ptr<ReusableVar> > > exported_reusable_variables_;
-  // the scheduling algorithm that will be used
-  SchedulingAlgorithmType scheduling_algorithm_;
+  // the scheduling policy that decides which tasks run on which workers
+  std::unique_ptr<SchedulingPolicy> scheduling_policy_;
+  // when to start copies of straggler tasks
+  SpeculationOptions speculation_options_;
+  // the maximum number of bytes per object store that ship_arguments_early
+  // ships for tasks that are still queued, zero if it is disabled
+  size_t early_shipping_budget_;
+  // The predictions made by ship_arguments_early for the queued tasks. The
+  // entries are removed when the tasks leave the queue. This is protected by
+  // the lock on task_queue_.
+  std::unordered_map<OperationId, EarlyShipment> early_shipments_;
+  // The (canonical object ID, object store) pairs of the copies that
+  // ship_arguments_early started and that nothing else has asked for since.
+  // deliver_object_async_if_necessary removes a pair when a task, a get or a
+  // prefetch needs the copy. This is protected by the lock on objtable_.
+  std::set<std::pair<ObjectID, ObjStoreId> > early_replicas_;
+  // The pairs of early_replicas_ whose tasks have left the queue. They are
+  // deallocated by deallocate_unused_early_replicas once they have arrived.
+  // This is protected by the lock on objtable_.
+  std::vector<std::pair<ObjectID, ObjStoreId> > unused_early_replicas_;
+  // early_shipping_bytes_[objstoreid] is the sum of the num_bytes of the
+  // early_shipments_ to objstoreid. This is protected by the lock on task_queue_.
+  std::vector<size_t> early_shipping_bytes_;
 };
 
 #endif
@@ -0,0 +1,173 @@
+#include "scheduling_policy.h"
+
+#include <limits>
+
+// Return the tasks in the queue whose arguments are all ready, in queue order.
+static std::vector<OperationId> ready_tasks(SchedulingState& state) {
+  std::vector<OperationId> ready;
+  for (OperationId operationid : state.task_queue()) {
+    if (state.arguments_ready(operationid)) {
+      ready.push_back(operationid);
+    }
+  }
+  return ready;
+}
+
+// For each idle worker, pick the ready task with the lowest cost according to
+// cost(operationid, objstoreid). Ties are broken by queue order.
+template<class CostFunction>
+static void schedule_by_worker(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments, CostFunction cost) {
+  std::vector<OperationId> ready = ready_tasks(state);
+  std::vector<bool> assigned(ready.size(), false);
+  for (WorkerId workerid : state.available_workers()) {
+    ObjStoreId objstoreid = state.get_store(workerid);
+    size_t best = ready.size();
+    size_t min_cost = std::numeric_limits<size_t>::max();
+    for (size_t i = 0; i < ready.size(); ++i) {
+      if (assigned[i] || !state.function_registered(ready[i], workerid)) {
+        continue;
+      }
+      size_t task_cost = cost(ready[i], objstoreid);
+      if (task_cost < min_cost) {
+        min_cost = task_cost;
+        best = i;
+      }
+    }
+    if (best != ready.size()) {
+      assignments.push_back(std::make_pair(ready[best], workerid));
+      assigned[best] = true;
+    }
+  }
+}
+
+// Return the indices into state.available_workers() of the idle workers that
+// have not been assigned a task yet and that can run the task.
+static std::vector<size_t> eligible_workers(SchedulingState& state, OperationId operationid, const std::vector<bool>& assigned) {
+  std::vector<size_t> workers;
+  const std::vector<WorkerId>& available_workers = state.available_workers();
+  for (size_t i = 0; i < available_workers.size(); ++i) {
+    if (!assigned[i] && state.function_registered(operationid, available_workers[i])) {
+      workers.push_back(i);
+    }
+  }
+  return workers;
+}
+
+void NaiveSchedulingPolicy::schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) {
+  schedule_by_worker(state, assignments, [](OperationId operationid, ObjStoreId objstoreid) -> size_t { return 0; });
+}
+
+void LocalityAwareSchedulingPolicy::schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) {
+  schedule_by_worker(state, assignments, [&state](OperationId operationid, ObjStoreId objstoreid) { return state.num_objects_to_ship(operationid, objstoreid); });
+}
+
+void LocalityByBytesSchedulingPolicy::schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) {
+  schedule_by_worker(state, assignments, [&state](OperationId operationid, ObjStoreId objstoreid) { return state.num_bytes_to_ship(operationid, objstoreid); });
+}
+
+void LeastLoadedSchedulingPolicy::schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) {
+  const std::vector<WorkerId>& available_workers = state.available_workers();
+  std::vector<bool> assigned(available_workers.size(), false);
+  // The number of tasks assigned to each object store in this round.
+  std::unordered_map<ObjStoreId, size_t> num_assigned;
+  for (OperationId operationid : ready_tasks(state)) {
+    std::vector<size_t> workers = eligible_workers(state, operationid, assigned);
+    size_t best = available_workers.size();
+    size_t min_load = std::numeric_limits<size_t>::max();
+    for (size_t i : workers) {
+      ObjStoreId objstoreid = state.get_store(available_workers[i]);
+      size_t load = state.num_busy_workers(objstoreid) + num_assigned[objstoreid];
+      if (load < min_load) {
+        min_load = load;
+        best = i;
+      }
+    }
+    if (best != available_workers.size()) {
+      assignments.push_back(std::make_pair(operationid, available_workers[best]));
+      assigned[best] = true;
+      num_assigned[state.get_store(available_workers[best])] += 1;
+    }
+  }
+}
+
+RandomSchedulingPolicy::RandomSchedulingPolicy() : rng_(std::random_device()()) {}
+
+void RandomSchedulingPolicy::schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) {
+  const std::vector<WorkerId>& available_workers = state.available_workers();
+  std::vector<bool> assigned(available_workers.size(), false);
+  for (OperationId operationid : ready_tasks(state)) {
+    std::vector<size_t> workers = eligible_workers(state, operationid, assigned);
+    if (workers.empty()) {
+      continue;
+    }
+    std::uniform_int_distribution<size_t> uni(0, workers.size() - 1);
+    size_t chosen = workers[uni(rng_)];
+    assignments.push_back(std::make_pair(operationid, available_workers[chosen]));
+    assigned[chosen] = true;
+  }
+}
+
+DelaySchedulingPolicy::DelaySchedulingPolicy(std::chrono::milliseconds delay) : delay_(delay) {}
+
+void DelaySchedulingPolicy::schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) {
+  auto now = std::chrono::steady_clock::now();
+  const std::vector<WorkerId>& available_workers = state.available_workers();
+  std::vector<bool> assigned(available_workers.size(), false);
+  // Only keep track of the tasks that are still waiting after this round.
+  std::unordered_map<OperationId, std::chrono::steady_clock::time_point> waiting_since;
+  for (OperationId operationid : ready_tasks(state)) {
+    std::vector<size_t> workers = eligible_workers(state, operationid, assigned);
+    if (workers.empty()) {
+      continue;
+    }
+    size_t best = available_workers.size();
+    size_t min_bytes = std::numeric_limits<size_t>::max();
+    for (size_t i : workers) {
+      size_t num_bytes = state.num_bytes_to_ship(operationid, state.get_store(available_workers[i]));
+      if (num_bytes < min_bytes) {
+        min_bytes = num_bytes;
+        best = i;
+      }
+    }
+    // Check whether some other object store would need fewer bytes shipped.
+    bool best_objstore_available = true;
+    for (ObjStoreId objstoreid = 0; objstoreid < state.num_objstores(); ++objstoreid) {
+      if (state.num_bytes_to_ship(operationid, objstoreid) < min_bytes) {
+        best_objstore_available = false;
+        break;
+      }
+    }
+    if (!best_objstore_available) {
+      auto it = waiting_since_.find(operationid);
+      auto first_ready = (it == waiting_since_.end()) ? now : it->second;
+      if (now - first_ready < delay_) {
+        waiting_since[operationid] = first_ready;
+        continue;
+      }
+    }
+    assignments.push_back(std::make_pair(operationid, available_workers[best]));
+    assigned[best] = true;
+  }
+  waiting_since_.swap(waiting_since);
+}
+
+std::chrono::milliseconds DelaySchedulingPolicy::rescheduling_interval() {
+  return std::max(delay_ / 4, std::chrono::milliseconds(1));
+}
+
+std::unique_ptr<SchedulingPolicy> create_scheduling_policy(const std::string& name) {
+  if (name == "naive") {
+    return std::unique_ptr<SchedulingPolicy>(new NaiveSchedulingPolicy());
+  } else if (name == "locality_aware") {
+    return std::unique_ptr<SchedulingPolicy>(new LocalityAwareSchedulingPolicy());
+  } else if (name == "locality_by_bytes") {
+    return std::unique_ptr<SchedulingPolicy>(new LocalityByBytesSchedulingPolicy());
+  } else if (name == "least_loaded") {
+    return std::unique_ptr<SchedulingPolicy>(new LeastLoadedSchedulingPolicy());
+  } else if (name == "random") {
+    return std::unique_ptr<SchedulingPolicy>(new RandomSchedulingPolicy());
+  } else if (name == "delay") {
+    return std::unique_ptr<SchedulingPolicy>(new DelaySchedulingPolicy(DEFAULT_SCHEDULING_DELAY));
+  }
+  return nullptr;
+}
@@ -0,0 +1,123 @@
+#ifndef RAY_SCHEDULING_POLICY_H
+#define RAY_SCHEDULING_POLICY_H
+
+#include <chrono>
+#include <deque>
+#include <memory>
+#include <random>
+#include <string>
+#include <unordered_map>
+
+#include "ray/ray.h"
+
+#include "graph.pb.h"
+
+// The view of the scheduler state that is available to a scheduling policy.
+// The scheduler holds the locks on the task queue and the available workers
+// while a policy is running, so these methods must only be called from inside
+// SchedulingPolicy::schedule.
+class SchedulingState {
+public:
+  virtual ~SchedulingState() {}
+  // The OperationIds of the tasks waiting to be scheduled, in submission order.
+  virtual const std::deque<OperationId>& task_queue() = 0;
+  // The workers that are currently idle.
+  virtual const std::vector<WorkerId>& available_workers() = 0;
+  // Return the task corresponding to a particular OperationId.
+  virtual const Task& get_task(OperationId operationid) = 0;
+  // Check if all of the arguments of the task are available in some object store.
+  virtual bool arguments_ready(OperationId operationid) = 0;
+  // Check if the function of the task has been registered on the worker.
+  virtual bool function_registered(OperationId operationid, WorkerId workerid) = 0;
+  // Return the object store that a worker is connected to.
+  virtual ObjStoreId get_store(WorkerId workerid) = 0;
+  // Return the number of object stores registered with the scheduler.
+  virtual size_t num_objstores() = 0;
+  // Return the number of arguments of a ready task that are not present in the
+  // object store objstoreid.
+  virtual size_t num_objects_to_ship(OperationId operationid, ObjStoreId objstoreid) = 0;
+  // Return the total size in bytes of the arguments of a ready task that are
+  // not present in the object store objstoreid.
+  virtual size_t num_bytes_to_ship(OperationId operationid, ObjStoreId objstoreid) = 0;
+  // Return the number of workers connected to objstoreid that are executing a
+  // task.
+  virtual size_t num_busy_workers(ObjStoreId objstoreid) = 0;
+};
+
+// A scheduling policy decides which queued tasks run on which idle workers.
+class SchedulingPolicy {
+public:
+  virtual ~SchedulingPolicy() {}
+  // Append (operationid, workerid) pairs to assignments for the tasks that
+  // should be started now. Every task and every worker may appear at most once,
+  // the worker must be available, the task's arguments must be ready, and the
+  // task's function must be registered on the worker.
+  virtual void schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) = 0;
+  // If this is positive, the scheduler calls schedule at least this often, even
+  // if no new tasks or workers show up. Policies that hold tasks back for a
+  // while rely on this.
+  virtual std::chrono::milliseconds rescheduling_interval() { return std::chrono::milliseconds(0); }
+};
+
+// For each idle worker, start the first task in the queue that it can run.
+class NaiveSchedulingPolicy : public SchedulingPolicy {
+public:
+  void schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) override;
+};
+
+// For each idle worker, start the task that requires shipping the fewest
+// arguments to the worker's object store.
+class LocalityAwareSchedulingPolicy : public SchedulingPolicy {
+public:
+  void schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) override;
+};
+
+// For each idle worker, start the task that requires shipping the fewest bytes
+// to the worker's object store.
+class LocalityByBytesSchedulingPolicy : public SchedulingPolicy {
+public:
+  void schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) override;
+};
+
+// Start the tasks in queue order, each on an idle worker whose object store has
+// the fewest busy workers.
+class LeastLoadedSchedulingPolicy : public SchedulingPolicy {
+public:
+  void schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) override;
+};
+
+// Start the tasks in queue order, each on an idle worker chosen uniformly at
+// random among those that can run it.
+class RandomSchedulingPolicy : public SchedulingPolicy {
+public:
+  RandomSchedulingPolicy();
+  void schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) override;
+private:
+  std::mt19937 rng_;
+};
+
+// Delay scheduling: start the tasks in queue order, each on the idle worker
+// that requires shipping the fewest bytes. If that worker is not on an object
+// store that needs the fewest bytes shipped among all object stores (that is,
+// the data is elsewhere), hold the task back for up to delay in the hope that
+// a worker on a better object store becomes idle.
+class DelaySchedulingPolicy : public SchedulingPolicy {
+public:
+  DelaySchedulingPolicy(std::chrono::milliseconds delay);
+  void schedule(SchedulingState& state, std::vector<std::pair<OperationId, WorkerId> >& assignments) override;
+  std::chrono::milliseconds rescheduling_interval() override;
+private:
+  std::chrono::milliseconds delay_;
+  // The time at which each task that is being held back was first ready.
+  std::unordered_map<OperationId, std::chrono::steady_clock::time_point> waiting_since_;
+};
+
+// The delay used by the "delay" policy.
+const std::chrono::milliseconds DEFAULT_SCHEDULING_DELAY = std::chrono::milliseconds(100);
+
+// Return the scheduling policy with the given name ("naive", "locality_aware",
+// "locality_by_bytes", "least_loaded", "random", or "delay"), or nullptr if
+// there is no such policy.
+std::unique_ptr<SchedulingPolicy> create_scheduling_policy(const std::string& name);
+
+#endif
@@ -1,10 +1,16 @@
 #include "worker.h"
 
 #include <atomic>
+#include <limits>
 #include <random>
 #include <chrono>
 #include <thread>
 
+#if !defined(WIN32) && !defined(_WIN32)
+#include <signal.h>
+#include <unistd.h>
+#endif
+
 #include "utils.h"
 
 extern "C" {
@@ -24,7 +30,7 @@ Status WorkerServiceImpl::ExecuteTask(ServerContext* context, const ExecuteTaskR
   message->mutable_task()->CopyFrom(request->task());
   {
     WorkerMessage* message_ptr = message.get();
-    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker because the message queue was full.");
+    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker.");
   }
   // The message will get deleted in receive_next_message().
   message.release();
@@ -38,7 +44,7 @@ Status WorkerServiceImpl::RunFunctionOnWorker(ServerContext* context, const RunF
   RAY_LOG(RAY_INFO, "Running function on worker.");
   {
     WorkerMessage* message_ptr = message.get();
-    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker because the message queue was full.");
+    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker.");
   }
   // The message will get deleted in receive_next_message().
   message.release();
@@ -52,7 +58,7 @@ Status WorkerServiceImpl::ImportRemoteFunction(ServerContext* context, const Imp
   RAY_LOG(RAY_INFO, "importing function");
   {
     WorkerMessage* message_ptr = message.get();
-    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker because the message queue was full.");
+    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker.");
   }
   // The message will get deleted in receive_next_message().
   message.release();
@@ -66,7 +72,7 @@ Status WorkerServiceImpl::ImportReusableVariable(ServerContext* context, const I
   RAY_LOG(RAY_INFO, "importing reusable variable");
   {
     WorkerMessage* message_ptr = message.get();
-    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker because the message queue was full.");
+    RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker.");
   }
   // The message will get deleted in receive_next_message().
   message.release();
@@ -76,7 +82,7 @@ Status WorkerServiceImpl::ImportReusableVariable(ServerContext* context, const I
 Status WorkerServiceImpl::Die(ServerContext* context, const DieRequest* request, AckReply* reply) {
   RAY_CHECK(mode_ == Mode::WORKER_MODE, "Die can only be called on workers.");
   WorkerMessage* message_ptr = NULL;
-  RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker because the message queue was full.");
+  RAY_CHECK(send_queue_.send(&message_ptr), "Failed to send message from the worker service to the worker.");
   return Status::OK;
 }
 
@@ -109,6 +115,25 @@ Status WorkerServiceImpl::PrintErrorMessage(ServerContext* context, const PrintE
   return Status::OK;
 }
 
+// The object ID of the last InterruptTask request. The signal handler in the
+// Python interpreter reads it to check that the interrupt is meant for the task
+// that is running.
+static std::atomic<ObjectID> interrupted_objectid(std::numeric_limits<ObjectID>::max());
+
+// The main thread may be busy executing a remote function, so we cannot use
+// the message queue here. Instead, we send a signal to our own process, which
+// the Python interpreter handles in the main thread.
+Status WorkerServiceImpl::InterruptTask(ServerContext* context, const InterruptTaskRequest* request, AckReply* reply) {
+  RAY_CHECK(mode_ == Mode::WORKER_MODE, "InterruptTask can only be called on workers.");
+#if defined(WIN32) || defined(_WIN32)
+  RAY_LOG(RAY_INFO, "Interrupting tasks is not supported on Windows.");
+#else
+  interrupted_objectid = request->objectid();
+  RAY_CHECK(kill(getpid(), SIGUSR1) == 0, "Failed to interrupt the task.");
+#endif
+  return Status::OK;
+}
+
 Worker::Worker(const std::string& node_ip_address, const std::string& scheduler_address, Mode mode)
     : scheduler_address_(scheduler_address),
       node_ip_address_(node_ip_address),
@@ -180,14 +205,19 @@ void Worker::register_worker(const std::string& node_ip_address, const std::stri
   objstoreid_ = reply.objstoreid();
   objstore_address_ = reply.objstore_address();
   segmentpool_ = std::make_shared<MemorySegmentPool>(objstoreid_, objstore_address_, false);
-  // Connect to the queue for sending requests to the object store.
+  // Create the channel for exchanging messages with the object store.
+  std::string objstore_channel_name = std::string("queue:") + objstore_address_ + std::string(":worker:") + std::to_string(workerid_) + std::string(":obj");
+  RAY_LOG(RAY_INFO, "Worker creating channel with name " << objstore_channel_name << " to exchange messages with the object store.");
+  RAY_CHECK(objstore_channel_.connect(objstore_channel_name, true), "error connecting objstore_channel_");
+  objstore_doorbells_.open(std::string("queue:") + objstore_address_ + std::string(":doorbells"));
+  // Tell the object store about the channel over the object store's queue.
   std::string request_obj_queue_name = std::string("queue:") + objstore_address_ + std::string(":obj");
-  RAY_LOG(RAY_INFO, "Worker connecting to queue with name " << request_obj_queue_name << " to send requests to the object store.");
+  RAY_LOG(RAY_INFO, "Worker connecting to queue with name " << request_obj_queue_name << " to connect to the object store.");
   RAY_CHECK(request_obj_queue_.connect(request_obj_queue_name, false), "error connecting request_obj_queue_");
-  // Create a queue for receiving messages from the object store.
-  std::string receive_obj_queue_name = std::string("queue:") + objstore_address_ + std::string(":worker:") + std::to_string(workerid_) + std::string(":obj");
-  RAY_LOG(RAY_INFO, "Worker creating queue with name " << receive_obj_queue_name << " to receive messages from the object store.");
-  RAY_CHECK(receive_obj_queue_.connect(receive_obj_queue_name, true), "error connecting receive_obj_queue_");
+  ObjRequest connect_request;
+  connect_request.workerid = workerid_;
+  connect_request.type = ObjRequestType::CONNECT;
+  RAY_CHECK(request_obj_queue_.send(&connect_request), "Failed to send request from the worker to the object store.");
   connected_ = true;
   return;
 }
@@ -203,6 +233,33 @@ void Worker::request_object(ObjectID objectid) {
   return;
 }
 
+void Worker::broadcast_object(ObjectID objectid) {
+  RAY_CHECK(connected_, "Attempted to perform broadcast_object but failed.");
+  BroadcastRequest request;
+  request.set_objectid(objectid);
+  AckReply reply;
+  ClientContext context;
+  RAY_CHECK_GRPC(scheduler_stub_->Broadcast(&context, request, &reply));
+}
+
+bool Worker::prefetch_objects(const std::vector<ObjectID>& objectids, const std::string& objstore_address, const ObjectID* placement_hint) {
+  RAY_CHECK(connected_, "Attempted to perform prefetch_objects but failed.");
+  PrefetchRequest request;
+  request.set_workerid(workerid_);
+  for (ObjectID objectid : objectids) {
+    request.add_objectid(objectid);
+  }
+  request.set_objstore_address(objstore_address);
+  if (placement_hint != nullptr) {
+    request.set_has_placement_hint(true);
+    request.set_placement_hint(*placement_hint);
+  }
+  PrefetchReply reply;
+  ClientContext context;
+  RAY_CHECK_GRPC(scheduler_stub_->Prefetch(&context, request, &reply));
+  return reply.objstore_registered();
+}
+
 ObjectID Worker::get_objectid() {
   // first get objectid for the new object
   RAY_CHECK(connected_, "Attempted to perform get_objectid but failed.");
@@ -251,9 +308,9 @@ const char* Worker::allocate_buffer(ObjectID objectid, int64_t size, SegmentId&
   request.type = ObjRequestType::ALLOC;
   request.objectid = objectid;
   request.size = size;
-  RAY_CHECK(request_obj_queue_.send(&request), "Failed to send request from the worker to the object store because the message queue was full.");
+  objstore_channel_.push_request(request, objstore_doorbells_);
   ObjHandle result;
-  RAY_CHECK(receive_obj_queue_.receive(&result), "error receiving over IPC");
+  objstore_channel_.pop_reply(&result);
   const char* address = reinterpret_cast<const char*>(segmentpool_->get_address(result));
   segmentid = result.segmentid();
   return address;
@@ -266,7 +323,7 @@ PyObject* Worker::finish_buffer(ObjectID objectid, SegmentId segmentid, int64_t
   request.objectid = objectid;
   request.type = ObjRequestType::WORKER_DONE;
   request.metadata_offset = metadata_offset;
-  RAY_CHECK(request_obj_queue_.send(&request), "Failed to send request from the worker to the object store because the message queue was full.");
+  objstore_channel_.push_request(request, objstore_doorbells_);
   Py_RETURN_NONE;
 }
 
@@ -276,9 +333,9 @@ const char* Worker::get_buffer(ObjectID objectid, int64_t &size, SegmentId& segm
   request.workerid = workerid_;
   request.type = ObjRequestType::GET;
   request.objectid = objectid;
-  RAY_CHECK(request_obj_queue_.send(&request), "Failed to send request from the worker to the object store because the message queue was full.");
+  objstore_channel_.push_request(request, objstore_doorbells_);
   ObjHandle result;
-  RAY_CHECK(receive_obj_queue_.receive(&result), "error receiving over IPC");
+  objstore_channel_.pop_reply(&result);
   const char* address = reinterpret_cast<const char*>(segmentpool_->get_address(result));
   size = result.size();
   segmentid = result.segmentid();
@@ -286,16 +343,8 @@ const char* Worker::get_buffer(ObjectID objectid, int64_t &size, SegmentId& segm
   return address;
 }
 
-bool Worker::is_arrow(ObjectID objectid) {
-  RAY_CHECK(connected_, "Attempted to perform is_arrow but failed.");
-  ObjRequest request;
-  request.workerid = workerid_;
-  request.type = ObjRequestType::GET;
-  request.objectid = objectid;
-  RAY_CHECK(request_obj_queue_.send(&request), "Failed to send request from the worker to the object store because the message queue was full.");
-  ObjHandle result;
-  RAY_CHECK(receive_obj_queue_.receive(&result), "error receiving over IPC");
-  return result.metadata_offset() != 0;
+ObjectID Worker::get_interrupted_objectid() {
+  return interrupted_objectid;
 }
 
 void Worker::unmap_object(ObjectID objectid) {
@@ -390,6 +439,13 @@ void Worker::ready_for_new_task() {
 }
 
 void Worker::disconnect() {
+  if (connected_ && objstore_channel_.connected()) {
+    // Let the object store stop processing the requests of this worker.
+    ObjRequest request;
+    request.workerid = workerid_;
+    request.type = ObjRequestType::DISCONNECT;
+    objstore_channel_.push_request(request, objstore_doorbells_);
+  }
   connected_ = false;
   // Shut down the worker service. This will cause the call to server->Wait() to
   // return.
@@ -409,6 +465,23 @@ void Worker::task_info(ClientContext &context, TaskInfoRequest &request, TaskInf
   RAY_CHECK_GRPC(scheduler_stub_->TaskInfo(&context, request, &reply));
 }
 
+void Worker::memory_info(ClientContext &context, MemoryInfoRequest &request, MemoryInfoReply &reply) {
+  RAY_CHECK(connected_, "Attempted to get memory info but failed.");
+  RAY_CHECK_GRPC(scheduler_stub_->MemoryInfo(&context, request, &reply));
+}
+
+void Worker::dump_computation_graph(std::ostream& output) {
+  RAY_CHECK(connected_, "Attempted to dump the computation graph but failed.");
+  ClientContext context;
+  ComputationGraphInfoRequest request;
+  ComputationGraphChunk chunk;
+  std::unique_ptr<ClientReader<ComputationGraphChunk> > reader(scheduler_stub_->ComputationGraphInfo(&context, request));
+  while (reader->Read(&chunk)) {
+    output.write(chunk.data().data(), chunk.data().size());
+  }
+  RAY_CHECK_GRPC(reader->Finish());
+}
+
 std::vector<int> Worker::wait(std::vector<ObjectID>& objectids) {
   RAY_CHECK(connected_, "Attempted to test if object was ready but failed.");
   ClientContext context;
@@ -425,6 +498,16 @@ std::vector<int> Worker::wait(std::vector<ObjectID>& objectids) {
   return result;
 }
 
+CancelTaskReply Worker::cancel_task(ObjectID objectid) {
+  RAY_CHECK(connected_, "Attempted to cancel a task but failed.");
+  ClientContext context;
+  CancelTaskRequest request;
+  request.set_objectid(objectid);
+  CancelTaskReply reply;
+  RAY_CHECK_GRPC(scheduler_stub_->CancelTask(&context, request, &reply));
+  return reply;
+}
+
 void Worker::run_function_on_all_workers(const std::string& function) {
   RAY_CHECK(connected_, "Attempted to run function on all workers but failed.");
   ClientContext context;
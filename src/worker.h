@@ -22,6 +22,7 @@ using grpc::Status;
 using grpc::Channel;
 using grpc::ClientContext;
 using grpc::ClientWriter;
+using grpc::ClientReader;
 
 // These three constants are used to define the mode that a worker is running
 // in. Right now, this is mostly used for determining how to print information
@@ -37,6 +38,7 @@ public:
   Status Die(ServerContext* context, const DieRequest* request, AckReply* reply) override;
   Status ImportReusableVariable(ServerContext* context, const ImportReusableVariableRequest* request, AckReply* reply) override;
   Status PrintErrorMessage(ServerContext* context, const PrintErrorMessageRequest* request, AckReply* reply) override;
+  Status InterruptTask(ServerContext* context, const InterruptTaskRequest* request, AckReply* reply) override;
 private:
   // The queue used to send commands from the worker service to the worker. This
   // corresponds to the receive_queue_ in the worker.
@@ -62,16 +64,22 @@ class Worker {
   ObjectID get_objectid();
   // request an object to be delivered to the local object store
   void request_object(ObjectID objectid);
+  // request an object to be copied to all object stores
+  void broadcast_object(ObjectID objectid);
+  // request objects to be copied to the object store at objstore_address, to
+  // the local object store if objstore_address is empty, or to an object store
+  // holding placement_hint if placement_hint is not null
+  // Returns false if objstore_address is not empty and no object store with
+  // this address is registered.
+  bool prefetch_objects(const std::vector<ObjectID>& objectids, const std::string& objstore_address, const ObjectID* placement_hint);
   // Notify the scheduler about the object IDs contained within a remote object.
   void add_contained_objectids(ObjectID objectid, std::vector<ObjectID> &contained_objectids);
   // Allocates buffer for objectid with size of size
   const char* allocate_buffer(ObjectID objectid, int64_t size, SegmentId& segmentid);
   // Finishes buffer with segmentid and an offset of metadata_ofset
   PyObject* finish_buffer(ObjectID objectid, SegmentId segmentid, int64_t metadata_offset);
-  // Gets the buffer for objectid
+  // Gets the buffer for objectid, the object is an arrow object if metadata_offset is not zero
   const char* get_buffer(ObjectID objectid, int64_t& size, SegmentId& segmentid, int64_t& metadata_offset);
-  // determine if the object stored in objectid is an arrow object // TODO(pcm): more general mechanism for this?
-  bool is_arrow(ObjectID objectid);
   // unmap the segment containing an object from the local address space
   void unmap_object(ObjectID objectid);
   // make `alias_objectid` refer to the same object that `target_objectid` refers to
@@ -101,8 +109,17 @@ class Worker {
   void scheduler_info(ClientContext &context, SchedulerInfoRequest &request, SchedulerInfoReply &reply);
   // get task statuses from scheduler
   void task_info(ClientContext &context, TaskInfoRequest &request, TaskInfoReply &reply);
+  // get the memory usage of the object stores from the scheduler
+  void memory_info(ClientContext &context, MemoryInfoRequest &request, MemoryInfoReply &reply);
+  // stream the computation graph from the scheduler to output as a serialized CompGraph
+  void dump_computation_graph(std::ostream& output);
   // gets indices of available objects
   std::vector<int> wait(std::vector<ObjectID>& objectids);
+  // Cancel the task that creates objectid.
+  CancelTaskReply cancel_task(ObjectID objectid);
+  // Return the object ID of the last request to interrupt the task running on
+  // this worker.
+  ObjectID get_interrupted_objectid();
   // Export a function to be run on all workers.
   void run_function_on_all_workers(const std::string& function);
   // export function to workers
@@ -132,13 +149,16 @@ class Worker {
   MessageQueue<WorkerMessage*> receive_queue_;
   // The name of the receive queue.
   std::string receive_queue_name_;
-  // The queue used to send requests to the object store. There is a single
-  // queue shared by all workers sending requests to the object store, and this
-  // queue is created by the object store.
+  // The queue used to connect to the object store. There is a single queue
+  // shared by all workers connecting to the object store, and this queue is
+  // created by the object store.
   MessageQueue<ObjRequest> request_obj_queue_;
-  // The queue used to receive object addresses from the object store. This
-  // queue is created by this worker.
-  MessageQueue<ObjHandle> receive_obj_queue_;
+  // The ring buffers used to send requests to the object store and to receive
+  // object addresses from it. This channel is created by this worker.
+  ObjStoreChannel objstore_channel_;
+  // The doorbells of the request threads of the object store, one of which is
+  // rung after every request sent over objstore_channel_.
+  DoorbellArray objstore_doorbells_;
   std::shared_ptr<MemorySegmentPool> segmentpool_;
 };
 
@@ -2,6 +2,9 @@ import unittest
 import ray
 import numpy as np
 import time
+import os
+import shutil
+import tempfile
 from numpy.testing import assert_equal, assert_almost_equal
 
 import ray.array.remote as ra
@@ -53,6 +56,218 @@ class DistributedArrayTest(unittest.TestCase):
     x = da.DistArray([2 * da.BLOCK_SIZE, da.BLOCK_SIZE], np.array([[a], [b]]))
     assert_equal(x.assemble(), np.vstack([np.ones([da.BLOCK_SIZE, da.BLOCK_SIZE]), np.zeros([da.BLOCK_SIZE, da.BLOCK_SIZE])]))
 
+    # Assemble into a preallocated array, with one object ID in several blocks.
+    y = da.DistArray([da.BLOCK_SIZE, 3 * da.BLOCK_SIZE], np.array([[a, b, a]]))
+    out = np.empty([da.BLOCK_SIZE, 3 * da.BLOCK_SIZE])
+    self.assertIs(y.assemble(out=out), out)
+    assert_equal(out, np.hstack([np.ones([da.BLOCK_SIZE, da.BLOCK_SIZE]), np.zeros([da.BLOCK_SIZE, da.BLOCK_SIZE]), np.ones([da.BLOCK_SIZE, da.BLOCK_SIZE])]))
+    self.assertRaises(Exception, lambda : y.assemble(out=np.empty([da.BLOCK_SIZE, da.BLOCK_SIZE])))
+
+    # Arrays with more blocks than are gotten and prefetched at a time.
+    num_blocks = (da.ASSEMBLE_PREFETCH_CHUNKS + 3) * da.ASSEMBLE_CHUNK_SIZE + 1
+    blocks = [ra.zeros.remote([da.BLOCK_SIZE, da.BLOCK_SIZE]) if i % 2 == 0 else a for i in range(num_blocks)]
+    w = da.DistArray([num_blocks * da.BLOCK_SIZE, da.BLOCK_SIZE], np.array([[block] for block in blocks]))
+    assert_equal(w.assemble(), np.vstack([np.zeros([da.BLOCK_SIZE, da.BLOCK_SIZE]) if i % 2 == 0 else np.ones([da.BLOCK_SIZE, da.BLOCK_SIZE]) for i in range(num_blocks)]))
+
+    # The dtype is recorded when the array is created.
+    z = ray.get(da.zeros.remote([25, 15], "int32"))
+    self.assertEqual(z.dtype_name, "int32")
+    self.assertEqual(z.assemble().dtype, np.int32)
+    self.assertEqual(ray.get(da.add.remote(z, ray.get(da.ones.remote([25, 15])))).dtype_name, "float64")
+
+    ray.worker.cleanup()
+
+  def testBlockShapes(self):
+    for module in [ra.core, ra.random, ra.linalg, da.core, da.random, da.linalg]:
+      reload(module)
+    ray.init(start_ray_local=True, num_workers=2)
+
+    self.assertEqual(da.choose_block_shape([10000, 10000], "float", 8 * 1000 ** 2), [1000, 1000])
+    self.assertEqual(da.choose_block_shape([3, 10 ** 6], "float", 8 * 3000), [3, 1000])
+    self.assertEqual(da.choose_block_shape([100, 100, 100], "float", 8 * 1000), [10, 10, 10])
+
+    x = da.random.normal.remote([25, 49], block_shape=[7, 12])
+    self.assertEqual(ray.get(x).block_shape, [7, 12])
+    self.assertEqual(ray.get(x).num_blocks, [4, 5])
+    y = da.random.normal.remote([49, 18], block_shape=[12, 5])
+    x_val = ray.get(da.assemble.remote(x))
+    y_val = ray.get(da.assemble.remote(y))
+    assert_almost_equal(ray.get(da.assemble.remote(da.dot.remote(x, y))), np.dot(x_val, y_val))
+    v = da.random.normal.remote([49], block_shape=[12])
+    assert_almost_equal(ray.get(da.assemble.remote(da.dot.remote(x, v))), np.dot(x_val, ray.get(da.assemble.remote(v))))
+    # Split the inner dimension into panels of one and two blocks, with either
+    # operand stationary.
+    for panel_blocks in [1, 2]:
+      assert_almost_equal(ray.get(da.assemble.remote(da.dot.remote(x, y, panel_blocks=panel_blocks))), np.dot(x_val, y_val))
+      assert_almost_equal(ray.get(da.assemble.remote(da.dot.remote(da.transpose.remote(y), da.transpose.remote(x), panel_blocks=panel_blocks))), np.dot(y_val.T, x_val.T))
+      assert_almost_equal(ray.get(da.assemble.remote(da.dot.remote(x, v, panel_blocks=panel_blocks))), np.dot(x_val, ray.get(da.assemble.remote(v))))
+    self.assertRaises(Exception, lambda : ray.get(da.dot.remote(x, y, panel_blocks=0)))
+    assert_equal(ray.get(da.assemble.remote(da.transpose.remote(x))), x_val.T)
+    assert_equal(ray.get(da.assemble.remote(da.add.remote(x, x))), x_val + x_val)
+    assert_equal(ray.get(da.assemble.remote(da.numpy_to_dist.remote(x_val, [3, 30]))), x_val)
+    assert_equal(ray.get(da.assemble.remote(da.zeros.remote([9, 25, 51], "float", [4, 4, 50]))), np.zeros([9, 25, 51]))
+    assert_equal(ray.get(da.assemble.remote(da.eye.remote(25, block_shape=[6, 6]))), np.eye(25))
+
+    a = da.random.normal.remote([40, 23], block_shape=[15, 15])
+    q, r = da.linalg.qr.remote(a)
+    a_val = ray.get(da.assemble.remote(a))
+    q_val = ray.get(da.assemble.remote(q))
+    r_val = ray.get(da.assemble.remote(r))
+    assert_almost_equal(np.dot(q_val.T, q_val), np.eye(23))
+    assert_almost_equal(a_val, np.dot(q_val, r_val))
+
+    ray.worker.cleanup()
+
+  def testGetItem(self):
+    for module in [ra.core, ra.random, ra.linalg, da.core, da.random, da.linalg]:
+      reload(module)
+    ray.init(start_ray_local=True, num_workers=2)
+
+    x = ray.get(da.random.normal.remote([25, 49, 3], block_shape=[7, 12, 2]))
+    x_val = x.assemble()
+    for index in [3, -1, (3, 40, 1), (slice(None), 5), (slice(2, 20), slice(11, 13)), (slice(None, None, -3), slice(5, 45, 7), 0),
+                  (Ellipsis, 2), (4, Ellipsis), (slice(10, 10),), (slice(24, 2, -5), Ellipsis, slice(None, None, -1))]:
+      assert_equal(x[index], x_val[index])
+    self.assertRaises(IndexError, lambda : x[25])
+    self.assertRaises(IndexError, lambda : x[1, 2, 3, 4])
+
+    ray.worker.cleanup()
+
+  def testLazy(self):
+    for module in [ra.core, ra.random, ra.linalg, da.core, da.random, da.linalg, da.lazy]:
+      reload(module)
+    ray.init(start_ray_local=True, num_workers=2)
+
+    a, b, c = [ray.get(da.random.normal.remote([23, 23], block_shape=[5, 5])) for _ in range(3)]
+    a_val, b_val, c_val = a.assemble(), b.assemble(), c.assemble()
+    x = da.lazy.as_lazy(a) + b - c
+    assert_almost_equal(ray.get(da.lazy.materialize.remote(x)).assemble(), a_val + b_val - c_val)
+    y = da.lazy.triu(da.lazy.transpose(da.lazy.subtract(a, da.lazy.tril(b))))
+    assert_almost_equal(ray.get(da.lazy.materialize.remote(y)).assemble(), np.triu((a_val - np.tril(b_val)).T))
+    # Materializing an array that is not the result of an operation reuses its blocks.
+    z = ray.get(da.lazy.materialize.remote(da.lazy.as_lazy(a)))
+    self.assertEqual(list(z.objectids.flatten()), list(a.objectids.flatten()))
+    self.assertRaises(Exception, lambda : da.lazy.add(a, ray.get(da.random.normal.remote([23, 23]))))
+    # Numbers can be used on either side of an operation.
+    w = 2 * da.lazy.as_lazy(a) - 1
+    w = 3.0 / (1 + w ** 2) + np.float32(0.5) - da.lazy.as_lazy(b) * 2
+    assert_almost_equal(ray.get(da.lazy.materialize.remote(w)).assemble(), 3.0 / (1 + (2 * a_val - 1) ** 2) + np.float32(0.5) - b_val * 2)
+    self.assertEqual(w.dtype_name, "float64")
+    self.assertEqual(ray.get(da.lazy.materialize.remote(2 ** da.lazy.as_lazy(a))).dtype_name, "float64")
+    self.assertRaises(Exception, lambda : da.lazy.add(1, 2))
+    self.assertRaises(Exception, lambda : da.lazy.as_lazy(a) + "hi")
+    self.assertRaises(Exception, lambda : da.lazy.as_lazy(2))
+
+    ray.worker.cleanup()
+
+  def testTransposedBlocks(self):
+    for module in [ra.core, ra.random, ra.linalg, da.core, da.random, da.reductions, da.linalg, da.lazy]:
+      reload(module)
+    ray.init(start_ray_local=True, num_workers=2)
+
+    x = ray.get(da.random.normal.remote([23, 17], block_shape=[5, 4]))
+    y = ray.get(da.random.normal.remote([17, 23], block_shape=[4, 5]))
+    x_val, y_val = x.assemble(), y.assemble()
+    # Transposing, copying and taking subblocks only rearrange object IDs.
+    xt = x.T
+    self.assertTrue(xt.transposed)
+    self.assertEqual(xt.block_shape, [4, 5])
+    self.assertEqual(set(xt.objectids.flatten()), set(x.objectids.flatten()))
+    self.assertFalse(xt.T.transposed)
+    assert_equal(xt.assemble(), x_val.T)
+    assert_equal(xt[3:9, 2], x_val.T[3:9, 2])
+    assert_equal(xt.subblocks([1, 2], []).assemble(), x_val.T[4:12, :])
+    assert_equal(xt.copy().assemble(), x_val.T)
+    assert_equal(ray.get(da.transpose.remote(x)).assemble(), x_val.T)
+    assert_equal(xt.untransposed().assemble(), x_val.T)
+    self.assertFalse(xt.untransposed().transposed)
+    # Operations on arrays with transposed blocks transpose them in their tasks.
+    assert_almost_equal(ray.get(da.add.remote(xt, y)).assemble(), x_val.T + y_val)
+    assert_almost_equal(ray.get(da.dot.remote(xt, x)).assemble(), np.dot(x_val.T, x_val))
+    assert_almost_equal(ray.get(da.dot.remote(y, xt)).assemble(), np.dot(y_val, x_val.T))
+    assert_almost_equal(ray.get(da.sum.remote(xt, axis=0)).assemble(), np.sum(x_val.T, axis=0))
+    assert_almost_equal(ray.get(da.lazy.materialize.remote(da.lazy.as_lazy(xt) - y)).assemble(), x_val.T - y_val)
+    z = ray.get(da.random.normal.remote([20, 20], block_shape=[5, 5]))
+    assert_equal(ray.get(da.triu.remote(z.T)).assemble(), np.triu(z.assemble().T))
+    q, r = da.linalg.qr.remote(z.T)
+    assert_almost_equal(np.dot(ray.get(da.assemble.remote(q)), ray.get(da.assemble.remote(r))), z.assemble().T)
+
+    ray.worker.cleanup()
+
+  def testReductions(self):
+    for module in [ra.core, ra.random, ra.linalg, da.core, da.random, da.reductions, da.linalg]:
+      reload(module)
+    ray.init(start_ray_local=True, num_workers=2)
+
+    x = da.random.normal.remote([47, 23, 5], block_shape=[3, 7, 2])
+    x_val = ray.get(da.assemble.remote(x))
+    for (reduction, numpy_reduction) in [(da.sum, np.sum), (da.mean, np.mean), (da.max, np.max), (da.min, np.min), (da.argmax, np.argmax), (da.linalg.norm, None)]:
+      for axis in [None, 0, 1, -1]:
+        for keepdims in [False, True]:
+          if reduction is da.argmax and keepdims:
+            continue # np.argmax does not support keepdims.
+          if numpy_reduction is None:
+            expected = np.sqrt(np.sum(x_val ** 2, axis=axis, keepdims=keepdims))
+          else:
+            expected = numpy_reduction(x_val, axis=axis, keepdims=keepdims) if reduction is not da.argmax else np.argmax(x_val, axis=axis)
+          result = ray.get(reduction.remote(x, axis=axis, keepdims=keepdims))
+          if axis is not None:
+            result = result.assemble()
+          assert_almost_equal(result, expected)
+    self.assertTrue(np.isscalar(ray.get(da.sum.remote(x))))
+    y = da.random.normal.remote([100], block_shape=[3])
+    assert_almost_equal(ray.get(da.mean.remote(y, axis=0)), np.mean(ray.get(da.assemble.remote(y))))
+    self.assertEqual(ray.get(da.sum.remote(da.ones.remote([10, 30], "int32", [4, 4]), axis=0)).assemble().dtype, np.sum(np.ones(1, dtype=np.int32)).dtype)
+
+    ray.worker.cleanup()
+
+  def testNpyFiles(self):
+    for module in [ra.core, ra.random, ra.linalg, da.core, da.random, da.linalg]:
+      reload(module)
+    ray.init(start_ray_local=True, num_workers=2)
+
+    directory = tempfile.mkdtemp()
+    try:
+      path = os.path.join(directory, "a.npy")
+      a_val = np.random.normal(size=[23, 17]).astype(np.float32)
+      np.save(path, a_val)
+      a = da.from_npy.remote(path, block_shape=[5, 4])
+      self.assertEqual(ray.get(a).block_shape, [5, 4])
+      self.assertEqual(ray.get(a).dtype_name, "float32")
+      assert_equal(ray.get(da.assemble.remote(a)), a_val)
+      # Fortran-ordered files and the default block shape.
+      np.save(path, np.asfortranarray(a_val))
+      assert_equal(ray.get(da.assemble.remote(da.from_npy.remote(path))), a_val)
+      # Raw files that are memory-mapped on the driver.
+      raw_path = os.path.join(directory, "b.dat")
+      a_val.tofile(raw_path)
+      assert_equal(da.from_memmap(np.memmap(raw_path, dtype=np.float32, mode="r", shape=(23, 17)), block_shape=[6, 6]).assemble(), a_val)
+      # Contiguous views start at their own offset in the file, and strided
+      # views cannot be loaded.
+      raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(23, 17))
+      assert_equal(da.from_memmap(raw[5:19], block_shape=[6, 6]).assemble(), a_val[5:19])
+      assert_equal(da.from_memmap(raw[5:19][3:], block_shape=[6, 6]).assemble(), a_val[8:19])
+      self.assertRaises(Exception, lambda : da.from_memmap(raw[:, 2:5]))
+      self.assertRaises(Exception, lambda : da.from_memmap(raw[::2]))
+      self.assertRaises(Exception, lambda : da.from_memmap(np.ones([3, 3])))
+
+      out_path = os.path.join(directory, "out.npy")
+      b = da.random.normal.remote([31, 9, 4], block_shape=[7, 2, 3])
+      writes = da.to_npy(ray.get(b), out_path)
+      self.assertEqual(len(writes), ray.get(b).objectids.size)
+      self.assertTrue(all(ray.get(writes)))
+      assert_equal(np.load(out_path), ray.get(da.assemble.remote(b)))
+      # Arrays with transposed blocks are written in their logical layout.
+      c = ray.get(da.numpy_to_dist.remote(a_val, block_shape=[5, 4])).T
+      ray.get(da.to_npy(c, out_path))
+      assert_equal(np.load(out_path), a_val.T)
+      # Blocks that cover whole rows are written as one range of bytes.
+      d = da.numpy_to_dist.remote(a_val, block_shape=[5, 17])
+      ray.get(da.to_npy(ray.get(d), out_path))
+      assert_equal(np.load(out_path), a_val)
+    finally:
+      shutil.rmtree(directory)
+
     ray.worker.cleanup()
 
   def testMethods(self):
@@ -102,6 +317,23 @@ class DistributedArrayTest(unittest.TestCase):
     z = da.subtract.remote(x, y)
     assert_almost_equal(ray.get(da.assemble.remote(z)), ray.get(da.assemble.remote(x)) - ray.get(da.assemble.remote(y)))
 
+    # test broadcasting
+    x = da.random.normal.remote([23, 42], block_shape=[5, 7])
+    y = da.random.normal.remote([42], block_shape=[7])
+    w = da.random.normal.remote([23, 1], block_shape=[5, 1])
+    x_val, y_val, w_val = [ray.get(da.assemble.remote(v)) for v in [x, y, w]]
+    self.assertEqual(da.broadcast_shapes([23, 42], [42], [1, 1]), [23, 42])
+    self.assertRaises(Exception, lambda : da.broadcast_shapes([23, 42], [23]))
+    assert_almost_equal(ray.get(da.assemble.remote(da.add.remote(x, y))), x_val + y_val)
+    assert_almost_equal(ray.get(da.assemble.remote(da.multiply.remote(w, x))), w_val * x_val)
+    assert_almost_equal(ray.get(da.assemble.remote(da.subtract.remote(w, y))), w_val - y_val)
+    assert_almost_equal(ray.get(da.assemble.remote(da.divide.remote(x, 2.0))), x_val / 2.0)
+    assert_almost_equal(ray.get(da.assemble.remote(da.power.remote(3, w))), 3 ** w_val)
+    assert_equal(ray.get(da.assemble.remote(da.greater.remote(x, y))), x_val > y_val)
+    assert_equal(ray.get(da.assemble.remote(da.less_equal.remote(x, 0))), x_val <= 0)
+    self.assertEqual(ray.get(da.add.remote(w, y)).block_shape, [5, 7])
+    self.assertEqual(ray.get(da.equal.remote(x, y)).dtype_name, "bool")
+
     # test transpose
     x = da.random.normal.remote([234, 432])
     y = da.transpose.remote(x)
@@ -1,7 +1,9 @@
 import unittest
+import os
 import ray
 import time
 import numpy as np
+import ray.array.distributed as da
 
 import test_functions
 
@@ -78,5 +80,125 @@ class MicroBenchmarkTest(unittest.TestCase):
 
     ray.worker.cleanup()
 
+  def testSchedulerMemory(self):
+    ray.init(start_ray_local=True, num_workers=0)
+
+    def scheduler_rss_kb():
+      # The scheduler is the first process started by start_ray_local.
+      scheduler_pid = ray.services.all_processes[0].pid
+      with open("/proc/{}/status".format(scheduler_pid)) as f:
+        for line in f:
+          if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+
+    # Create and release many objects. The scheduler reclaims the metadata of
+    # deallocated objects, so its memory usage should stay flat.
+    num_rounds = 10
+    num_objects_per_round = 10000
+    rss_samples = []
+    for _ in range(num_rounds):
+      for _ in range(num_objects_per_round):
+        ray.put(1)
+      rss_samples.append(scheduler_rss_kb())
+    print "Scheduler memory while creating {} objects:".format(num_rounds * num_objects_per_round)
+    print "    RSS after each round (KB): {}".format(rss_samples)
+    print "    live objects:              {}".format(ray.scheduler_info()["num_live_objects"])
+    # Once the first half of the rounds has warmed up the allocator, the RSS
+    # should not grow by more than a few MB over the second half. Unbounded
+    # growth of the metadata would show up as growth in every round.
+    max_growth_kb = 4 * 1024
+    growth_kb = rss_samples[-1] - rss_samples[num_rounds / 2 - 1]
+    self.assertLess(growth_kb, max_growth_kb, "The scheduler RSS grew by {} KB over the second half of the rounds.".format(growth_kb))
+
+    ray.worker.cleanup()
+
+  def testPutGetBandwidth(self):
+    # Measure the bandwidth of putting and getting arrays between 1MB and 4GB
+    # with and without huge pages and prefaulting. Only use sizes that fit in
+    # /dev/shm several times over.
+    shm_stats = os.statvfs("/dev/shm")
+    shm_bytes = shm_stats.f_bsize * shm_stats.f_bavail
+    sizes = [size for size in [2 ** 20, 2 ** 24, 2 ** 28, 2 ** 30, 2 ** 32] if 3 * size < shm_bytes]
+    num_trials = 5
+    for huge_pages, prefault in [(False, False), (False, True), (True, True)]:
+      ray.init(start_ray_local=True, num_workers=0, huge_pages=huge_pages, prefault=prefault)
+      print "Put and get bandwidth with huge_pages={} and prefault={}:".format(huge_pages, prefault)
+      for size in sizes:
+        a = np.ones(size, dtype=np.uint8)
+        put_times = []
+        get_times = []
+        for _ in range(num_trials):
+          start_time = time.time()
+          x = ray.put(a)
+          put_times.append(time.time() - start_time)
+          start_time = time.time()
+          ray.get(x)
+          get_times.append(time.time() - start_time)
+          del x
+        print "    {:>5} MB: put {:.0f} MB/s, get {:.0f} MB/s".format(size / 2 ** 20, size / 2 ** 20 / min(put_times), size / 2 ** 20 / min(get_times))
+      ray.worker.cleanup()
+
+  def testDistributedDot(self):
+    # Compare da.dot with the previous implementation, which computed each block
+    # of the result in one task from a whole block row of a and block column of
+    # b, on local clusters with several object stores.
+    def panel_dot(a, b):
+      result = da.DistArray([a.shape[0], b.shape[1]], block_shape=[a.block_shape[0], b.block_shape[1]])
+      for (i, j) in np.ndindex(*result.num_blocks):
+        result.objectids[i, j] = da.blockwise_dot.remote(*(list(a.objectids[i, :]) + list(b.objectids[:, j])))
+      return result
+
+    def time_dot(dot, a, b):
+      start_time = time.time()
+      result = dot(a, b)
+      objectids = list(result.objectids.flatten())
+      ray.wait(objectids, num_returns=len(objectids))
+      return time.time() - start_time
+
+    num_trials = 3
+    for num_objstores in [2, 4]:
+      ray.init(start_ray_local=True, num_objstores=num_objstores, num_workers=4 * num_objstores)
+      for (n, block_size) in [(2000, 250), (4000, 500)]:
+        a = ray.get(da.random.normal.remote([n, n], block_shape=[block_size, block_size]))
+        b = ray.get(da.random.normal.remote([n, n], block_shape=[block_size, block_size]))
+        v = ray.get(da.random.normal.remote([n], block_shape=[block_size]))
+        panel_times = [time_dot(panel_dot, a, b) for _ in range(num_trials)]
+        summa_times = [time_dot(lambda x, y: ray.get(da.dot.remote(x, y)), a, b) for _ in range(num_trials)]
+        matvec_times = [time_dot(lambda x, y: ray.get(da.dot.remote(x, y)), a, v) for _ in range(num_trials)]
+        print "Distributed dot of {0}x{0} matrices with {1}x{1} blocks on {2} object stores:".format(n, block_size, num_objstores)
+        print "    block row times block column: {:.2f}s".format(min(panel_times))
+        print "    da.dot:                       {:.2f}s".format(min(summa_times))
+        print "    da.dot with a vector:         {:.2f}s".format(min(matvec_times))
+      ray.worker.cleanup()
+
+  def testDistArrayPassThrough(self):
+    # Measure the cost of putting, getting, and passing a DistArray through a
+    # task as the number of blocks grows. The blocks reuse a pool of small
+    # objects, so the time is dominated by the grid of object IDs.
+    ray.init(start_ray_local=True, num_workers=1)
+    pool = [ray.put(np.zeros([1])) for _ in range(1000)]
+    num_trials = 3
+    print "Passing DistArrays with many blocks:"
+    for num_blocks in [1000, 10000, 100000]:
+      a = da.DistArray([num_blocks], block_shape=[1], dtype_name="float64")
+      for i in range(num_blocks):
+        a.objectids[i] = pool[i % len(pool)]
+      put_times = []
+      get_times = []
+      task_times = []
+      for _ in range(num_trials):
+        start_time = time.time()
+        x = ray.put(a)
+        put_times.append(time.time() - start_time)
+        start_time = time.time()
+        ray.get(x)
+        get_times.append(time.time() - start_time)
+        start_time = time.time()
+        ray.get(da.copy.remote(x))
+        task_times.append(time.time() - start_time)
+        del x
+      print "    {:>6} blocks: put {:.4f}s, get {:.4f}s, round trip through a task {:.4f}s".format(num_blocks, min(put_times), min(get_times), min(task_times))
+    ray.worker.cleanup()
+
 if __name__ == "__main__":
   unittest.main(verbosity=2)
@@ -1,6 +1,8 @@
 import unittest
 import ray
 import numpy as np
+import os
+import tempfile
 import time
 import string
 import sys
@@ -143,6 +145,24 @@ class SerializationTest(unittest.TestCase):
 
     ray.worker.cleanup()
 
+def objstore_memory_info(objstore_address):
+  [info] = [info for info in ray.memory_info() if info["address"] == objstore_address]
+  return info
+
+# Wait until the object store holds num_objects objects, or num_objects objects
+# created by function if function is given, and return False on timeout.
+def wait_for_num_objects(objstore_address, num_objects, function=None):
+  def count():
+    info = objstore_memory_info(objstore_address)
+    if function is None:
+      return info["num_objects"]
+    return info["functions"][function]["num_objects"] if function in info["functions"] else 0
+  for _ in range(50):
+    if count() == num_objects:
+      break
+    time.sleep(0.1)
+  return count() == num_objects
+
 class ObjStoreTest(unittest.TestCase):
 
   # Test setting up object stores, transfering data between them and retrieving data to a client
@@ -201,6 +221,352 @@ class ObjStoreTest(unittest.TestCase):
     ray.disconnect(worker=w2)
     ray.worker.cleanup()
 
+  def testCopyBetweenColocatedObjStores(self):
+    node_ip_address = "127.0.0.1"
+    scheduler_address = ray.services.start_ray_local(num_objstores=2, num_workers=0, worker_path=None)
+    ray.connect(node_ip_address, scheduler_address, mode=ray.SCRIPT_MODE)
+    objstore_addresses = [objstore_info["address"] for objstore_info in ray.scheduler_info()["objstores"]]
+    w1 = ray.worker.Worker()
+    w2 = ray.worker.Worker()
+    ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+    ray.connect(node_ip_address, scheduler_address, objstore_address=objstore_addresses[0], mode=ray.SCRIPT_MODE, worker=w1)
+    ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+    ray.connect(node_ip_address, scheduler_address, objstore_address=objstore_addresses[1], mode=ray.SCRIPT_MODE, worker=w2)
+
+    # Each object is deallocated in both object stores before the next one is
+    # put, so the next one reuses the memory of the previous one in the source
+    # object store, and the copy must still see the new data.
+    for i in range(5):
+      for data in [i * np.ones(10), np.random.normal(size=[1000, 1000]), np.arange(2 * 10 ** 6) + i]:
+        objectid = ray.put(data, w1)
+        result = ray.get(objectid, w2)
+        assert_equal(result, data)
+        del objectid, result
+        self.assertTrue(wait_for_num_objects(objstore_addresses[0], 0))
+        self.assertTrue(wait_for_num_objects(objstore_addresses[1], 0))
+
+    # The object stores run on the same machine, so they copied the objects
+    # through shared memory (MapObj) and did not stream any of them.
+    for objstore_address in objstore_addresses:
+      compression_stats = objstore_memory_info(objstore_address)["compression_stats"]
+      self.assertEqual(compression_stats["num_streams_compressed"], 0)
+      self.assertEqual(compression_stats["num_streams_uncompressed"], 0)
+
+    # We started multiple drivers manually, so we will disconnect them manually.
+    ray.disconnect(worker=w1)
+    ray.disconnect(worker=w2)
+    ray.worker.cleanup()
+
+class ObjStoreConcurrencyTest(unittest.TestCase):
+
+  def testConcurrentPutsAndGets(self):
+    ray.init(start_ray_local=True, num_workers=8)
+
+    # Every task puts objects of its own and gets them back, and also gets an
+    # object that all of the tasks share, so the object store handles many
+    # requests for the same and for different object IDs at the same time.
+    shared = ray.put(np.arange(1000))
+
+    @ray.remote
+    def f(i, shared):
+      for j in range(50):
+        value = np.array([i, j])
+        assert np.alltrue(ray.get(ray.put(value)) == value)
+        assert np.alltrue(ray.get(shared) == np.arange(1000))
+      return i
+
+    self.assertEqual(ray.get([f.remote(i, shared) for i in range(32)]), range(32))
+    # The objects put by the tasks can be retrieved by the driver too.
+    @ray.remote
+    def g(i):
+      return [ray.put(i * np.ones(100)) for _ in range(10)]
+
+    for (i, objectids) in enumerate(ray.get([g.remote(i) for i in range(16)])):
+      for value in ray.get(objectids):
+        self.assertTrue(np.alltrue(value == i * np.ones(100)))
+
+    ray.worker.cleanup()
+
+  def testObjReadyLatency(self):
+    ray.init(start_ray_local=True, num_workers=2)
+
+    # Each task depends on the previous one, so every step of the chain waits
+    # for the scheduler to learn that an object is ready. If batched ObjReady
+    # notifications were held back, the chain would take much longer.
+    @ray.remote
+    def increment(x):
+      return x + 1
+
+    self.assertEqual(ray.get(increment.remote(0)), 1) # Warm up the workers.
+    num_steps = 200
+    start_time = time.time()
+    x = 0
+    for _ in range(num_steps):
+      x = increment.remote(x)
+    self.assertEqual(ray.get(x), num_steps)
+    self.assertLess(time.time() - start_time, 10)
+
+    # A task that is waiting for an object that another task is still computing
+    # starts as soon as the object is ready.
+    @ray.remote
+    def slow():
+      time.sleep(1)
+      return 1
+
+    start_time = time.time()
+    self.assertEqual(ray.get(increment.remote(slow.remote())), 2)
+    self.assertLess(time.time() - start_time, 3)
+
+    ray.worker.cleanup()
+
+  def testManySmallRequests(self):
+    ray.init(start_ray_local=True, num_workers=4)
+
+    # Thousands of tiny puts and gets from several workers at once exercise the
+    # request threads of the object store and the doorbells that wake them up.
+    @ray.remote
+    def f(i):
+      for j in range(1000):
+        assert ray.get(ray.put(j)) == j
+      return i
+
+    self.assertEqual(ray.get([f.remote(i) for i in range(8)]), range(8))
+    # After the object store has been idle long enough for its request threads
+    # to sleep, requests are still answered right away.
+    time.sleep(2)
+    start_time = time.time()
+    for j in range(1000):
+      self.assertEqual(ray.get(ray.put(j)), j)
+    self.assertLess(time.time() - start_time, 10)
+
+    ray.worker.cleanup()
+
+class BroadcastTest(unittest.TestCase):
+
+  def testBroadcast(self):
+    node_ip_address = "127.0.0.1"
+    scheduler_address = ray.services.start_ray_local(num_objstores=4, num_workers=0, worker_path=None)
+    ray.connect(node_ip_address, scheduler_address, mode=ray.SCRIPT_MODE)
+    objstore_addresses = [objstore_info["address"] for objstore_info in ray.scheduler_info()["objstores"]]
+    workers = []
+    for objstore_address in objstore_addresses:
+      w = ray.worker.Worker()
+      ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+      ray.connect(node_ip_address, scheduler_address, objstore_address=objstore_address, mode=ray.SCRIPT_MODE, worker=w)
+      workers.append(w)
+
+    # Broadcast a small object and a large object, which is sent along a tree.
+    for data in [np.arange(10), np.random.normal(size=[1000, 1000])]:
+      objectid = ray.put(data, workers[0])
+      ray.broadcast(objectid, workers[0])
+      for w in workers:
+        assert_equal(ray.get(objectid, w), data)
+
+    # We started multiple drivers manually, so we will disconnect them manually.
+    for w in workers:
+      ray.disconnect(worker=w)
+    ray.worker.cleanup()
+
+class CompressionTest(unittest.TestCase):
+
+  def testCompressedTransfers(self):
+    node_ip_address = "127.0.0.1"
+    scheduler_address = ray.services.start_ray_local(num_objstores=1, num_workers=0, worker_path=None)
+    # Object stores with different IP addresses are treated as being on
+    # different machines, so objects are streamed between them and compressed
+    # when that pays off.
+    ray.services.start_objstore(scheduler_address, "127.0.0.2", cleanup=True)
+    ray.connect(node_ip_address, scheduler_address, mode=ray.SCRIPT_MODE)
+    for _ in range(50):
+      if len(ray.scheduler_info()["objstores"]) == 2:
+        break
+      time.sleep(0.1)
+    objstore_addresses = [objstore_info["address"] for objstore_info in ray.scheduler_info()["objstores"]]
+    self.assertEqual(len(objstore_addresses), 2)
+    w1 = ray.worker.Worker()
+    w2 = ray.worker.Worker()
+    ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+    ray.connect(node_ip_address, scheduler_address, objstore_address=objstore_addresses[0], mode=ray.SCRIPT_MODE, worker=w1)
+    ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+    ray.connect(node_ip_address, scheduler_address, objstore_address=objstore_addresses[1], mode=ray.SCRIPT_MODE, worker=w2)
+
+    def compression_stats(objstore_address):
+      return objstore_memory_info(objstore_address)["compression_stats"]
+
+    # A compressible array is sent compressed.
+    before = compression_stats(objstore_addresses[0])
+    data = np.zeros(10 ** 6)
+    assert_equal(ray.get(ray.put(data, w1), w2), data)
+    after = compression_stats(objstore_addresses[0])
+    self.assertGreater(after["num_streams_compressed"], before["num_streams_compressed"])
+    num_bytes_uncompressed = after["num_bytes_uncompressed"] - before["num_bytes_uncompressed"]
+    num_bytes_compressed = after["num_bytes_compressed"] - before["num_bytes_compressed"]
+    self.assertGreaterEqual(num_bytes_uncompressed, data.nbytes)
+    self.assertLess(num_bytes_compressed, num_bytes_uncompressed)
+    self.assertGreater(after["compression_time"], 0)
+    self.assertGreater(compression_stats(objstore_addresses[1])["decompression_time"], 0)
+
+    # A random array does not compress, so it is sent as it is.
+    before = after
+    data = np.frombuffer(np.random.bytes(8 * 10 ** 6), dtype=np.uint8)
+    assert_equal(ray.get(ray.put(data, w1), w2), data)
+    after = compression_stats(objstore_addresses[0])
+    self.assertGreater(after["num_streams_uncompressed"], before["num_streams_uncompressed"])
+    self.assertEqual(after["num_streams_compressed"], before["num_streams_compressed"])
+    self.assertEqual(after["num_bytes_compressed"], before["num_bytes_compressed"])
+
+    # Both kinds of arrays also make it back to the first object store.
+    for data in [np.ones([1000, 1000]), np.frombuffer(np.random.bytes(8 * 10 ** 6), dtype=np.uint8)]:
+      assert_equal(ray.get(ray.put(data, w2), w1), data)
+    self.assertGreater(compression_stats(objstore_addresses[1])["num_streams_compressed"], 0)
+    self.assertGreater(compression_stats(objstore_addresses[1])["num_streams_uncompressed"], 0)
+
+    # We started multiple drivers manually, so we will disconnect them manually.
+    ray.disconnect(worker=w1)
+    ray.disconnect(worker=w2)
+    ray.worker.cleanup()
+
+class PrefetchTest(unittest.TestCase):
+
+  def testPrefetch(self):
+    node_ip_address = "127.0.0.1"
+    scheduler_address = ray.services.start_ray_local(num_objstores=2, num_workers=0, worker_path=None)
+    ray.connect(node_ip_address, scheduler_address, mode=ray.SCRIPT_MODE)
+    objstore_addresses = [objstore_info["address"] for objstore_info in ray.scheduler_info()["objstores"]]
+    w1 = ray.worker.Worker()
+    w2 = ray.worker.Worker()
+    ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+    ray.connect(node_ip_address, scheduler_address, objstore_address=objstore_addresses[0], mode=ray.SCRIPT_MODE, worker=w1)
+    ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+    ray.connect(node_ip_address, scheduler_address, objstore_address=objstore_addresses[1], mode=ray.SCRIPT_MODE, worker=w2)
+
+    data = np.random.normal(size=[100, 100])
+    objectid = ray.put(data, w1)
+    ray.prefetch(objectid, node=objstore_addresses[1], worker=w1)
+    # The object is copied before anybody gets it.
+    self.assertTrue(wait_for_num_objects(objstore_addresses[1], 1))
+    assert_equal(ray.get(objectid, w2), data)
+    # Prefetching to the local object store of w2.
+    objectids = [ray.put(data, w1) for _ in range(3)]
+    ray.prefetch(objectids, worker=w2)
+    self.assertTrue(wait_for_num_objects(objstore_addresses[1], 4))
+    for objectid in objectids:
+      assert_equal(ray.get(objectid, w2), data)
+    # The scheduler rejects unknown addresses and keeps serving prefetches.
+    self.assertRaises(ray.libraylib.ray_error, lambda : ray.prefetch(objectid, node="0.0.0.0:1", worker=w1))
+    ray.prefetch(objectid, node=objstore_addresses[1], worker=w1)
+    self.assertRaises(TypeError, lambda : ray.libraylib.prefetch_objects(w1.handle, objectid, "", None))
+    self.assertRaises(TypeError, lambda : ray.libraylib.prefetch_objects(w1.handle, [objectid, 1], "", None))
+
+    # We started multiple drivers manually, so we will disconnect them manually.
+    ray.disconnect(worker=w1)
+    ray.disconnect(worker=w2)
+    ray.worker.cleanup()
+
+  def testPlacementHint(self):
+    ray.init(start_ray_local=True, num_objstores=2, num_workers=4)
+
+    @ray.remote
+    def f(x, y):
+      return x + y
+
+    xref = ray.put(np.ones(100))
+    yref = ray.put(np.ones(100))
+    ray.get([xref, yref]) # Wait until the object store reports both objects.
+    # The arguments are copied to the object store that holds the hint object
+    # before the task needs them there. The hint object is put into the object
+    # store that does not hold the arguments yet.
+    objstore_addresses = [objstore_info["address"] for objstore_info in ray.scheduler_info()["objstores"]]
+    [other_address] = [address for address in objstore_addresses if "ray.put in driver" not in objstore_memory_info(address)["functions"]]
+    w = ray.worker.Worker()
+    ray.reusables._cached_reusables = [] # This is a hack to make the test run.
+    ray.connect("127.0.0.1", ray.worker.global_worker.scheduler_address, objstore_address=other_address, mode=ray.SCRIPT_MODE, worker=w)
+    zref = ray.put(np.ones(100), w)
+    resultref = f.remote(xref, yref, _placement_hint=zref)
+    self.assertTrue(wait_for_num_objects(other_address, 3, function="ray.put in driver"))
+    assert_equal(ray.get(resultref), 2 * np.ones(100))
+    ray.disconnect(worker=w)
+
+    assert_equal(ray.get(f.remote(xref, yref, _placement_hint=xref)), 2 * np.ones(100))
+    assert_equal(ray.get(f.remote(1, 2, _placement_hint=f.remote(xref, yref))), 3)
+    self.assertRaises(Exception, lambda : f.remote(1, 2, _placement_hint=1))
+
+    ray.worker.cleanup()
+
+class EarlyShippingTest(unittest.TestCase):
+
+  def testEarlyShippingBudget(self):
+    node_ip_address = "127.0.0.1"
+    argument_size = 10 ** 6
+    num_arguments_in_budget = 2
+    scheduler_address = ray.services.start_ray_local(num_objstores=2, num_workers=4, early_shipping_budget=num_arguments_in_budget * argument_size + 10 ** 5)
+    ray.connect(node_ip_address, scheduler_address, mode=ray.SCRIPT_MODE)
+
+    @ray.remote
+    def use_argument(x):
+      time.sleep(0.2)
+      return x.size
+
+    arguments = [ray.put(np.zeros(argument_size, dtype=np.uint8)) for _ in range(16)]
+    ray.get(arguments) # Wait until the object store reports the arguments.
+    objstore_addresses = [objstore_info["address"] for objstore_info in ray.scheduler_info()["objstores"]]
+    [other_address] = [address for address in objstore_addresses if "ray.put in driver" not in objstore_memory_info(address)["functions"]]
+
+    # Every task uses its own argument, so the copies of the arguments in the
+    # other object store that are not used by the tasks that ran there are the
+    # overhead of shipping arguments ahead of time.
+    def num_unused_copies():
+      functions = objstore_memory_info(other_address)["functions"]
+      num_copies = functions["ray.put in driver"]["num_objects"] if "ray.put in driver" in functions else 0
+      num_tasks = sum([entry["num_objects"] for (name, entry) in functions.items() if name.endswith("use_argument")])
+      return num_copies - num_tasks
+
+    results = [use_argument.remote(x) for x in arguments]
+    num_running_tasks = 2 # the number of workers of the other object store
+    num_releasing = 1 # a copy can be observed between the assignment of its task and its deallocation
+    while len(ray.wait(results, num_returns=len(results), timeout=0.05)[0]) < len(results):
+      self.assertLessEqual(num_unused_copies(), num_arguments_in_budget + num_running_tasks + num_releasing)
+    self.assertEqual(ray.get(results), len(results) * [argument_size])
+    # The copies that were shipped for tasks that ran elsewhere are deallocated.
+    for _ in range(50):
+      if num_unused_copies() == 0:
+        break
+      time.sleep(0.1)
+    self.assertEqual(num_unused_copies(), 0)
+
+    ray.worker.cleanup()
+
+class MemoryInfoTest(unittest.TestCase):
+
+  def testMemoryInfo(self):
+    ray.init(start_ray_local=True, num_workers=1)
+
+    x = ray.put(np.zeros(2 * 10 ** 6, dtype=np.uint8))
+    y = ra.zeros.remote([1000, 1000])
+    ray.get(y)
+    [info] = ray.memory_info()
+    self.assertTrue(info["available"])
+    functions = info["functions"]
+    self.assertEqual(functions["ray.put in driver"]["num_objects"], 1)
+    self.assertGreaterEqual(functions["ray.put in driver"]["num_bytes"], 2 * 10 ** 6)
+    zeros_names = [name for name in functions if name.endswith("zeros")]
+    self.assertEqual(len(zeros_names), 1)
+    self.assertGreaterEqual(functions[zeros_names[0]]["num_bytes"], 8 * 10 ** 6)
+    self.assertEqual(info["num_objects"], sum(info["num_objects_by_size"].values()))
+    self.assertEqual(info["num_objects_by_size"][1024 * 1024], 2)
+    self.assertEqual(info["num_bytes"], info["pinned_bytes"] + info["evictable_bytes"])
+    self.assertGreater(info["oldest_object_age"], 0)
+
+    # The memory of deallocated objects is no longer reported.
+    del x
+    for _ in range(50):
+      if "ray.put in driver" not in ray.memory_info()[0]["functions"]:
+        break
+      time.sleep(0.1)
+    self.assertNotIn("ray.put in driver", ray.memory_info()[0]["functions"])
+
+    ray.worker.cleanup()
+
 class WorkerTest(unittest.TestCase):
 
   def testPutGet(self):
@@ -534,11 +900,11 @@ class ReferenceCountingTest(unittest.TestCase):
     def check_not_deallocated(object_ids):
       reference_counts = ray.scheduler_info()["reference_counts"]
       for object_id in object_ids:
-        self.assertGreater(reference_counts[object_id.id], 0)
+        self.assertGreater(reference_counts.get(object_id.id, 0), 0)
 
     def check_everything_deallocated():
-      reference_counts = ray.scheduler_info()["reference_counts"]
-      self.assertEqual(reference_counts, len(reference_counts) * [-1])
+      # Deallocated object IDs are not reported.
+      self.assertEqual(ray.scheduler_info()["reference_counts"], {})
 
     z = da.zeros.remote([da.BLOCK_SIZE, 2 * da.BLOCK_SIZE])
     time.sleep(0.1)
@@ -574,6 +940,38 @@ class ReferenceCountingTest(unittest.TestCase):
 
     ray.worker.cleanup()
 
+  def testObjectIDArrays(self):
+    ray.init(start_ray_local=True, num_workers=1)
+
+    # Arrays of object IDs are serialized as arrays of integers, so check that
+    # they come back with the same IDs and shape, and that the objects they
+    # refer to stay alive as long as the deserialized array does.
+    objectids = [ray.put(i) for i in range(6)]
+    ids = [objectid.id for objectid in objectids]
+    grid = np.array(objectids, dtype=object).reshape([2, 3])
+    x = ray.put(grid)
+    grid_val = ray.get(x)
+    self.assertEqual(grid_val.shape, (2, 3))
+    self.assertEqual([objectid.id for objectid in grid_val.ravel()], ids)
+    self.assertEqual(ray.get(grid_val.ravel().tolist()), range(6))
+    del objectids, grid, x
+    reference_counts = ray.scheduler_info()["reference_counts"]
+    for objectid in ids:
+      self.assertGreater(reference_counts.get(objectid, 0), 0)
+    del grid_val
+    reference_counts = ray.scheduler_info()["reference_counts"]
+    for objectid in ids:
+      self.assertNotIn(objectid, reference_counts)
+
+    # Object arrays that do not only contain object IDs are serialized as
+    # before.
+    for val in [np.array([1, "hi", None], dtype=object), np.array([ray.put(1), 1], dtype=object), np.empty([0], dtype=object)]:
+      val_get = ray.get(ray.put(val))
+      self.assertEqual(val_get.dtype, np.dtype(object))
+      self.assertEqual(val_get.shape, val.shape)
+
+    ray.worker.cleanup()
+
   def testGet(self):
     ray.init(start_ray_local=True, num_workers=3)
 
@@ -587,7 +985,7 @@ class ReferenceCountingTest(unittest.TestCase):
       objectid = x.id
       xval = ray.get(x)
       del x, xval
-      self.assertEqual(ray.scheduler_info()["reference_counts"][objectid], -1)
+      self.assertNotIn(objectid, ray.scheduler_info()["reference_counts"])
 
     # Remote objects that do not contain numpy arrays should be deallocated when
     # the corresponding ObjectID goes out of scope, even if ray.get has been
@@ -597,7 +995,7 @@ class ReferenceCountingTest(unittest.TestCase):
       objectid = x.id
       xval = ray.get(x)
       del x
-      self.assertEqual(ray.scheduler_info()["reference_counts"][objectid], -1)
+      self.assertNotIn(objectid, ray.scheduler_info()["reference_counts"])
 
     # Remote objects that contain numpy arrays should not be deallocated when
     # the corresponding ObjectID goes out of scope, if ray.get has been called
@@ -630,7 +1028,7 @@ class ReferenceCountingTest(unittest.TestCase):
       xval3
       self.assertEqual(ray.scheduler_info()["reference_counts"][objectid], 1)
       del xval3
-      self.assertEqual(ray.scheduler_info()["reference_counts"][objectid], -1)
+      self.assertNotIn(objectid, ray.scheduler_info()["reference_counts"])
 
     # Getting an object multiple times and assigning it to the same name should
     # work. This was a problem in https://github.com/ray-project/ray/issues/159.
@@ -645,7 +1043,265 @@ class ReferenceCountingTest(unittest.TestCase):
       del x
       self.assertEqual(ray.scheduler_info()["reference_counts"][objectid], 1)
       del xval
-      self.assertEqual(ray.scheduler_info()["reference_counts"][objectid], -1)
+      self.assertNotIn(objectid, ray.scheduler_info()["reference_counts"])
+
+    ray.worker.cleanup()
+
+def dump_computation_graph():
+  proto_path = os.path.join(tempfile.mkdtemp(), "computation-graph.binaryproto")
+  ray.libraylib.dump_computation_graph(ray.worker.global_worker.handle, proto_path)
+  computation_graph = ray.internal.graph_pb2.CompGraph()
+  with open(proto_path) as f:
+    computation_graph.ParseFromString(f.read())
+  os.remove(proto_path)
+  return computation_graph
+
+class ComputationGraphTest(unittest.TestCase):
+
+  def testPruningAndSpilling(self):
+    reload(test_functions)
+    ray.init(start_ray_local=True, num_workers=3, spill_computation_graph=True)
+
+    # Drop the results right away, so the tasks are pruned from the graph as
+    # soon as they finish, which happens while the graph is being streamed.
+    # There are more tasks than fit in one batch of the stream.
+    num_tasks = 3000
+    for _ in range(num_tasks):
+      test_functions.trivial_function.remote()
+    for computation_graph in [dump_computation_graph(), dump_computation_graph()]:
+      operationids = list(computation_graph.operationid)
+      self.assertEqual(len(operationids), len(set(operationids)))
+      self.assertEqual(len(operationids), len(computation_graph.operation))
+      self.assertEqual(len([op for op in computation_graph.operation if op.task.name == "test_functions.trivial_function"]), num_tasks)
+
+    # Once every task has finished, all of them are read back from the spill
+    # file exactly once.
+    ray.get(test_functions.trivial_function.remote())
+    time.sleep(0.5)
+    computation_graph = dump_computation_graph()
+    operationids = list(computation_graph.operationid)
+    self.assertEqual(len(operationids), len(set(operationids)))
+    self.assertEqual(len([op for op in computation_graph.operation if op.task.name == "test_functions.trivial_function"]), num_tasks + 1)
+    self.assertEqual(len(ray.task_info()["failed_tasks"]), 0)
+
+    spill_files = list(ray.services.spill_files)
+    self.assertEqual(len(spill_files), 1)
+    self.assertTrue(os.path.exists(spill_files[0]))
+    ray.worker.cleanup()
+    self.assertFalse(os.path.exists(spill_files[0]))
+
+  def testPruningWithoutSpilling(self):
+    reload(test_functions)
+    ray.init(start_ray_local=True, num_workers=3)
+
+    # Without a spill file, the operations that have been pruned are gone.
+    for _ in range(100):
+      test_functions.trivial_function.remote()
+    ray.get(test_functions.trivial_function.remote())
+    time.sleep(0.5)
+    computation_graph = dump_computation_graph()
+    self.assertLess(len([op for op in computation_graph.operation if op.task.name == "test_functions.trivial_function"]), 101)
+    self.assertEqual(ray.services.spill_files, [])
+
+    ray.worker.cleanup()
+
+class SchedulingPolicyTest(unittest.TestCase):
+
+  def testSchedulingPolicies(self):
+    for scheduling_policy in ["naive", "locality_aware", "locality_by_bytes", "least_loaded", "random", "delay"]:
+      reload(test_functions)
+      ray.init(start_ray_local=True, num_objstores=2, num_workers=4, scheduling_policy=scheduling_policy)
+
+      @ray.remote
+      def f(x, y):
+        return x + y
+
+      # Run independent tasks and tasks whose arguments live in different
+      # object stores to completion.
+      self.assertEqual(ray.get([test_functions.trivial_function.remote() for _ in range(20)]), 20 * [1])
+      a = ray.put(np.ones(1000))
+      b = ray.put(np.ones(1000))
+      results = [f.remote(a, b) for _ in range(10)]
+      results = [f.remote(results[i], results[i + 1]) for i in range(9)]
+      for result in ray.get(results):
+        self.assertTrue(np.alltrue(result == 4 * np.ones(1000)))
+
+      ray.worker.cleanup()
+
+  def testSchedulerAlgorithmFlag(self):
+    # --scheduler-algorithm is still accepted as an alias of
+    # --scheduling-policy, and an unknown policy stops the scheduler.
+    for (scheduling_policy, starts) in [("naive", True), ("locality_aware", True), ("unknown_policy", False)]:
+      scheduler_address = ray.services.address("127.0.0.1", ray.services.new_scheduler_port())
+      p = ray.services.subprocess.Popen(["scheduler", scheduler_address, "--scheduler-algorithm", scheduling_policy], env=ray.services._services_env)
+      time.sleep(0.5)
+      if starts:
+        self.assertIsNone(p.poll())
+        p.kill()
+      else:
+        self.assertIsNotNone(p.poll())
+        self.assertNotEqual(p.returncode, 0)
+      p.wait()
+
+class SpeculativeExecutionTest(unittest.TestCase):
+
+  def testStragglers(self):
+    ray.init(start_ray_local=True, num_workers=2, speculation_percentile=0.9)
+
+    # The first execution of f with slow=True takes a long time, the copy that
+    # the scheduler starts is fast.
+    marker = os.path.join(tempfile.mkdtemp(), "straggler")
+    @ray.remote
+    def f(x, slow):
+      if slow:
+        try:
+          os.mkdir(marker)
+          time.sleep(30)
+        except OSError:
+          pass
+      return x
+
+    # Record the runtimes of some fast tasks.
+    for i in range(20):
+      self.assertEqual(ray.get(f.remote(i, False)), i)
+    start_time = time.time()
+    self.assertEqual(ray.get(f.remote(100, True)), 100)
+    self.assertLess(time.time() - start_time, 10)
+    info = ray.scheduler_info()
+    self.assertGreaterEqual(info["num_speculative_executions"], 1)
+    self.assertGreaterEqual(info["num_speculative_executions_won"], 1)
+
+    ray.worker.cleanup()
+
+  def testMemoryInfoAfterStragglerFinishes(self):
+    ray.init(start_ray_local=True, num_workers=2, speculation_percentile=0.9)
+
+    marker = os.path.join(tempfile.mkdtemp(), "straggler")
+    @ray.remote
+    def maybe_slow(x, slow):
+      if slow:
+        try:
+          os.mkdir(marker)
+          time.sleep(3)
+        except OSError:
+          pass
+      return x
+
+    results = [maybe_slow.remote(i, False) for i in range(20)]
+    self.assertEqual(ray.get(results), range(20))
+    slow_result = maybe_slow.remote(100, True)
+    self.assertEqual(ray.get(slow_result), 100)
+    # Wait for the straggler to finish writing its duplicate of the result.
+    time.sleep(4)
+    # Asking for the memory usage does not change it, and the objects are
+    # reported consistently.
+    [info] = ray.memory_info()
+    [info_again] = ray.memory_info()
+    self.assertEqual(info["num_objects"], info_again["num_objects"])
+    self.assertEqual(info["num_bytes"], info_again["num_bytes"])
+    self.assertEqual(info["num_objects"], sum(info["num_objects_by_size"].values()))
+    self.assertEqual(info["num_bytes"], info["pinned_bytes"] + info["evictable_bytes"])
+    [name] = [name for name in info["functions"] if name.endswith("maybe_slow")]
+    self.assertGreaterEqual(info["functions"][name]["num_objects"], 21)
+
+    # Once the results are deallocated, neither they nor the duplicate are
+    # reported anymore.
+    del results, slow_result
+    for _ in range(50):
+      if name not in ray.memory_info()[0]["functions"]:
+        break
+      time.sleep(0.1)
+    self.assertNotIn(name, ray.memory_info()[0]["functions"])
+
+    ray.worker.cleanup()
+
+class CancelTest(unittest.TestCase):
+
+  def testCancel(self):
+    ray.init(start_ray_local=True, num_workers=1, driver_mode=ray.SILENT_MODE)
+
+    marker = os.path.join(tempfile.mkdtemp(), "running")
+    @ray.remote
+    def f(x, sleep):
+      if sleep:
+        os.mkdir(marker)
+        time.sleep(30)
+      return x
+
+    # A task that has finished cannot be cancelled.
+    xref = f.remote(1, False)
+    self.assertEqual(ray.get(xref), 1)
+    self.assertFalse(ray.cancel(xref))
+    self.assertEqual(ray.get(xref), 1)
+
+    # Occupy the only worker, so the next task stays in the queue.
+    running = f.remote(2, True)
+    while not os.path.exists(marker):
+      time.sleep(0.1)
+    queued = f.remote(3, False)
+    self.assertTrue(ray.cancel(queued))
+    self.assertRaises(Exception, lambda : ray.get(queued))
+
+    start_time = time.time()
+    self.assertTrue(ray.cancel(running))
+    self.assertRaises(Exception, lambda : ray.get(running))
+    self.assertLess(time.time() - start_time, 10)
+
+    # The worker is still usable after being interrupted.
+    self.assertEqual(ray.get(f.remote(4, False)), 4)
+
+    # The cancellation is not swallowed by "except Exception:" in the task.
+    os.rmdir(marker)
+    @ray.remote
+    def g():
+      try:
+        os.mkdir(marker)
+        time.sleep(30)
+      except Exception:
+        pass
+      return 5
+    running = g.remote()
+    while not os.path.exists(marker):
+      time.sleep(0.1)
+    start_time = time.time()
+    self.assertTrue(ray.cancel(running))
+    self.assertRaises(Exception, lambda : ray.get(running))
+    self.assertLess(time.time() - start_time, 10)
+
+    ray.worker.cleanup()
+
+  def testCancelBlockedInGet(self):
+    ray.init(start_ray_local=True, num_workers=2, driver_mode=ray.SILENT_MODE)
+
+    directory = tempfile.mkdtemp()
+    @ray.remote
+    def slow(x):
+      time.sleep(3)
+      return x
+
+    @ray.remote
+    def g(x):
+      os.mkdir(os.path.join(directory, "waiting"))
+      y = ray.get(x)
+      # This is never reached, because the interrupt takes effect as soon as
+      # ray.get returns.
+      os.mkdir(os.path.join(directory, "finished"))
+      return y
+
+    x = slow.remote(1)
+    y = g.remote(x)
+    while not os.path.exists(os.path.join(directory, "waiting")):
+      time.sleep(0.1)
+    start_time = time.time()
+    self.assertTrue(ray.cancel(y))
+    self.assertRaises(Exception, lambda : ray.get(y))
+    self.assertLess(time.time() - start_time, 10)
+    self.assertFalse(os.path.exists(os.path.join(directory, "finished")))
+    # The object that the cancelled task was waiting for is not affected.
+    self.assertEqual(ray.get(x), 1)
+
+    # The workers are still usable afterwards.
+    self.assertEqual(ray.get([slow.remote(2), slow.remote(3)]), [2, 3])
 
     ray.worker.cleanup()
 